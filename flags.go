@@ -241,6 +241,17 @@ func newApp() (app *cli.App) {
 				Usage: "Experimental: Export metrics to the OpenTelemetry collector at this address.",
 			},
 
+			cli.BoolFlag{
+				Name:  "experimental-opentelemetry-collector-insecure",
+				Usage: "Experimental: Connect to the OpenTelemetry collector without TLS, e.g. to a collector on the same host.",
+			},
+
+			cli.DurationFlag{
+				Name:  "experimental-opentelemetry-collector-export-interval",
+				Value: 0,
+				Usage: "Experimental: Export metrics to the OpenTelemetry collector with this interval. It sets the reporting period of all the OpenCensus view exporters of the process. The default value 0 keeps the OpenCensus default of 10s.",
+			},
+
 			cli.StringFlag{
 				Name:  "log-file",
 				Value: "",
@@ -327,10 +338,12 @@ type flagStorage struct {
 	MaxConnsPerHost   int
 
 	// Monitoring & Logging
-	StackdriverExportInterval time.Duration
-	OtelCollectorAddress      string
-	LogFile                   string
-	LogFormat                 string
+	StackdriverExportInterval   time.Duration
+	OtelCollectorAddress        string
+	OtelCollectorInsecure       bool
+	OtelCollectorExportInterval time.Duration
+	LogFile                     string
+	LogFormat                   string
 
 	// Debugging
 	DebugFuse       bool
@@ -382,10 +395,12 @@ func populateFlags(c *cli.Context) (flags *flagStorage) {
 		MaxConnsPerHost:   c.Int("max-conns-per-host"),
 
 		// Monitoring & Logging
-		StackdriverExportInterval: c.Duration("experimental-stackdriver-export-interval"),
-		OtelCollectorAddress:      c.String("experimental-opentelemetry-collector-address"),
-		LogFile:                   c.String("log-file"),
-		LogFormat:                 c.String("log-format"),
+		StackdriverExportInterval:   c.Duration("experimental-stackdriver-export-interval"),
+		OtelCollectorAddress:        c.String("experimental-opentelemetry-collector-address"),
+		OtelCollectorInsecure:       c.Bool("experimental-opentelemetry-collector-insecure"),
+		OtelCollectorExportInterval: c.Duration("experimental-opentelemetry-collector-export-interval"),
+		LogFile:                     c.String("log-file"),
+		LogFormat:                   c.String("log-format"),
 
 		// Debugging,
 		DebugFuse:       c.Bool("debug_fuse"),
@@ -85,22 +85,35 @@ func CloseStackdriverExporter() {
 var ocExporter *ocagent.Exporter
 
 // EnableOpenTelemetryCollectorExporter starts exporting monitoring metrics to
-// the OpenTelemetry Collector at the given address.
+// the OpenTelemetry Collector at the given address. The connection is made
+// without TLS iff insecure, and views are reported with the given interval iff
+// it is positive, which applies to all the view exporters of the process.
 // Details: https://opentelemetry.io/docs/collector/
-func EnableOpenTelemetryCollectorExporter(address string) error {
+func EnableOpenTelemetryCollectorExporter(
+	address string,
+	insecure bool,
+	interval time.Duration) error {
 	if address == "" {
 		return nil
 	}
 
-	var err error
-	if ocExporter, err = ocagent.NewExporter(
+	options := []ocagent.ExporterOption{
 		ocagent.WithAddress(address),
 		ocagent.WithServiceName("gcsfuse"),
-		ocagent.WithReconnectionPeriod(5*time.Second),
-	); err != nil {
+		ocagent.WithReconnectionPeriod(5 * time.Second),
+	}
+	if insecure {
+		options = append(options, ocagent.WithInsecure())
+	}
+
+	var err error
+	if ocExporter, err = ocagent.NewExporter(options...); err != nil {
 		return fmt.Errorf("create opentelementry collector exporter: %w", err)
 	}
 
+	if interval > 0 {
+		view.SetReportingPeriod(interval)
+	}
 	view.RegisterExporter(ocExporter)
 	infoLogger.Printf("OpenTelemetry collector exporter started")
 	return nil
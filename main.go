@@ -294,7 +294,10 @@ func runCLIApp(c *cli.Context) (err error) {
 
 	// The returned error is ignored as we do not enforce monitoring exporters
 	monitor.EnableStackdriverExporter(flags.StackdriverExportInterval)
-	monitor.EnableOpenTelemetryCollectorExporter(flags.OtelCollectorAddress)
+	monitor.EnableOpenTelemetryCollectorExporter(
+		flags.OtelCollectorAddress,
+		flags.OtelCollectorInsecure,
+		flags.OtelCollectorExportInterval)
 
 	// Mount, writing information about our progress to the writer that package
 	// daemonize gives us and telling it about the outcome.
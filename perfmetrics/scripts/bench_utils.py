@@ -0,0 +1,104 @@
+"""Helpers shared by the benchmarks of ml_tests and mount_benchmarks.
+
+The benchmarks import this module after adding perfmetrics/scripts to the
+path:
+  sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  '..'))
+  import bench_utils
+"""
+import os
+import sys
+import time
+from typing import Tuple
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# It takes up to 240 seconds for sampled data to be visible in Cloud Monitoring.
+METRICS_DELAY_SEC = 250
+
+
+def drop_caches() -> bool:
+  """Drops the kernel page cache, returning whether it succeeded.
+
+  Requires root or sudo.
+  """
+  return os.system(
+      'sync && echo 3 | sudo tee /proc/sys/vm/drop_caches > /dev/null') == 0
+
+
+def import_vm_metrics():
+  """Returns the vm_metrics module.
+
+  Imported on demand, so that the benchmarks run without the Cloud Monitoring
+  client when the GCS metrics are not fetched.
+  """
+  sys.path.insert(0, SCRIPTS_DIR)
+  from vm_metrics import vm_metrics
+  return vm_metrics
+
+
+def get_metric_window(start_time_sec, end_time_sec) -> Tuple[int, int]:
+  """Returns the whole-second interval covering a run, to fetch its metrics."""
+  return int(start_time_sec), int(end_time_sec) + 1
+
+
+def wait_for_metric_window(start_time_sec, end_time_sec) -> None:
+  """Waits until the metric window of a run has ended.
+
+  vm_metrics.VmMetrics.fetch_metric_total widens a run shorter than the
+  alignment period to a whole period, so the next run starts after it, not to
+  be counted in the metrics of this one.
+  """
+  window_end = import_vm_metrics().get_metric_window_end(
+      *get_metric_window(start_time_sec, end_time_sec))
+  time.sleep(max(0.0, window_end + 1 - time.time()))
+
+
+def wait_for_metrics() -> None:
+  """Waits until the metrics of the runs are visible in Cloud Monitoring."""
+  print(f'Waiting for {METRICS_DELAY_SEC} seconds for metrics to be updated...')
+  time.sleep(METRICS_DELAY_SEC)
+
+
+def import_fake_gcs_server():
+  """Returns the fake_gcs_server module of fake_gcs.
+
+  Imported on demand, so that the benchmarks run against GCS without fake_gcs.
+  """
+  sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'fake_gcs'))
+  import fake_gcs_server
+  return fake_gcs_server
+
+
+def fetch_fake_gcs_reads(endpoint) -> Tuple[int, int]:
+  """Returns the readers opened and bytes sent by the fake GCS server."""
+  fake_gcs_server = import_fake_gcs_server()
+  stats = fake_gcs_server.fetch_stats(endpoint).get(
+      fake_gcs_server.OBJECTS_GET_MEDIA, fake_gcs_server.MethodStats())
+  return stats.requests, stats.bytes_sent
+
+
+def fetch_fake_gcs_uploads(endpoint) -> Tuple[int, int]:
+  """Returns the requests and bytes received by the fake GCS server."""
+  stats = import_fake_gcs_server().fetch_stats(endpoint).values()
+  return (sum(s.requests for s in stats), sum(s.bytes_received for s in stats))
+
+
+def percentile(values, percentile_rank) -> float:
+  """Returns the value at a percentile rank in [0, 100] of non empty values."""
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * percentile_rank / 100))]
+
+
+def fetch_fake_gcs_stats(endpoint):
+  """Returns the stats of the fake GCS server by API method."""
+  return import_fake_gcs_server().fetch_stats(endpoint)
+
+
+def fetch_fake_gcs_metadata_requests(endpoint) -> int:
+  """Returns the objects.get and objects.list requests of the fake server."""
+  fake_gcs_server = import_fake_gcs_server()
+  stats = fake_gcs_server.fetch_stats(endpoint)
+  return sum(stats[method].requests
+             for method in (fake_gcs_server.OBJECTS_GET,
+                            fake_gcs_server.OBJECTS_LIST)
+             if method in stats)
@@ -0,0 +1,22 @@
+"""Tests for bench_utils."""
+import unittest
+
+import bench_utils
+
+
+class BenchUtilsTest(unittest.TestCase):
+
+  def test_percentile(self):
+    values = [5, 1, 4, 2, 3]
+
+    self.assertEqual(1, bench_utils.percentile(values, 0))
+    self.assertEqual(3, bench_utils.percentile(values, 50))
+    self.assertEqual(5, bench_utils.percentile(values, 99))
+    self.assertEqual(5, bench_utils.percentile(values, 100))
+
+  def test_get_metric_window(self):
+    self.assertEqual((100, 131), bench_utils.get_metric_window(100.7, 130.2))
+
+
+if __name__ == '__main__':
+  unittest.main()
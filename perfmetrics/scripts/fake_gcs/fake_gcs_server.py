@@ -0,0 +1,840 @@
+"""Fake GCS server, so that gcsfuse and the load tests run without network.
+
+The server implements the parts of the GCS JSON API used by gcsfuse (objects
+get with ranges, insert with media, multipart and resumable uploads, compose,
+copy/rewrite, patch, list with pagination and delete) and the object
+get/put/delete of the XML API. Objects are kept in memory, or on local disk
+with --root_dir. Mount gcsfuse against it with mount_fake_gcs.sh, or with
+`gcsfuse --endpoint http://localhost:<port>`.
+
+The number of requests and the bytes received and sent for every API method
+are served as JSON at /_fake_gcs/stats, and reset by a DELETE of it.
+
+Latencies, errors and bandwidth caps are injected according to a profile of
+injection.py, selected with --profile and switched at runtime by a PUT of
+{"name": <profile name>} to /_fake_gcs/profile, or of {"name": <name>,
+"profile": <profile>} for a new profile.
+
+To run the server:
+>> python3 fake_gcs_server.py [--port 9000] [--root_dir <dir>] [--bucket <bucket name>] [--profile gcs_like] [--profile_file <profiles JSON file>]
+"""
+import argparse
+import base64
+import dataclasses
+import http
+import http.server
+import json
+import signal
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from typing import Dict, Iterator, Optional
+
+import injection
+import object_store
+
+DEFAULT_PORT = 9000
+STATS_PATH = '/_fake_gcs/stats'
+PROFILE_PATH = '/_fake_gcs/profile'
+DEFAULT_PROFILE = 'none'
+MAX_LIST_RESULTS = 5000
+DEFAULT_LIST_RESULTS = 1000
+BODY_CHUNK_SIZE = 1024 * 1024
+# Bytes sent or received at once when the bandwidth is limited, for the rate to
+# be smooth.
+THROTTLED_CHUNK_SIZE = 64 * 1024
+SHUTDOWN_POLL_SEC = 0.05
+# Resumable uploads sent in several requests are spooled to disk above this.
+MAX_SPOOLED_UPLOAD_SIZE = 16 * 1024 * 1024
+
+# API methods, as named in the JSON API, for the stats.
+BUCKETS_LIST = 'buckets.list'
+BUCKETS_GET = 'buckets.get'
+BUCKETS_INSERT = 'buckets.insert'
+OBJECTS_LIST = 'objects.list'
+OBJECTS_GET = 'objects.get'
+# Reads of the object data, i.e. objects.get with alt=media, as NewReader in
+# gcsfuse.
+OBJECTS_GET_MEDIA = 'objects.get_media'
+OBJECTS_INSERT = 'objects.insert'
+OBJECTS_COMPOSE = 'objects.compose'
+OBJECTS_COPY = 'objects.copy'
+OBJECTS_PATCH = 'objects.patch'
+OBJECTS_DELETE = 'objects.delete'
+
+
+class BadRequestError(Exception):
+  """The request is invalid."""
+
+
+@dataclasses.dataclass
+class MethodStats:
+  requests: int = 0
+  errors: int = 0
+  bytes_received: int = 0
+  bytes_sent: int = 0
+  injected_errors: int = 0
+  injected_latency_sec: float = 0
+  throttled_sec: float = 0
+
+
+class RequestStats:
+  """Thread-safe counters of the requests of every API method."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._stats: Dict[str, MethodStats] = {}
+
+  def add(self, method, request: MethodStats) -> None:
+    """Adds the stats of requests to those of their method."""
+    with self._lock:
+      stats = self._stats.setdefault(method, MethodStats())
+      for field in dataclasses.fields(MethodStats):
+        setattr(stats, field.name,
+                getattr(stats, field.name) + getattr(request, field.name))
+
+  def get(self) -> Dict[str, dict]:
+    with self._lock:
+      return {
+          method: dataclasses.asdict(stats)
+          for method, stats in sorted(self._stats.items())
+      }
+
+  def reset(self) -> None:
+    with self._lock:
+      self._stats.clear()
+
+
+@dataclasses.dataclass
+class ResumableUpload:
+  metadata: object_store.ObjectMetadata
+  if_generation_match: Optional[int]
+  if_metageneration_match: Optional[int]
+  data: Optional[object] = None
+  received: int = 0
+
+
+def parse_range(value, size) -> Optional[tuple]:
+  """Returns the [start, end) range of a Range header, or None to read all.
+
+  Raises:
+    BadRequestError: When the header is not a single bytes range.
+  """
+  if not value:
+    return None
+  unit, _, spec = value.partition('=')
+  if unit.strip() != 'bytes' or ',' in spec or '-' not in spec:
+    raise BadRequestError(f'Unsupported range {value}')
+  first, last = (part.strip() for part in spec.split('-', 1))
+  try:
+    if not first:
+      # Suffix range of the last bytes.
+      return max(size - int(last), 0), size
+    return int(first), size if not last else int(last) + 1
+  except ValueError:
+    raise BadRequestError(f'Invalid range {value}')
+
+
+def parse_multipart(body: bytes, content_type) -> tuple:
+  """Returns (metadata resource, data) of a multipart/related upload.
+
+  Raises:
+    BadRequestError: When the body has no metadata and data parts.
+  """
+  boundary = ''
+  for param in content_type.split(';')[1:]:
+    key, _, value = param.strip().partition('=')
+    if key == 'boundary':
+      boundary = value.strip('"')
+  if not boundary:
+    raise BadRequestError('No multipart boundary')
+  parts = []
+  for part in body.split(b'--' + boundary.encode())[1:]:
+    if part.startswith(b'--'):
+      break
+    _, _, content = part.partition(b'\r\n\r\n')
+    # Every part is followed by a CRLF before the next boundary.
+    parts.append(content[:-2] if content.endswith(b'\r\n') else content)
+  if len(parts) != 2:
+    raise BadRequestError(f'Expected 2 multipart parts, got {len(parts)}')
+  return json.loads(parts[0] or b'{}'), parts[1]
+
+
+def _get_int(query, key) -> Optional[int]:
+  value = query.get(key)
+  if value is None or value == '':
+    return None
+  try:
+    return int(value)
+  except ValueError:
+    raise BadRequestError(f'Invalid {key}: {value}')
+
+
+def _get_metadata(bucket, name, resource) -> object_store.ObjectMetadata:
+  """Returns the metadata of a new object from an object resource."""
+  return object_store.ObjectMetadata(
+      bucket, name,
+      content_type=(resource.get('contentType') or
+                    object_store.DEFAULT_CONTENT_TYPE),
+      metadata=resource.get('metadata') or {},
+      cache_control=resource.get('cacheControl') or '',
+      content_encoding=resource.get('contentEncoding') or '',
+      content_language=resource.get('contentLanguage') or '')
+
+
+def _get_bucket_resource(bucket) -> dict:
+  return {
+      'kind': 'storage#bucket',
+      'id': bucket,
+      'name': bucket,
+      'location': 'US',
+      'storageClass': 'STANDARD',
+  }
+
+
+class FakeGcsHandler(http.server.BaseHTTPRequestHandler):
+  """Handles the requests of a FakeGcsServer."""
+  # Keep-alive, for gcsfuse connections to be reused as with GCS.
+  protocol_version = 'HTTP/1.1'
+  # Headers and bodies are written separately, which Nagle's algorithm would
+  # delay by up to 40ms.
+  disable_nagle_algorithm = True
+
+  def setup(self) -> None:
+    super().setup()
+    # Injector of the profile of the connection and its token buckets.
+    self.injector = None
+    self.buckets = []
+
+  def log_message(self, format, *args) -> None:
+    if self.server.verbose:
+      super().log_message(format, *args)
+
+  def do_GET(self):
+    self._handle()
+
+  def do_HEAD(self):
+    self._handle()
+
+  def do_POST(self):
+    self._handle()
+
+  def do_PUT(self):
+    self._handle()
+
+  def do_PATCH(self):
+    self._handle()
+
+  def do_DELETE(self):
+    self._handle()
+
+  def _handle(self) -> None:
+    # gcsfuse sends absolute URIs, e.g. http://host/storage/v1/b/..., which
+    # urlsplit handles along with paths.
+    url = urllib.parse.urlsplit(self.path)
+    self.query = {
+        key: values[0]
+        for key, values in urllib.parse.parse_qs(
+            url.query, keep_blank_values=True).items()
+    }
+    self.stats = MethodStats(requests=1)
+    self.body_read = False
+    if self.injector is not self.server.injector:
+      self.injector = self.server.injector
+      self.buckets = self.injector.new_connection_buckets()
+    if url.path == STATS_PATH:
+      self._handle_stats()
+      return
+    if url.path == PROFILE_PATH:
+      self._handle_profile()
+      return
+    segments = [urllib.parse.unquote(segment)
+                for segment in url.path.split('/')[1:]]
+    method, handler, args = self._route(segments)
+    self.stats.errors = 1
+    try:
+      injected_status = self.injector.get_error(method) if handler else None
+      latency_sec = self.injector.get_latency(method)
+      if latency_sec:
+        self.stats.injected_latency_sec = latency_sec
+        time.sleep(latency_sec)
+      if handler is None:
+        self._send_error(http.HTTPStatus.NOT_FOUND, f'No route {url.path}')
+      elif injected_status:
+        self.stats.injected_errors = 1
+        self._send_error(
+            http.HTTPStatus(injected_status),
+            f'Error injected by profile {self.injector.profile.name}')
+      else:
+        handler(*args)
+        self.stats.errors = 0
+    except object_store.NotFoundError as e:
+      self._send_error(http.HTTPStatus.NOT_FOUND, str(e))
+    except object_store.PreconditionError as e:
+      self._send_error(http.HTTPStatus.PRECONDITION_FAILED, str(e))
+    except object_store.InvalidRangeError as e:
+      self._send_error(http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, str(e))
+    except (BadRequestError, ValueError) as e:
+      self._send_error(http.HTTPStatus.BAD_REQUEST, str(e))
+    except ConnectionError:
+      # The client closed the connection, e.g. gcsfuse discarding a reader.
+      self.close_connection = True
+    finally:
+      self.server.stats.add(method, self.stats)
+
+  def _route(self, segments) -> tuple:
+    """Returns (API method, handler, handler args) of a request."""
+    command = self.command
+    if segments[:2] == ['upload', 'storage']:
+      if segments[2:4] == ['v1', 'b'] and segments[5:] == ['o'] and command in [
+          'POST', 'PUT'
+      ]:
+        return OBJECTS_INSERT, self._insert_object, [segments[4]]
+      return OBJECTS_INSERT, None, []
+    if segments[:2] == ['download', 'storage']:
+      segments = segments[1:]
+      if len(segments) == 6 and command in ['GET', 'HEAD']:
+        return OBJECTS_GET_MEDIA, self._get_media, [segments[3], segments[5]]
+      return OBJECTS_GET_MEDIA, None, []
+    if segments[:3] == ['storage', 'v1', 'b']:
+      return self._route_json(segments[3:])
+    # XML API: /<bucket>/<object>.
+    if len(segments) >= 2 and segments[1]:
+      bucket, name = segments[0], '/'.join(segments[1:])
+      routes = {
+          'GET': (OBJECTS_GET_MEDIA, self._get_media),
+          'HEAD': (OBJECTS_GET_MEDIA, self._get_media),
+          'PUT': (OBJECTS_INSERT, self._put_xml_object),
+          'DELETE': (OBJECTS_DELETE, self._delete_object),
+      }
+      if command in routes:
+        method, handler = routes[command]
+        return method, handler, [bucket, name]
+    return command, None, []
+
+  def _route_json(self, resource) -> tuple:
+    """Routes the resources under /storage/v1/b of the JSON API."""
+    command = self.command
+    length = len(resource)
+    if length == 0:
+      if command == 'GET':
+        return BUCKETS_LIST, self._list_buckets, []
+      if command == 'POST':
+        return BUCKETS_INSERT, self._insert_bucket, []
+    elif length == 1 and command == 'GET':
+      return BUCKETS_GET, self._get_bucket, resource
+    elif resource[1] == 'o':
+      bucket = resource[0]
+      if length == 2 and command == 'GET':
+        return OBJECTS_LIST, self._list_objects, [bucket]
+      if length == 3:
+        routes = {
+            'GET': (OBJECTS_GET, self._get_object),
+            'HEAD': (OBJECTS_GET, self._get_object),
+            'PATCH': (OBJECTS_PATCH, self._patch_object),
+            'DELETE': (OBJECTS_DELETE, self._delete_object),
+        }
+        if command in routes:
+          method, handler = routes[command]
+          if method == OBJECTS_GET and self.query.get('alt') == 'media':
+            method, handler = OBJECTS_GET_MEDIA, self._get_media
+          return method, handler, [bucket, resource[2]]
+      if length == 4 and resource[3] == 'compose' and command == 'POST':
+        return OBJECTS_COMPOSE, self._compose_object, [bucket, resource[2]]
+      # <object>/{copyTo,rewriteTo}/b/<bucket>/o/<object>
+      if (length == 8 and resource[3] in ['copyTo', 'rewriteTo'] and
+          resource[4] == 'b' and resource[6] == 'o' and command == 'POST'):
+        return OBJECTS_COPY, self._copy_object, [
+            bucket, resource[2], resource[3], resource[5], resource[7]
+        ]
+    return command, None, []
+
+  def _get_chunk_size(self) -> int:
+    if self.injector.limits_bandwidth:
+      return THROTTLED_CHUNK_SIZE
+    return BODY_CHUNK_SIZE
+
+  def _throttle(self, num_bytes, sent=True) -> None:
+    """Waits until bytes can be sent (or received) under the bandwidth caps."""
+    if self.injector.limits_bandwidth:
+      self.stats.throttled_sec += self.injector.throttle(
+          self.buckets, num_bytes, sent)
+
+  def _iter_body(self) -> Iterator[bytes]:
+    """Yields the request body in chunks, with or without chunked encoding."""
+    self.body_read = True
+    chunk_size = self._get_chunk_size()
+    if 'chunked' in self.headers.get('Transfer-Encoding', ''):
+      while True:
+        size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+        if size == 0:
+          # Trailers, up to an empty line.
+          while self.rfile.readline() not in [b'\r\n', b'\n', b'']:
+            pass
+          return
+        remaining = size
+        while remaining > 0:
+          self._throttle(min(remaining, chunk_size), sent=False)
+          chunk = self.rfile.read(min(remaining, chunk_size))
+          if not chunk:
+            raise BadRequestError('Truncated body')
+          remaining -= len(chunk)
+          self.stats.bytes_received += len(chunk)
+          yield chunk
+        self.rfile.readline()
+    else:
+      remaining = int(self.headers.get('Content-Length') or 0)
+      while remaining > 0:
+        self._throttle(min(remaining, chunk_size), sent=False)
+        chunk = self.rfile.read(min(remaining, chunk_size))
+        if not chunk:
+          raise BadRequestError('Truncated body')
+        remaining -= len(chunk)
+        self.stats.bytes_received += len(chunk)
+        yield chunk
+
+  def _read_body(self) -> bytes:
+    return b''.join(self._iter_body())
+
+  def _read_json(self) -> dict:
+    body = self._read_body()
+    return json.loads(body) if body.strip() else {}
+
+  def _drain_body(self) -> None:
+    """Reads the unread body for the connection to be reused."""
+    if not self.body_read:
+      for _ in self._iter_body():
+        pass
+
+  def _send(self, status, body=b'', content_type='application/json',
+            headers=None) -> None:
+    self._drain_body()
+    self.send_response(status)
+    for key, value in (headers or {}).items():
+      self.send_header(key, value)
+    if body or status != http.HTTPStatus.NO_CONTENT:
+      self.send_header('Content-Type', content_type)
+      self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    if self.command != 'HEAD' and body:
+      self._write_chunks([body])
+
+  def _send_json(self, resource, status=http.HTTPStatus.OK,
+                 headers=None) -> None:
+    self._send(status, json.dumps(resource).encode(), headers=headers)
+
+  def _send_error(self, status, message) -> None:
+    # The error format of the JSON API, parsed by googleapi.CheckResponse.
+    self._send_json(
+        {
+            'error': {
+                'code': int(status),
+                'message': message,
+                'errors': [{
+                    'domain': 'global',
+                    'reason': status.phrase,
+                    'message': message
+                }],
+            }
+        }, status)
+
+  def _handle_stats(self) -> None:
+    if self.command == 'DELETE':
+      self.server.stats.reset()
+      self._send(http.HTTPStatus.NO_CONTENT)
+    else:
+      self._send_json(self.server.stats.get())
+
+  def _handle_profile(self) -> None:
+    """Serves the injection profile, or selects it on PUT."""
+    if self.command == 'PUT':
+      request = self._read_json()
+      try:
+        self.server.set_profile(request.get('name', ''),
+                                request.get('profile'))
+      except (KeyError, ValueError) as e:
+        self._send_error(http.HTTPStatus.BAD_REQUEST, str(e))
+        return
+    self._send_json({
+        'name': self.server.injector.profile.name,
+        'profiles': sorted(self.server.profiles),
+    })
+
+  def _list_buckets(self) -> None:
+    self._send_json({
+        'kind': 'storage#buckets',
+        'items': [
+            _get_bucket_resource(bucket)
+            for bucket in self.server.store.list_buckets()
+        ],
+    })
+
+  def _insert_bucket(self) -> None:
+    bucket = self._read_json().get('name')
+    if not bucket:
+      raise BadRequestError('No bucket name')
+    self.server.store.create_bucket(bucket)
+    self._send_json(_get_bucket_resource(bucket))
+
+  def _get_bucket(self, bucket) -> None:
+    if not self.server.store.has_bucket(bucket):
+      raise object_store.NotFoundError(f'No bucket {bucket}')
+    self._send_json(_get_bucket_resource(bucket))
+
+  def _list_objects(self, bucket) -> None:
+    page_token = self.query.get('pageToken', '')
+    try:
+      start_after = base64.urlsafe_b64decode(page_token).decode()
+    except ValueError:
+      raise BadRequestError(f'Invalid page token {page_token}')
+    max_results = min(
+        _get_int(self.query, 'maxResults') or DEFAULT_LIST_RESULTS,
+        MAX_LIST_RESULTS)
+    objects, prefixes, last_name = self.server.store.list(
+        bucket, self.query.get('prefix', ''), self.query.get('delimiter', ''),
+        start_after, max_results,
+        self.query.get('includeTrailingDelimiter') == 'true')
+    listing = {
+        'kind': 'storage#objects',
+        'items': [metadata.to_resource() for metadata in objects],
+    }
+    if prefixes:
+      listing['prefixes'] = prefixes
+    if last_name:
+      listing['nextPageToken'] = base64.urlsafe_b64encode(
+          last_name.encode()).decode()
+    self._send_json(listing)
+
+  def _get_object(self, bucket, name) -> None:
+    metadata = self.server.store.get_metadata(
+        bucket, name, _get_int(self.query, 'generation'))
+    self._send_json(metadata.to_resource())
+
+  def _get_media(self, bucket, name) -> None:
+    store = self.server.store
+    metadata = store.get_metadata(bucket, name,
+                                  _get_int(self.query, 'generation'))
+    byte_range = parse_range(self.headers.get('Range'), metadata.size)
+    if byte_range is not None and byte_range[0] >= metadata.size:
+      raise object_store.InvalidRangeError(
+          f'Range {self.headers.get("Range")} not satisfiable for size '
+          f'{metadata.size}')
+    start, end = byte_range or (0, metadata.size)
+    end = min(end, metadata.size)
+    chunks = []
+    if self.command != 'HEAD':
+      metadata, start, end, chunks = store.read(bucket, name,
+                                                metadata.generation, start,
+                                                end)
+    self._drain_body()
+    if byte_range is None:
+      self.send_response(http.HTTPStatus.OK)
+    else:
+      self.send_response(http.HTTPStatus.PARTIAL_CONTENT)
+      self.send_header('Content-Range',
+                       f'bytes {start}-{end - 1}/{metadata.size}')
+    self.send_header('Content-Type', metadata.content_type)
+    self.send_header('Content-Length', str(end - start))
+    self.send_header('ETag', f'"{metadata.generation}"')
+    self.send_header('x-goog-generation', str(metadata.generation))
+    self.send_header('x-goog-metageneration', str(metadata.metageneration))
+    self.send_header('x-goog-stored-content-length', str(metadata.size))
+    if metadata.md5_hash:
+      self.send_header('x-goog-hash', f'md5={metadata.md5_hash}')
+    self.end_headers()
+    self._write_chunks(chunks)
+
+  def _write_chunks(self, chunks) -> None:
+    chunk_size = self._get_chunk_size()
+    for chunk in chunks:
+      for offset in range(0, len(chunk), chunk_size):
+        piece = chunk[offset:offset + chunk_size]
+        self._throttle(len(piece))
+        self.wfile.write(piece)
+        self.stats.bytes_sent += len(piece)
+
+  def _insert_object(self, bucket) -> None:
+    store = self.server.store
+    upload_type = self.query.get('uploadType', 'media')
+    if_generation_match = _get_int(self.query, 'ifGenerationMatch')
+    if_metageneration_match = _get_int(self.query, 'ifMetagenerationMatch')
+    if 'upload_id' in self.query:
+      self._continue_resumable_upload(self.query['upload_id'])
+      return
+    if upload_type == 'media':
+      name = self.query.get('name')
+      if not name:
+        raise BadRequestError('No object name')
+      metadata = _get_metadata(
+          bucket, name, {'contentType': self.headers.get('Content-Type')})
+      chunks = self._iter_body()
+    elif upload_type == 'multipart':
+      resource, data = parse_multipart(self._read_body(),
+                                       self.headers.get('Content-Type', ''))
+      name = resource.get('name') or self.query.get('name')
+      if not name:
+        raise BadRequestError('No object name')
+      metadata = _get_metadata(bucket, name, resource)
+      chunks = [data]
+    elif upload_type == 'resumable':
+      resource = self._read_json()
+      name = resource.get('name') or self.query.get('name')
+      if not name:
+        raise BadRequestError('No object name')
+      if not resource.get('contentType'):
+        resource['contentType'] = self.headers.get('X-Upload-Content-Type')
+      if not store.has_bucket(bucket):
+        raise object_store.NotFoundError(f'No bucket {bucket}')
+      upload_id = uuid.uuid4().hex
+      with self.server.lock:
+        self.server.uploads[upload_id] = ResumableUpload(
+            _get_metadata(bucket, name, resource), if_generation_match,
+            if_metageneration_match)
+      query = urllib.parse.urlencode({
+          'uploadType': 'resumable',
+          'upload_id': upload_id
+      })
+      host = self.headers.get('Host') or '%s:%d' % self.server.server_address
+      self._send_json({}, headers={
+          'Location': f'http://{host}/upload/storage/v1/b/'
+                      f'{urllib.parse.quote(bucket, safe="")}/o?{query}'
+      })
+      return
+    else:
+      raise BadRequestError(f'Unsupported uploadType {upload_type}')
+    metadata = store.write(metadata, chunks, if_generation_match,
+                           if_metageneration_match)
+    self._send_json(metadata.to_resource())
+
+  def _continue_resumable_upload(self, upload_id) -> None:
+    """Receives data of a resumable upload, in one or several requests.
+
+    Uploads are finalized once the total size is known from the Content-Range
+    header, or by a request without Content-Range.
+    """
+    with self.server.lock:
+      upload = self.server.uploads.get(upload_id)
+    if upload is None:
+      raise object_store.NotFoundError(f'No upload {upload_id}')
+    # The Content-Range is bytes <first>-<last>/<total or *>, or bytes
+    # */<total> to end the upload. The total is only sent with the last data.
+    final = not self.headers.get('Content-Range', '').endswith('/*')
+    chunks = self._iter_body()
+    if final and upload.data is None:
+      # The whole object is in this request, as sent by gcsfuse.
+      with self.server.lock:
+        self.server.uploads.pop(upload_id, None)
+      metadata = self.server.store.write(upload.metadata, chunks,
+                                         upload.if_generation_match,
+                                         upload.if_metageneration_match)
+      self._send_json(metadata.to_resource())
+      return
+    if upload.data is None:
+      upload.data = tempfile.SpooledTemporaryFile(
+          max_size=MAX_SPOOLED_UPLOAD_SIZE)
+    for chunk in chunks:
+      upload.data.write(chunk)
+      upload.received += len(chunk)
+    if not final:
+      headers = ({
+          'Range': f'bytes=0-{upload.received - 1}'
+      } if upload.received else {})
+      self._send(http.HTTPStatus.PERMANENT_REDIRECT, headers=headers)
+      return
+    with self.server.lock:
+      self.server.uploads.pop(upload_id, None)
+    upload.data.seek(0)
+    with upload.data:
+      metadata = self.server.store.write(
+          upload.metadata,
+          iter(lambda: upload.data.read(BODY_CHUNK_SIZE), b''),
+          upload.if_generation_match, upload.if_metageneration_match)
+    self._send_json(metadata.to_resource())
+
+  def _put_xml_object(self, bucket, name) -> None:
+    metadata = _get_metadata(
+        bucket, name, {'contentType': self.headers.get('Content-Type')})
+    metadata = self.server.store.write(
+        metadata, self._iter_body(),
+        _get_int(self.headers, 'x-goog-if-generation-match'))
+    self._send(http.HTTPStatus.OK, headers={
+        'ETag': f'"{metadata.generation}"',
+        'x-goog-generation': str(metadata.generation)
+    })
+
+  def _compose_object(self, bucket, name) -> None:
+    request = self._read_json()
+    sources = [(source['name'], _get_int(source, 'generation'))
+               for source in request.get('sourceObjects', [])]
+    if not sources:
+      raise BadRequestError('No source objects')
+    metadata = self.server.store.compose(
+        bucket, _get_metadata(bucket, name, request.get('destination') or {}),
+        sources, _get_int(self.query, 'ifGenerationMatch'),
+        _get_int(self.query, 'ifMetagenerationMatch'))
+    self._send_json(metadata.to_resource())
+
+  def _copy_object(self, bucket, name, operation, destination_bucket,
+                   destination_name) -> None:
+    store = self.server.store
+    resource = self._read_json()
+    source, _, _, chunks = store.read(
+        bucket, name, _get_int(self.query, 'sourceGeneration'))
+    destination = dataclasses.replace(
+        source, bucket=destination_bucket, name=destination_name,
+        metadata=dict(source.metadata))
+    if resource:
+      destination = _get_metadata(destination_bucket, destination_name, {
+          **source.to_resource(), **resource
+      })
+    metadata = store.write(destination, chunks,
+                           _get_int(self.query, 'ifGenerationMatch'),
+                           _get_int(self.query, 'ifMetagenerationMatch'))
+    if operation == 'rewriteTo':
+      self._send_json({
+          'kind': 'storage#rewriteResponse',
+          'totalBytesRewritten': str(metadata.size),
+          'objectSize': str(metadata.size),
+          'done': True,
+          'resource': metadata.to_resource(),
+      })
+    else:
+      self._send_json(metadata.to_resource())
+
+  def _patch_object(self, bucket, name) -> None:
+    metadata = self.server.store.update(
+        bucket, name, self._read_json(), _get_int(self.query, 'generation'),
+        _get_int(self.query, 'ifGenerationMatch'),
+        _get_int(self.query, 'ifMetagenerationMatch'))
+    self._send_json(metadata.to_resource())
+
+  def _delete_object(self, bucket, name) -> None:
+    self.server.store.delete(bucket, name, _get_int(self.query, 'generation'),
+                             _get_int(self.query, 'ifGenerationMatch'),
+                             _get_int(self.query, 'ifMetagenerationMatch'))
+    self._send(http.HTTPStatus.NO_CONTENT)
+
+
+class FakeGcsServer(http.server.ThreadingHTTPServer):
+  """HTTP server of an object store, with a thread per connection."""
+  daemon_threads = True
+
+  def __init__(self, store: object_store.ObjectStore, address=('localhost',
+                                                               DEFAULT_PORT),
+               handler_class=FakeGcsHandler, verbose=False, profiles=None,
+               profile=DEFAULT_PROFILE):
+    """Initializes the server.
+
+    Args:
+      store: Store of the buckets and objects.
+      address: (host, port) to listen on.
+      handler_class: Class handling the requests.
+      verbose: Whether to log every request.
+      profiles: Injection profiles by name, see injection.load_profiles. The
+        built-in profiles by default.
+      profile: Name of the injection profile.
+
+    Raises:
+      KeyError: When the profile does not exist.
+    """
+    super().__init__(address, handler_class)
+    self.store = store
+    self.stats = RequestStats()
+    self.lock = threading.Lock()
+    self.uploads: Dict[str, ResumableUpload] = {}
+    self.verbose = verbose
+    self.profiles = (injection.load_profiles(None)
+                     if profiles is None else dict(profiles))
+    self.injector: Optional[injection.Injector] = None
+    self.set_profile(profile)
+
+  def set_profile(self, name, spec=None) -> None:
+    """Selects the injection profile of the next requests.
+
+    Connections switch to the profile on their next request, with new token
+    buckets and a new random seed sequence.
+
+    Args:
+      name: Name of the profile.
+      spec: Dict of a new profile, as documented in injection.py, added to the
+        profiles under the name.
+
+    Raises:
+      KeyError: When the profile does not exist.
+      ValueError: When the spec is invalid.
+    """
+    if spec is not None:
+      self.profiles[name] = injection.InjectionProfile.from_dict(name, spec)
+    if name not in self.profiles:
+      raise KeyError(f'No profile {name}')
+    self.injector = injection.Injector(self.profiles[name])
+
+  @property
+  def endpoint(self) -> str:
+    host, port = self.server_address[:2]
+    return f'http://{host}:{port}'
+
+
+def start_server(store: object_store.ObjectStore, address=('localhost', 0),
+                 **kwargs) -> FakeGcsServer:
+  """Starts serving the store in a background thread.
+
+  Port 0 picks a free port, see FakeGcsServer.endpoint.
+  """
+  server = FakeGcsServer(store, address, **kwargs)
+  threading.Thread(target=server.serve_forever, args=[SHUTDOWN_POLL_SEC],
+                   daemon=True).start()
+  return server
+
+
+def fetch_stats(endpoint) -> Dict[str, MethodStats]:
+  """Fetches the stats of a running server by method, e.g. for a benchmark."""
+  with urllib.request.urlopen(endpoint + STATS_PATH) as response:
+    return {
+        method: MethodStats(**stats)
+        for method, stats in json.load(response).items()
+    }
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--host', default='localhost')
+  parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+  parser.add_argument('--root_dir', default='',
+                      help='Directory the objects are stored in. Objects are '
+                      'kept in memory by default')
+  parser.add_argument('--bucket', action='append', default=[],
+                      help='Bucket to create. Can be repeated')
+  parser.add_argument('--verbose', action='store_true', default=False,
+                      help='Log every request')
+  parser.add_argument('--profile', default=DEFAULT_PROFILE,
+                      help='Injection profile, e.g. gcs_like, throttled or '
+                      'bandwidth_capped')
+  parser.add_argument('--profile_file', default='',
+                      help='JSON file of injection profiles by name')
+  args = parser.parse_args(argv[1:])
+
+  if args.root_dir:
+    store = object_store.DiskObjectStore(args.root_dir)
+  else:
+    store = object_store.MemoryObjectStore()
+  for bucket in args.bucket:
+    store.create_bucket(bucket)
+  server = FakeGcsServer(store, (args.host, args.port), verbose=args.verbose,
+                         profiles=injection.load_profiles(args.profile_file),
+                         profile=args.profile)
+  for signum in [signal.SIGINT, signal.SIGTERM]:
+    signal.signal(signum, lambda *_: threading.Thread(
+        target=server.shutdown).start())
+  print(f'Serving fake GCS at {server.endpoint} with profile {args.profile}',
+        flush=True)
+  server.serve_forever()
+  server.server_close()
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,372 @@
+"""Tests for fake_gcs_server."""
+import http.client
+import json
+import unittest
+import urllib.parse
+
+import fake_gcs_server
+import object_store
+
+BUCKET = 'bucket'
+
+
+class FakeGcsServerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.store = object_store.MemoryObjectStore()
+    self.store.create_bucket(BUCKET)
+    self.server = fake_gcs_server.start_server(self.store)
+    host, port = self.server.server_address[:2]
+    self.connection = http.client.HTTPConnection(host, port)
+
+  def tearDown(self):
+    self.connection.close()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def _request(self, method, path, body=None, headers=None):
+    self.connection.request(method, path, body, headers or {})
+    response = self.connection.getresponse()
+    return response, response.read()
+
+  def _json_request(self, method, path, resource=None, headers=None):
+    body = json.dumps(resource) if resource is not None else None
+    response, data = self._request(method, path, body, headers)
+    return response, json.loads(data) if data else None
+
+  def _insert(self, name, data):
+    quoted = urllib.parse.quote(name, safe='')
+    response, data = self._request(
+        'POST', f'/upload/storage/v1/b/{BUCKET}/o?uploadType=media&'
+        f'name={quoted}', data, {'Content-Type': 'text/plain'})
+    self.assertEqual(200, response.status)
+    return json.loads(data)
+
+  def test_media_insert_and_ranged_get(self):
+    resource = self._insert('a/b', b'0123456789')
+
+    response, data = self._request(
+        'GET', f'/download/storage/v1/b/{BUCKET}/o/a%2Fb?alt=media&'
+        f'generation={resource["generation"]}', headers={'Range': 'bytes=2-5'})
+
+    self.assertEqual(206, response.status)
+    self.assertEqual(b'2345', data)
+    self.assertEqual('bytes 2-5/10', response.headers['Content-Range'])
+    self.assertEqual('10', resource['size'])
+
+  def test_get_media_of_absolute_uri(self):
+    # gcsfuse sends absolute URIs as the request target.
+    self._insert('a', b'data')
+    host, port = self.server.server_address[:2]
+
+    response, data = self._request(
+        'GET', f'http://{host}:{port}/download/storage/v1/b/{BUCKET}/o/a?'
+        'alt=media')
+
+    self.assertEqual(200, response.status)
+    self.assertEqual(b'data', data)
+
+  def test_range_after_end_returns_416(self):
+    self._insert('a', b'0123')
+
+    response, data = self._request(
+        'GET', f'/storage/v1/b/{BUCKET}/o/a?alt=media',
+        headers={'Range': 'bytes=4-10'})
+
+    self.assertEqual(416, response.status)
+    self.assertEqual(416, json.loads(data)['error']['code'])
+
+  def test_get_object_metadata(self):
+    self._insert('a', b'data')
+
+    response, resource = self._json_request('GET',
+                                            f'/storage/v1/b/{BUCKET}/o/a')
+
+    self.assertEqual(200, response.status)
+    self.assertEqual('4', resource['size'])
+    self.assertEqual('storage#object', resource['kind'])
+
+  def test_missing_object_returns_404(self):
+    response, resource = self._json_request('GET',
+                                            f'/storage/v1/b/{BUCKET}/o/a')
+
+    self.assertEqual(404, response.status)
+    self.assertEqual(404, resource['error']['code'])
+
+  def test_resumable_upload_in_one_request(self):
+    response, _ = self._json_request(
+        'POST', f'/upload/storage/v1/b/{BUCKET}/o?uploadType=resumable&'
+        'ifGenerationMatch=0', {'name': 'a'},
+        {'X-Upload-Content-Type': 'text/plain'})
+    location = urllib.parse.urlsplit(response.headers['Location'])
+
+    # Chunked, as sent by gcsfuse for files.
+    self.connection.request('PUT', f'{location.path}?{location.query}',
+                            iter([b'01', b'23']), encode_chunked=True)
+    response = self.connection.getresponse()
+    resource = json.loads(response.read())
+
+    self.assertEqual(200, response.status)
+    self.assertEqual('4', resource['size'])
+    self.assertEqual('text/plain', resource['contentType'])
+    _, _, _, chunks = self.store.read(BUCKET, 'a')
+    self.assertEqual(b'0123', b''.join(chunks))
+
+  def test_resumable_upload_in_several_requests(self):
+    response, _ = self._json_request(
+        'POST', f'/upload/storage/v1/b/{BUCKET}/o?uploadType=resumable',
+        {'name': 'a'})
+    location = urllib.parse.urlsplit(response.headers['Location'])
+    path = f'{location.path}?{location.query}'
+
+    response, _ = self._request('PUT', path, b'01',
+                                {'Content-Range': 'bytes 0-1/*'})
+    self.assertEqual(308, response.status)
+    self.assertEqual('bytes=0-1', response.headers['Range'])
+    response, data = self._request('PUT', path, b'23',
+                                   {'Content-Range': 'bytes 2-3/4'})
+
+    self.assertEqual(200, response.status)
+    self.assertEqual('4', json.loads(data)['size'])
+
+  def test_multipart_insert(self):
+    body = (b'--b\r\nContent-Type: application/json\r\n\r\n'
+            b'{"name": "a", "metadata": {"k": "v"}}\r\n'
+            b'--b\r\nContent-Type: text/plain\r\n\r\ndata\r\n--b--\r\n')
+
+    response, resource = self._json_request(
+        'POST', f'/upload/storage/v1/b/{BUCKET}/o?uploadType=multipart', None,
+        {'Content-Type': 'multipart/related; boundary=b'})
+    self.assertEqual(400, response.status)
+    response, data = self._request(
+        'POST', f'/upload/storage/v1/b/{BUCKET}/o?uploadType=multipart', body,
+        {'Content-Type': 'multipart/related; boundary=b'})
+
+    resource = json.loads(data)
+    self.assertEqual(200, response.status)
+    self.assertEqual('4', resource['size'])
+    self.assertEqual({'k': 'v'}, resource['metadata'])
+
+  def test_precondition_failure_returns_412(self):
+    self._insert('a', b'1')
+
+    response, _ = self._request(
+        'POST', f'/upload/storage/v1/b/{BUCKET}/o?uploadType=media&name=a&'
+        'ifGenerationMatch=0', b'2')
+
+    self.assertEqual(412, response.status)
+
+  def test_compose(self):
+    self._insert('a', b'01')
+    self._insert('b', b'23')
+
+    response, resource = self._json_request(
+        'POST', f'/storage/v1/b/{BUCKET}/o/c/compose', {
+            'destination': {'contentType': 'text/plain'},
+            'sourceObjects': [{'name': 'a'}, {'name': 'b'}]
+        })
+
+    self.assertEqual(200, response.status)
+    self.assertEqual('4', resource['size'])
+    self.assertEqual(2, resource['componentCount'])
+    _, _, _, chunks = self.store.read(BUCKET, 'c')
+    self.assertEqual(b'0123', b''.join(chunks))
+
+  def test_copy_and_rewrite(self):
+    self._insert('a', b'data')
+
+    response, resource = self._json_request(
+        'POST', f'/storage/v1/b/{BUCKET}/o/a/copyTo/b/{BUCKET}/o/b')
+    self.assertEqual(200, response.status)
+    self.assertEqual('b', resource['name'])
+    response, resource = self._json_request(
+        'POST', f'/storage/v1/b/{BUCKET}/o/a/rewriteTo/b/{BUCKET}/o/c', {})
+
+    self.assertTrue(resource['done'])
+    self.assertEqual('4', resource['resource']['size'])
+
+  def test_patch(self):
+    self._insert('a', b'data')
+
+    response, resource = self._json_request(
+        'PATCH', f'/storage/v1/b/{BUCKET}/o/a?ifMetagenerationMatch=1',
+        {'metadata': {'k': 'v'}})
+
+    self.assertEqual(200, response.status)
+    self.assertEqual('2', resource['metageneration'])
+    self.assertEqual({'k': 'v'}, resource['metadata'])
+
+  def test_list_pages(self):
+    for name in ['a', 'b/1', 'b/2', 'c']:
+      self._insert(name, b'')
+
+    names, prefixes = [], []
+    page_token = ''
+    while True:
+      response, listing = self._json_request(
+          'GET', f'/storage/v1/b/{BUCKET}/o?delimiter=/&maxResults=2&'
+          f'pageToken={page_token}')
+      self.assertEqual(200, response.status)
+      names += [item['name'] for item in listing['items']]
+      prefixes += listing.get('prefixes', [])
+      page_token = listing.get('nextPageToken')
+      if not page_token:
+        break
+
+    self.assertEqual(['a', 'c'], names)
+    self.assertEqual(['b/'], prefixes)
+
+  def test_delete(self):
+    self._insert('a', b'data')
+
+    response, _ = self._request('DELETE', f'/storage/v1/b/{BUCKET}/o/a')
+    self.assertEqual(204, response.status)
+    response, _ = self._request('DELETE', f'/storage/v1/b/{BUCKET}/o/a')
+
+    self.assertEqual(404, response.status)
+
+  def test_xml_api(self):
+    response, _ = self._request('PUT', f'/{BUCKET}/a/b', b'0123')
+    self.assertEqual(200, response.status)
+
+    response, data = self._request('GET', f'/{BUCKET}/a/b',
+                                   headers={'Range': 'bytes=-2'})
+    self.assertEqual(206, response.status)
+    self.assertEqual(b'23', data)
+    response, _ = self._request('DELETE', f'/{BUCKET}/a/b')
+
+    self.assertEqual(204, response.status)
+
+  def test_buckets(self):
+    response, resource = self._json_request('POST', '/storage/v1/b',
+                                            {'name': 'other'})
+    self.assertEqual(200, response.status)
+
+    response, resource = self._json_request('GET', '/storage/v1/b/other')
+    self.assertEqual('other', resource['name'])
+    response, resource = self._json_request('GET', '/storage/v1/b/missing')
+
+    self.assertEqual(404, response.status)
+
+  def test_stats(self):
+    self._insert('a', b'data')
+    self._request('GET', f'/storage/v1/b/{BUCKET}/o/a?alt=media')
+    self._request('GET', f'/storage/v1/b/{BUCKET}/o/missing')
+
+    _, stats = self._json_request('GET', fake_gcs_server.STATS_PATH)
+
+    self.assertEqual(
+        {
+            'requests': 1,
+            'errors': 0,
+            'bytes_received': 0,
+            'bytes_sent': 4,
+            'injected_errors': 0,
+            'injected_latency_sec': 0,
+            'throttled_sec': 0
+        }, stats[fake_gcs_server.OBJECTS_GET_MEDIA])
+    self.assertEqual(1, stats[fake_gcs_server.OBJECTS_GET]['errors'])
+    self.assertEqual(4, stats[fake_gcs_server.OBJECTS_INSERT]['bytes_received'])
+    response, _ = self._request('DELETE', fake_gcs_server.STATS_PATH)
+    self.assertEqual(204, response.status)
+    _, stats = self._json_request('GET', fake_gcs_server.STATS_PATH)
+    self.assertEqual({}, stats)
+
+  def test_fetch_stats(self):
+    self._insert('a', b'data')
+
+    stats = fake_gcs_server.fetch_stats(self.server.endpoint)
+
+    self.assertEqual(1, stats[fake_gcs_server.OBJECTS_INSERT].requests)
+    self.assertEqual(4, stats[fake_gcs_server.OBJECTS_INSERT].bytes_received)
+
+  def test_injected_errors_and_latency(self):
+    self._insert('a', b'data')
+    self.server.set_profile(
+        'flaky', {
+            'latency': {
+                '*': {
+                    'ms': 20
+                }
+            },
+            'errors': {
+                fake_gcs_server.OBJECTS_GET_MEDIA: {
+                    '503': 1
+                }
+            }
+        })
+
+    response, error = self._json_request(
+        'GET', f'/storage/v1/b/{BUCKET}/o/a?alt=media')
+    metadata_response, _ = self._json_request('GET',
+                                              f'/storage/v1/b/{BUCKET}/o/a')
+
+    self.assertEqual(503, response.status)
+    self.assertEqual(503, error['error']['code'])
+    self.assertEqual(200, metadata_response.status)
+    _, stats = self._json_request('GET', fake_gcs_server.STATS_PATH)
+    self.assertEqual(1, stats[fake_gcs_server.OBJECTS_GET_MEDIA]['errors'])
+    self.assertEqual(1,
+                     stats[fake_gcs_server.OBJECTS_GET_MEDIA]['injected_errors'])
+    self.assertAlmostEqual(
+        0.02, stats[fake_gcs_server.OBJECTS_GET]['injected_latency_sec'])
+
+  def test_bandwidth_cap(self):
+    data = b'x' * 200 * 1000
+    self._insert('a', data)
+    self.server.set_profile('capped', {
+        'bandwidth': {
+            'per_connection_mb_per_sec': 1,
+            'burst_kb': 64
+        }
+    })
+
+    response, received = self._request(
+        'GET', f'/storage/v1/b/{BUCKET}/o/a?alt=media')
+
+    self.assertEqual(data, received)
+    _, stats = self._json_request('GET', fake_gcs_server.STATS_PATH)
+    # 200KB at 1MB/s with a 64KiB burst.
+    self.assertGreater(stats[fake_gcs_server.OBJECTS_GET_MEDIA]['throttled_sec'],
+                       0.1)
+
+  def test_profile_endpoint(self):
+    response, profile = self._json_request(
+        'PUT', fake_gcs_server.PROFILE_PATH, {'name': 'gcs_like'})
+
+    self.assertEqual(200, response.status)
+    self.assertEqual('gcs_like', profile['name'])
+    self.assertIn('throttled', profile['profiles'])
+    self.assertEqual('gcs_like', self.server.injector.profile.name)
+    response, profile = self._json_request(
+        'PUT', fake_gcs_server.PROFILE_PATH, {
+            'name': 'slow',
+            'profile': {
+                'latency': {
+                    '*': {
+                        'ms': 1
+                    }
+                }
+            }
+        })
+    self.assertEqual('slow', profile['name'])
+    response, _ = self._json_request('PUT', fake_gcs_server.PROFILE_PATH,
+                                     {'name': 'missing'})
+    self.assertEqual(400, response.status)
+    _, profile = self._json_request('GET', fake_gcs_server.PROFILE_PATH)
+    self.assertEqual('slow', profile['name'])
+
+
+class ParseRangeTest(unittest.TestCase):
+
+  def test_parse_range(self):
+    self.assertIsNone(fake_gcs_server.parse_range('', 10))
+    self.assertEqual((2, 6), fake_gcs_server.parse_range('bytes=2-5', 10))
+    self.assertEqual((2, 10), fake_gcs_server.parse_range('bytes=2-', 10))
+    self.assertEqual((7, 10), fake_gcs_server.parse_range('bytes=-3', 10))
+    with self.assertRaises(fake_gcs_server.BadRequestError):
+      fake_gcs_server.parse_range('bytes=1-2,4-5', 10)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,315 @@
+"""Latency, bandwidth and error injection profiles of the fake GCS server.
+
+A profile injects, for every API method (see fake_gcs_server), a latency before
+the response is sent, i.e. a time to first byte, and errors at given rates, and
+caps the bandwidth of every connection and of the whole server with token
+buckets. Random draws are seeded, so that a benchmark sees the same latencies
+and errors every run.
+
+Profiles are dicts, usually in a JSON file of named profiles:
+{
+  "slow_reads": {
+    "seed": 1,
+    "latency": {
+      "objects.get_media": {"distribution": "lognormal", "median_ms": 30,
+                            "p99_ms": 250},
+      "*": {"distribution": "constant", "ms": 10}
+    },
+    "errors": {"objects.get_media": {"503": 0.01}, "*": {"429": 0.001}},
+    "bandwidth": {"per_connection_mb_per_sec": 50, "aggregate_mb_per_sec": 400,
+                  "burst_kb": 256}
+  }
+}
+Latency distributions are constant (ms), uniform (min_ms, max_ms), lognormal
+(median_ms and p99_ms) or percentiles (percentiles_ms, e.g. {"50": 20,
+"99": 300}, interpolated linearly). "*" applies to the methods not listed.
+Bandwidth caps apply to the bytes sent and received separately.
+"""
+import dataclasses
+import json
+import math
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_METHOD = '*'
+MB = 10**6
+# Tokens above which a bucket does not fill, i.e. the largest burst.
+DEFAULT_BURST_BYTES = 256 * 1024
+# z-score of the 99th percentile of the normal distribution.
+P99_Z_SCORE = 2.3263
+MS_TO_SEC = 10**(-3)
+CONSTANT = 'constant'
+UNIFORM = 'uniform'
+LOGNORMAL = 'lognormal'
+PERCENTILES = 'percentiles'
+
+# Profiles that can be selected by name without a profile file.
+BUILTIN_PROFILES = {
+    'none': {},
+    # Typical latencies of GCS from a VM in the same region.
+    'gcs_like': {
+        'seed': 1,
+        'latency': {
+            'objects.get_media': {
+                'distribution': LOGNORMAL,
+                'median_ms': 30,
+                'p99_ms': 200
+            },
+            'objects.insert': {
+                'distribution': LOGNORMAL,
+                'median_ms': 60,
+                'p99_ms': 400
+            },
+            DEFAULT_METHOD: {
+                'distribution': LOGNORMAL,
+                'median_ms': 15,
+                'p99_ms': 100
+            },
+        },
+    },
+    'throttled': {
+        'seed': 1,
+        'errors': {
+            DEFAULT_METHOD: {
+                '429': 0.02,
+                '503': 0.01
+            }
+        },
+    },
+    'bandwidth_capped': {
+        'bandwidth': {
+            'per_connection_mb_per_sec': 50,
+            'aggregate_mb_per_sec': 400
+        },
+    },
+}
+
+
+@dataclasses.dataclass
+class LatencyDistribution:
+  """Distribution of a latency in seconds."""
+  distribution: str
+  # constant: (value,), uniform: (min, max), lognormal: (mu, sigma) of the log,
+  # percentiles: sorted (percentile, value) pairs.
+  params: Tuple
+
+  @classmethod
+  def from_dict(cls, spec) -> 'LatencyDistribution':
+    """Returns the distribution of a spec of a profile.
+
+    Raises:
+      ValueError: When the spec is invalid.
+    """
+    distribution = spec.get('distribution', CONSTANT)
+    try:
+      if distribution == CONSTANT:
+        params = (spec['ms'] * MS_TO_SEC,)
+      elif distribution == UNIFORM:
+        params = (spec['min_ms'] * MS_TO_SEC, spec['max_ms'] * MS_TO_SEC)
+      elif distribution == LOGNORMAL:
+        median = spec['median_ms'] * MS_TO_SEC
+        p99 = spec['p99_ms'] * MS_TO_SEC
+        if median <= 0 or p99 < median:
+          raise ValueError(f'Expected 0 < median_ms <= p99_ms in {spec}')
+        params = (math.log(median), math.log(p99 / median) / P99_Z_SCORE)
+      elif distribution == PERCENTILES:
+        params = tuple(
+            sorted((float(percentile), value * MS_TO_SEC)
+                   for percentile, value in spec['percentiles_ms'].items()))
+        if not params:
+          raise ValueError(f'No percentiles in {spec}')
+      else:
+        raise ValueError(f'Unknown distribution {distribution}')
+    except KeyError as e:
+      raise ValueError(f'Missing {e} in latency {spec}')
+    return cls(distribution, params)
+
+  def sample(self, rng: random.Random) -> float:
+    if self.distribution == CONSTANT:
+      return self.params[0]
+    if self.distribution == UNIFORM:
+      return rng.uniform(*self.params)
+    if self.distribution == LOGNORMAL:
+      return rng.lognormvariate(*self.params)
+    percentile = rng.uniform(0, 100)
+    previous_percentile, previous_value = self.params[0]
+    if percentile <= previous_percentile:
+      return previous_value
+    for next_percentile, next_value in self.params[1:]:
+      if percentile <= next_percentile:
+        fraction = ((percentile - previous_percentile) /
+                    (next_percentile - previous_percentile))
+        return previous_value + fraction * (next_value - previous_value)
+      previous_percentile, previous_value = next_percentile, next_value
+    return previous_value
+
+
+class TokenBucket:
+  """Thread-safe token bucket of bytes, blocking until bytes can be sent.
+
+  Bytes consumed beyond the tokens available are a debt, paid by sleeping, so
+  that concurrent consumers share the rate in order of arrival.
+  """
+
+  def __init__(self, bytes_per_sec, burst_bytes=DEFAULT_BURST_BYTES,
+               clock=time.monotonic, sleep=time.sleep):
+    self.bytes_per_sec = bytes_per_sec
+    self.burst_bytes = burst_bytes
+    self._clock = clock
+    self._sleep = sleep
+    self._lock = threading.Lock()
+    self._tokens = burst_bytes
+    self._last_time = clock()
+
+  def consume(self, num_bytes) -> float:
+    """Takes bytes from the bucket, sleeping while in debt.
+
+    Returns:
+      Seconds slept.
+    """
+    with self._lock:
+      now = self._clock()
+      self._tokens = min(
+          self.burst_bytes,
+          self._tokens + (now - self._last_time) * self.bytes_per_sec)
+      self._last_time = now
+      self._tokens -= num_bytes
+      wait_sec = -self._tokens / self.bytes_per_sec if self._tokens < 0 else 0
+    if wait_sec:
+      self._sleep(wait_sec)
+    return wait_sec
+
+
+@dataclasses.dataclass
+class InjectionProfile:
+  """Latencies, error rates and bandwidth caps injected by the server."""
+  name: str
+  seed: Optional[int] = None
+  latencies: Dict[str, LatencyDistribution] = dataclasses.field(
+      default_factory=dict)
+  # Rates of every HTTP status, by method.
+  error_rates: Dict[str, Dict[int, float]] = dataclasses.field(
+      default_factory=dict)
+  per_connection_bytes_per_sec: float = 0
+  aggregate_bytes_per_sec: float = 0
+  burst_bytes: int = DEFAULT_BURST_BYTES
+
+  @classmethod
+  def from_dict(cls, name, spec) -> 'InjectionProfile':
+    """Returns the profile of a spec, as documented in the module.
+
+    Raises:
+      ValueError: When the spec is invalid.
+    """
+    unknown = set(spec) - {'seed', 'latency', 'errors', 'bandwidth'}
+    if unknown:
+      raise ValueError(f'Unknown fields {sorted(unknown)} in profile {name}')
+    error_rates = {}
+    for method, rates in spec.get('errors', {}).items():
+      error_rates[method] = {int(status): rate for status, rate in rates.items()}
+      if sum(rates.values()) > 1:
+        raise ValueError(f'Error rates of {method} add up to more than 1')
+    bandwidth = spec.get('bandwidth', {})
+    return cls(
+        name, spec.get('seed'), {
+            method: LatencyDistribution.from_dict(latency)
+            for method, latency in spec.get('latency', {}).items()
+        }, error_rates,
+        bandwidth.get('per_connection_mb_per_sec', 0) * MB,
+        bandwidth.get('aggregate_mb_per_sec', 0) * MB,
+        int(bandwidth.get('burst_kb', DEFAULT_BURST_BYTES / 1024) * 1024))
+
+
+def load_profiles(profile_file) -> Dict[str, InjectionProfile]:
+  """Returns the built-in profiles and the profiles of a JSON file, by name.
+
+  Raises:
+    ValueError: When a profile is invalid.
+  """
+  specs = dict(BUILTIN_PROFILES)
+  if profile_file:
+    with open(profile_file, 'r') as f:
+      specs.update(json.load(f))
+  return {
+      name: InjectionProfile.from_dict(name, spec)
+      for name, spec in specs.items()
+  }
+
+
+class Injector:
+  """Draws the injections of a profile for the requests of a server."""
+
+  def __init__(self, profile: InjectionProfile, clock=time.monotonic,
+               sleep=time.sleep):
+    self.profile = profile
+    self._clock = clock
+    self._sleep = sleep
+    self._lock = threading.Lock()
+    self._rng = random.Random(profile.seed)
+    # Aggregate buckets of the bytes sent and received.
+    self._aggregate_buckets = [
+        self._new_bucket(profile.aggregate_bytes_per_sec) for _ in range(2)
+    ]
+
+  def _new_bucket(self, bytes_per_sec) -> Optional[TokenBucket]:
+    if not bytes_per_sec:
+      return None
+    return TokenBucket(bytes_per_sec, self.profile.burst_bytes, self._clock,
+                       self._sleep)
+
+  def _get(self, values, method):
+    return values.get(method, values.get(DEFAULT_METHOD))
+
+  def get_error(self, method) -> Optional[int]:
+    """Returns the HTTP status of an error to inject for a request, or None."""
+    rates = self._get(self.profile.error_rates, method)
+    if not rates:
+      return None
+    with self._lock:
+      draw = self._rng.random()
+    for status, rate in sorted(rates.items()):
+      if draw < rate:
+        return status
+      draw -= rate
+    return None
+
+  def get_latency(self, method) -> float:
+    """Returns the seconds to wait before responding to a request."""
+    latency = self._get(self.profile.latencies, method)
+    if latency is None:
+      return 0
+    with self._lock:
+      return latency.sample(self._rng)
+
+  def new_connection_buckets(self) -> List[TokenBucket]:
+    """Returns the buckets of the bytes sent and received by a connection."""
+    return [
+        self._new_bucket(self.profile.per_connection_bytes_per_sec)
+        for _ in range(2)
+    ]
+
+  @property
+  def limits_bandwidth(self) -> bool:
+    return bool(self.profile.per_connection_bytes_per_sec or
+                self.profile.aggregate_bytes_per_sec)
+
+  def throttle(self, connection_buckets, num_bytes, sent=True) -> float:
+    """Sleeps until bytes can be sent (or received) by a connection.
+
+    Args:
+      connection_buckets: Buckets of the connection, from
+        new_connection_buckets.
+      num_bytes: Number of bytes.
+      sent: Whether the bytes are sent or received by the server.
+
+    Returns:
+      Seconds slept.
+    """
+    index = 0 if sent else 1
+    slept_sec = 0
+    for bucket in [connection_buckets[index], self._aggregate_buckets[index]]:
+      if bucket is not None:
+        slept_sec += bucket.consume(num_bytes)
+    return slept_sec
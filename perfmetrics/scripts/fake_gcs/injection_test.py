@@ -0,0 +1,229 @@
+"""Tests for injection."""
+import json
+import os
+import random
+import statistics
+import tempfile
+import unittest
+
+import injection
+
+
+class FakeClock:
+
+  def __init__(self):
+    self.now = 0
+    self.sleeps = []
+
+  def time(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.sleeps.append(seconds)
+    self.now += seconds
+
+
+class LatencyDistributionTest(unittest.TestCase):
+
+  def _sample(self, spec, count=2000):
+    distribution = injection.LatencyDistribution.from_dict(spec)
+    rng = random.Random(1)
+    return [distribution.sample(rng) for _ in range(count)]
+
+  def test_constant(self):
+    self.assertEqual([0.01] * 3, self._sample({'ms': 10}, 3))
+
+  def test_uniform(self):
+    samples = self._sample({
+        'distribution': 'uniform',
+        'min_ms': 10,
+        'max_ms': 20
+    })
+
+    self.assertGreaterEqual(min(samples), 0.01)
+    self.assertLessEqual(max(samples), 0.02)
+
+  def test_lognormal_median_and_p99(self):
+    samples = sorted(
+        self._sample({
+            'distribution': 'lognormal',
+            'median_ms': 30,
+            'p99_ms': 200
+        }, 20000))
+
+    self.assertAlmostEqual(0.03, statistics.median(samples), delta=0.002)
+    self.assertAlmostEqual(0.2, samples[int(0.99 * len(samples))], delta=0.02)
+
+  def test_percentiles_are_interpolated(self):
+    samples = sorted(
+        self._sample({
+            'distribution': 'percentiles',
+            'percentiles_ms': {
+                '0': 10,
+                '50': 20,
+                '100': 100
+            }
+        }, 10000))
+
+    self.assertAlmostEqual(0.02, statistics.median(samples), delta=0.001)
+    self.assertAlmostEqual(0.06, samples[int(0.75 * len(samples))],
+                           delta=0.003)
+    self.assertLessEqual(samples[-1], 0.1)
+
+  def test_invalid_specs(self):
+    for spec in [{
+        'distribution': 'pareto'
+    }, {
+        'distribution': 'uniform',
+        'min_ms': 1
+    }, {
+        'distribution': 'lognormal',
+        'median_ms': 30,
+        'p99_ms': 10
+    }]:
+      with self.assertRaises(ValueError):
+        injection.LatencyDistribution.from_dict(spec)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+  def test_burst_then_rate(self):
+    clock = FakeClock()
+    bucket = injection.TokenBucket(1000, 500, clock.time, clock.sleep)
+
+    self.assertEqual(0, bucket.consume(500))
+    self.assertEqual(0.5, bucket.consume(500))
+    clock.now += 2
+    # Refilled up to the burst only.
+    self.assertEqual(0, bucket.consume(500))
+    self.assertEqual(0.1, bucket.consume(100))
+    self.assertEqual([0.5, 0.1], clock.sleeps)
+
+
+class InjectionProfileTest(unittest.TestCase):
+
+  def test_from_dict(self):
+    profile = injection.InjectionProfile.from_dict(
+        'p', {
+            'seed': 3,
+            'errors': {
+                '*': {
+                    '429': 0.5
+                }
+            },
+            'bandwidth': {
+                'per_connection_mb_per_sec': 2,
+                'burst_kb': 1
+            }
+        })
+
+    self.assertEqual(3, profile.seed)
+    self.assertEqual({'*': {429: 0.5}}, profile.error_rates)
+    self.assertEqual(2 * injection.MB, profile.per_connection_bytes_per_sec)
+    self.assertEqual(0, profile.aggregate_bytes_per_sec)
+    self.assertEqual(1024, profile.burst_bytes)
+
+  def test_invalid_profiles(self):
+    for spec in [{
+        'latencies': {}
+    }, {
+        'errors': {
+            '*': {
+                '503': 0.6,
+                '429': 0.6
+            }
+        }
+    }]:
+      with self.assertRaises(ValueError):
+        injection.InjectionProfile.from_dict('p', spec)
+
+  def test_load_profiles(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      profile_file = os.path.join(temp_dir, 'profiles.json')
+      with open(profile_file, 'w') as f:
+        json.dump({'slow': {'latency': {'*': {'ms': 100}}}}, f)
+
+      profiles = injection.load_profiles(profile_file)
+
+    self.assertEqual(
+        set(injection.BUILTIN_PROFILES) | {'slow'}, set(profiles))
+    self.assertEqual(0.1, profiles['slow'].latencies['*'].params[0])
+
+
+class InjectorTest(unittest.TestCase):
+
+  def test_error_rates_by_method(self):
+    injector = injection.Injector(
+        injection.InjectionProfile.from_dict(
+            'p', {
+                'seed': 1,
+                'errors': {
+                    'objects.get_media': {
+                        '429': 0.2,
+                        '503': 0.1
+                    }
+                }
+            }))
+
+    errors = [injector.get_error('objects.get_media') for _ in range(10000)]
+
+    self.assertAlmostEqual(0.2, errors.count(429) / len(errors), delta=0.02)
+    self.assertAlmostEqual(0.1, errors.count(503) / len(errors), delta=0.02)
+    self.assertIsNone(injector.get_error('objects.get'))
+
+  def test_same_seed_same_draws(self):
+    profile = injection.load_profiles(None)['gcs_like']
+
+    first, second = injection.Injector(profile), injection.Injector(profile)
+
+    first_latencies = [first.get_latency('objects.get_media') for _ in range(5)]
+    second_latencies = [
+        second.get_latency('objects.get_media') for _ in range(5)
+    ]
+
+    self.assertEqual(first_latencies, second_latencies)
+
+  def test_latency_of_default_method(self):
+    injector = injection.Injector(
+        injection.InjectionProfile.from_dict('p', {
+            'latency': {
+                'objects.get_media': {
+                    'ms': 5
+                },
+                '*': {
+                    'ms': 1
+                }
+            }
+        }))
+
+    self.assertEqual(0.005, injector.get_latency('objects.get_media'))
+    self.assertEqual(0.001, injector.get_latency('objects.list'))
+
+  def test_throttle_per_connection_and_aggregate(self):
+    # The clock does not advance, as for concurrent requests.
+    sleeps = []
+    injector = injection.Injector(
+        injection.InjectionProfile.from_dict(
+            'p', {
+                'bandwidth': {
+                    'per_connection_mb_per_sec': 1,
+                    'aggregate_mb_per_sec': 2,
+                    'burst_kb': 0
+                }
+            }), lambda: 0, sleeps.append)
+    first = injector.new_connection_buckets()
+    second = injector.new_connection_buckets()
+
+    self.assertTrue(injector.limits_bandwidth)
+    # 1s for the connection and 0.5s for the aggregate.
+    self.assertAlmostEqual(1.5, injector.throttle(first, injection.MB))
+    # The second MB waits 1s for the aggregate.
+    self.assertAlmostEqual(2, injector.throttle(second, injection.MB))
+    # Received bytes have their own buckets.
+    self.assertAlmostEqual(1.5, injector.throttle(first, injection.MB,
+                                                  sent=False))
+    self.assertEqual(6, len(sleeps))
+
+
+if __name__ == '__main__':
+  unittest.main()
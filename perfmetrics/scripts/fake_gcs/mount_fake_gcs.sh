@@ -0,0 +1,60 @@
+#!/bin/bash
+# Starts the fake GCS server and mounts one of its buckets with gcsfuse, so
+# that the load tests run without network.
+#
+# Usage:
+#   ./fake_gcs/mount_fake_gcs.sh <bucket name> <mount point> [gcsfuse flags]
+# Environment variables:
+#   FAKE_GCS_PORT: port of the server, 9000 by default.
+#   FAKE_GCS_ROOT_DIR: directory the objects are stored in, in memory by
+#     default.
+#   FAKE_GCS_PID_FILE: file the pid of the server is written to, fake_gcs.pid by
+#     default. Stop the server with `kill $(cat fake_gcs.pid)` after unmounting.
+#   FAKE_GCS_PROFILE: injection profile of the server, e.g. gcs_like, none by
+#     default. See injection.py.
+#   FAKE_GCS_PROFILE_FILE: JSON file of more injection profiles.
+#   JOB_FILE: FIO job file whose directories are created in the mount point.
+#     The first component of a directory, e.g. gcs of gcs/256kb, is the mount
+#     point FIO is run with, and is replaced by <mount point>.
+set -e
+if [ $# -lt 2 ]; then
+  echo "Usage: $0 <bucket name> <mount point> [gcsfuse flags]"
+  exit 1
+fi
+BUCKET_NAME=$1
+MOUNT_POINT=$2
+shift 2
+FAKE_GCS_PORT=${FAKE_GCS_PORT:-9000}
+FAKE_GCS_PID_FILE=${FAKE_GCS_PID_FILE:-fake_gcs.pid}
+ENDPOINT=http://localhost:$FAKE_GCS_PORT
+
+SERVER_FLAGS="--port $FAKE_GCS_PORT --bucket $BUCKET_NAME"
+if [ -n "$FAKE_GCS_ROOT_DIR" ]; then
+  SERVER_FLAGS="$SERVER_FLAGS --root_dir $FAKE_GCS_ROOT_DIR"
+fi
+if [ -n "$FAKE_GCS_PROFILE" ]; then
+  SERVER_FLAGS="$SERVER_FLAGS --profile $FAKE_GCS_PROFILE"
+fi
+if [ -n "$FAKE_GCS_PROFILE_FILE" ]; then
+  SERVER_FLAGS="$SERVER_FLAGS --profile_file $FAKE_GCS_PROFILE_FILE"
+fi
+echo Starting fake GCS server at $ENDPOINT
+python3 "$(dirname "$0")/fake_gcs_server.py" $SERVER_FLAGS &
+echo $! > "$FAKE_GCS_PID_FILE"
+for attempt in $(seq 1 50); do
+  if curl -sf "$ENDPOINT/storage/v1/b/$BUCKET_NAME" > /dev/null; then
+    break
+  fi
+  sleep 0.1
+done
+
+echo Mounting bucket $BUCKET_NAME at $MOUNT_POINT
+mkdir -p "$MOUNT_POINT"
+gcsfuse --endpoint $ENDPOINT "$@" $BUCKET_NAME "$MOUNT_POINT"
+if [ -n "$JOB_FILE" ]; then
+  for directory in $(sed -n 's/^directory=//p' "$JOB_FILE" | sort -u); do
+    case "$directory" in
+      */*) mkdir -p "$MOUNT_POINT/${directory#*/}" ;;
+    esac
+  done
+fi
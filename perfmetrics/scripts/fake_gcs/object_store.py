@@ -0,0 +1,490 @@
+"""Object stores backing the fake GCS server, in memory or on local disk.
+
+Objects have the generations, metagenerations and preconditions of GCS, so
+that gcsfuse sees the same semantics as with a real bucket. Only the latest
+generation of an object is kept.
+"""
+import base64
+import dataclasses
+import datetime
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+READ_CHUNK_SIZE = 1024 * 1024
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+METADATA_SUFFIX = '.json'
+DATA_SUFFIX = '.data'
+
+
+class NotFoundError(Exception):
+  """The bucket or object does not exist."""
+
+
+class PreconditionError(Exception):
+  """A generation or metageneration precondition does not hold."""
+
+
+class InvalidRangeError(Exception):
+  """The start of a range is after the end of the object."""
+
+
+@dataclasses.dataclass
+class ObjectMetadata:
+  """Metadata of an object, as in the JSON API object resource."""
+  bucket: str
+  name: str
+  generation: int = 0
+  metageneration: int = 1
+  size: int = 0
+  content_type: str = DEFAULT_CONTENT_TYPE
+  md5_hash: str = ''
+  component_count: int = 1
+  time_created: float = 0
+  updated: float = 0
+  metadata: Dict[str, str] = dataclasses.field(default_factory=dict)
+  cache_control: str = ''
+  content_encoding: str = ''
+  content_language: str = ''
+
+  def to_resource(self) -> dict:
+    """Returns the JSON API object resource of the object."""
+    resource = {
+        'kind': 'storage#object',
+        'id': f'{self.bucket}/{self.name}/{self.generation}',
+        'name': self.name,
+        'bucket': self.bucket,
+        'generation': str(self.generation),
+        'metageneration': str(self.metageneration),
+        'contentType': self.content_type,
+        'size': str(self.size),
+        'componentCount': self.component_count,
+        'storageClass': 'STANDARD',
+        'timeCreated': _format_time(self.time_created),
+        'updated': _format_time(self.updated),
+    }
+    # Composite objects have no MD5 hash, as in GCS.
+    if self.md5_hash:
+      resource['md5Hash'] = self.md5_hash
+    if self.metadata:
+      resource['metadata'] = self.metadata
+    for key, value in [('cacheControl', self.cache_control),
+                       ('contentEncoding', self.content_encoding),
+                       ('contentLanguage', self.content_language)]:
+      if value:
+        resource[key] = value
+    return resource
+
+
+def _format_time(timestamp) -> str:
+  return datetime.datetime.fromtimestamp(
+      timestamp, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def check_preconditions(current: Optional[ObjectMetadata],
+                        if_generation_match: Optional[int] = None,
+                        if_metageneration_match: Optional[int] = None) -> None:
+  """Checks GCS preconditions against the current version of an object.
+
+  An ifGenerationMatch of 0 requires the object not to exist.
+
+  Raises:
+    PreconditionError: When a precondition does not hold.
+  """
+  generation = current.generation if current else 0
+  if if_generation_match is not None and if_generation_match != generation:
+    raise PreconditionError(
+        f'Generation {generation} does not match {if_generation_match}')
+  if if_metageneration_match is not None and (
+      current is None or current.metageneration != if_metageneration_match):
+    raise PreconditionError(
+        f'Metageneration does not match {if_metageneration_match}')
+
+
+class ObjectStore:
+  """Buckets of objects, with the data stored by subclasses.
+
+  Metadata is kept in memory and all the methods are thread safe. Data is
+  written to a staging file first, so that readers of the previous generation
+  are not affected by writers.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._buckets: Dict[str, Dict[str, ObjectMetadata]] = {}
+    self._last_generation = 0
+
+  def _new_generation(self) -> int:
+    # Generations are microsecond timestamps, as in GCS, and increase strictly.
+    self._last_generation = max(self._last_generation + 1,
+                                int(time.time() * 10**6))
+    return self._last_generation
+
+  def create_bucket(self, bucket) -> None:
+    with self._lock:
+      self._buckets.setdefault(bucket, {})
+
+  def has_bucket(self, bucket) -> bool:
+    with self._lock:
+      return bucket in self._buckets
+
+  def list_buckets(self) -> List[str]:
+    with self._lock:
+      return sorted(self._buckets)
+
+  def _get_bucket(self, bucket) -> Dict[str, ObjectMetadata]:
+    if bucket not in self._buckets:
+      raise NotFoundError(f'No bucket {bucket}')
+    return self._buckets[bucket]
+
+  def get_metadata(self, bucket, name,
+                   generation: Optional[int] = None) -> ObjectMetadata:
+    """Returns the metadata of an object.
+
+    Raises:
+      NotFoundError: When the object, or its generation, does not exist.
+    """
+    with self._lock:
+      metadata = self._get_bucket(bucket).get(name)
+    if metadata is None or (generation and metadata.generation != generation):
+      raise NotFoundError(f'No object {name} in bucket {bucket}')
+    return dataclasses.replace(metadata)
+
+  def list(self, bucket, prefix='', delimiter='', start_after='',
+           max_results=1000,
+           include_trailing_delimiter=False
+          ) -> Tuple[List[ObjectMetadata], List[str], str]:
+    """Lists objects in name order, as objects.list of the JSON API.
+
+    Args:
+      bucket: Bucket name.
+      prefix: Prefix of the names listed.
+      delimiter: Names containing the delimiter after the prefix are collapsed
+        into prefixes.
+      start_after: Names up to this one, the page token of the previous page,
+        are skipped.
+      max_results: Maximum number of objects and prefixes returned.
+      include_trailing_delimiter: Also return the objects whose names end with
+        the delimiter, along with their prefix.
+
+    Returns:
+      (objects, prefixes, last name of the page if there are more results)
+    Raises:
+      NotFoundError: When the bucket does not exist.
+    """
+    with self._lock:
+      names = sorted(name for name in self._get_bucket(bucket)
+                     if name.startswith(prefix) and name > start_after)
+      objects_by_name = {
+          name: dataclasses.replace(self._buckets[bucket][name])
+          for name in names
+      }
+    objects, prefixes = [], []
+    last_name = ''
+    for name in names:
+      index = name.find(delimiter, len(prefix)) if delimiter else -1
+      collapsed = name[:index + len(delimiter)] if index >= 0 else ''
+      # Names collapsed into the last prefix are part of the same result.
+      if not collapsed or not prefixes or prefixes[-1] != collapsed:
+        if len(objects) + len(prefixes) >= max_results:
+          return objects, prefixes, last_name
+        if collapsed:
+          prefixes.append(collapsed)
+      if not collapsed or (include_trailing_delimiter and name == collapsed):
+        objects.append(objects_by_name[name])
+      last_name = name
+    return objects, prefixes, ''
+
+  def read(self, bucket, name, generation: Optional[int] = None, start=0,
+           end: Optional[int] = None
+          ) -> Tuple[ObjectMetadata, int, int, Iterator[bytes]]:
+    """Reads the bytes [start, end) of an object, clipped to its size.
+
+    Returns:
+      (metadata, start, end, iterator over the data in chunks)
+    Raises:
+      NotFoundError: When the object does not exist.
+      InvalidRangeError: When the start is after the end of the object.
+    """
+    metadata = self.get_metadata(bucket, name, generation)
+    end = metadata.size if end is None else min(end, metadata.size)
+    if start > end or (start and start >= metadata.size):
+      raise InvalidRangeError(
+          f'Range {start}-{end} not satisfiable for size {metadata.size}')
+    return metadata, start, end, self._read_data(metadata, start, end)
+
+  def write(self, metadata: ObjectMetadata, chunks: Iterable[bytes],
+            if_generation_match: Optional[int] = None,
+            if_metageneration_match: Optional[int] = None) -> ObjectMetadata:
+    """Creates a new generation of an object with the data of the chunks.
+
+    The preconditions are checked before and after the data is staged.
+
+    Raises:
+      NotFoundError: When the bucket does not exist.
+      PreconditionError: When a precondition does not hold.
+    """
+    with self._lock:
+      check_preconditions(
+          self._get_bucket(metadata.bucket).get(metadata.name),
+          if_generation_match, if_metageneration_match)
+    md5 = hashlib.md5()
+    size = 0
+    staged = self._stage()
+    try:
+      for chunk in chunks:
+        md5.update(chunk)
+        size += len(chunk)
+        staged.write(chunk)
+      staged.flush()
+      metadata = dataclasses.replace(
+          metadata, size=size,
+          md5_hash=base64.b64encode(md5.digest()).decode('ascii'),
+          component_count=1)
+      return self._commit(metadata, staged, if_generation_match,
+                          if_metageneration_match)
+    finally:
+      staged.close()
+      self._discard(staged)
+
+  def compose(self, bucket, destination: ObjectMetadata,
+              sources: List[Tuple[str, Optional[int]]],
+              if_generation_match: Optional[int] = None,
+              if_metageneration_match: Optional[int] = None
+             ) -> ObjectMetadata:
+    """Creates an object with the concatenated data of source objects.
+
+    Args:
+      bucket: Bucket of the objects.
+      destination: Metadata of the composite object.
+      sources: (name, generation or None) of the source objects, in order.
+      if_generation_match: Precondition on the destination.
+      if_metageneration_match: Precondition on the destination.
+
+    Raises:
+      NotFoundError: When a source object does not exist.
+      PreconditionError: When a precondition does not hold.
+    """
+    source_metadata = [
+        self.get_metadata(bucket, name, generation)
+        for name, generation in sources
+    ]
+
+    def chunks():
+      for metadata in source_metadata:
+        yield from self._read_data(metadata, 0, metadata.size)
+
+    metadata = self.write(
+        dataclasses.replace(destination, bucket=bucket), chunks(),
+        if_generation_match, if_metageneration_match)
+    with self._lock:
+      current = self._buckets[bucket][metadata.name]
+      if current.generation == metadata.generation:
+        current.md5_hash = ''
+        current.component_count = sum(
+            source.component_count for source in source_metadata)
+        self._save_metadata(current)
+        metadata = dataclasses.replace(current)
+    return metadata
+
+  def update(self, bucket, name, fields: dict,
+             generation: Optional[int] = None,
+             if_generation_match: Optional[int] = None,
+             if_metageneration_match: Optional[int] = None) -> ObjectMetadata:
+    """Updates the metadata of an object, as objects.patch of the JSON API.
+
+    Args:
+      bucket: Bucket name.
+      name: Object name.
+      fields: Fields of the object resource to update. None values clear the
+        fields. User metadata is merged.
+      generation: Generation the object must have.
+      if_generation_match: Precondition on the object.
+      if_metageneration_match: Precondition on the object.
+
+    Raises:
+      NotFoundError: When the object does not exist.
+      PreconditionError: When a precondition does not hold.
+    """
+    with self._lock:
+      current = self._get_bucket(bucket).get(name)
+      if current is None or (generation and current.generation != generation):
+        raise NotFoundError(f'No object {name} in bucket {bucket}')
+      check_preconditions(current, if_generation_match,
+                          if_metageneration_match)
+      for key, attribute in [('contentType', 'content_type'),
+                             ('cacheControl', 'cache_control'),
+                             ('contentEncoding', 'content_encoding'),
+                             ('contentLanguage', 'content_language')]:
+        if key in fields:
+          setattr(current, attribute, fields[key] or '')
+      if fields.get('metadata'):
+        for key, value in fields['metadata'].items():
+          if value is None:
+            current.metadata.pop(key, None)
+          else:
+            current.metadata[key] = value
+      current.metageneration += 1
+      current.updated = time.time()
+      self._save_metadata(current)
+      return dataclasses.replace(current)
+
+  def delete(self, bucket, name, generation: Optional[int] = None,
+             if_generation_match: Optional[int] = None,
+             if_metageneration_match: Optional[int] = None) -> None:
+    """Deletes an object.
+
+    Raises:
+      NotFoundError: When the object does not exist.
+      PreconditionError: When a precondition does not hold.
+    """
+    with self._lock:
+      objects = self._get_bucket(bucket)
+      current = objects.get(name)
+      if current is None or (generation and current.generation != generation):
+        raise NotFoundError(f'No object {name} in bucket {bucket}')
+      check_preconditions(current, if_generation_match,
+                          if_metageneration_match)
+      del objects[name]
+      self._delete_data(current)
+
+  def _commit(self, metadata: ObjectMetadata, staged, if_generation_match,
+              if_metageneration_match) -> ObjectMetadata:
+    with self._lock:
+      objects = self._get_bucket(metadata.bucket)
+      current = objects.get(metadata.name)
+      check_preconditions(current, if_generation_match,
+                          if_metageneration_match)
+      now = time.time()
+      metadata = dataclasses.replace(
+          metadata, generation=self._new_generation(), metageneration=1,
+          time_created=now, updated=now)
+      self._store_data(metadata, staged)
+      objects[metadata.name] = metadata
+      self._save_metadata(metadata)
+      return dataclasses.replace(metadata)
+
+  def _stage(self) -> BinaryIO:
+    raise NotImplementedError
+
+  def _discard(self, staged) -> None:
+    pass
+
+  def _store_data(self, metadata: ObjectMetadata, staged) -> None:
+    raise NotImplementedError
+
+  def _read_data(self, metadata: ObjectMetadata, start,
+                 end) -> Iterator[bytes]:
+    raise NotImplementedError
+
+  def _delete_data(self, metadata: ObjectMetadata) -> None:
+    raise NotImplementedError
+
+  def _save_metadata(self, metadata: ObjectMetadata) -> None:
+    pass
+
+
+class MemoryObjectStore(ObjectStore):
+  """Stores the data of the objects in memory."""
+
+  def __init__(self):
+    super().__init__()
+    self._data: Dict[Tuple[str, str], bytes] = {}
+
+  def _stage(self) -> BinaryIO:
+    return io.BytesIO()
+
+  def _store_data(self, metadata, staged) -> None:
+    self._data[(metadata.bucket, metadata.name)] = staged.getvalue()
+
+  def _read_data(self, metadata, start, end) -> Iterator[bytes]:
+    # The data of a generation is immutable, so it is read without lock once
+    # looked up.
+    data = self._data.get((metadata.bucket, metadata.name), b'')
+    return (data[offset:min(offset + READ_CHUNK_SIZE, end)]
+            for offset in range(start, end, READ_CHUNK_SIZE))
+
+  def _delete_data(self, metadata) -> None:
+    self._data.pop((metadata.bucket, metadata.name), None)
+
+
+class DiskObjectStore(ObjectStore):
+  """Stores the objects in a directory per bucket, to hold large objects.
+
+  Every object is a data file and a metadata file named after the escaped
+  object name, so the buckets written by a previous server are loaded again.
+  """
+
+  def __init__(self, root_dir):
+    super().__init__()
+    self._root_dir = root_dir
+    self._staging_dir = os.path.join(root_dir, '.staging')
+    os.makedirs(self._staging_dir, exist_ok=True)
+    for bucket in os.listdir(root_dir):
+      bucket_dir = os.path.join(root_dir, bucket)
+      if bucket.startswith('.') or not os.path.isdir(bucket_dir):
+        continue
+      objects = self._buckets.setdefault(bucket, {})
+      for file_name in os.listdir(bucket_dir):
+        if not file_name.endswith(METADATA_SUFFIX):
+          continue
+        with open(os.path.join(bucket_dir, file_name), 'r') as f:
+          metadata = ObjectMetadata(**json.load(f))
+        objects[metadata.name] = metadata
+        self._last_generation = max(self._last_generation,
+                                    metadata.generation)
+
+  def create_bucket(self, bucket) -> None:
+    os.makedirs(os.path.join(self._root_dir, bucket), exist_ok=True)
+    super().create_bucket(bucket)
+
+  def _get_path(self, metadata: ObjectMetadata, suffix) -> str:
+    return os.path.join(self._root_dir, metadata.bucket,
+                        urllib.parse.quote(metadata.name, safe='') + suffix)
+
+  def _stage(self) -> BinaryIO:
+    return tempfile.NamedTemporaryFile(dir=self._staging_dir, delete=False)
+
+  def _discard(self, staged) -> None:
+    if os.path.exists(staged.name):
+      os.remove(staged.name)
+
+  def _store_data(self, metadata, staged) -> None:
+    # Readers of the previous generation keep reading its replaced file.
+    os.replace(staged.name, self._get_path(metadata, DATA_SUFFIX))
+
+  def _read_data(self, metadata, start, end) -> Iterator[bytes]:
+    # The file is opened before returning, so that it is the file of the
+    # generation even if the object is replaced while it is read.
+    f = open(self._get_path(metadata, DATA_SUFFIX), 'rb')
+
+    def chunks():
+      with f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+          chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+          if not chunk:
+            return
+          remaining -= len(chunk)
+          yield chunk
+
+    return chunks()
+
+  def _delete_data(self, metadata) -> None:
+    for suffix in [DATA_SUFFIX, METADATA_SUFFIX]:
+      path = self._get_path(metadata, suffix)
+      if os.path.exists(path):
+        os.remove(path)
+
+  def _save_metadata(self, metadata) -> None:
+    path = self._get_path(metadata, METADATA_SUFFIX)
+    with open(path + '.tmp', 'w') as f:
+      json.dump(dataclasses.asdict(metadata), f)
+    os.replace(path + '.tmp', path)
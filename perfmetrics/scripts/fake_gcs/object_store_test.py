@@ -0,0 +1,205 @@
+"""Tests for object_store."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import object_store
+
+BUCKET = 'bucket'
+
+
+def _write(store, name, data, **kwargs) -> object_store.ObjectMetadata:
+  return store.write(object_store.ObjectMetadata(BUCKET, name), [data],
+                     **kwargs)
+
+
+class ObjectStoreTestMixin:
+  """Tests of the behaviour common to all the object stores."""
+
+  def create_store(self) -> object_store.ObjectStore:
+    raise NotImplementedError
+
+  def setUp(self):
+    self.store = self.create_store()
+    self.store.create_bucket(BUCKET)
+
+  def _read(self, name, **kwargs) -> bytes:
+    _, _, _, chunks = self.store.read(BUCKET, name, **kwargs)
+    return b''.join(chunks)
+
+  def test_write_and_read(self):
+    metadata = _write(self.store, 'a/b', b'0123456789')
+
+    self.assertEqual(10, metadata.size)
+    self.assertEqual('eB5eJF1ptWaXm4bijSPyxw==', metadata.md5_hash)
+    self.assertEqual(b'0123456789', self._read('a/b'))
+    self.assertEqual(b'2345', self._read('a/b', start=2, end=6))
+    self.assertEqual(b'89', self._read('a/b', start=8, end=100))
+
+  def test_read_range_after_end_raises(self):
+    _write(self.store, 'a', b'0123')
+
+    with self.assertRaises(object_store.InvalidRangeError):
+      self.store.read(BUCKET, 'a', start=4)
+
+  def test_read_of_old_generation_raises(self):
+    first = _write(self.store, 'a', b'1')
+    _write(self.store, 'a', b'2')
+
+    with self.assertRaises(object_store.NotFoundError):
+      self.store.read(BUCKET, 'a', generation=first.generation)
+
+  def test_read_of_missing_object_raises(self):
+    with self.assertRaises(object_store.NotFoundError):
+      self.store.read(BUCKET, 'a')
+    with self.assertRaises(object_store.NotFoundError):
+      self.store.read('other', 'a')
+
+  def test_reader_of_replaced_object_reads_its_generation(self):
+    _write(self.store, 'a', b'old')
+    _, _, _, chunks = self.store.read(BUCKET, 'a')
+
+    _write(self.store, 'a', b'new')
+
+    self.assertEqual(b'old', b''.join(chunks))
+
+  def test_generations_increase(self):
+    first = _write(self.store, 'a', b'1')
+    second = _write(self.store, 'a', b'2')
+
+    self.assertGreater(second.generation, first.generation)
+    self.assertEqual(1, second.metageneration)
+
+  def test_write_preconditions(self):
+    metadata = _write(self.store, 'a', b'1', if_generation_match=0)
+
+    with self.assertRaises(object_store.PreconditionError):
+      _write(self.store, 'a', b'2', if_generation_match=0)
+    with self.assertRaises(object_store.PreconditionError):
+      _write(self.store, 'a', b'2', if_metageneration_match=2)
+    _write(self.store, 'a', b'2', if_generation_match=metadata.generation)
+    self.assertEqual(b'2', self._read('a'))
+
+  def test_compose(self):
+    _write(self.store, 'a', b'012')
+    b = _write(self.store, 'b', b'345')
+
+    metadata = self.store.compose(
+        BUCKET, object_store.ObjectMetadata(BUCKET, 'c'),
+        [('a', None), ('b', b.generation)])
+
+    self.assertEqual(b'012345', self._read('c'))
+    self.assertEqual(6, metadata.size)
+    self.assertEqual(2, metadata.component_count)
+    self.assertEqual('', metadata.md5_hash)
+    self.assertNotIn('md5Hash', metadata.to_resource())
+
+  def test_compose_of_missing_source_raises(self):
+    with self.assertRaises(object_store.NotFoundError):
+      self.store.compose(BUCKET, object_store.ObjectMetadata(BUCKET, 'c'),
+                         [('a', None)])
+
+  def test_update(self):
+    _write(self.store, 'a', b'1')
+
+    metadata = self.store.update(BUCKET, 'a', {
+        'contentType': 'text/plain',
+        'metadata': {'k': 'v', 'x': 'y'}
+    })
+    metadata = self.store.update(BUCKET, 'a', {'metadata': {'x': None}},
+                                 if_metageneration_match=2)
+
+    self.assertEqual('text/plain', metadata.content_type)
+    self.assertEqual({'k': 'v'}, metadata.metadata)
+    self.assertEqual(3, metadata.metageneration)
+    with self.assertRaises(object_store.PreconditionError):
+      self.store.update(BUCKET, 'a', {}, if_metageneration_match=2)
+
+  def test_delete(self):
+    metadata = _write(self.store, 'a', b'1')
+
+    with self.assertRaises(object_store.NotFoundError):
+      self.store.delete(BUCKET, 'a', generation=metadata.generation + 1)
+    self.store.delete(BUCKET, 'a', generation=metadata.generation)
+
+    with self.assertRaises(object_store.NotFoundError):
+      self.store.get_metadata(BUCKET, 'a')
+
+  def test_list_with_delimiter(self):
+    for name in ['a', 'b/', 'b/1', 'b/2', 'c/d/e', 'd']:
+      _write(self.store, name, b'')
+
+    objects, prefixes, next_name = self.store.list(BUCKET, delimiter='/')
+
+    self.assertEqual(['a', 'd'], [metadata.name for metadata in objects])
+    self.assertEqual(['b/', 'c/'], prefixes)
+    self.assertEqual('', next_name)
+
+  def test_list_with_prefix_and_trailing_delimiter(self):
+    for name in ['b/', 'b/1', 'b/c/', 'b/c/2', 'bb']:
+      _write(self.store, name, b'')
+
+    objects, prefixes, _ = self.store.list(
+        BUCKET, prefix='b/', delimiter='/', include_trailing_delimiter=True)
+
+    self.assertEqual(['b/', 'b/1', 'b/c/'],
+                     [metadata.name for metadata in objects])
+    self.assertEqual(['b/c/'], prefixes)
+
+  def test_list_pages(self):
+    for name in ['a', 'b/1', 'b/2', 'b/3', 'c', 'd']:
+      _write(self.store, name, b'')
+
+    pages = []
+    start_after = ''
+    while True:
+      objects, prefixes, start_after = self.store.list(
+          BUCKET, delimiter='/', start_after=start_after, max_results=2)
+      pages.append(([metadata.name for metadata in objects], prefixes))
+      if not start_after:
+        break
+
+    self.assertEqual([(['a'], ['b/']), (['c', 'd'], [])], pages)
+
+
+class MemoryObjectStoreTest(ObjectStoreTestMixin, unittest.TestCase):
+
+  def create_store(self):
+    return object_store.MemoryObjectStore()
+
+
+class DiskObjectStoreTest(ObjectStoreTestMixin, unittest.TestCase):
+
+  def create_store(self):
+    self.root_dir = tempfile.mkdtemp()
+    return object_store.DiskObjectStore(self.root_dir)
+
+  def tearDown(self):
+    shutil.rmtree(self.root_dir)
+
+  def test_objects_are_loaded_again(self):
+    metadata = _write(self.store, 'a/b', b'data')
+    self.store.update(BUCKET, 'a/b', {'metadata': {'k': 'v'}})
+
+    store = object_store.DiskObjectStore(self.root_dir)
+
+    loaded = store.get_metadata(BUCKET, 'a/b')
+    self.assertEqual(metadata.generation, loaded.generation)
+    self.assertEqual({'k': 'v'}, loaded.metadata)
+    _, _, _, chunks = store.read(BUCKET, 'a/b')
+    self.assertEqual(b'data', b''.join(chunks))
+    self.assertGreater(_write(store, 'a/b', b'').generation,
+                       metadata.generation)
+
+  def test_failed_write_leaves_no_staged_file(self):
+    _write(self.store, 'a', b'1')
+
+    with self.assertRaises(object_store.PreconditionError):
+      _write(self.store, 'a', b'2', if_generation_match=0)
+
+    self.assertEqual([], os.listdir(os.path.join(self.root_dir, '.staging')))
+
+
+if __name__ == '__main__':
+  unittest.main()
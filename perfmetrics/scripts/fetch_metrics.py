@@ -1,11 +1,39 @@
 """Executes fio_metrics.py and vm_metrics.py by passing appropriate arguments.
+
+To run the script:
+>> python3 fetch_metrics.py <fio output json filepath> [<gcsfuse metrics csv filepath>] [--op_mix_file <csv filepath>] [--local_metrics_file <metrics jsonl file>] [--period_sec 120] [--read_amplification_file <csv filepath>] [--max_read_amplification 1.5]
+
+When the CSV filepath is given, all the OpenCensus views exported by gcsfuse
+(vm_metrics.GCSFUSE_VIEWS) are also fetched for every fio job and written to
+the CSV file, with one row per job and one column per view and label value.
+
+With --op_mix_file, the FUSE op mix of every job (ops per second, mean and p99
+latency and share of the total latency per fs_op) is printed and written to
+that file, with one row per job and FUSE op.
+
+With --local_metrics_file, the VM metrics are read from the JSON lines file of
+local_metrics/collector.py instead of Cloud Monitoring, without waiting for
+them to be visible, and can be aligned to any --period_sec. The fio and VM
+metrics are then printed instead of being written to the Google Sheet, so that
+no cloud API is used.
+
+With --read_amplification_file, the bytes read from GCS and the GCS readers
+opened during every read job are joined with the bytes read by fio, and the
+read amplification (GCS bytes per fio byte) and readers opened per MB are
+printed and written to that file. With --max_read_amplification, the script
+exits with an error when a job reads more than that from GCS, e.g. to catch
+read-ahead regressions in CI.
 """
+import argparse
+import csv
+import dataclasses
 import socket
 import sys
 import time
 from fio import fio_metrics
 from vm_metrics import vm_metrics
 from gsheet import gsheet
+from local_metrics import collector
 
 INSTANCE = socket.gethostname()
 PERIOD_SEC = 120
@@ -15,32 +43,122 @@ FIO_WORKSHEET_NAME = 'fio_metrics'
 VM_WORKSHEET_NAME = 'vm_metrics'
 
 if __name__ == '__main__':
-  argv = sys.argv
-  if len(argv) != 2:
-    raise TypeError('Incorrect number of arguments.\n'
-                    'Usage: '
-                    'python3 fetch_metrics.py <fio output json filepath>')
+  parser = argparse.ArgumentParser()
+  parser.add_argument('fio_output_file')
+  parser.add_argument('gcsfuse_metrics_file', nargs='?')
+  parser.add_argument('--local_metrics_file',
+                      help='JSON lines file written by the local collector')
+  parser.add_argument('--period_sec', type=int, default=PERIOD_SEC)
+  parser.add_argument('--op_mix_file',
+                      help='CSV filepath to write the FUSE op mix of every '
+                      'job to')
+  parser.add_argument('--read_amplification_file',
+                      help='CSV filepath to write the read amplification of '
+                      'every read job to')
+  parser.add_argument('--max_read_amplification', type=float, default=0,
+                      help='Fail when the read amplification of a job is '
+                      'above it')
+  args = parser.parse_args(sys.argv[1:])
+  if args.local_metrics_file and args.gcsfuse_metrics_file:
+    parser.error('The gcsfuse metrics are only fetched from Cloud Monitoring')
+  if args.local_metrics_file and args.op_mix_file:
+    parser.error('The op mix is only fetched from Cloud Monitoring')
 
   fio_metrics_obj = fio_metrics.FioMetrics()
   print('Getting fio metrics...')
-  temp = fio_metrics_obj.get_metrics(argv[1], FIO_WORKSHEET_NAME)
+  temp = fio_metrics_obj.get_metrics(
+      args.fio_output_file,
+      None if args.local_metrics_file else FIO_WORKSHEET_NAME)
 
-  print('Waiting for 250 seconds for metrics to be updated on VM...')
-  # It takes up to 240 seconds for sampled data to be visible on the VM metrics graph
-  # So, waiting for 250 seconds to ensure the returned metrics are not empty
-  time.sleep(250)
+  if args.local_metrics_file:
+    vm_metrics_obj = collector.LocalMetrics.from_file(args.local_metrics_file)
+  else:
+    print('Waiting for 250 seconds for metrics to be updated on VM...')
+    # It takes up to 240 seconds for sampled data to be visible on the VM metrics graph
+    # So, waiting for 250 seconds to ensure the returned metrics are not empty
+    time.sleep(250)
+    vm_metrics_obj = vm_metrics.VmMetrics()
 
-  vm_metrics_obj = vm_metrics.VmMetrics()
   vm_metrics_data = []
+  gcsfuse_metrics_data = []
+  op_mix_data = []
+  read_amplification_data = []
+  fetch_read_amplification = (args.read_amplification_file or
+                              args.max_read_amplification)
   # Getting VM metrics for every job
   for ind, job in enumerate(temp):
     start_time_sec = job[fio_metrics.consts.START_TIME]
     end_time_sec = job[fio_metrics.consts.END_TIME]
     rw = job[fio_metrics.consts.PARAMS][fio_metrics.consts.RW]
     print(f'Getting VM metrics for job at index {ind+1}...')
-    metrics_data = vm_metrics_obj.fetch_metrics(start_time_sec, end_time_sec, INSTANCE, PERIOD_SEC, rw)
+    metrics_data = vm_metrics_obj.fetch_metrics(start_time_sec, end_time_sec, INSTANCE, args.period_sec, rw)
     for row in metrics_data:
       vm_metrics_data.append(row)
+    if args.gcsfuse_metrics_file:
+      gcsfuse_metrics_data.append(
+          vm_metrics_obj.fetch_gcsfuse_metrics(start_time_sec, end_time_sec,
+                                               INSTANCE))
+    if args.op_mix_file:
+      op_mix = vm_metrics_obj.fetch_op_mix(start_time_sec, end_time_sec,
+                                           INSTANCE)
+      print(f'FUSE op mix of job at index {ind+1} ({rw}):')
+      for op in op_mix:
+        print(f'  {op.fs_op}: {op.ops_per_sec:.1f} ops/s, '
+              f'mean {op.mean_latency_ms:.2f} ms, '
+              f'{op.latency_share:.1%} of the latency')
+        op_mix_data.append([ind + 1, rw] + list(dataclasses.astuple(op)))
+    if fetch_read_amplification and rw in ['read', 'randread']:
+      gcs_read_bytes, readers_opened = vm_metrics_obj.fetch_gcs_reads(
+          start_time_sec, end_time_sec, INSTANCE)
+      amplification = vm_metrics.get_read_amplification(
+          job[fio_metrics.consts.METRICS][fio_metrics.consts.IO_BYTES],
+          gcs_read_bytes, readers_opened)
+      print(f'Read amplification of job at index {ind+1} ({rw}): '
+            f'{amplification.read_amplification:.2f} GCS bytes per byte read, '
+            f'{amplification.readers_opened_per_mb:.3f} readers opened per MB')
+      read_amplification_data.append((ind + 1, rw, amplification))
+
+  if args.local_metrics_file:
+    for row in vm_metrics_data:
+      print(row)
+  else:
+    gsheet.write_to_google_sheet(VM_WORKSHEET_NAME, vm_metrics_data)
+
+  if args.gcsfuse_metrics_file:
+    header, rows = vm_metrics.pivot_rows(gcsfuse_metrics_data)
+    with open(args.gcsfuse_metrics_file, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow(['job', 'start_time_sec', 'end_time_sec', 'rw'] + header)
+      for ind, (job, row) in enumerate(zip(temp, rows)):
+        writer.writerow([
+            ind + 1, job[fio_metrics.consts.START_TIME],
+            job[fio_metrics.consts.END_TIME],
+            job[fio_metrics.consts.PARAMS][fio_metrics.consts.RW]
+        ] + row)
+
+  if args.op_mix_file:
+    with open(args.op_mix_file, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow(['job', 'rw'] + [
+          field.name for field in dataclasses.fields(vm_metrics.OpMix)
+      ])
+      writer.writerows(op_mix_data)
 
-  gsheet.write_to_google_sheet(VM_WORKSHEET_NAME, vm_metrics_data)
+  if args.read_amplification_file:
+    with open(args.read_amplification_file, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow(['job', 'rw'] + [
+          field.name
+          for field in dataclasses.fields(vm_metrics.ReadAmplification)
+      ])
+      for ind, rw, amplification in read_amplification_data:
+        writer.writerow([ind, rw] + list(dataclasses.astuple(amplification)))
 
+  if args.max_read_amplification:
+    amplified_jobs = [
+        ind for ind, _, amplification in read_amplification_data
+        if amplification.read_amplification > args.max_read_amplification
+    ]
+    if amplified_jobs:
+      sys.exit(f'Read amplification above {args.max_read_amplification} for '
+               f'jobs at index {amplified_jobs}')
@@ -131,6 +131,18 @@ def _convert_value(value, conversion_dict, default_unit=''):
   return converted_num
 
 
+def get_time_ms(value):
+  """Converts a time option of a fio job, e.g. ramp_time, to milliseconds.
+
+  Args:
+    value: String, time value[+unit], in seconds if there is no unit
+
+  Returns:
+    Int, time in milliseconds
+  """
+  return _convert_value(value, consts.TIME_TO_MS_CONVERSION, 's')
+
+
 def _get_rw(rw_value):
   """Converting read/randread/write/randwrite to just read/write.
 
@@ -377,6 +377,11 @@ class TestFioMetricsTest(unittest.TestCase):
     with self.assertRaises(ValueError):
       _ = fio_metrics._convert_value('s', {'s': 1}, 's')
 
+  def test_get_time_ms(self):
+    self.assertEqual(5000, fio_metrics.get_time_ms('5s'))
+    self.assertEqual(10000, fio_metrics.get_time_ms('10'))
+    self.assertEqual(20, fio_metrics.get_time_ms('20ms'))
+
   def test_get_rw(self):
     rw = fio_metrics._get_rw('randread')
 
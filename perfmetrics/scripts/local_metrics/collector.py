@@ -0,0 +1,445 @@
+"""Local receiver of the gcsfuse metrics, replacing Cloud Monitoring.
+
+gcsfuse mounted with --experimental-opentelemetry-collector-address exports its
+OpenCensus views over the OpenCensus agent gRPC protocol (the ocagent exporter,
+service name "gcsfuse"). The collector doesn't serve TLS, so gcsfuse must also
+be mounted with --experimental-opentelemetry-collector-insecure, and with
+--experimental-opentelemetry-collector-export-interval 1s for 1s resolution.
+This script serves that protocol with grpcio (in requirements.txt), keeps the
+exported time series at 1s resolution in memory, appends them to a JSON lines
+file and samples the host CPU utilization and received bytes every second next
+to them. The metrics are then available with no delay and without network
+access, through LocalMetrics.fetch_metrics, which returns the same rows as
+vm_metrics.VmMetrics.fetch_metrics.
+
+To run the collector while the load test runs:
+>> python3 collector.py <metrics jsonl file> [--address localhost:55678]
+>> gcsfuse --experimental-opentelemetry-collector-address localhost:55678 --experimental-opentelemetry-collector-insecure --experimental-opentelemetry-collector-export-interval 1s ...
+
+The collector stops on SIGINT or SIGTERM.
+"""
+import argparse
+import bisect
+import concurrent.futures
+import dataclasses
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import proc_sampler
+import protowire
+
+DEFAULT_ADDRESS = 'localhost:55678'
+SERVICE_NAME = 'gcsfuse'
+METRICS_SERVICE = 'opencensus.proto.agent.metrics.v1.MetricsService'
+TRACE_SERVICE = 'opencensus.proto.agent.trace.v1.TraceService'
+
+# MetricDescriptor.Type values of opencensus/proto/metrics/v1/metrics.proto.
+GAUGE_INT64 = 1
+GAUGE_DOUBLE = 2
+GAUGE_DISTRIBUTION = 3
+CUMULATIVE_INT64 = 4
+CUMULATIVE_DOUBLE = 5
+CUMULATIVE_DISTRIBUTION = 6
+CUMULATIVE_TYPES = [
+    CUMULATIVE_INT64, CUMULATIVE_DOUBLE, CUMULATIVE_DISTRIBUTION
+]
+
+# Series sampled from the host by the collector.
+HOST_CPU_UTILIZATION = 'host/cpu_utilization'
+HOST_RECEIVED_BYTES_RATE = 'host/received_bytes_rate'
+HOST_SAMPLE_INTERVAL_SEC = 1
+
+# gcsfuse views read by LocalMetrics.fetch_metrics.
+READ_BYTES_COUNT = 'gcs/read_bytes_count'
+READER_COUNT = 'gcs/reader_count'
+OPS_ERROR_COUNT = 'fs/ops_error_count'
+OPS_LATENCY = 'fs/ops_latency'
+
+
+@dataclasses.dataclass
+class Sample:
+  """One point of a time series.
+
+  value is the point value, or the sum of the values of a distribution, whose
+  number of values is count. Cumulative series have a start_time_sec.
+  """
+  name: str
+  labels: Dict[str, str]
+  time_sec: int
+  value: float
+  count: int = 0
+  start_time_sec: int = 0
+  cumulative: bool = False
+
+
+def _parse_timestamp_sec(data) -> int:
+  fields = protowire.get_fields(data)
+  return protowire.to_int64(fields.get(1, [0])[0])
+
+
+def _parse_point(data) -> Tuple[int, float, int]:
+  """Returns (time_sec, value, count) of an OpenCensus Point."""
+  time_sec, value, count = 0, 0.0, 0
+  for field_number, _, field_value in protowire.iter_fields(data):
+    if field_number == 1:
+      time_sec = _parse_timestamp_sec(field_value)
+    elif field_number == 2:
+      value = protowire.to_int64(field_value)
+    elif field_number == 3:
+      value = protowire.to_double(field_value)
+    elif field_number == 4:
+      distribution = protowire.get_fields(field_value)
+      count = protowire.to_int64(distribution.get(1, [0])[0])
+      if 2 in distribution:
+        value = protowire.to_double(distribution[2][0])
+  return time_sec, value, count
+
+
+def _parse_metric(data) -> List[Sample]:
+  """Returns the samples of every point of an OpenCensus Metric."""
+  fields = protowire.get_fields(data)
+  name, metric_type, label_keys = '', 0, []
+  if 1 in fields:
+    descriptor = protowire.get_fields(fields[1][0])
+    name = protowire.to_string(descriptor.get(1, [b''])[0])
+    metric_type = descriptor.get(4, [0])[0]
+    label_keys = [
+        protowire.to_string(protowire.get_fields(key).get(1, [b''])[0])
+        for key in descriptor.get(5, [])
+    ]
+
+  samples = []
+  for timeseries in fields.get(2, []):
+    timeseries_fields = protowire.get_fields(timeseries)
+    start_time_sec = 0
+    if 1 in timeseries_fields:
+      start_time_sec = _parse_timestamp_sec(timeseries_fields[1][0])
+    labels = {}
+    for key, label_value in zip(label_keys, timeseries_fields.get(2, [])):
+      label_fields = protowire.get_fields(label_value)
+      if label_fields.get(2, [0])[0]:
+        labels[key] = protowire.to_string(label_fields.get(1, [b''])[0])
+    for point in timeseries_fields.get(3, []):
+      time_sec, value, count = _parse_point(point)
+      samples.append(
+          Sample(name, labels, time_sec, value, count, start_time_sec,
+                 metric_type in CUMULATIVE_TYPES))
+  return samples
+
+
+def parse_export_request(data) -> Tuple[str, List[Sample]]:
+  """Parses an ExportMetricsServiceRequest.
+
+  Returns:
+    (service name of the node, '' when the node is not set, list[Sample])
+  Raises:
+    protowire.DecodeError: When the request is not a valid message.
+  """
+  service_name = ''
+  samples = []
+  for field_number, _, value in protowire.iter_fields(data):
+    if field_number == 1:
+      service_info = protowire.get_fields(value).get(3)
+      if service_info:
+        service_name = protowire.to_string(
+            protowire.get_fields(service_info[0]).get(1, [b''])[0])
+    elif field_number == 2:
+      samples.extend(_parse_metric(value))
+  return service_name, samples
+
+
+class _Series:
+  """Points of one time series at 1s resolution, in time order."""
+
+  def __init__(self):
+    self.times = []
+    self.values = []
+    self.counts = []
+
+  def add(self, time_sec, value, count) -> None:
+    if self.times and self.times[-1] >= time_sec:
+      if self.times[-1] > time_sec:
+        # Points are exported in time order, late points are dropped.
+        return
+      self.values[-1], self.counts[-1] = value, count
+      return
+    self.times.append(time_sec)
+    self.values.append(value)
+    self.counts.append(count)
+
+  def value_at(self, time_sec) -> Tuple[float, int]:
+    """Returns the last (value, count) at or before time_sec, or (0, 0)."""
+    index = bisect.bisect_right(self.times, time_sec)
+    if not index:
+      return 0.0, 0
+    return self.values[index - 1], self.counts[index - 1]
+
+  def values_between(self, start_time_sec, end_time_sec) -> List[float]:
+    low = bisect.bisect_right(self.times, start_time_sec)
+    high = bisect.bisect_right(self.times, end_time_sec)
+    return self.values[low:high]
+
+
+class MetricStore:
+  """Thread-safe store of time series, optionally appended to a JSON lines file.
+
+  Cumulative series restarted by gcsfuse (new start time) are stored as
+  separate series, whose deltas are added up.
+  """
+
+  def __init__(self, output_file: Optional[str] = None):
+    self._series = {}
+    self._lock = threading.Lock()
+    self._output = open(output_file, 'a') if output_file else None
+
+  @classmethod
+  def load(cls, metrics_file):
+    """Returns a store of the samples of a JSON lines file."""
+    store = cls()
+    samples = []
+    with open(metrics_file, 'r') as f:
+      for line in f:
+        if line.strip():
+          samples.append(Sample(**json.loads(line)))
+    store.add(samples)
+    return store
+
+  def add(self, samples: List[Sample]) -> None:
+    with self._lock:
+      for sample in samples:
+        key = (sample.name, tuple(sorted(sample.labels.items())),
+               sample.start_time_sec, sample.cumulative)
+        self._series.setdefault(key, _Series()).add(sample.time_sec,
+                                                    sample.value, sample.count)
+        if self._output:
+          self._output.write(json.dumps(dataclasses.asdict(sample)) + '\n')
+      if self._output:
+        self._output.flush()
+
+  def close(self) -> None:
+    if self._output:
+      self._output.close()
+      self._output = None
+
+  def _get_series(self, name, label_filter):
+    with self._lock:
+      return [(key, series)
+              for key, series in self._series.items()
+              if key[0] == name and label_filter(dict(key[1]))]
+
+  def delta(self, name, start_time_sec, end_time_sec,
+            label_filter=lambda labels: True) -> Tuple[float, int]:
+    """Returns the increase of cumulative series over the interval.
+
+    Args:
+      name (str): Series name, e.g. gcs/read_bytes_count
+      start_time_sec (int): Epoch seconds
+      end_time_sec (int): Epoch seconds
+      label_filter: Called with the labels of a series, selects the series
+    Returns:
+      (value increase, count increase) summed over the selected series
+    """
+    value, count = 0.0, 0
+    for (_, _, series_start_sec, cumulative), series in self._get_series(
+        name, label_filter):
+      if not cumulative or series_start_sec > end_time_sec:
+        continue
+      end_value, end_count = series.value_at(end_time_sec)
+      start_value, start_count = 0.0, 0
+      if series_start_sec < start_time_sec:
+        start_value, start_count = series.value_at(start_time_sec)
+      value += end_value - start_value
+      count += end_count - start_count
+    return value, count
+
+  def gauge_values(self, name, start_time_sec, end_time_sec) -> List[float]:
+    """Returns the values of gauge series in (start_time_sec, end_time_sec]."""
+    values = []
+    for (_, _, _, cumulative), series in self._get_series(
+        name, lambda labels: True):
+      if not cumulative:
+        values.extend(series.values_between(start_time_sec, end_time_sec))
+    return values
+
+
+def sample_host(store: MetricStore, stop: threading.Event,
+                interval_sec=HOST_SAMPLE_INTERVAL_SEC) -> None:
+  """Adds the CPU utilization (%) and received bytes/s to store until stop."""
+  busy, total = proc_sampler.read_cpu_times()['cpu']
+  received_bytes, _ = proc_sampler.read_net_bytes()
+  last_time = time.time()
+  while not stop.wait(interval_sec):
+    new_busy, new_total = proc_sampler.read_cpu_times()['cpu']
+    new_received_bytes, _ = proc_sampler.read_net_bytes()
+    now = time.time()
+    cpu_utilization = (100 * (new_busy - busy) / (new_total - total)
+                       if new_total > total else 0.0)
+    store.add([
+        Sample(HOST_CPU_UTILIZATION, {}, int(now), cpu_utilization),
+        Sample(HOST_RECEIVED_BYTES_RATE, {}, int(now),
+               (new_received_bytes - received_bytes) / (now - last_time)),
+    ])
+    busy, total, received_bytes, last_time = (new_busy, new_total,
+                                              new_received_bytes, now)
+
+
+class Collector:
+  """gRPC handlers of the OpenCensus agent services used by gcsfuse."""
+
+  def __init__(self, store: MetricStore):
+    self.store = store
+
+  def export_metrics(self, request_iterator, context):
+    """MetricsService.Export: stores the metrics of the gcsfuse node."""
+    # Only the first request of a stream carries the node.
+    service_name = ''
+    for request in request_iterator:
+      node_service_name, samples = parse_export_request(request)
+      service_name = node_service_name or service_name
+      if service_name == SERVICE_NAME:
+        self.store.add(samples)
+    return iter([])
+
+  def discard(self, request_iterator, context):
+    """TraceService.Export and TraceService.Config, traces are not collected."""
+    for _ in request_iterator:
+      pass
+    return iter([])
+
+  def get_handlers(self):
+    return [
+        grpc.method_handlers_generic_handler(
+            METRICS_SERVICE,
+            {'Export': grpc.stream_stream_rpc_method_handler(
+                self.export_metrics)}),
+        grpc.method_handlers_generic_handler(
+            TRACE_SERVICE, {
+                'Export': grpc.stream_stream_rpc_method_handler(self.discard),
+                'Config': grpc.stream_stream_rpc_method_handler(self.discard),
+            }),
+    ]
+
+
+def serve(store: MetricStore, address=DEFAULT_ADDRESS) -> grpc.Server:
+  """Starts serving the OpenCensus agent protocol at the address."""
+  # Every gcsfuse connection keeps three streams open.
+  server = grpc.server(concurrent.futures.ThreadPoolExecutor(max_workers=16))
+  server.add_generic_rpc_handlers(Collector(store).get_handlers())
+  server.add_insecure_port(address)
+  server.start()
+  return server
+
+
+class LocalMetrics:
+  """Metrics of the local collector, with the interface of VmMetrics."""
+
+  def __init__(self, store: MetricStore):
+    self.store = store
+
+  @classmethod
+  def from_file(cls, metrics_file):
+    return cls(MetricStore.load(metrics_file))
+
+  def fetch_metrics(self, start_time_sec, end_time_sec, instance, period,
+                    test_type) -> List[list]:
+    """Returns the rows of vm_metrics.VmMetrics.fetch_metrics.
+
+    The host metrics are those of the local host whatever the instance, and
+    any period of at least 1 second is supported.
+
+    Args:
+      start_time_sec (int): Epoch seconds
+      end_time_sec (int): Epoch seconds
+      instance (str): VM instance, unused
+      period (float): Period over which the values are taken
+      test_type(str): The type of load test for which metrics are taken
+
+    Returns:
+      list[[period end time, interval end time, CPU_UTI_PEAK, CPU_UTI_MEAN,
+      REC_BYTES_PEAK, REC_BYTES_MEAN, READ_BYTES_COUNT, OPS_ERROR_COUNT,
+      OPS_MEAN_LATENCY]]
+    Raises:
+      ValueError: When start time is not before end time.
+    """
+    if start_time_sec >= end_time_sec:
+      raise ValueError('Start time should be before end time')
+    fs_op = 'ReadFile' if test_type in ['read', 'randread'] else 'WriteFile'
+
+    metrics_data = []
+    for period_start in range(int(start_time_sec), int(end_time_sec),
+                              int(period)):
+      period_end = min(period_start + int(period), int(end_time_sec))
+      cpu = self.store.gauge_values(HOST_CPU_UTILIZATION, period_start,
+                                    period_end)
+      received = self.store.gauge_values(HOST_RECEIVED_BYTES_RATE,
+                                         period_start, period_end)
+      read_bytes, _ = self.store.delta(READ_BYTES_COUNT, period_start,
+                                       period_end)
+      errors, _ = self.store.delta(
+          OPS_ERROR_COUNT, period_start, period_end,
+          lambda labels: labels.get('fs_op') != 'GetXattr')
+      latency_sum, latency_count = self.store.delta(
+          OPS_LATENCY, period_start, period_end,
+          lambda labels: labels.get('fs_op') == fs_op)
+      metrics_data.append([
+          period_end, end_time_sec,
+          max(cpu, default=0.0),
+          sum(cpu) / len(cpu) if cpu else 0.0,
+          max(received, default=0.0),
+          sum(received) / len(received) if received else 0.0,
+          read_bytes, errors,
+          latency_sum / latency_count if latency_count else 0.0
+      ])
+    return metrics_data
+
+  def fetch_gcs_reads(self, start_time_sec, end_time_sec,
+                      instance) -> Tuple[float, float]:
+    """Returns the bytes read from GCS and the readers opened over the interval.
+
+    Args:
+      start_time_sec (int): Epoch seconds
+      end_time_sec (int): Epoch seconds
+      instance (str): VM instance, unused
+    Returns:
+      (gcs/read_bytes_count, gcs/reader_count opened), as
+      vm_metrics.VmMetrics.fetch_gcs_reads
+    """
+    read_bytes, _ = self.store.delta(READ_BYTES_COUNT, start_time_sec,
+                                     end_time_sec)
+    readers_opened, _ = self.store.delta(
+        READER_COUNT, start_time_sec, end_time_sec,
+        lambda labels: labels.get('io_method') == 'opened')
+    return read_bytes, readers_opened
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('metrics_file',
+                      help='JSON lines file the samples are appended to')
+  parser.add_argument('--address', default=DEFAULT_ADDRESS)
+  parser.add_argument('--host_sample_interval_sec', type=float,
+                      default=HOST_SAMPLE_INTERVAL_SEC)
+  args = parser.parse_args(argv[1:])
+
+  store = MetricStore(args.metrics_file)
+  server = serve(store, args.address)
+  stop = threading.Event()
+  for signum in [signal.SIGINT, signal.SIGTERM]:
+    signal.signal(signum, lambda *_: stop.set())
+  print(f'Collecting gcsfuse metrics at {args.address} into '
+        f'{args.metrics_file}')
+  sample_host(store, stop, args.host_sample_interval_sec)
+  server.stop(grace=1).wait()
+  store.close()
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,202 @@
+"""Tests for collector."""
+import os
+import socket
+import struct
+import tempfile
+import unittest
+
+import grpc
+
+import collector
+
+TEST_TIME_SEC = 1656300600
+
+
+def _varint(value):
+  value &= (1 << 64) - 1
+  data = b''
+  while True:
+    byte = value & 0x7f
+    value >>= 7
+    if value:
+      data += bytes([byte | 0x80])
+    else:
+      return data + bytes([byte])
+
+
+def _field(field_number, value):
+  """Encodes an int as a varint field, a float as a double, bytes as is."""
+  if isinstance(value, float):
+    return _varint(field_number << 3 | 1) + struct.pack('<d', value)
+  if isinstance(value, int):
+    return _varint(field_number << 3) + _varint(value)
+  if isinstance(value, str):
+    value = value.encode()
+  return _varint(field_number << 3 | 2) + _varint(len(value)) + value
+
+
+def _timestamp(seconds):
+  return _field(1, seconds)
+
+
+def _metric(name, metric_type, label_keys, timeseries):
+  descriptor = _field(1, name) + _field(4, metric_type) + b''.join(
+      _field(5, _field(1, key)) for key in label_keys)
+  return _field(1, descriptor) + b''.join(
+      _field(2, series) for series in timeseries)
+
+
+def _timeseries(start_sec, label_values, points):
+  return (_field(1, _timestamp(start_sec)) + b''.join(
+      _field(2, _field(1, value) + _field(2, 1)) for value in label_values) +
+          b''.join(_field(3, point) for point in points))
+
+
+def _int_point(time_sec, value):
+  return _field(1, _timestamp(time_sec)) + _field(2, value)
+
+
+def _distribution_point(time_sec, count, total):
+  return _field(1, _timestamp(time_sec)) + _field(
+      4, _field(1, count) + _field(2, total))
+
+
+def _export_request(metrics, service_name=''):
+  request = b''
+  if service_name:
+    request += _field(1, _field(3, _field(1, service_name)))
+  return request + b''.join(_field(2, metric) for metric in metrics)
+
+
+READ_BYTES = _metric('gcs/read_bytes_count', collector.CUMULATIVE_INT64, [], [
+    _timeseries(TEST_TIME_SEC, [], [_int_point(TEST_TIME_SEC + 1, 100)])
+])
+
+
+class CollectorTest(unittest.TestCase):
+
+  def test_parse_export_request(self):
+    latency = _metric('fs/ops_latency', collector.CUMULATIVE_DISTRIBUTION,
+                      ['fs_op'], [
+                          _timeseries(TEST_TIME_SEC, ['ReadFile'], [
+                              _distribution_point(TEST_TIME_SEC + 2, 4, 10.0)
+                          ])
+                      ])
+
+    service_name, samples = collector.parse_export_request(
+        _export_request([READ_BYTES, latency], 'gcsfuse'))
+
+    self.assertEqual('gcsfuse', service_name)
+    self.assertEqual([
+        collector.Sample('gcs/read_bytes_count', {}, TEST_TIME_SEC + 1, 100, 0,
+                         TEST_TIME_SEC, True),
+        collector.Sample('fs/ops_latency', {'fs_op': 'ReadFile'},
+                         TEST_TIME_SEC + 2, 10.0, 4, TEST_TIME_SEC, True),
+    ], samples)
+
+  def test_delta_of_cumulative_series(self):
+    store = collector.MetricStore()
+    store.add([
+        collector.Sample('a', {}, TEST_TIME_SEC + i, 10 * i, i, TEST_TIME_SEC,
+                         True) for i in range(1, 10)
+    ])
+    # gcsfuse restarted.
+    store.add([collector.Sample('a', {}, TEST_TIME_SEC + 12, 5, 1,
+                                TEST_TIME_SEC + 11, True)])
+
+    self.assertEqual((50, 5), store.delta('a', TEST_TIME_SEC + 3,
+                                          TEST_TIME_SEC + 8))
+    self.assertEqual((30, 3), store.delta('a', TEST_TIME_SEC - 5,
+                                          TEST_TIME_SEC + 3))
+    self.assertEqual((15, 2), store.delta('a', TEST_TIME_SEC + 8,
+                                          TEST_TIME_SEC + 20))
+
+  def test_delta_filters_labels(self):
+    store = collector.MetricStore()
+    store.add([
+        collector.Sample('a', {'fs_op': op}, TEST_TIME_SEC + 1, 10, 0,
+                         TEST_TIME_SEC, True) for op in ['ReadFile', 'GetXattr']
+    ])
+
+    value, _ = store.delta('a', TEST_TIME_SEC, TEST_TIME_SEC + 1,
+                           lambda labels: labels['fs_op'] != 'GetXattr')
+
+    self.assertEqual(10, value)
+
+  def test_store_is_written_and_loaded(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      metrics_file = os.path.join(temp_dir, 'metrics.jsonl')
+      store = collector.MetricStore(metrics_file)
+      store.add([collector.Sample('g', {}, TEST_TIME_SEC + 1, 2.5)])
+      store.close()
+
+      loaded = collector.MetricStore.load(metrics_file)
+
+    self.assertEqual([2.5], loaded.gauge_values('g', TEST_TIME_SEC,
+                                                TEST_TIME_SEC + 1))
+
+  def test_local_metrics_fetch_metrics(self):
+    store = collector.MetricStore()
+    for i in range(1, 5):
+      time_sec = TEST_TIME_SEC + i
+      store.add([
+          collector.Sample(collector.HOST_CPU_UTILIZATION, {}, time_sec, i),
+          collector.Sample(collector.HOST_RECEIVED_BYTES_RATE, {}, time_sec,
+                           100 * i),
+          collector.Sample(collector.READ_BYTES_COUNT, {}, time_sec, 1000 * i,
+                           0, TEST_TIME_SEC, True),
+          collector.Sample(collector.OPS_LATENCY, {'fs_op': 'ReadFile'},
+                           time_sec, 6.0 * i, 2 * i, TEST_TIME_SEC, True),
+      ])
+
+    rows = collector.LocalMetrics(store).fetch_metrics(
+        TEST_TIME_SEC, TEST_TIME_SEC + 4, 'instance', 2, 'read')
+
+    self.assertEqual([
+        [TEST_TIME_SEC + 2, TEST_TIME_SEC + 4, 2, 1.5, 200, 150, 2000, 0, 3],
+        [TEST_TIME_SEC + 4, TEST_TIME_SEC + 4, 4, 3.5, 400, 350, 2000, 0, 3],
+    ], rows)
+
+  def test_local_metrics_fetch_gcs_reads(self):
+    store = collector.MetricStore()
+    for i in range(1, 5):
+      store.add([
+          collector.Sample(collector.READ_BYTES_COUNT, {}, TEST_TIME_SEC + i,
+                           1000 * i, 0, TEST_TIME_SEC, True),
+          collector.Sample(collector.READER_COUNT, {'io_method': 'opened'},
+                           TEST_TIME_SEC + i, 2 * i, 0, TEST_TIME_SEC, True),
+          collector.Sample(collector.READER_COUNT, {'io_method': 'closed'},
+                           TEST_TIME_SEC + i, i, 0, TEST_TIME_SEC, True),
+      ])
+
+    self.assertEqual((2000, 4),
+                     collector.LocalMetrics(store).fetch_gcs_reads(
+                         TEST_TIME_SEC + 1, TEST_TIME_SEC + 3, 'instance'))
+
+  def test_local_metrics_with_start_time_after_end_time(self):
+    with self.assertRaises(ValueError):
+      collector.LocalMetrics(collector.MetricStore()).fetch_metrics(
+          TEST_TIME_SEC, TEST_TIME_SEC, 'instance', 1, 'read')
+
+  def test_export_over_grpc(self):
+    with socket.socket() as s:
+      s.bind(('localhost', 0))
+      port = s.getsockname()[1]
+    store = collector.MetricStore()
+    server = collector.serve(store, f'localhost:{port}')
+    try:
+      with grpc.insecure_channel(f'localhost:{port}') as channel:
+        export = channel.stream_stream(
+            f'/{collector.METRICS_SERVICE}/Export')
+        list(export(iter([_export_request([], 'gcsfuse'),
+                          _export_request([READ_BYTES])])))
+        list(export(iter([_export_request([READ_BYTES], 'other')])))
+    finally:
+      server.stop(grace=None)
+
+    self.assertEqual((100, 0), store.delta('gcs/read_bytes_count',
+                                           TEST_TIME_SEC, TEST_TIME_SEC + 1))
+
+
+if __name__ == '__main__':
+  unittest.main()
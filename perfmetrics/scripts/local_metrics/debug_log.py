@@ -0,0 +1,518 @@
+"""Analyzes the debug logs of gcsfuse per fio job window.
+
+gcsfuse mounted with --debug_fuse, --debug_gcs and --debug_http logs every FUSE
+op, GCS call and HTTP request:
+  fuse_debug: <time> Op 0x<id> connection.go:416] <- ReadFile (inode 3, ...)
+  fuse_debug: <time> Op 0x<id> connection.go:498] -> OK ()
+  gcs: <time> Req 0x<id>: <- Read("a/b", [0, 8388608))
+  gcs: <time> Req 0x<id>: -> Read("a/b", [0, 8388608)) (12.5ms): OK
+  http: <time> ========== REQUEST:
+  GET http://... HTTP/1.1
+The analyzer pairs the request and response lines of every FUSE op into
+latency histograms, reports the latencies of GCS calls and attributes every
+GCS call to the FUSE ops in flight when it started, split evenly between them,
+or to <none> (e.g. mounting). Per window, it reports the GCS calls per FUSE op,
+the GCS bytes requested per byte read through FUSE and the HTTP requests per
+GCS call, e.g. retries.
+
+The log is split into byte ranges parsed by parallel processes. Every process
+first replays the ops in flight before its range, and keeps fixed-size
+histograms and at most MAX_IN_FLIGHT ops in flight, so that multi-GB logs are
+analyzed in bounded memory.
+
+To analyze a log (windows labelled <job index>:<rw>, plus <all>):
+>> python3 debug_log.py <gcsfuse log> [--fio_output_file <fio output json>] [--output_file latencies.csv] [--amplification_file amplification.csv] [--processes 8]
+"""
+import argparse
+import bisect
+import csv
+import dataclasses
+import multiprocessing
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+FUSE_PREFIX = b'fuse_debug: '
+GCS_PREFIX = b'gcs: '
+HTTP_PREFIX = b'http: '
+HTTP_REQUEST_MARKER = b'========== REQUEST:'
+HTTP_RESPONSE_MARKER = b'========== RESPONSE:'
+# Label of the window of the whole log.
+ALL = '<all>'
+# FUSE op of the GCS calls made while no FUSE op is in flight.
+NO_OP = '<none>'
+# GCS call of NewReader in the debug log.
+GCS_READ = 'Read'
+NEW_READER = 'NewReader'
+READ_FILE = 'ReadFile'
+WRITE_FILE = 'WriteFile'
+# Ops whose request is not answered.
+UNANSWERED_OPS = ['interrupt']
+# Upper bounds of the latency buckets, 10us to ~168s doubling.
+LATENCY_BOUNDS_MS = [0.01 * 2**i for i in range(25)]
+PERCENTILES = [50, 90, 99, 99.9]
+# Ops in flight tracked at most. Ops never answered beyond it are dropped.
+MAX_IN_FLIGHT = 100000
+# Bytes of log before a range replayed to know the ops in flight.
+DEFAULT_WARMUP_BYTES = 16 * 2**20
+MIN_RANGE_BYTES = 64 * 2**20
+# Lines are read up to this size. HTTP bodies dumped by --debug_http can be
+# megabytes long, and the rest of them is skipped as separate lines.
+MAX_LINE_BYTES = 64 * 1024
+TIME_FORMAT = '%Y/%m/%d'
+
+# <time> Op 0x00000012        connection.go:416] <- FlushFile (inode 3, ...)
+FUSE_RE = re.compile(r'Op 0x([0-9a-f]+)\s+\S+\] (<-|->) (\S+)(.*)')
+# <time> Req              0x8: -> Read("d/f", [0, 10)) (1.8ms): OK
+GCS_RE = re.compile(r'Req\s+0x([0-9a-f]+): (<-|->) (\w+)\((.*)$')
+GCS_RESULT_RE = re.compile(r'\) \(([0-9.a-zµ]+)\): (.*)$')
+RANGE_RE = re.compile(r'\[(\d+), (\d+)\)\)')
+FUSE_BYTES_RE = re.compile(r'offset \d+, (\d+) bytes')
+DURATION_RE = re.compile(r'([0-9.]+)(ns|us|µs|ms|s|m|h)')
+DURATION_UNITS_MS = {
+    'ns': 10**(-6),
+    'us': 10**(-3),
+    'µs': 10**(-3),
+    'ms': 1,
+    's': 10**3,
+    'm': 60 * 10**3,
+    'h': 3600 * 10**3,
+}
+
+
+def parse_duration_ms(duration) -> float:
+  """Returns the milliseconds of a Go duration, e.g. 1m2.5s or 914.849µs."""
+  return sum(
+      float(value) * DURATION_UNITS_MS[unit]
+      for value, unit in DURATION_RE.findall(duration))
+
+
+class TimeParser:
+  """Parses the local times of log lines, caching the time of the day start."""
+
+  def __init__(self):
+    self._date = None
+    self._date_sec = 0
+
+  def parse(self, date, clock) -> float:
+    """Returns the epoch seconds of e.g. ('2023/05/10', '10:36:25.134772')."""
+    if date != self._date:
+      self._date = date
+      self._date_sec = time.mktime(time.strptime(date, TIME_FORMAT))
+    hours, minutes, seconds = clock.split(':')
+    return (self._date_sec + int(hours) * 3600 + int(minutes) * 60 +
+            float(seconds))
+
+
+@dataclasses.dataclass
+class LatencyStats:
+  """Count, errors and latency histogram of an op or call."""
+  count: int = 0
+  errors: int = 0
+  total_ms: float = 0
+  bucket_counts: List[int] = dataclasses.field(
+      default_factory=lambda: [0] * (len(LATENCY_BOUNDS_MS) + 1))
+
+  def add(self, latency_ms, error=False) -> None:
+    self.count += 1
+    self.errors += int(error)
+    self.total_ms += latency_ms
+    self.bucket_counts[bisect.bisect_left(LATENCY_BOUNDS_MS, latency_ms)] += 1
+
+  def merge(self, other: 'LatencyStats') -> None:
+    self.count += other.count
+    self.errors += other.errors
+    self.total_ms += other.total_ms
+    for i, count in enumerate(other.bucket_counts):
+      self.bucket_counts[i] += count
+
+  @property
+  def mean_ms(self) -> float:
+    return self.total_ms / self.count if self.count else 0
+
+  def percentile_ms(self, percentile) -> float:
+    """Estimates a percentile by linear interpolation within its bucket.
+
+    The overflow bucket is reported as the last bound.
+    """
+    total = sum(self.bucket_counts)
+    if not total:
+      return 0
+    rank = percentile / 100 * total
+    below = 0
+    for index, count in enumerate(self.bucket_counts):
+      if count and below + count >= rank:
+        if index == len(LATENCY_BOUNDS_MS):
+          return LATENCY_BOUNDS_MS[-1]
+        lower = LATENCY_BOUNDS_MS[index - 1] if index else 0
+        fraction = (rank - below) / count
+        return lower + fraction * (LATENCY_BOUNDS_MS[index] - lower)
+      below += count
+    return LATENCY_BOUNDS_MS[-1]
+
+
+@dataclasses.dataclass
+class WindowStats:
+  """Stats of the log lines of a window."""
+  fuse_ops: Dict[str, LatencyStats] = dataclasses.field(default_factory=dict)
+  gcs_calls: Dict[str, LatencyStats] = dataclasses.field(default_factory=dict)
+  # GCS calls attributed to FUSE ops: {fuse op: {gcs method: calls}}.
+  attributed_calls: Dict[str, Dict[str, float]] = dataclasses.field(
+      default_factory=dict)
+  fuse_read_bytes: int = 0
+  fuse_write_bytes: int = 0
+  # Bytes of the ranges of the GCS reads, as read by gcsfuse unless the
+  # reader is closed early.
+  gcs_read_bytes: int = 0
+  http_requests: int = 0
+  http_statuses: Dict[str, int] = dataclasses.field(default_factory=dict)
+  # FUSE responses whose request was not found, e.g. beyond the warm-up.
+  unpaired_responses: int = 0
+
+  def merge(self, other: 'WindowStats') -> None:
+    for name, stats in other.fuse_ops.items():
+      self.fuse_ops.setdefault(name, LatencyStats()).merge(stats)
+    for name, stats in other.gcs_calls.items():
+      self.gcs_calls.setdefault(name, LatencyStats()).merge(stats)
+    for op, calls in other.attributed_calls.items():
+      op_calls = self.attributed_calls.setdefault(op, {})
+      for method, count in calls.items():
+        op_calls[method] = op_calls.get(method, 0) + count
+    for status, count in other.http_statuses.items():
+      self.http_statuses[status] = self.http_statuses.get(status, 0) + count
+    self.fuse_read_bytes += other.fuse_read_bytes
+    self.fuse_write_bytes += other.fuse_write_bytes
+    self.gcs_read_bytes += other.gcs_read_bytes
+    self.http_requests += other.http_requests
+    self.unpaired_responses += other.unpaired_responses
+
+  @property
+  def gcs_call_count(self) -> int:
+    return sum(stats.count for stats in self.gcs_calls.values())
+
+  @property
+  def read_amplification(self) -> float:
+    """GCS bytes requested per byte read through FUSE."""
+    if not self.fuse_read_bytes:
+      return 0
+    return self.gcs_read_bytes / self.fuse_read_bytes
+
+  @property
+  def http_requests_per_gcs_call(self) -> float:
+    return (self.http_requests /
+            self.gcs_call_count if self.gcs_call_count else 0)
+
+
+class LogParser:
+  """Parses log lines into the stats of the windows they fall in.
+
+  Windows are (label, start_time_sec, end_time_sec) and can overlap. Every
+  line also counts in the ALL window.
+  """
+
+  def __init__(self, windows=()):
+    self.windows = list(windows)
+    self.stats: Dict[str, WindowStats] = {ALL: WindowStats()}
+    for label, _, _ in self.windows:
+      self.stats[label] = WindowStats()
+    # FUSE ops in flight: {id: (op, start time)}, oldest first.
+    self._in_flight: Dict[str, Tuple[str, float]] = {}
+    self._times = TimeParser()
+    # Marker of the HTTP request or response whose first line is next.
+    self._http_marker = None
+    self._http_time_sec = 0
+
+  def _get_windows(self, time_sec) -> List[WindowStats]:
+    windows = [self.stats[ALL]]
+    for label, start_time_sec, end_time_sec in self.windows:
+      if start_time_sec <= time_sec <= end_time_sec:
+        windows.append(self.stats[label])
+    return windows
+
+  def parse_line(self, line: bytes, record=True) -> None:
+    """Parses a line of the log.
+
+    Args:
+      line: Line, with or without its end of line.
+      record: Whether to record the stats of the line, or only to update the
+        ops in flight, e.g. for the lines before the range of a process.
+    """
+    marker, self._http_marker = self._http_marker, None
+    if marker is not None:
+      if record:
+        self._parse_http_line(marker, line)
+      return
+    if line.startswith(FUSE_PREFIX):
+      prefix, parse = FUSE_PREFIX, self._parse_fuse_line
+    elif line.startswith(GCS_PREFIX):
+      if not record:
+        return
+      prefix, parse = GCS_PREFIX, self._parse_gcs_line
+    elif line.startswith(HTTP_PREFIX):
+      if record and (HTTP_REQUEST_MARKER in line or
+                     HTTP_RESPONSE_MARKER in line):
+        fields = line[len(HTTP_PREFIX):].decode(errors='replace').split(' ', 2)
+        try:
+          self._http_time_sec = self._times.parse(fields[0], fields[1])
+        except (IndexError, ValueError):
+          return
+        self._http_marker = (HTTP_REQUEST_MARKER if HTTP_REQUEST_MARKER in line
+                             else HTTP_RESPONSE_MARKER)
+      return
+    else:
+      return
+    fields = line[len(prefix):].decode(errors='replace').rstrip().split(' ', 2)
+    if len(fields) < 3:
+      return
+    try:
+      time_sec = self._times.parse(fields[0], fields[1])
+    except ValueError:
+      return
+    parse(time_sec, fields[2], record)
+
+  def _parse_fuse_line(self, time_sec, message, record) -> None:
+    match = FUSE_RE.match(message)
+    if not match:
+      return
+    op_id, direction, name, rest = match.groups()
+    if direction == '<-':
+      if name in UNANSWERED_OPS:
+        return
+      if len(self._in_flight) >= MAX_IN_FLIGHT:
+        del self._in_flight[next(iter(self._in_flight))]
+      self._in_flight[op_id] = (name, time_sec)
+      if record and name in [READ_FILE, WRITE_FILE]:
+        bytes_match = FUSE_BYTES_RE.search(rest)
+        if bytes_match:
+          for window in self._get_windows(time_sec):
+            if name == READ_FILE:
+              window.fuse_read_bytes += int(bytes_match.group(1))
+            else:
+              window.fuse_write_bytes += int(bytes_match.group(1))
+      return
+    request = self._in_flight.pop(op_id, None)
+    if not record:
+      return
+    windows = self._get_windows(time_sec)
+    if request is None:
+      for window in windows:
+        window.unpaired_responses += 1
+      return
+    op, start_time_sec = request
+    latency_ms = max(time_sec - start_time_sec, 0) * 1000
+    for window in windows:
+      window.fuse_ops.setdefault(op, LatencyStats()).add(
+          latency_ms, error=name != 'OK')
+
+  def _parse_gcs_line(self, time_sec, message, record) -> None:
+    match = GCS_RE.match(message)
+    if not match:
+      return
+    _, direction, method, rest = match.groups()
+    if method == GCS_READ:
+      method = NEW_READER
+    windows = self._get_windows(time_sec)
+    if direction == '<-':
+      ops = [op for op, _ in self._in_flight.values()] or [NO_OP]
+      for window in windows:
+        for op in ops:
+          op_calls = window.attributed_calls.setdefault(op, {})
+          op_calls[method] = op_calls.get(method, 0) + 1 / len(ops)
+      if method == NEW_READER:
+        range_match = RANGE_RE.search(rest)
+        if range_match:
+          start, limit = map(int, range_match.groups())
+          for window in windows:
+            window.gcs_read_bytes += limit - start
+      return
+    # Responses end with (<duration>): <result>. Read errors of readers are
+    # logged without a duration, and the reader is closed later.
+    result_match = GCS_RESULT_RE.search(rest)
+    if not result_match:
+      return
+    duration, result = result_match.groups()
+    latency_ms = parse_duration_ms(duration)
+    for window in windows:
+      window.gcs_calls.setdefault(method, LatencyStats()).add(
+          latency_ms, error=result != 'OK')
+
+  def _parse_http_line(self, marker, line) -> None:
+    fields = line.decode(errors='replace').split(' ', 2)
+    for window in self._get_windows(self._http_time_sec):
+      if marker == HTTP_REQUEST_MARKER:
+        window.http_requests += 1
+      elif len(fields) >= 2:
+        window.http_statuses[fields[1]] = (
+            window.http_statuses.get(fields[1], 0) + 1)
+
+
+def _iter_lines(f, start, end):
+  """Yields the lines of a binary file starting in [start, end)."""
+  position = start
+  if start > 0:
+    # The line in progress at start belongs to the previous range.
+    f.seek(start - 1)
+    position = start - 1
+    while True:
+      part = f.readline(MAX_LINE_BYTES)
+      position += len(part)
+      if not part or part.endswith(b'\n'):
+        break
+  else:
+    f.seek(start)
+  while position < end:
+    line = f.readline(MAX_LINE_BYTES)
+    if not line:
+      return
+    yield line
+    position += len(line)
+
+
+def parse_range(log_file, start, end, windows=(),
+                warmup_bytes=DEFAULT_WARMUP_BYTES) -> Dict[str, WindowStats]:
+  """Returns the stats of the lines of a log starting in [start, end).
+
+  The ops in flight at start are replayed from the warmup_bytes before it.
+  """
+  parser = LogParser(windows)
+  with open(log_file, 'rb') as f:
+    if start > 0:
+      for line in _iter_lines(f, max(start - warmup_bytes, 0), start):
+        parser.parse_line(line, record=False)
+    for line in _iter_lines(f, start, end):
+      parser.parse_line(line)
+  return parser.stats
+
+
+def _parse_range_args(args) -> Dict[str, WindowStats]:
+  return parse_range(*args)
+
+
+def analyze_log(log_file, windows=(), processes=None,
+                range_bytes=MIN_RANGE_BYTES,
+                warmup_bytes=DEFAULT_WARMUP_BYTES) -> Dict[str, WindowStats]:
+  """Returns the stats of every window and ALL of a log.
+
+  Args:
+    log_file: gcsfuse log file.
+    windows: (label, start_time_sec, end_time_sec) of the windows, e.g. fio
+      jobs.
+    processes: Number of processes parsing the log, the number of CPUs by
+      default.
+    range_bytes: Minimum bytes of log parsed by a process.
+    warmup_bytes: Bytes before a range replayed for the ops in flight.
+  """
+  processes = processes or os.cpu_count() or 1
+  size = os.path.getsize(log_file)
+  num_ranges = max(1, min(processes, size // max(range_bytes, 1)))
+  bounds = [size * i // num_ranges for i in range(num_ranges + 1)]
+  args = [(log_file, bounds[i], bounds[i + 1], list(windows), warmup_bytes)
+          for i in range(num_ranges)]
+  if num_ranges == 1:
+    results = [_parse_range_args(args[0])]
+  else:
+    with multiprocessing.Pool(num_ranges) as pool:
+      results = pool.map(_parse_range_args, args)
+  stats = results[0]
+  for result in results[1:]:
+    for label, window_stats in result.items():
+      stats[label].merge(window_stats)
+  return stats
+
+
+def get_latency_rows(stats: Dict[str, WindowStats]) -> List[list]:
+  """Returns rows of window, kind (fuse or gcs), name, count and latencies."""
+  rows = []
+  for label, window in stats.items():
+    for kind, ops in [('fuse', window.fuse_ops), ('gcs', window.gcs_calls)]:
+      for name, op_stats in sorted(ops.items()):
+        rows.append([label, kind, name, op_stats.count, op_stats.errors,
+                     op_stats.mean_ms] +
+                    [op_stats.percentile_ms(p) for p in PERCENTILES])
+  return rows
+
+
+def get_amplification_rows(stats: Dict[str, WindowStats]) -> List[list]:
+  """Returns rows of window, FUSE op, ops, GCS method, calls and calls per op.
+
+  The GCS calls made without FUSE op in flight are under NO_OP, without ops.
+  """
+  rows = []
+  for label, window in stats.items():
+    for op, calls in sorted(window.attributed_calls.items()):
+      op_count = window.fuse_ops[op].count if op in window.fuse_ops else 0
+      for method, count in sorted(calls.items()):
+        rows.append([
+            label, op, op_count, method, count,
+            count / op_count if op_count else 0
+        ])
+  return rows
+
+
+def print_stats(stats: Dict[str, WindowStats]) -> None:
+  for label, window in stats.items():
+    print(f'Window {label}: {sum(op.count for op in window.fuse_ops.values())} '
+          f'FUSE ops, {window.gcs_call_count} GCS calls, '
+          f'{window.http_requests} HTTP requests '
+          f'({window.http_requests_per_gcs_call:.2f} per GCS call), read '
+          f'amplification {window.read_amplification:.2f}')
+    for kind, ops in [('FUSE', window.fuse_ops), ('GCS', window.gcs_calls)]:
+      for name, op_stats in sorted(ops.items(),
+                                   key=lambda item: -item[1].total_ms):
+        percentiles = ', '.join(
+            f'p{p}: {op_stats.percentile_ms(p):.2f}ms' for p in PERCENTILES)
+        print(f'  {kind} {name}: {op_stats.count} ({op_stats.errors} errors), '
+              f'mean {op_stats.mean_ms:.2f}ms, {percentiles}')
+    if window.unpaired_responses:
+      print(f'  {window.unpaired_responses} FUSE responses without request')
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('log_file')
+  parser.add_argument('--fio_output_file', default='',
+                      help='fio output JSON file of the jobs to report')
+  parser.add_argument('--output_file', default='',
+                      help='CSV filepath to write the latencies to')
+  parser.add_argument('--amplification_file', default='',
+                      help='CSV filepath to write the GCS calls per FUSE op to')
+  parser.add_argument('--processes', type=int, default=0,
+                      help='Number of processes, the number of CPUs by '
+                      'default')
+  args = parser.parse_args(argv[1:])
+
+  windows = []
+  if args.fio_output_file:
+    # Imported here so that logs are analyzed without the fio_metrics
+    # dependencies.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    '..'))
+    from fio import fio_metrics
+    consts = fio_metrics.consts
+    jobs = fio_metrics.FioMetrics().get_metrics(args.fio_output_file)
+    windows = [(f'{index + 1}:{job[consts.PARAMS][consts.RW]}',
+                job[consts.START_TIME], job[consts.END_TIME])
+               for index, job in enumerate(jobs)]
+
+  stats = analyze_log(args.log_file, windows, args.processes or None)
+  print_stats(stats)
+  if args.output_file:
+    with open(args.output_file, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow(['window', 'kind', 'name', 'count', 'errors', 'mean_ms'] +
+                      [f'p{p}_ms' for p in PERCENTILES])
+      writer.writerows(get_latency_rows(stats))
+  if args.amplification_file:
+    with open(args.amplification_file, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow([
+          'window', 'fuse_op', 'fuse_ops', 'gcs_method', 'gcs_calls',
+          'gcs_calls_per_fuse_op'
+      ])
+      writer.writerows(get_amplification_rows(stats))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,193 @@
+"""Tests for debug_log."""
+import datetime
+import os
+import tempfile
+import unittest
+
+import debug_log
+
+DATE = '2023/05/10'
+# A read of 256KiB, whose LookUpInode and OpenFile make GCS calls, with
+# --debug_http dumps and an upload body without end of line in between.
+LOG = '''Mounting file system "bucket"...
+fuse_debug: 2023/05/10 10:00:00.000000 Op 0x00000002        connection.go:416] <- init
+fuse_debug: 2023/05/10 10:00:00.000100 Op 0x00000002        connection.go:498] -> OK ()
+gcs: 2023/05/10 10:00:00.000200 Req              0x0: <- ListObjects("")
+http: 2023/05/10 10:00:00.000300 ========== REQUEST:
+GET http://localhost:9000/storage/v1/b/bucket/o?maxResults=1 HTTP/1.1
+Host: localhost:9000
+
+http: 2023/05/10 10:00:00.000400 ========== RESPONSE:
+HTTP/1.1 200 OK
+Content-Length: 2
+
+{}
+http: 2023/05/10 10:00:00.000500 ====================
+gcs: 2023/05/10 10:00:00.000600 Req              0x0: -> ListObjects("") (400µs): OK
+fuse_debug: 2023/05/10 10:00:01.000000 Op 0x00000004        connection.go:416] <- LookUpInode (parent 1, name "f", PID 10)
+gcs: 2023/05/10 10:00:01.000100 Req              0x1: <- StatObject("f")
+gcs: 2023/05/10 10:00:01.000200 Req              0x2: <- StatObject("f/")
+gcs: 2023/05/10 10:00:01.002000 Req              0x1: -> StatObject("f") (1.9ms): OK
+gcs: 2023/05/10 10:00:01.003000 Req              0x2: -> StatObject("f/") (2.8ms): gcs.NotFoundError: Not Found
+fuse_debug: 2023/05/10 10:00:01.004000 Op 0x00000004        connection.go:498] -> OK ()
+fuse_debug: 2023/05/10 10:00:01.005000 Op 0x00000006        connection.go:416] <- OpenFile (inode 2, PID 10)
+fuse_debug: 2023/05/10 10:00:01.005000 Op 0x00000008        connection.go:416] <- ReadFile (inode 2, PID 10, handle 0, offset 0, 131072 bytes)
+fuse_debug: 2023/05/10 10:00:01.006000 Op 0x00000006        connection.go:498] -> OK ()
+fuse_debug: 2023/05/10 10:00:01.006000 Op 0x0000000a        connection.go:416] <- ReadFile (inode 2, PID 10, handle 0, offset 131072, 131072 bytes)
+gcs: 2023/05/10 10:00:01.007000 Req              0x3: <- Read("f", [0, 1048576))
+http: 2023/05/10 10:00:01.007100 ========== REQUEST:
+PUT http://localhost:9000/upload?upload_id=1 HTTP/1.1
+Host: localhost:9000
+
+''' + 'x' * 100000 + '''
+http: 2023/05/10 10:00:01.007200 ========== RESPONSE:
+HTTP/1.1 503 Service Unavailable
+
+http: 2023/05/10 10:00:01.007300 ========== REQUEST:
+GET http://localhost:9000/download/storage/v1/b/bucket/o/f?alt=media HTTP/1.1
+
+http: 2023/05/10 10:00:01.007400 ========== RESPONSE:
+HTTP/1.1 206 Partial Content
+
+fuse_debug: 2023/05/10 10:00:01.015000 Op 0x00000008        connection.go:498] -> OK ()
+fuse_debug: 2023/05/10 10:00:01.025000 Op 0x0000000a        connection.go:498] -> Error: "input/output error"
+fuse_debug: 2023/05/10 10:00:01.026000 Op 0x0000000c        connection.go:416] <- interrupt (fuseid 0x0000000a)
+gcs: 2023/05/10 10:00:02.000000 Req              0x3: -> Read("f", [0, 1048576)) (1m2.5s): OK
+'''
+
+
+def _time(clock):
+  return datetime.datetime.strptime(f'{DATE} {clock}',
+                                    '%Y/%m/%d %H:%M:%S.%f').timestamp()
+
+
+class DebugLogTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.log_file = os.path.join(self.temp_dir.name, 'gcsfuse.log')
+    with open(self.log_file, 'w') as f:
+      f.write(LOG)
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+    super().tearDown()
+
+  def test_parse_duration_ms(self):
+    self.assertAlmostEqual(0.914849, debug_log.parse_duration_ms('914.849µs'))
+    self.assertAlmostEqual(62500, debug_log.parse_duration_ms('1m2.5s'))
+    self.assertAlmostEqual(3.5, debug_log.parse_duration_ms('3.5ms'))
+
+  def test_percentiles(self):
+    stats = debug_log.LatencyStats()
+    for _ in range(99):
+      stats.add(1)
+    stats.add(1000)
+
+    # 1ms is in the bucket (0.64ms, 1.28ms].
+    self.assertLessEqual(stats.percentile_ms(50), 1.28)
+    self.assertGreater(stats.percentile_ms(50), 0.64)
+    self.assertGreater(stats.percentile_ms(99.9), 655)
+    self.assertAlmostEqual(10.99, stats.mean_ms)
+    self.assertEqual(0, debug_log.LatencyStats().percentile_ms(99))
+
+  def test_analyze_log(self):
+    stats = debug_log.analyze_log(self.log_file, processes=1)[debug_log.ALL]
+
+    self.assertEqual({'init', 'LookUpInode', 'OpenFile', 'ReadFile'},
+                     set(stats.fuse_ops))
+    read_file = stats.fuse_ops['ReadFile']
+    self.assertEqual(2, read_file.count)
+    self.assertEqual(1, read_file.errors)
+    self.assertAlmostEqual(29, read_file.total_ms, places=3)
+    self.assertAlmostEqual(4, stats.fuse_ops['LookUpInode'].total_ms, places=3)
+    self.assertEqual(2, stats.gcs_calls['StatObject'].count)
+    self.assertEqual(1, stats.gcs_calls['StatObject'].errors)
+    self.assertAlmostEqual(62500, stats.gcs_calls['NewReader'].total_ms)
+    self.assertEqual(
+        {
+            debug_log.NO_OP: {
+                'ListObjects': 1
+            },
+            'LookUpInode': {
+                'StatObject': 2
+            },
+            # The read started while both ReadFile ops were in flight.
+            'ReadFile': {
+                'NewReader': 1
+            },
+        }, stats.attributed_calls)
+    self.assertEqual(262144, stats.fuse_read_bytes)
+    self.assertEqual(4, stats.read_amplification)
+    self.assertEqual(3, stats.http_requests)
+    self.assertEqual({'200': 1, '503': 1, '206': 1}, stats.http_statuses)
+    self.assertEqual(0.75, stats.http_requests_per_gcs_call)
+    self.assertEqual(0, stats.unpaired_responses)
+
+  def test_split_between_ops_in_flight(self):
+    parser = debug_log.LogParser()
+    for line in [
+        'fuse_debug: 2023/05/10 10:00:00.0 Op 0x1 a.go:1] <- OpenFile (inode 2)',
+        'fuse_debug: 2023/05/10 10:00:00.0 Op 0x2 a.go:1] <- ReadFile (inode 3)',
+        'gcs: 2023/05/10 10:00:00.1 Req 0x1: <- StatObject("f")',
+    ]:
+      parser.parse_line(line.encode())
+
+    self.assertEqual({
+        'OpenFile': {
+            'StatObject': 0.5
+        },
+        'ReadFile': {
+            'StatObject': 0.5
+        }
+    }, parser.stats[debug_log.ALL].attributed_calls)
+
+  def test_windows(self):
+    windows = [('1:read', _time('10:00:00.0'), _time('10:00:00.5')),
+               ('2:read', _time('10:00:01.0'), _time('10:00:01.010'))]
+
+    stats = debug_log.analyze_log(self.log_file, windows, processes=1)
+
+    self.assertEqual(['init'], list(stats['1:read'].fuse_ops))
+    self.assertEqual({'ListObjects'}, set(stats['1:read'].gcs_calls))
+    self.assertEqual({'LookUpInode', 'OpenFile'}, set(stats['2:read'].fuse_ops))
+    self.assertEqual(262144, stats['2:read'].fuse_read_bytes)
+    self.assertEqual(2, stats['2:read'].http_requests)
+
+  def test_ranges_in_parallel(self):
+    serial = debug_log.analyze_log(self.log_file, processes=1)[debug_log.ALL]
+
+    parallel = debug_log.analyze_log(self.log_file, processes=4,
+                                     range_bytes=1)[debug_log.ALL]
+
+    self.assertEqual(serial.attributed_calls, parallel.attributed_calls)
+    self.assertEqual(
+        debug_log.get_latency_rows({debug_log.ALL: serial}),
+        debug_log.get_latency_rows({debug_log.ALL: parallel}))
+    self.assertEqual(serial.http_statuses, parallel.http_statuses)
+
+  def test_ranges_without_warmup(self):
+    stats = debug_log.analyze_log(self.log_file, processes=4, range_bytes=1,
+                                  warmup_bytes=0)[debug_log.ALL]
+
+    # Some responses are in another range than their request.
+    self.assertGreater(stats.unpaired_responses, 0)
+
+  def test_rows(self):
+    stats = debug_log.analyze_log(self.log_file, processes=1)
+
+    latency_rows = debug_log.get_latency_rows(stats)
+    amplification_rows = debug_log.get_amplification_rows(stats)
+
+    new_reader_rows = [row for row in latency_rows if row[2] == 'NewReader']
+    self.assertEqual([debug_log.ALL, 'gcs', 'NewReader', 1, 0, 62500.0],
+                     new_reader_rows[0][:6])
+    self.assertIn([debug_log.ALL, 'LookUpInode', 1, 'StatObject', 2, 2],
+                  amplification_rows)
+    self.assertIn([debug_log.ALL, debug_log.NO_OP, 0, 'ListObjects', 1, 0],
+                  amplification_rows)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,325 @@
+"""Samples host and gcsfuse process metrics from /proc during a load test.
+
+Every --interval_sec (100ms to 1s) the sampler reads /proc/stat,
+/proc/net/dev and /proc/<gcsfuse pid>/{stat,status,io,fd} and records:
+  cpu, cpu<N>: utilization (%) of all the CPUs and of every core.
+  rx_bytes_per_sec, tx_bytes_per_sec: network throughput, without loopback.
+  gcsfuse_cpu: CPU time of gcsfuse per second (%, 100 = one core).
+  gcsfuse_rss_bytes, gcsfuse_threads, gcsfuse_fds.
+  gcsfuse_ctx_switches_per_sec: voluntary and involuntary context switches.
+  gcsfuse_rchar_per_sec, gcsfuse_wchar_per_sec: bytes read and written by
+    gcsfuse syscalls (/proc/<pid>/io is only readable by the owner or root).
+Every column is an array('d') of the series, written to a CSV file when the
+sampler stops. No cloud API is used, so it works on any Linux box.
+
+To sample while the load test runs (stops on SIGINT or SIGTERM):
+>> python3 proc_sampler.py sample <samples csv> [--pid <gcsfuse pid>] [--interval_sec 0.5]
+
+To summarize the samples per fio job window (labelled <job index>:<rw>):
+>> python3 proc_sampler.py summarize <samples csv> <fio output json> [--output_file jobs.csv]
+"""
+import argparse
+import array
+import bisect
+import csv
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+PROC_ROOT = '/proc'
+PROCESS_NAME = 'gcsfuse'
+DEFAULT_INTERVAL_SEC = 0.5
+MIN_INTERVAL_SEC = 0.1
+TIME = 'time_sec'
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def read_cpu_times(proc_root=PROC_ROOT) -> Dict[str, Tuple[int, int]]:
+  """Returns the (busy, total) jiffies of 'cpu' (all CPUs) and every core."""
+  cpu_times = {}
+  with open(os.path.join(proc_root, 'stat'), 'r') as f:
+    for line in f:
+      if not line.startswith('cpu'):
+        break
+      name, *values = line.split()
+      # guest and guest_nice, after the first 8 values, are already counted in
+      # user and nice.
+      times = [int(value) for value in values[:8]]
+      # idle and iowait are the 4th and 5th values.
+      idle = times[3] + (times[4] if len(times) > 4 else 0)
+      cpu_times[name] = (sum(times) - idle, sum(times))
+  return cpu_times
+
+
+def read_net_bytes(proc_root=PROC_ROOT) -> Tuple[int, int]:
+  """Returns the bytes received and sent by all the interfaces but loopback."""
+  received_bytes, sent_bytes = 0, 0
+  with open(os.path.join(proc_root, 'net', 'dev'), 'r') as f:
+    for line in f.readlines()[2:]:
+      interface, counters = line.split(':', 1)
+      if interface.strip() == 'lo':
+        continue
+      counters = counters.split()
+      received_bytes += int(counters[0])
+      sent_bytes += int(counters[8])
+  return received_bytes, sent_bytes
+
+
+def read_process(pid, proc_root=PROC_ROOT) -> Dict[str, float]:
+  """Returns the counters of a process, see the module docstring.
+
+  Raises:
+    FileNotFoundError: When the process does not exist.
+  """
+  process_dir = os.path.join(proc_root, str(pid))
+  with open(os.path.join(process_dir, 'stat'), 'r') as f:
+    # The command name in parentheses can contain spaces.
+    stat = f.read().rsplit(')', 1)[1].split()
+  # stat[0] is the 3rd field of proc(5), the state.
+  counters = {
+      'cpu_sec': (int(stat[11]) + int(stat[12])) / CLOCK_TICKS,
+      'threads': int(stat[17]),
+  }
+
+  with open(os.path.join(process_dir, 'status'), 'r') as f:
+    status = dict(line.split(':', 1) for line in f if ':' in line)
+  counters['rss_bytes'] = int(status.get('VmRSS', '0 kB').split()[0]) * 1024
+  counters['ctx_switches'] = (int(status['voluntary_ctxt_switches']) +
+                              int(status['nonvoluntary_ctxt_switches']))
+
+  try:
+    counters['fds'] = len(os.listdir(os.path.join(process_dir, 'fd')))
+  except PermissionError:
+    counters['fds'] = math.nan
+  try:
+    with open(os.path.join(process_dir, 'io'), 'r') as f:
+      io = dict(line.split(':', 1) for line in f if ':' in line)
+    counters['rchar'] = int(io['rchar'])
+    counters['wchar'] = int(io['wchar'])
+  except PermissionError:
+    counters['rchar'] = counters['wchar'] = math.nan
+  return counters
+
+
+def find_pid(name=PROCESS_NAME, proc_root=PROC_ROOT) -> Optional[int]:
+  """Returns the pid of the oldest process with the given name, or None."""
+  pids = []
+  for entry in os.listdir(proc_root):
+    if not entry.isdigit():
+      continue
+    try:
+      with open(os.path.join(proc_root, entry, 'comm'), 'r') as f:
+        if f.read().strip() == name:
+          pids.append(int(entry))
+    except OSError:
+      continue
+  return min(pids) if pids else None
+
+
+class TimeSeries:
+  """Samples of named columns, stored as arrays of doubles.
+
+  Missing values are NaN, so that columns (e.g. a core) can appear at any time.
+  """
+
+  def __init__(self):
+    self.times = array.array('d')
+    self.columns = {}
+
+  def __len__(self):
+    return len(self.times)
+
+  def append(self, time_sec, values: Dict[str, float]) -> None:
+    for column in values:
+      if column not in self.columns:
+        self.columns[column] = array.array('d', [math.nan] * len(self.times))
+    self.times.append(time_sec)
+    for column, column_values in self.columns.items():
+      column_values.append(values.get(column, math.nan))
+
+  def get_window(self, start_time_sec, end_time_sec) -> slice:
+    """Returns the slice of the samples in [start_time_sec, end_time_sec]."""
+    return slice(bisect.bisect_left(self.times, start_time_sec),
+                 bisect.bisect_right(self.times, end_time_sec))
+
+  def summarize(self, start_time_sec,
+                end_time_sec) -> Dict[str, Tuple[float, float]]:
+    """Returns the (mean, max) of every column over the window.
+
+    NaN values are ignored, and columns without values in the window are (NaN,
+    NaN).
+    """
+    window = self.get_window(start_time_sec, end_time_sec)
+    summary = {}
+    for column, column_values in self.columns.items():
+      values = [
+          value for value in column_values[window] if not math.isnan(value)
+      ]
+      summary[column] = ((sum(values) / len(values), max(values))
+                         if values else (math.nan, math.nan))
+    return summary
+
+  def write_csv(self, output_file) -> None:
+    with open(output_file, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow([TIME] + list(self.columns))
+      for i, time_sec in enumerate(self.times):
+        writer.writerow([time_sec] +
+                        [column[i] for column in self.columns.values()])
+
+  @classmethod
+  def read_csv(cls, samples_file):
+    series = cls()
+    with open(samples_file, 'r', newline='') as f:
+      for row in csv.DictReader(f):
+        time_sec = float(row.pop(TIME))
+        series.append(time_sec,
+                      {column: float(value) for column, value in row.items()})
+    return series
+
+
+class ProcSampler:
+  """Records rates and gauges derived from two consecutive /proc readings."""
+
+  def __init__(self, pid=None, proc_root=PROC_ROOT):
+    self.pid = pid
+    self.proc_root = proc_root
+    self.series = TimeSeries()
+    self._last = None
+
+  def _read(self):
+    cpu_times = read_cpu_times(self.proc_root)
+    net_bytes = read_net_bytes(self.proc_root)
+    process = None
+    if self.pid:
+      try:
+        process = read_process(self.pid, self.proc_root)
+      except FileNotFoundError:
+        # gcsfuse exited, e.g. unmounted between two fio runs.
+        process = None
+    return time.time(), cpu_times, net_bytes, process
+
+  def sample(self) -> None:
+    """Reads /proc and appends the values since the previous call."""
+    reading = self._read()
+    last, self._last = self._last, reading
+    if last is None:
+      return
+    self.series.append(reading[0], get_values(last, reading))
+
+  def run(self, stop: threading.Event,
+          interval_sec=DEFAULT_INTERVAL_SEC) -> None:
+    """Samples every interval_sec until stop is set."""
+    interval_sec = max(interval_sec, MIN_INTERVAL_SEC)
+    self.sample()
+    next_time = time.time() + interval_sec
+    while not stop.wait(max(next_time - time.time(), 0)):
+      self.sample()
+      next_time += interval_sec
+
+
+def get_values(last, reading) -> Dict[str, float]:
+  """Returns the values between two readings of ProcSampler._read."""
+  last_time, last_cpu_times, last_net_bytes, last_process = last
+  time_sec, cpu_times, net_bytes, process = reading
+  elapsed_sec = time_sec - last_time
+
+  values = {}
+  for cpu, (busy, total) in cpu_times.items():
+    last_busy, last_total = last_cpu_times.get(cpu, (busy, total))
+    values[cpu] = (100 * (busy - last_busy) / (total - last_total)
+                   if total > last_total else 0.0)
+  values['rx_bytes_per_sec'] = (net_bytes[0] - last_net_bytes[0]) / elapsed_sec
+  values['tx_bytes_per_sec'] = (net_bytes[1] - last_net_bytes[1]) / elapsed_sec
+
+  if process and last_process:
+    values[f'{PROCESS_NAME}_cpu'] = (
+        100 * (process['cpu_sec'] - last_process['cpu_sec']) / elapsed_sec)
+    values[f'{PROCESS_NAME}_ctx_switches_per_sec'] = (
+        process['ctx_switches'] - last_process['ctx_switches']) / elapsed_sec
+    for counter in ['rchar', 'wchar']:
+      values[f'{PROCESS_NAME}_{counter}_per_sec'] = (
+          process[counter] - last_process[counter]) / elapsed_sec
+    for gauge in ['rss_bytes', 'threads', 'fds']:
+      values[f'{PROCESS_NAME}_{gauge}'] = process[gauge]
+  return values
+
+
+def summarize_windows(series: TimeSeries,
+                      windows) -> Tuple[List[str], List[list]]:
+  """Returns a header and a row of means and maxima for every window.
+
+  Args:
+    series: TimeSeries of the samples
+    windows (list[(label, start_time_sec, end_time_sec)]): e.g. fio jobs
+  Returns:
+    (list[str] header, list[list] rows)
+  """
+  columns = list(series.columns)
+  header = ['window', 'start_time_sec', 'end_time_sec', 'num_samples']
+  for column in columns:
+    header += [f'{column}_mean', f'{column}_max']
+  rows = []
+  for label, start_time_sec, end_time_sec in windows:
+    window = series.get_window(start_time_sec, end_time_sec)
+    summary = series.summarize(start_time_sec, end_time_sec)
+    row = [label, start_time_sec, end_time_sec, len(series.times[window])]
+    for column in columns:
+      row += list(summary[column])
+    rows.append(row)
+  return header, rows
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  subparsers = parser.add_subparsers(dest='command', required=True)
+  sample_parser = subparsers.add_parser('sample')
+  sample_parser.add_argument('samples_file')
+  sample_parser.add_argument('--pid', type=int,
+                             help='gcsfuse pid, found by name by default')
+  sample_parser.add_argument('--interval_sec', type=float,
+                             default=DEFAULT_INTERVAL_SEC)
+  summarize_parser = subparsers.add_parser('summarize')
+  summarize_parser.add_argument('samples_file')
+  summarize_parser.add_argument('fio_output_file')
+  summarize_parser.add_argument('--output_file', default='proc_metrics.csv')
+  args = parser.parse_args(argv[1:])
+
+  if args.command == 'sample':
+    pid = args.pid or find_pid()
+    if pid is None:
+      print(f'No {PROCESS_NAME} process found, sampling the host only')
+    sampler = ProcSampler(pid)
+    stop = threading.Event()
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+      signal.signal(signum, lambda *_: stop.set())
+    sampler.run(stop, args.interval_sec)
+    sampler.series.write_csv(args.samples_file)
+    print(f'Wrote {len(sampler.series)} samples to {args.samples_file}')
+    return
+
+  # Imported here so that the sampler runs without the fio_metrics
+  # dependencies.
+  sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  '..'))
+  from fio import fio_metrics
+
+  jobs = fio_metrics.FioMetrics().get_metrics(args.fio_output_file)
+  consts = fio_metrics.consts
+  windows = [(f'{index + 1}:{job[consts.PARAMS][consts.RW]}',
+              job[consts.START_TIME], job[consts.END_TIME])
+             for index, job in enumerate(jobs)]
+  header, rows = summarize_windows(TimeSeries.read_csv(args.samples_file),
+                                   windows)
+  with open(args.output_file, 'w', newline='') as f:
+    writer = csv.writer(f)
+    writer.writerow(header)
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,141 @@
+"""Tests for proc_sampler."""
+import math
+import os
+import tempfile
+import unittest
+
+import proc_sampler
+
+PID = 1234
+STAT = '''cpu  100 0 100 700 100 0 0 0 30 0
+cpu0 50 0 50 350 50 0 0 0 0 0
+cpu1 50 0 50 350 50 0 0 0 30 0
+intr 1 2 3
+'''
+NET_DEV = '''Inter-|   Receive                            |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: 5000 10 0 0 0 0 0 0 5000 10 0 0 0 0 0 0
+  eth0: 1000 10 0 0 0 0 0 0 300 5 0 0 0 0 0 0
+'''
+PROCESS_STAT = (f'{PID} (gcs fuse) S 1 1 1 0 -1 0 0 0 0 0 {2 * os.sysconf("SC_CLK_TCK")} '
+                f'{os.sysconf("SC_CLK_TCK")} 0 0 20 0 12 0 100 0 0')
+PROCESS_STATUS = '''Name:\tgcsfuse
+VmRSS:\t  2048 kB
+voluntary_ctxt_switches:\t10
+nonvoluntary_ctxt_switches:\t5
+'''
+PROCESS_IO = '''rchar: 4096
+wchar: 1024
+'''
+
+
+def _write(path, content):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'w') as f:
+    f.write(content)
+
+
+class ProcSamplerTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.proc_root = self.temp_dir.name
+    _write(os.path.join(self.proc_root, 'stat'), STAT)
+    _write(os.path.join(self.proc_root, 'net', 'dev'), NET_DEV)
+    process_dir = os.path.join(self.proc_root, str(PID))
+    _write(os.path.join(process_dir, 'stat'), PROCESS_STAT)
+    _write(os.path.join(process_dir, 'status'), PROCESS_STATUS)
+    _write(os.path.join(process_dir, 'io'), PROCESS_IO)
+    _write(os.path.join(process_dir, 'comm'), 'gcsfuse\n')
+    for fd in ['0', '1', '2']:
+      _write(os.path.join(process_dir, 'fd', fd), '')
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+    super().tearDown()
+
+  def test_read_cpu_times(self):
+    cpu_times = proc_sampler.read_cpu_times(self.proc_root)
+
+    self.assertEqual({'cpu': (200, 1000), 'cpu0': (100, 500),
+                      'cpu1': (100, 500)}, cpu_times)
+
+  def test_read_net_bytes_without_loopback(self):
+    self.assertEqual((1000, 300), proc_sampler.read_net_bytes(self.proc_root))
+
+  def test_read_process(self):
+    counters = proc_sampler.read_process(PID, self.proc_root)
+
+    self.assertEqual({'cpu_sec': 3, 'threads': 12, 'rss_bytes': 2048 * 1024,
+                      'ctx_switches': 15, 'fds': 3, 'rchar': 4096,
+                      'wchar': 1024}, counters)
+
+  def test_find_pid(self):
+    self.assertEqual(PID, proc_sampler.find_pid(proc_root=self.proc_root))
+    self.assertIsNone(proc_sampler.find_pid('fio', self.proc_root))
+
+  def test_get_values(self):
+    last = (100.0, {'cpu': (200, 1000)}, (1000, 300),
+            {'cpu_sec': 3, 'ctx_switches': 15, 'rchar': 4096, 'wchar': 1024,
+             'rss_bytes': 10, 'threads': 12, 'fds': 3})
+    reading = (102.0, {'cpu': (700, 2000)}, (3000, 500),
+               {'cpu_sec': 4, 'ctx_switches': 55, 'rchar': 8192, 'wchar': 1024,
+                'rss_bytes': 20, 'threads': 14, 'fds': 5})
+
+    values = proc_sampler.get_values(last, reading)
+
+    self.assertEqual({'cpu': 50, 'rx_bytes_per_sec': 1000,
+                      'tx_bytes_per_sec': 100, 'gcsfuse_cpu': 50,
+                      'gcsfuse_ctx_switches_per_sec': 20,
+                      'gcsfuse_rchar_per_sec': 2048,
+                      'gcsfuse_wchar_per_sec': 0, 'gcsfuse_rss_bytes': 20,
+                      'gcsfuse_threads': 14, 'gcsfuse_fds': 5}, values)
+
+  def test_sampler_skips_first_reading(self):
+    sampler = proc_sampler.ProcSampler(PID, self.proc_root)
+
+    sampler.sample()
+    sampler.sample()
+
+    self.assertEqual(1, len(sampler.series))
+    self.assertIn('gcsfuse_rss_bytes', sampler.series.columns)
+
+  def test_time_series_fills_missing_values_with_nan(self):
+    series = proc_sampler.TimeSeries()
+    series.append(1, {'a': 1})
+    series.append(2, {'a': 2, 'b': 5})
+
+    self.assertTrue(math.isnan(series.columns['b'][0]))
+    self.assertEqual({'a': (1.5, 2), 'b': (5, 5)}, series.summarize(0, 2))
+    self.assertEqual(slice(1, 2), series.get_window(1.5, 3))
+
+  def test_time_series_csv_round_trip(self):
+    series = proc_sampler.TimeSeries()
+    series.append(1, {'a': 1})
+    series.append(2, {'a': 2, 'b': 5})
+    samples_file = os.path.join(self.proc_root, 'samples.csv')
+
+    series.write_csv(samples_file)
+    loaded = proc_sampler.TimeSeries.read_csv(samples_file)
+
+    self.assertEqual(list(series.times), list(loaded.times))
+    self.assertEqual([2, 5], [loaded.columns['a'][1], loaded.columns['b'][1]])
+
+  def test_summarize_windows(self):
+    series = proc_sampler.TimeSeries()
+    for i in range(10):
+      series.append(i, {'cpu': i})
+
+    header, rows = proc_sampler.summarize_windows(series, [('1:read', 2, 4),
+                                                           ('2:write', 20, 30)])
+
+    self.assertEqual(['window', 'start_time_sec', 'end_time_sec',
+                      'num_samples', 'cpu_mean', 'cpu_max'], header)
+    self.assertEqual(['1:read', 2, 4, 3, 3, 4], rows[0])
+    self.assertEqual(0, rows[1][3])
+    self.assertTrue(math.isnan(rows[1][4]))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,105 @@
+"""Minimal decoder of the protobuf wire format.
+
+The messages read by the local tools (OpenCensus agent exports, pprof profiles)
+are decoded field by field with their field numbers, so that neither protoc nor
+the generated Python modules are needed. Refer
+https://protobuf.dev/programming-guides/encoding/.
+"""
+import struct
+from typing import Dict, Iterator, List, Tuple
+
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+
+class DecodeError(Exception):
+  """The data is not a valid protobuf message."""
+
+
+def decode_varint(data, pos) -> Tuple[int, int]:
+  """Decodes the varint at data[pos].
+
+  Returns:
+    (value, position after the varint)
+  Raises:
+    DecodeError: When the varint is truncated.
+  """
+  result = 0
+  shift = 0
+  while True:
+    if pos >= len(data):
+      raise DecodeError('Truncated varint')
+    byte = data[pos]
+    pos += 1
+    result |= (byte & 0x7f) << shift
+    if not byte & 0x80:
+      return result, pos
+    shift += 7
+
+
+def iter_fields(data) -> Iterator[Tuple[int, int, object]]:
+  """Yields (field number, wire type, value) of every field of a message.
+
+  Varints are yielded as unsigned ints, fixed64 and fixed32 as raw bytes and
+  length-delimited fields as memoryviews of the data.
+
+  Raises:
+    DecodeError: On truncated data or unsupported (group) wire types.
+  """
+  data = memoryview(data)
+  pos = 0
+  while pos < len(data):
+    key, pos = decode_varint(data, pos)
+    field_number, wire_type = key >> 3, key & 0x7
+    if wire_type == VARINT:
+      value, pos = decode_varint(data, pos)
+    elif wire_type == FIXED64:
+      value, pos = bytes(data[pos:pos + 8]), pos + 8
+    elif wire_type == LENGTH_DELIMITED:
+      length, pos = decode_varint(data, pos)
+      value, pos = data[pos:pos + length], pos + length
+    elif wire_type == FIXED32:
+      value, pos = bytes(data[pos:pos + 4]), pos + 4
+    else:
+      raise DecodeError(f'Unsupported wire type {wire_type}')
+    if pos > len(data):
+      raise DecodeError('Truncated field')
+    yield field_number, wire_type, value
+
+
+def get_fields(data) -> Dict[int, List[object]]:
+  """Returns the values of every field number, in order of appearance."""
+  fields = {}
+  for field_number, _, value in iter_fields(data):
+    fields.setdefault(field_number, []).append(value)
+  return fields
+
+
+def to_int64(value) -> int:
+  """Converts an unsigned varint to a two's complement int64."""
+  return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_double(value) -> float:
+  return struct.unpack('<d', value)[0]
+
+
+def to_string(value) -> str:
+  return bytes(value).decode('utf-8')
+
+
+def packed_varints(value) -> List[int]:
+  """Decodes a packed repeated varint field."""
+  result = []
+  pos = 0
+  while pos < len(value):
+    number, pos = decode_varint(value, pos)
+    result.append(number)
+  return result
+
+
+def packed_doubles(value) -> List[float]:
+  """Decodes a packed repeated double field."""
+  return list(struct.unpack(f'<{len(value) // 8}d', value))
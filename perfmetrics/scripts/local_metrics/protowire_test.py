@@ -0,0 +1,47 @@
+"""Tests for protowire."""
+import struct
+import unittest
+
+import protowire
+
+
+class ProtowireTest(unittest.TestCase):
+
+  def test_decode_varint(self):
+    self.assertEqual((300, 2), protowire.decode_varint(b'\xac\x02', 0))
+
+  def test_decode_truncated_varint(self):
+    with self.assertRaises(protowire.DecodeError):
+      protowire.decode_varint(b'\xac', 0)
+
+  def test_iter_fields(self):
+    data = (b'\x08\x96\x01' + b'\x12\x03abc' + b'\x19' + struct.pack('<d', 1.5) +
+            b'\x25\x01\x00\x00\x00')
+
+    fields = [(number, wire_type, bytes(value) if wire_type else value)
+              for number, wire_type, value in protowire.iter_fields(data)]
+
+    self.assertEqual([(1, protowire.VARINT, 150),
+                      (2, protowire.LENGTH_DELIMITED, b'abc'),
+                      (3, protowire.FIXED64, struct.pack('<d', 1.5)),
+                      (4, protowire.FIXED32, b'\x01\x00\x00\x00')], fields)
+
+  def test_iter_fields_with_truncated_field(self):
+    with self.assertRaises(protowire.DecodeError):
+      list(protowire.iter_fields(b'\x12\x05abc'))
+
+  def test_get_fields_keeps_repeated_values(self):
+    self.assertEqual({1: [1, 2]}, protowire.get_fields(b'\x08\x01\x08\x02'))
+
+  def test_to_int64(self):
+    self.assertEqual(-1, protowire.to_int64((1 << 64) - 1))
+    self.assertEqual(5, protowire.to_int64(5))
+
+  def test_packed(self):
+    self.assertEqual([1, 300], protowire.packed_varints(b'\x01\xac\x02'))
+    self.assertEqual([1.5, 2.0],
+                     protowire.packed_doubles(struct.pack('<2d', 1.5, 2.0)))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,26 @@
+"""Labels of the classes of the animal model dataset.
+
+The ml-models-data-gcsfuse dataset names its classes in Italian or in English.
+The animal model titles its sample predictions with the other name of a class,
+and with the class name itself for the classes of other datasets, e.g. the
+class_0000 classes of generate_synthetic_dataset.py.
+
+  Usage inside a model script:
+    plt.title('True:' + animal_classes.get_label(class_names[label]))
+"""
+
+# Italian names of the classes to English, and English names to Italian.
+TRANSLATE = {
+    'cane': 'dog', 'cavallo': 'horse', 'elefante': 'elephant',
+    'farfalla': 'butterfly', 'gallina': 'chicken', 'gatto': 'cat',
+    'mucca': 'cow', 'pecora': 'sheep', 'scoiattolo': 'squirrel',
+    'dog': 'cane', 'elephant': 'elefante', 'butterfly': 'farfalla',
+    'chicken': 'gallina', 'cat': 'gatto', 'cow': 'mucca', 'spider': 'ragno',
+    'squirrel': 'scoiattolo'
+}
+T_INV = {v: k for k, v in TRANSLATE.items()}
+
+
+def get_label(class_name) -> str:
+  """Returns the label of a class in the titles of the animal model."""
+  return T_INV.get(class_name, TRANSLATE.get(class_name, class_name))
@@ -0,0 +1,31 @@
+"""Tests for animal_classes."""
+import os
+import tempfile
+import unittest
+
+import animal_classes
+import generate_synthetic_dataset
+
+
+class AnimalClassesTest(unittest.TestCase):
+
+  def test_labels_of_the_animal_dataset(self):
+    self.assertEqual('cane', animal_classes.get_label('dog'))
+    self.assertEqual('ragno', animal_classes.get_label('spider'))
+    self.assertEqual('sheep', animal_classes.get_label('pecora'))
+
+  def test_labels_of_generated_classes(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      specs = generate_synthetic_dataset.get_image_specs(
+          temp_dir, num_classes=12, images_per_class=1, min_size=16,
+          max_size=32, size_distribution='uniform', splits=[], seed=0)
+      class_names = sorted(
+          {os.path.basename(os.path.dirname(spec.path)) for spec in specs})
+
+    self.assertEqual(12, len(class_names))
+    self.assertEqual(class_names,
+                     [animal_classes.get_label(name) for name in class_names])
+
+
+if __name__ == '__main__':
+  unittest.main()
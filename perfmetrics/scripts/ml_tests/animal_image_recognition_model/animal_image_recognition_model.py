@@ -2,6 +2,9 @@
 """
 # In[ ]:
 
+import argparse
+import contextlib
+import os
 from os import stat
 import sys
 import time
@@ -17,12 +20,34 @@ import matplotlib.pyplot as plt
 from torch.utils.data import Dataset, DataLoader ,random_split
 from torchvision import transforms, utils
 from torchvision.datasets import ImageFolder
+from torchvision.datasets.folder import default_loader
 
-# In[ ]:
-start_time = time.time()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import animal_classes
+import decoded_cache
+import epoch_cache
+import run_results
 
+# In[ ]:
+parser = argparse.ArgumentParser()
+parser.add_argument('data_path', help='Path of the dataset')
+parser.add_argument('--epoch_cache_dir', default=None,
+                    help='Local directory for the read-through epoch cache')
+parser.add_argument('--epoch_cache_size_mb', type=int, default=10240,
+                    help='Capacity of the read-through epoch cache in MB')
+parser.add_argument('--decoded_cache_dir', default=None,
+                    help='Directory for the memory-mapped cache of decoded images')
+parser.add_argument('--keep_decoded_cache', action='store_true', default=False,
+                    help='Reuse the decoded images of a previous run, so that '
+                    'the first epoch reads from the cache too')
+parser.add_argument('--no_pretrained_weights', action='store_true', default=False,
+                    help='Start from random weights instead of downloading them')
+parser.add_argument('--results_file', default=None,
+                    help='JSON lines file where the phase records are appended')
+args = parser.parse_args()
 
-res_18_model = models.resnet18(pretrained=True)
+start_time = time.time()
+recorder = run_results.PhaseRecorder(args.results_file)
 
 
 # In[ ]:
@@ -38,16 +63,43 @@ T = transforms.Compose([
 # In[ ]:
 
 
-dataset = ImageFolder(sys.argv[1], transform=T)
+recorder.start_phase(run_results.INDEX_BUILD)
+cache = None
+loader = default_loader
+if args.epoch_cache_dir:
+    cache = epoch_cache.ReadThroughCache(
+        args.epoch_cache_dir, args.epoch_cache_size_mb * epoch_cache.MB_TO_BYTES)
+    loader = cache.pil_loader
+
+timers = decoded_cache.StageTimers()
+if args.decoded_cache_dir:
+    folder = ImageFolder(args.data_path)
+    decoded_images = decoded_cache.DecodedImageCache(
+        args.decoded_cache_dir, folder.samples, (224, 224),
+        clear=not args.keep_decoded_cache)
+    dataset = decoded_cache.DecodedImageFolder(
+        folder.samples, folder.classes, decoded_images,
+        pre_transform=transforms.Resize((224,224)),
+        post_transform=transforms.Compose([
+            transforms.ConvertImageDtype(torch.float),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        ]),
+        reader=cache.read if cache else decoded_cache.read_file,
+        timers=timers)
+else:
+    dataset = ImageFolder(args.data_path, transform=T, loader=loader)
 train_set, val_set = random_split(dataset, [int(len(dataset)*.8), len(dataset)-int(len(dataset)*.8)])
 train_loader =DataLoader(train_set, batch_size=4096, num_workers=4)
 test_loader = DataLoader(val_set, batch_size=4096, num_workers=4)
+recorder.end_phase()
 
 
 # In[ ]:
 
 
-res_18_model.fc= nn.Linear(512, 10)
+recorder.start_phase(run_results.SETUP)
+res_18_model = models.resnet18(pretrained=not args.no_pretrained_weights)
+res_18_model.fc= nn.Linear(512, len(dataset.classes))
 
 
 # In[ ]:
@@ -59,6 +111,7 @@ if(torch.cuda.is_available()==True):
     
 optimiser=optim.SGD(model.parameters(),lr=1e-2)
 loss=nn.CrossEntropyLoss()
+recorder.end_phase()
 
 
 # In[ ]:
@@ -68,10 +121,17 @@ loss=nn.CrossEntropyLoss()
 nb_epochs = 4
 acc_tot=np.zeros(nb_epochs)
 for epoch in range(nb_epochs):
+    epoch_timers = contextlib.ExitStack()
+    if cache:
+        epoch_timers.enter_context(cache.epoch(epoch))
+    if args.decoded_cache_dir:
+        epoch_timers.enter_context(timers.epoch(epoch))
+    recorder.start_phase(run_results.EPOCH, epoch=epoch + 1)
     losses = list()
     accuracies = list()
     model.train()     
     for x,y in train_loader: 
+        compute_start = time.perf_counter()
 
         if(torch.cuda.is_available()==True):
             x=x.cuda()
@@ -99,6 +159,9 @@ for epoch in range(nb_epochs):
 
         losses.append(J.item())
         accuracies.append(y.eq(l.detach().argmax(dim=1)).float().mean())
+        timers.add(decoded_cache.COMPUTE, time.perf_counter() - compute_start)
+    recorder.end_phase()
+    epoch_timers.close()
 
     print(f'Epoch {epoch + 1}', end=', ')
     print(f'training loss: {torch.tensor(losses).mean():.2f}', end=', ')
@@ -122,8 +185,6 @@ def imformat(inp, title=None):
 
 
 class_names = dataset.classes
-translate = {"cane": "dog", "cavallo": "horse", "elefante": "elephant", "farfalla": "butterfly", "gallina": "chicken", "gatto": "cat", "mucca": "cow", "pecora": "sheep", "scoiattolo": "squirrel", "dog": "cane", "cavallo": "horse", "elephant" : "elefante", "butterfly": "farfalla", "chicken": "gallina", "cat": "gatto", "cow": "mucca", "spider": "ragno", "squirrel": "scoiattolo"}
-t_inv = {v: k for k, v in translate.items()}
 
 
 # In[ ]:
@@ -145,10 +206,7 @@ for i in range(0,9):
     
     plt.imshow((img))
 
-    try:
-        plt.title('True:'+str(t_inv[class_names[classes[i]]])+'    Pred:'+str(t_inv[class_names[preds[i]]]))
-    except:
-        plt.title('True:'+str(translate[class_names[classes[i]]])+'    Pred:'+str(translate[class_names[preds[i]]]))
+    plt.title('True:'+animal_classes.get_label(class_names[classes[i]])+'    Pred:'+animal_classes.get_label(class_names[preds[i]]))
     if(i==9):
         plt.axis("off")
 
@@ -156,6 +214,7 @@ for i in range(0,9):
 # In[ ]:
 
 
+recorder.start_phase(run_results.EVAL)
 losses = list()
 accuracies = list() 
 model.eval()
@@ -174,10 +233,13 @@ for batch in test_loader:
     losses.append(J.item())
     accuracies.append(y.eq(l.detach().argmax(dim=1)).float().mean())
 
+recorder.end_phase()
 
 end_time = time.time()
 
 print(f'Start_time: {start_time}')
 print(f'End_time: {end_time}')
 print(f'Total_running_time: {(end_time - start_time)/60} Minutes')
+if cache:
+    cache.print_summary()
 
@@ -0,0 +1,280 @@
+"""Benchmarks saving and loading model checkpoints through a directory.
+
+gcsfuse writes go to a local temp file and are uploaded to GCS when the file is
+flushed/closed, so the cost of torch.save through a mount is mostly hidden in
+close(). This script saves and loads checkpoints of different sizes in any
+directory (a gcsfuse mount, local disk, ...) and times open, write, flush,
+fsync and close separately. The time of every step is summed over the files
+of a checkpoint, while the save throughput is over the elapsed time of the
+whole save.
+
+Checkpoints:
+  resnet18, resnet50: state dicts of the torchvision models (random weights).
+  synthetic_<size>mb: state dict of float32 tensors of --tensor_size_mb each,
+    adding up to <size> MB, given with --synthetic_sizes_mb.
+
+Save modes:
+  single: torch.save of the whole state dict into one file.
+  buffered: the state dict is serialized in memory, then written to one file in
+    --chunk_size_mb chunks.
+  sharded: the state dict is split into shards of at most --shard_size_mb, each
+    saved to its own file by one of --num_threads threads.
+
+To run the script:
+>> python3 checkpoint_benchmark.py <target_dir> [--checkpoints resnet18,resnet50] [--synthetic_sizes_mb 1024,4096] [--modes single,buffered,sharded] [--iterations 3] [--no_fsync] [--drop_caches] [--output_file checkpoints.csv]
+"""
+import argparse
+import concurrent.futures
+import csv
+import dataclasses
+import io
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+MB = 1024 * 1024
+FLOAT32_BYTES = 4
+MODES = ['single', 'buffered', 'sharded']
+MODEL_CHECKPOINTS = ['resnet18', 'resnet50']
+
+
+@dataclasses.dataclass
+class FileTiming:
+  """Time in seconds spent in each step of writing one file."""
+  num_bytes: int = 0
+  open_sec: float = 0.0
+  write_sec: float = 0.0
+  flush_sec: float = 0.0
+  fsync_sec: float = 0.0
+  close_sec: float = 0.0
+
+  @property
+  def total_sec(self) -> float:
+    return (self.open_sec + self.write_sec + self.flush_sec + self.fsync_sec +
+            self.close_sec)
+
+  def __add__(self, other):
+    return FileTiming(*[
+        getattr(self, f.name) + getattr(other, f.name)
+        for f in dataclasses.fields(self)
+    ])
+
+
+def timed_write(path, write_fn: Callable, fsync=True) -> FileTiming:
+  """Writes a file with write_fn and times every step.
+
+  Args:
+    path (str): Path of the file to write.
+    write_fn: Called with the open binary file object.
+    fsync (bool): Whether to fsync the file before closing it.
+  Returns:
+    FileTiming
+  """
+  timing = FileTiming()
+  start = time.perf_counter()
+  f = open(path, 'wb')
+  timing.open_sec = time.perf_counter() - start
+  try:
+    start = time.perf_counter()
+    write_fn(f)
+    timing.write_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    f.flush()
+    timing.flush_sec = time.perf_counter() - start
+
+    if fsync:
+      start = time.perf_counter()
+      os.fsync(f.fileno())
+      timing.fsync_sec = time.perf_counter() - start
+  finally:
+    start = time.perf_counter()
+    f.close()
+    timing.close_sec = time.perf_counter() - start
+  timing.num_bytes = os.path.getsize(path)
+  return timing
+
+
+def write_in_chunks(f, data, chunk_size) -> None:
+  view = memoryview(data)
+  for offset in range(0, len(view), chunk_size):
+    f.write(view[offset:offset + chunk_size])
+
+
+def plan_shards(tensor_sizes: Dict[str, int], shard_size) -> List[List[str]]:
+  """Groups the tensors into shards of at most shard_size bytes.
+
+  Tensors larger than shard_size get a shard of their own. The order of the
+  state dict is preserved.
+  """
+  shards = []
+  current, current_size = [], 0
+  for name, size in tensor_sizes.items():
+    if current and current_size + size > shard_size:
+      shards.append(current)
+      current, current_size = [], 0
+    current.append(name)
+    current_size += size
+  if current:
+    shards.append(current)
+  return shards
+
+
+def get_state_dict(checkpoint, tensor_size_mb):
+  """Returns the state dict of a model checkpoint or synthetic_<size>mb."""
+  # Imported here so that the timing helpers can be used and tested without
+  # torch.
+  import torch
+  from torchvision import models
+
+  if checkpoint in MODEL_CHECKPOINTS:
+    return getattr(models, checkpoint)().state_dict()
+
+  size_mb = int(checkpoint[len('synthetic_'):-len('mb')])
+  generator = torch.Generator().manual_seed(0)
+  state_dict = {}
+  remaining_mb = size_mb
+  while remaining_mb > 0:
+    tensor_mb = min(tensor_size_mb, remaining_mb)
+    state_dict[f'tensor_{len(state_dict)}'] = torch.rand(
+        tensor_mb * MB // FLOAT32_BYTES, generator=generator)
+    remaining_mb -= tensor_mb
+  return state_dict
+
+
+def save(state_dict, path, mode, fsync, chunk_size, shard_size,
+         num_threads) -> FileTiming:
+  """Saves the state dict and returns the timing summed over all files."""
+  import torch
+
+  if mode == 'single':
+    return timed_write(path, lambda f: torch.save(state_dict, f), fsync)
+
+  if mode == 'buffered':
+    buffer = io.BytesIO()
+    start = time.perf_counter()
+    torch.save(state_dict, buffer)
+    serialize_sec = time.perf_counter() - start
+    timing = timed_write(
+        path, lambda f: write_in_chunks(f, buffer.getbuffer(), chunk_size),
+        fsync)
+    timing.write_sec += serialize_sec
+    return timing
+
+  tensor_sizes = {
+      name: tensor.numel() * tensor.element_size()
+      for name, tensor in state_dict.items()
+  }
+  shards = plan_shards(tensor_sizes, shard_size)
+  os.makedirs(path, exist_ok=True)
+
+  def save_shard(index):
+    shard = {name: state_dict[name] for name in shards[index]}
+    return timed_write(
+        os.path.join(path, f'shard_{index:05d}.pt'),
+        lambda f: torch.save(shard, f), fsync)
+
+  with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+    timings = list(executor.map(save_shard, range(len(shards))))
+  return sum(timings, FileTiming())
+
+
+def load(path, mode) -> float:
+  """Loads a saved checkpoint and returns the time taken in seconds."""
+  import torch
+
+  start = time.perf_counter()
+  if mode == 'sharded':
+    state_dict = {}
+    for name in sorted(os.listdir(path)):
+      state_dict.update(torch.load(os.path.join(path, name),
+                                   map_location='cpu'))
+  else:
+    torch.load(path, map_location='cpu')
+  return time.perf_counter() - start
+
+
+def _remove(path) -> None:
+  if os.path.isdir(path):
+    for name in os.listdir(path):
+      os.remove(os.path.join(path, name))
+    os.rmdir(path)
+  elif os.path.exists(path):
+    os.remove(path)
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('target_dir',
+                      help='Directory the checkpoints are saved to')
+  parser.add_argument('--checkpoints', default=','.join(MODEL_CHECKPOINTS),
+                      help='Comma separated model checkpoints')
+  parser.add_argument('--synthetic_sizes_mb', default='1024,4096',
+                      help='Comma separated sizes of synthetic checkpoints')
+  parser.add_argument('--tensor_size_mb', type=int, default=64)
+  parser.add_argument('--modes', default=','.join(MODES))
+  parser.add_argument('--chunk_size_mb', type=int, default=16)
+  parser.add_argument('--shard_size_mb', type=int, default=256)
+  parser.add_argument('--num_threads', type=int, default=4)
+  parser.add_argument('--iterations', type=int, default=3)
+  parser.add_argument('--no_fsync', action='store_true', default=False)
+  parser.add_argument('--drop_caches', action='store_true', default=False,
+                      help='Drop the kernel page cache before every load, '
+                      'requires root')
+  parser.add_argument('--output_file', default='checkpoint_benchmark.csv')
+  args = parser.parse_args(argv[1:])
+
+  checkpoints = [c for c in args.checkpoints.split(',') if c]
+  checkpoints += [
+      f'synthetic_{size}mb' for size in args.synthetic_sizes_mb.split(',')
+      if size
+  ]
+  modes = args.modes.split(',')
+  for mode in modes:
+    if mode not in MODES:
+      raise ValueError(f'Unknown mode {mode}, expected one of {MODES}')
+
+  rows = []
+  for checkpoint in checkpoints:
+    state_dict = get_state_dict(checkpoint, args.tensor_size_mb)
+    for mode, iteration in [(m, i) for m in modes
+                            for i in range(args.iterations)]:
+      path = os.path.join(args.target_dir, f'{checkpoint}_{mode}.ckpt')
+      _remove(path)
+      start = time.perf_counter()
+      timing = save(state_dict, path, mode, not args.no_fsync,
+                    args.chunk_size_mb * MB, args.shard_size_mb * MB,
+                    args.num_threads)
+      save_sec = time.perf_counter() - start
+      if args.drop_caches:
+        bench_utils.drop_caches()
+      load_sec = load(path, mode)
+      _remove(path)
+
+      row = {'checkpoint': checkpoint, 'mode': mode, 'iteration': iteration}
+      # The steps are summed over the files, which the sharded mode writes
+      # concurrently, so they add up to more than the elapsed save_sec.
+      row.update(dataclasses.asdict(timing))
+      row['file_sec_sum'] = timing.total_sec
+      row['save_sec'] = save_sec
+      row['save_mb_per_sec'] = timing.num_bytes / MB / save_sec
+      row['load_sec'] = load_sec
+      row['load_mb_per_sec'] = timing.num_bytes / MB / load_sec
+      rows.append(row)
+      print(f'{checkpoint} {mode}: save {row["save_mb_per_sec"]:.1f} MB/s '
+            f'(close {timing.close_sec:.2f}s), '
+            f'load {row["load_mb_per_sec"]:.1f} MB/s')
+
+  with open(args.output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
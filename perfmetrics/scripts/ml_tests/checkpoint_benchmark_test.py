@@ -0,0 +1,54 @@
+"""Tests for checkpoint_benchmark."""
+import io
+import os
+import tempfile
+import unittest
+
+import checkpoint_benchmark
+
+
+class CheckpointBenchmarkTest(unittest.TestCase):
+
+  def test_timed_write(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, 'ckpt')
+
+      timing = checkpoint_benchmark.timed_write(path,
+                                                lambda f: f.write(b'x' * 10))
+
+      self.assertEqual(10, timing.num_bytes)
+      self.assertGreater(timing.fsync_sec, 0)
+      self.assertGreaterEqual(timing.total_sec, timing.close_sec)
+
+  def test_timed_write_without_fsync(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, 'ckpt')
+
+      timing = checkpoint_benchmark.timed_write(
+          path, lambda f: f.write(b'x'), fsync=False)
+
+    self.assertEqual(0, timing.fsync_sec)
+
+  def test_file_timings_add_up(self):
+    total = (checkpoint_benchmark.FileTiming(1, 0.5, 1, 0, 0, 2) +
+             checkpoint_benchmark.FileTiming(2, 0.5, 1, 0, 1, 3))
+
+    self.assertEqual(3, total.num_bytes)
+    self.assertEqual(9, total.total_sec)
+
+  def test_write_in_chunks(self):
+    f = io.BytesIO()
+
+    checkpoint_benchmark.write_in_chunks(f, bytes(range(10)), 3)
+
+    self.assertEqual(bytes(range(10)), f.getvalue())
+
+  def test_plan_shards(self):
+    shards = checkpoint_benchmark.plan_shards(
+        {'a': 4, 'b': 4, 'c': 10, 'd': 1, 'e': 2}, 8)
+
+    self.assertEqual([['a', 'b'], ['c'], ['d', 'e']], shards)
+
+
+if __name__ == '__main__':
+  unittest.main()
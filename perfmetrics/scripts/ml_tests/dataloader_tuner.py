@@ -0,0 +1,248 @@
+"""Sweeps the DataLoader parameters of the ML models for each storage backend.
+
+The ML models use fixed DataLoader parameters (batch_size=4096 and
+num_workers=4 for the animal model, batch_size=16 and num_workers=4 for the
+fashion model), so a run measures a single arbitrary point. This script runs
+the read-only loading path of the models (ImageFolder with the resize and
+normalize transforms, no model) for every combination of num_workers,
+batch_size, prefetch_factor and persistent_workers, and reports the
+configuration with the highest samples/sec for every storage backend. The
+whole surface is written to a CSV file.
+
+The kernel page cache is dropped before every configuration, so that no
+configuration reads the files cached by the previous one, and the
+configurations run in a random order of --seed. Every row of the CSV file
+records the position of its configuration in the run and whether the cache
+was dropped before it: a configuration measured on a warm cache is biased
+towards a higher samples/sec.
+
+To run the script:
+>> python3 dataloader_tuner.py --data_path gcsfuse=/path/to/mount/data --data_path disk=/path/to/data [--num_workers 0,2,4,8] [--batch_size 16,256,4096] [--prefetch_factor 2,4] [--persistent_workers false,true] [--num_epochs 2] [--max_samples 10000] [--keep_caches] [--seed 42] [--output_file surface.csv]
+
+-> --data_path Can be repeated, <backend name>=<ImageFolder directory>.
+-> --num_epochs Number of passes over the data with the same DataLoader, so
+   that persistent_workers has an effect.
+-> --max_samples Upper bound on the number of samples read in every epoch.
+-> --keep_caches Does not drop the kernel page cache before every
+   configuration. Dropping it requires root or sudo.
+-> --seed Seed of the order of the configurations.
+"""
+import argparse
+import csv
+import dataclasses
+import itertools
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+SURFACE_FIELDS = ['backend', 'num_workers', 'batch_size', 'prefetch_factor',
+                  'persistent_workers', 'samples', 'elapsed_sec',
+                  'samples_per_sec', 'order', 'caches_dropped']
+DEFAULT_PREFETCH_FACTOR = 2
+SEED = 42
+
+
+@dataclasses.dataclass(frozen=True)
+class LoaderConfig:
+  num_workers: int
+  batch_size: int
+  prefetch_factor: int
+  persistent_workers: bool
+
+
+@dataclasses.dataclass
+class TuningResult:
+  backend: str
+  config: LoaderConfig
+  samples: int
+  elapsed_sec: float
+  # Position of the configuration in the run of its backend.
+  order: int = 0
+  # Whether the page cache was dropped before the configuration.
+  caches_dropped: bool = False
+
+  @property
+  def samples_per_sec(self) -> float:
+    return self.samples / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+  def to_row(self) -> Dict[str, object]:
+    row = {'backend': self.backend, 'samples': self.samples,
+           'elapsed_sec': self.elapsed_sec,
+           'samples_per_sec': self.samples_per_sec, 'order': self.order,
+           'caches_dropped': self.caches_dropped}
+    row.update(dataclasses.asdict(self.config))
+    return row
+
+
+def _parse_int_list(value) -> List[int]:
+  return [int(v) for v in value.split(',')]
+
+
+def _parse_bool_list(value) -> List[bool]:
+  values = []
+  for v in value.split(','):
+    if v.lower() not in ['true', 'false']:
+      raise argparse.ArgumentTypeError(f'Expected true or false, got {v}')
+    values.append(v.lower() == 'true')
+  return values
+
+
+def _parse_data_paths(data_paths) -> Dict[str, str]:
+  """Parses a list of <backend>=<path> strings into a dict.
+
+  Raises:
+    ValueError: If a value is not of the form <backend>=<path>.
+  """
+  backends = {}
+  for data_path in data_paths:
+    backend, sep, path = data_path.partition('=')
+    if not sep or not backend or not path:
+      raise ValueError(f'Expected <backend>=<path>, got {data_path}')
+    backends[backend] = path
+  return backends
+
+
+def get_configs(num_workers_list, batch_sizes, prefetch_factors,
+                persistent_workers_list) -> List[LoaderConfig]:
+  """Returns all valid combinations of the given parameters.
+
+  prefetch_factor and persistent_workers only apply to worker processes, so for
+  num_workers=0 a single configuration with their defaults is returned.
+  """
+  configs = []
+  for num_workers, batch_size in itertools.product(num_workers_list,
+                                                   batch_sizes):
+    if num_workers == 0:
+      configs.append(LoaderConfig(0, batch_size, DEFAULT_PREFETCH_FACTOR,
+                                  False))
+      continue
+    for prefetch_factor, persistent_workers in itertools.product(
+        prefetch_factors, persistent_workers_list):
+      configs.append(LoaderConfig(num_workers, batch_size, prefetch_factor,
+                                  persistent_workers))
+  return configs
+
+
+def get_best_results(results) -> Dict[str, TuningResult]:
+  """Returns the result with the highest samples/sec for every backend."""
+  best = {}
+  for result in results:
+    if (result.backend not in best or
+        result.samples_per_sec > best[result.backend].samples_per_sec):
+      best[result.backend] = result
+  return best
+
+
+def write_surface(results, output_file) -> None:
+  with open(output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=SURFACE_FIELDS)
+    writer.writeheader()
+    for result in results:
+      writer.writerow(result.to_row())
+
+
+def _measure(dataset, config, num_epochs) -> TuningResult:
+  """Iterates over the dataset with the given DataLoader configuration.
+
+  The time includes starting the worker processes, which is what
+  persistent_workers saves after the first epoch.
+  """
+  # Imported here so that the sweep logic can be used and tested without torch.
+  from torch.utils.data import DataLoader
+
+  kwargs = {}
+  if config.num_workers > 0:
+    kwargs['prefetch_factor'] = config.prefetch_factor
+    kwargs['persistent_workers'] = config.persistent_workers
+
+  samples = 0
+  start = time.perf_counter()
+  loader = DataLoader(dataset, batch_size=config.batch_size,
+                      num_workers=config.num_workers, **kwargs)
+  for _ in range(num_epochs):
+    for x, _ in loader:
+      samples += len(x)
+  elapsed_sec = time.perf_counter() - start
+  # Shutting down persistent workers before the next configuration starts.
+  del loader
+  return TuningResult('', config, samples, elapsed_sec)
+
+
+def _get_dataset(data_path, max_samples):
+  from torch.utils.data import Subset
+  from torchvision import transforms
+  from torchvision.datasets import ImageFolder
+
+  transform = transforms.Compose([
+      transforms.Resize((224, 224)),
+      transforms.ToTensor(),
+      transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                           std=[0.229, 0.224, 0.225]),
+  ])
+  dataset = ImageFolder(data_path, transform=transform)
+  if max_samples and max_samples < len(dataset):
+    indices = random.Random(SEED).sample(range(len(dataset)), max_samples)
+    dataset = Subset(dataset, indices)
+  return dataset
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+      '--data_path',
+      action='append',
+      required=True,
+      help='<backend name>=<ImageFolder directory>, can be repeated')
+  parser.add_argument('--num_workers', type=_parse_int_list,
+                      default=[0, 2, 4, 8, 16])
+  parser.add_argument('--batch_size', type=_parse_int_list,
+                      default=[16, 64, 256, 1024, 4096])
+  parser.add_argument('--prefetch_factor', type=_parse_int_list,
+                      default=[2, 4, 8])
+  parser.add_argument('--persistent_workers', type=_parse_bool_list,
+                      default=[False, True])
+  parser.add_argument('--num_epochs', type=int, default=2)
+  parser.add_argument('--max_samples', type=int, default=0)
+  parser.add_argument('--keep_caches', action='store_true', default=False,
+                      help='Do not drop the page cache before every '
+                      'configuration')
+  parser.add_argument('--seed', type=int, default=SEED,
+                      help='Seed of the order of the configurations')
+  parser.add_argument('--output_file', default='dataloader_surface.csv')
+  args = parser.parse_args(argv[1:])
+
+  backends = _parse_data_paths(args.data_path)
+  configs = get_configs(args.num_workers, args.batch_size,
+                        args.prefetch_factor, args.persistent_workers)
+  random.Random(args.seed).shuffle(configs)
+
+  results = []
+  for backend, data_path in backends.items():
+    dataset = _get_dataset(data_path, args.max_samples)
+    for order, config in enumerate(configs):
+      caches_dropped = not args.keep_caches and bench_utils.drop_caches()
+      if not args.keep_caches and not caches_dropped:
+        print('Warning: could not drop the page cache, the configuration '
+              'may read cached files')
+      result = _measure(dataset, config, args.num_epochs)
+      result.backend = backend
+      result.order = order
+      result.caches_dropped = caches_dropped
+      print(f'{backend} {config}: {result.samples_per_sec:.1f} samples/sec')
+      results.append(result)
+      # Writing after every configuration so a long sweep can be inspected.
+      write_surface(results, args.output_file)
+
+  for backend, result in get_best_results(results).items():
+    print(f'Best configuration for {backend}: {result.config}, '
+          f'{result.samples_per_sec:.1f} samples/sec')
+
+
+if __name__ == '__main__':
+  main(sys.argv)
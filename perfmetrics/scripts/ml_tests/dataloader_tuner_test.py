@@ -0,0 +1,72 @@
+"""Tests for dataloader_tuner."""
+import csv
+import os
+import tempfile
+import unittest
+
+import dataloader_tuner
+
+
+class DataloaderTunerTest(unittest.TestCase):
+
+  def test_get_configs_skips_worker_options_without_workers(self):
+    configs = dataloader_tuner.get_configs([0, 2], [16, 32], [2, 4],
+                                           [False, True])
+
+    self.assertEqual(2 + 2 * 2 * 2, len(configs))
+    self.assertIn(dataloader_tuner.LoaderConfig(0, 16, 2, False), configs)
+    self.assertNotIn(dataloader_tuner.LoaderConfig(0, 16, 4, False), configs)
+    self.assertIn(dataloader_tuner.LoaderConfig(2, 32, 4, True), configs)
+
+  def test_parse_data_paths(self):
+    backends = dataloader_tuner._parse_data_paths(
+        ['gcsfuse=/mnt/gcs/data', 'disk=/data=1'])
+
+    self.assertEqual({'gcsfuse': '/mnt/gcs/data', 'disk': '/data=1'}, backends)
+
+  def test_parse_data_paths_without_backend_raises_value_error(self):
+    with self.assertRaises(ValueError):
+      dataloader_tuner._parse_data_paths(['/mnt/gcs/data'])
+
+  def test_parse_bool_list(self):
+    self.assertEqual([False, True],
+                     dataloader_tuner._parse_bool_list('false,True'))
+
+  def test_get_best_results_per_backend(self):
+    slow = dataloader_tuner.LoaderConfig(2, 16, 2, False)
+    fast = dataloader_tuner.LoaderConfig(8, 256, 4, True)
+    results = [
+        dataloader_tuner.TuningResult('gcsfuse', slow, 100, 10),
+        dataloader_tuner.TuningResult('gcsfuse', fast, 100, 2),
+        dataloader_tuner.TuningResult('disk', slow, 100, 1),
+        dataloader_tuner.TuningResult('disk', fast, 100, 4),
+    ]
+
+    best = dataloader_tuner.get_best_results(results)
+
+    self.assertEqual(fast, best['gcsfuse'].config)
+    self.assertEqual(slow, best['disk'].config)
+    self.assertEqual(100, best['disk'].samples_per_sec)
+
+  def test_write_surface(self):
+    result = dataloader_tuner.TuningResult(
+        'disk', dataloader_tuner.LoaderConfig(4, 64, 2, True), 640, 3.2,
+        order=3, caches_dropped=True)
+    with tempfile.TemporaryDirectory() as temp_dir:
+      output_file = os.path.join(temp_dir, 'surface.csv')
+
+      dataloader_tuner.write_surface([result], output_file)
+
+      with open(output_file, 'r') as f:
+        rows = list(csv.DictReader(f))
+    self.assertEqual(1, len(rows))
+    self.assertEqual('disk', rows[0]['backend'])
+    self.assertEqual('4', rows[0]['num_workers'])
+    self.assertEqual('True', rows[0]['persistent_workers'])
+    self.assertEqual(200.0, float(rows[0]['samples_per_sec']))
+    self.assertEqual('3', rows[0]['order'])
+    self.assertEqual('True', rows[0]['caches_dropped'])
+
+
+if __name__ == '__main__':
+  unittest.main()
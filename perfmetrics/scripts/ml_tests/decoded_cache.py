@@ -0,0 +1,251 @@
+"""Memory-mapped cache of decoded images for the ML models.
+
+In the ML models, reading the image files and decoding/resizing them run in the
+same DataLoader workers, so a slow decode hides a storage regression and vice
+versa. DecodedImageFolder separates the two: during the first epoch it reads
+each file, decodes and resizes it, and stores the uint8 pixels in a NumPy
+memory-mapped array (DecodedImageCache). The later epochs read the pixels
+zero-copy from that array and only apply the cheap tensor transforms.
+
+StageTimers accumulates the time spent in raw file reads, decode/transform and
+model compute across all the worker processes, so the harness can report the
+three separately for every epoch.
+
+  Usage inside a model script:
+    timers = decoded_cache.StageTimers()
+    folder = ImageFolder(data_dir)
+    cache = decoded_cache.DecodedImageCache(cache_dir, folder.samples, (224, 224))
+    dataset = decoded_cache.DecodedImageFolder(
+        folder.samples, folder.classes, cache, pre_transform, post_transform,
+        timers=timers)
+    for epoch in range(nb_epochs):
+      with timers.epoch(epoch):
+        for x, y in loader:
+          with timers.time(decoded_cache.COMPUTE):
+            ...
+"""
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+READ = 'read'
+DECODE = 'decode/transform'
+COMPUTE = 'compute'
+STAGES = (READ, DECODE, COMPUTE)
+
+IMAGES_FILE = 'images.npy'
+FILLED_FILE = 'filled.npy'
+INDEX_FILE = 'index.json'
+NUM_CHANNELS = 3
+
+
+def read_file(path) -> bytes:
+  with open(path, 'rb') as f:
+    return f.read()
+
+
+class StageTimers:
+  """Time spent in each stage, summed over the main and worker processes.
+
+  The values are created in the main process and inherited by the DataLoader
+  workers. As the workers run in parallel, read and decode/transform times are
+  worker-seconds rather than wall-clock seconds.
+  """
+
+  def __init__(self):
+    self._values = {
+        stage: multiprocessing.Value('d', 0.0) for stage in STAGES
+    }
+    self.epoch_times: List[Dict[str, float]] = []
+
+  @contextlib.contextmanager
+  def time(self, stage):
+    """Adds the time taken by the block to the given stage."""
+    start = time.perf_counter()
+    yield
+    self.add(stage, time.perf_counter() - start)
+
+  def add(self, stage, seconds) -> None:
+    value = self._values[stage]
+    with value.get_lock():
+      value.value += seconds
+
+  def snapshot(self) -> Dict[str, float]:
+    return {stage: value.value for stage, value in self._values.items()}
+
+  @contextlib.contextmanager
+  def epoch(self, epoch):
+    """Records and prints the time of every stage during an epoch.
+
+    Args:
+      epoch (int): Index of the epoch, starting from 0.
+    """
+    start = self.snapshot()
+    yield
+    end = self.snapshot()
+    epoch_time = {stage: end[stage] - start[stage] for stage in STAGES}
+    self.epoch_times.append(epoch_time)
+    print(f'Epoch {epoch + 1} ' + ', '.join(
+        f'{stage}: {epoch_time[stage]:.2f}s' for stage in STAGES))
+
+
+class DecodedImageCache:
+  """uint8 images of a dataset stored in a memory-mapped NumPy array.
+
+  The cache directory contains:
+    images.npy: Array of shape (num_images, height, width, 3).
+    filled.npy: Array of shape (num_images,), 1 where the image is stored.
+    index.json: Shape of the images and the (path, label) of every sample.
+
+  The arrays are opened lazily, so every DataLoader worker maps the files
+  itself and the writes of one worker are visible to all the others.
+  """
+
+  def __init__(self, cache_dir, samples, image_size, clear=False):
+    """Creates the cache files, or reuses them if they match the samples.
+
+    Args:
+      cache_dir (str): Directory where the cache files are stored.
+      samples (list[tuple[str, int]]): (path, label) of every image, as in
+        ImageFolder.samples.
+      image_size (tuple[int, int]): (height, width) of the stored images.
+      clear (bool): Whether to discard an existing cache with the same index.
+    """
+    self.cache_dir = cache_dir
+    self.shape = (len(samples), image_size[0], image_size[1], NUM_CHANNELS)
+    self._images = None
+    self._filled = None
+
+    index = {
+        'shape': list(self.shape),
+        'samples': [[path, label] for path, label in samples],
+    }
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    if not clear and os.path.exists(index_path):
+      with open(index_path, 'r') as f:
+        if json.load(f) == index:
+          return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.lib.format.open_memmap(
+        os.path.join(cache_dir, IMAGES_FILE), mode='w+', dtype=np.uint8,
+        shape=self.shape).flush()
+    np.lib.format.open_memmap(
+        os.path.join(cache_dir, FILLED_FILE), mode='w+', dtype=np.uint8,
+        shape=(len(samples),)).flush()
+    with open(index_path, 'w') as f:
+      json.dump(index, f)
+
+  def _open(self) -> None:
+    if self._images is None:
+      self._images = np.load(os.path.join(self.cache_dir, IMAGES_FILE),
+                             mmap_mode='r+')
+      self._filled = np.load(os.path.join(self.cache_dir, FILLED_FILE),
+                             mmap_mode='r+')
+
+  def __getstate__(self):
+    # The memory maps are reopened by every worker process.
+    state = self.__dict__.copy()
+    state['_images'] = None
+    state['_filled'] = None
+    return state
+
+  def get(self, index) -> Optional[np.ndarray]:
+    """Returns a view of the stored image, or None if it isn't stored yet."""
+    self._open()
+    if not self._filled[index]:
+      return None
+    return self._images[index]
+
+  def put(self, index, image) -> None:
+    """Stores an image of shape (height, width, 3).
+
+    Raises:
+      ValueError: If the image doesn't have the shape of the cache.
+    """
+    if image.shape != self.shape[1:]:
+      raise ValueError(
+          f'Image shape {image.shape} does not match {self.shape[1:]}')
+    self._open()
+    self._images[index] = image
+    self._filled[index] = 1
+
+  def num_filled(self) -> int:
+    self._open()
+    return int(np.count_nonzero(self._filled))
+
+
+class DecodedImageFolder:
+  """Map-style dataset reading images through a DecodedImageCache.
+
+  Attributes:
+    samples: (path, label) of every image.
+    classes: Class names, as in ImageFolder.classes.
+  """
+
+  def __init__(self,
+               samples,
+               classes,
+               cache: DecodedImageCache,
+               pre_transform: Callable,
+               post_transform: Optional[Callable] = None,
+               reader: Callable[[str], bytes] = read_file,
+               timers: Optional[StageTimers] = None):
+    """Creates the dataset.
+
+    Args:
+      samples (list[tuple[str, int]]): (path, label) of every image.
+      classes (list[str]): Class names.
+      cache: Cache of the decoded images, created with the same samples.
+      pre_transform: Deterministic PIL transform (e.g. resize and crop) whose
+        output is stored in the cache.
+      post_transform: Transform applied on the uint8 CHW tensor in every epoch,
+        e.g. random flips, dtype conversion and normalization.
+      reader: Returns the raw bytes of a file, e.g. ReadThroughCache.read.
+      timers: Where the read and decode/transform times are accumulated.
+    """
+    self.samples = samples
+    self.classes = classes
+    self.targets = [label for _, label in samples]
+    self._cache = cache
+    self._pre_transform = pre_transform
+    self._post_transform = post_transform
+    self._reader = reader
+    self._timers = timers if timers is not None else StageTimers()
+
+  def __len__(self) -> int:
+    return len(self.samples)
+
+  def load_uint8(self, index) -> np.ndarray:
+    """Returns the pre-transformed image as a uint8 HWC array."""
+    with self._timers.time(READ):
+      image = self._cache.get(index)
+      if image is None:
+        data = self._reader(self.samples[index][0])
+    if image is not None:
+      return image
+
+    with self._timers.time(DECODE):
+      pil_image = Image.open(io.BytesIO(data)).convert('RGB')
+      image = np.asarray(self._pre_transform(pil_image), dtype=np.uint8)
+      self._cache.put(index, image)
+    return image
+
+  def __getitem__(self, index) -> Tuple[object, int]:
+    # Imported here so that the cache can be used and tested without torch.
+    import torch
+
+    image = self.load_uint8(index)
+    with self._timers.time(DECODE):
+      tensor = torch.from_numpy(image).permute(2, 0, 1)
+      if self._post_transform is not None:
+        tensor = self._post_transform(tensor)
+    return tensor, self.samples[index][1]
+
@@ -0,0 +1,94 @@
+"""Tests for decoded_cache."""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+import decoded_cache
+
+IMAGE_SIZE = (8, 6)
+
+
+def _resize(image):
+  return image.resize((IMAGE_SIZE[1], IMAGE_SIZE[0]))
+
+
+class DecodedCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+    self.samples = []
+    for i in range(3):
+      path = os.path.join(self.temp_dir.name, f'{i}.png')
+      Image.new('RGB', (20, 10), color=(i * 50, 0, 0)).save(path)
+      self.samples.append((path, i % 2))
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+    super().tearDown()
+
+  def test_put_and_get_image(self):
+    cache = decoded_cache.DecodedImageCache(self.cache_dir, self.samples,
+                                            IMAGE_SIZE)
+    image = np.full(IMAGE_SIZE + (3,), 7, dtype=np.uint8)
+
+    self.assertIsNone(cache.get(1))
+    cache.put(1, image)
+
+    np.testing.assert_array_equal(image, cache.get(1))
+    self.assertEqual(1, cache.num_filled())
+
+  def test_put_with_wrong_shape_raises_value_error(self):
+    cache = decoded_cache.DecodedImageCache(self.cache_dir, self.samples,
+                                            IMAGE_SIZE)
+
+    with self.assertRaises(ValueError):
+      cache.put(0, np.zeros((2, 2, 3), dtype=np.uint8))
+
+  def test_cache_with_same_index_is_reused(self):
+    cache = decoded_cache.DecodedImageCache(self.cache_dir, self.samples,
+                                            IMAGE_SIZE)
+    cache.put(0, np.ones(IMAGE_SIZE + (3,), dtype=np.uint8))
+
+    reused_cache = decoded_cache.DecodedImageCache(self.cache_dir, self.samples,
+                                                   IMAGE_SIZE)
+    self.assertEqual(1, reused_cache.num_filled())
+    recreated_cache = decoded_cache.DecodedImageCache(self.cache_dir,
+                                                      self.samples[:2],
+                                                      IMAGE_SIZE)
+    self.assertEqual(0, recreated_cache.num_filled())
+
+  def test_load_uint8_reads_file_only_once(self):
+    read_paths = []
+
+    def reader(path):
+      read_paths.append(path)
+      with open(path, 'rb') as f:
+        return f.read()
+
+    cache = decoded_cache.DecodedImageCache(self.cache_dir, self.samples,
+                                            IMAGE_SIZE)
+    timers = decoded_cache.StageTimers()
+    dataset = decoded_cache.DecodedImageFolder(
+        self.samples, ['a', 'b'], cache, _resize, reader=reader, timers=timers)
+
+    with timers.epoch(0):
+      first = dataset.load_uint8(2)
+    with timers.epoch(1):
+      second = dataset.load_uint8(2)
+
+    self.assertEqual([self.samples[2][0]], read_paths)
+    self.assertEqual(IMAGE_SIZE + (3,), first.shape)
+    self.assertEqual(100, first[0, 0, 0])
+    np.testing.assert_array_equal(first, second)
+    self.assertGreater(timers.epoch_times[0][decoded_cache.DECODE], 0)
+    self.assertEqual(0, timers.epoch_times[1][decoded_cache.DECODE])
+    self.assertEqual(3, len(dataset))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,255 @@
+"""Simulates data-parallel training readers sharing one gcsfuse mount.
+
+Data-parallel training runs one process per rank on the same VM, and every rank
+reads a disjoint shard of the dataset through the same mount. This script
+launches N reader processes (CPU only, no model) against one directory. The
+files are partitioned the way torch's DistributedSampler does it: the
+(optionally shuffled) index list is padded to a multiple of N and rank r reads
+indices r, r + N, r + 2N, ... The processes start together on a barrier, read
+their whole shard and report their throughput.
+
+For every N in the sweep, the script reports the aggregate throughput, the
+throughput of every rank, the straggler skew (slowest rank time / median rank
+time) and the scaling efficiency relative to N=1, which shows where gcsfuse
+stops scaling across cores.
+
+To run the script:
+>> python3 distributed_readers.py <data_path> [--num_ranks 1,2,4,8] [--shuffle] [--seed 0] [--max_files 10000] [--read_size_kb 1024] [--pin_cpus] [--drop_caches] [--output_file readers.csv]
+"""
+import argparse
+import csv
+import dataclasses
+import math
+import multiprocessing
+import os
+import queue as queue_lib
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+MB = 1024 * 1024
+KB = 1024
+# Seconds between two checks of the reader processes while waiting for them.
+POLL_INTERVAL_SEC = 1
+
+
+@dataclasses.dataclass
+class RankResult:
+  rank: int
+  num_files: int
+  num_bytes: int
+  start_time_sec: float
+  end_time_sec: float
+
+  @property
+  def elapsed_sec(self) -> float:
+    return self.end_time_sec - self.start_time_sec
+
+  @property
+  def throughput_mb_per_sec(self) -> float:
+    if self.elapsed_sec <= 0:
+      return 0.0
+    return self.num_bytes / MB / self.elapsed_sec
+
+
+@dataclasses.dataclass
+class SweepPoint:
+  """Results of all the ranks of a run with num_ranks processes."""
+  num_ranks: int
+  ranks: List[RankResult]
+
+  @property
+  def aggregate_mb_per_sec(self) -> float:
+    elapsed_sec = (max(r.end_time_sec for r in self.ranks) -
+                   min(r.start_time_sec for r in self.ranks))
+    if elapsed_sec <= 0:
+      return 0.0
+    return sum(r.num_bytes for r in self.ranks) / MB / elapsed_sec
+
+  @property
+  def straggler_skew(self) -> float:
+    """Time of the slowest rank divided by the median rank time."""
+    median_sec = statistics.median(r.elapsed_sec for r in self.ranks)
+    if median_sec <= 0:
+      return 0.0
+    return max(r.elapsed_sec for r in self.ranks) / median_sec
+
+
+def list_files(data_path) -> List[str]:
+  """Returns the files under data_path in ImageFolder order."""
+  files = []
+  for root, dirs, names in os.walk(data_path):
+    dirs.sort()
+    files.extend(os.path.join(root, name) for name in sorted(names))
+  return files
+
+
+def get_shard(num_samples, num_replicas, rank, shuffle=False, seed=0,
+              epoch=0) -> List[int]:
+  """Returns the indices read by a rank, as DistributedSampler partitions them.
+
+  Args:
+    num_samples (int): Size of the dataset.
+    num_replicas (int): Number of ranks.
+    rank (int): Rank of the reader, in [0, num_replicas).
+    shuffle (bool): Whether to shuffle the indices before partitioning.
+    seed (int): Seed of the shuffle, identical for all the ranks.
+    epoch (int): Added to the seed, so every epoch has a different order.
+  Returns:
+    list[int], of length ceil(num_samples / num_replicas).
+  """
+  indices = list(range(num_samples))
+  if shuffle:
+    random.Random(seed + epoch).shuffle(indices)
+  total_size = math.ceil(num_samples / num_replicas) * num_replicas
+  padding = total_size - len(indices)
+  indices += (indices * math.ceil(padding / len(indices)))[:padding]
+  return indices[rank:total_size:num_replicas]
+
+
+def _read_shard(rank, files, read_size, barrier, pin_cpus, queue) -> None:
+  """Reads all the files of a shard and puts a RankResult on the queue."""
+  if pin_cpus:
+    cpus = sorted(os.sched_getaffinity(0))
+    os.sched_setaffinity(0, {cpus[rank % len(cpus)]})
+
+  barrier.wait()
+  num_bytes = 0
+  start_time_sec = time.time()
+  for path in files:
+    with open(path, 'rb', buffering=0) as f:
+      while True:
+        chunk = f.read(read_size)
+        if not chunk:
+          break
+        num_bytes += len(chunk)
+  queue.put(RankResult(rank, len(files), num_bytes, start_time_sec,
+                       time.time()))
+
+
+def run_readers(files, num_ranks, shuffle, seed, read_size,
+                pin_cpus=False) -> SweepPoint:
+  """Runs num_ranks reader processes over their shards of files."""
+  barrier = multiprocessing.Barrier(num_ranks)
+  queue = multiprocessing.Queue()
+  processes = []
+  for rank in range(num_ranks):
+    shard = [files[i] for i in get_shard(len(files), num_ranks, rank, shuffle,
+                                         seed)]
+    process = multiprocessing.Process(
+        target=_read_shard,
+        args=(rank, shard, read_size, barrier, pin_cpus, queue))
+    process.start()
+    processes.append(process)
+
+  ranks = _get_results(queue, processes)
+  for process in processes:
+    process.join()
+  ranks.sort(key=lambda r: r.rank)
+  return SweepPoint(num_ranks, ranks)
+
+
+def _get_results(queue, processes) -> List[RankResult]:
+  """Waits for the result of every reader process.
+
+  Raises:
+    RuntimeError: If a process exited without putting its result, in which
+      case the other processes are terminated.
+  """
+  results = []
+  while len(results) < len(processes):
+    try:
+      results.append(queue.get(timeout=POLL_INTERVAL_SEC))
+      continue
+    except queue_lib.Empty:
+      pass
+    failed = [(rank, process.exitcode)
+              for rank, process in enumerate(processes)
+              if process.exitcode not in (None, 0)]
+    if failed:
+      for process in processes:
+        process.terminate()
+        process.join()
+      raise RuntimeError('Reader processes failed, (rank, exit code): '
+                         f'{failed}')
+  return results
+
+
+def get_rows(points) -> List[Dict[str, object]]:
+  """Returns one CSV row per rank of every sweep point."""
+  base_mb_per_sec = None
+  rows = []
+  for point in points:
+    if point.num_ranks == 1:
+      base_mb_per_sec = point.aggregate_mb_per_sec
+    efficiency = ''
+    if base_mb_per_sec:
+      efficiency = point.aggregate_mb_per_sec / (point.num_ranks *
+                                                 base_mb_per_sec)
+    for rank in point.ranks:
+      rows.append({
+          'num_ranks': point.num_ranks,
+          'aggregate_mb_per_sec': point.aggregate_mb_per_sec,
+          'straggler_skew': point.straggler_skew,
+          'scaling_efficiency': efficiency,
+          'rank': rank.rank,
+          'rank_files': rank.num_files,
+          'rank_bytes': rank.num_bytes,
+          'rank_elapsed_sec': rank.elapsed_sec,
+          'rank_mb_per_sec': rank.throughput_mb_per_sec,
+      })
+  return rows
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('data_path', help='Directory read by all the ranks')
+  parser.add_argument(
+      '--num_ranks',
+      type=lambda value: [int(v) for v in value.split(',')],
+      default=[n for n in [1, 2, 4, 8, 16, 32, 64] if n <= os.cpu_count()],
+      help='Comma separated numbers of reader processes to sweep')
+  parser.add_argument('--shuffle', action='store_true', default=False)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--max_files', type=int, default=0)
+  parser.add_argument('--read_size_kb', type=int, default=1024)
+  parser.add_argument('--pin_cpus', action='store_true', default=False,
+                      help='Pin every rank to its own CPU')
+  parser.add_argument('--drop_caches', action='store_true', default=False,
+                      help='Drop the kernel page cache before every run, '
+                      'requires root')
+  parser.add_argument('--output_file', default='distributed_readers.csv')
+  args = parser.parse_args(argv[1:])
+
+  files = list_files(args.data_path)
+  if args.max_files:
+    files = files[:args.max_files]
+  if not files:
+    raise ValueError(f'No files found in {args.data_path}')
+
+  points = []
+  for num_ranks in args.num_ranks:
+    if args.drop_caches:
+      bench_utils.drop_caches()
+    point = run_readers(files, num_ranks, args.shuffle, args.seed,
+                        args.read_size_kb * KB, args.pin_cpus)
+    points.append(point)
+    print(f'{num_ranks} ranks: {point.aggregate_mb_per_sec:.1f} MB/s '
+          f'aggregate, straggler skew {point.straggler_skew:.2f}, per rank '
+          + ' '.join(f'{r.throughput_mb_per_sec:.1f}' for r in point.ranks))
+
+  rows = get_rows(points)
+  with open(args.output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
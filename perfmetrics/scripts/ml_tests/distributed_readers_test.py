@@ -0,0 +1,77 @@
+"""Tests for distributed_readers."""
+import os
+import tempfile
+import unittest
+
+import distributed_readers
+
+
+class DistributedReadersTest(unittest.TestCase):
+
+  def test_get_shard_pads_and_interleaves(self):
+    shards = [distributed_readers.get_shard(10, 4, rank) for rank in range(4)]
+
+    self.assertEqual([[0, 4, 8], [1, 5, 9], [2, 6, 0], [3, 7, 1]], shards)
+
+  def test_get_shard_with_shuffle_covers_all_indices(self):
+    shards = [
+        distributed_readers.get_shard(100, 3, rank, shuffle=True, seed=5)
+        for rank in range(3)
+    ]
+
+    self.assertEqual(set(range(100)), set(sum(shards, [])))
+    self.assertEqual([34, 34, 34], [len(shard) for shard in shards])
+    self.assertNotEqual(list(range(0, 100, 3)), shards[0])
+    self.assertEqual(shards[1],
+                     distributed_readers.get_shard(100, 3, 1, True, 5))
+    self.assertNotEqual(shards[1],
+                        distributed_readers.get_shard(100, 3, 1, True, 5, 1))
+
+  def test_get_shard_with_more_replicas_than_samples(self):
+    shards = [distributed_readers.get_shard(2, 5, rank) for rank in range(5)]
+
+    self.assertEqual([[0], [1], [0], [1], [0]], shards)
+
+  def test_sweep_point_metrics(self):
+    point = distributed_readers.SweepPoint(3, [
+        distributed_readers.RankResult(0, 1, 10 * distributed_readers.MB, 0, 1),
+        distributed_readers.RankResult(1, 1, 10 * distributed_readers.MB, 0, 2),
+        distributed_readers.RankResult(2, 1, 10 * distributed_readers.MB, 1, 7),
+    ])
+
+    self.assertEqual(30 / 7, point.aggregate_mb_per_sec)
+    self.assertEqual(3, point.straggler_skew)
+    self.assertEqual(10, point.ranks[0].throughput_mb_per_sec)
+
+  def test_run_readers_reads_all_files(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      for class_name in ['b', 'a']:
+        os.makedirs(os.path.join(temp_dir, class_name))
+        for i in range(3):
+          with open(os.path.join(temp_dir, class_name, str(i)), 'wb') as f:
+            f.write(b'x' * 100)
+      files = distributed_readers.list_files(temp_dir)
+
+      point = distributed_readers.run_readers(files, 2, False, 0, 64)
+
+    self.assertEqual(os.path.join(temp_dir, 'a', '0'), files[0])
+    self.assertEqual([0, 1], [rank.rank for rank in point.ranks])
+    self.assertEqual(600, sum(rank.num_bytes for rank in point.ranks))
+    rows = distributed_readers.get_rows([point])
+    self.assertEqual(2, len(rows))
+    self.assertEqual('', rows[0]['scaling_efficiency'])
+
+  def test_run_readers_raises_if_a_rank_fails(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, 'file')
+      with open(path, 'wb') as f:
+        f.write(b'x' * 100)
+      # Rank 1 reads the missing file and exits without a result.
+      files = [path, os.path.join(temp_dir, 'missing')]
+
+      with self.assertRaises(RuntimeError):
+        distributed_readers.run_readers(files, 2, False, 0, 64)
+
+
+if __name__ == '__main__':
+  unittest.main()
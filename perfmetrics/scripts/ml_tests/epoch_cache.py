@@ -0,0 +1,241 @@
+"""Local-disk read-through cache for the datasets of the ML models.
+
+The ML models train for several epochs and read every image from the gcsfuse
+mount in each epoch. ReadThroughCache keeps a size bounded copy of the files
+read from the dataset on local disk, so that only the first epoch pays the cost
+of reading from GCS. When the cache is full, the least recently used files are
+evicted.
+
+The cache is shared by the DataLoader worker processes: the counters and the
+lock are created in the main process and inherited by the (forked) workers, and
+the cached files themselves are the index.
+
+  Usage inside a model script:
+    cache = epoch_cache.ReadThroughCache(cache_dir, capacity_bytes)
+    dataset = ImageFolder(data_dir, transform=T, loader=cache.pil_loader)
+    for epoch in range(nb_epochs):
+      with cache.epoch(epoch):
+        ...
+    cache.print_summary()
+"""
+import contextlib
+import dataclasses
+import hashlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from typing import List
+
+# Fraction of the capacity the cache is trimmed down to once it is over its
+# capacity, so that eviction does not have to run on every insert.
+EVICTION_LOW_WATERMARK = 0.9
+MB_TO_BYTES = 1024 * 1024
+
+
+@dataclasses.dataclass
+class CacheStats:
+  """Snapshot of the counters of a ReadThroughCache."""
+  hits: int = 0
+  misses: int = 0
+  bytes_from_cache: int = 0
+  bytes_from_source: int = 0
+  evictions: int = 0
+
+  @property
+  def hit_ratio(self) -> float:
+    total = self.hits + self.misses
+    if total == 0:
+      return 0.0
+    return self.hits / total
+
+  def __sub__(self, other):
+    return CacheStats(*[
+        getattr(self, f.name) - getattr(other, f.name)
+        for f in dataclasses.fields(self)
+    ])
+
+
+@dataclasses.dataclass
+class EpochRecord:
+  """Time taken by an epoch and the cache counters during that epoch."""
+  epoch: int
+  start_time_sec: float
+  end_time_sec: float
+  stats: CacheStats
+
+  @property
+  def duration_sec(self) -> float:
+    return self.end_time_sec - self.start_time_sec
+
+
+class ReadThroughCache:
+  """Size bounded local-disk cache for the files of a dataset.
+
+  Attributes:
+    cache_dir: Directory where the cached copies of the files are stored.
+    capacity_bytes: Maximum number of bytes stored in cache_dir.
+    epoch_records: EpochRecord for every epoch timed with epoch().
+  """
+
+  def __init__(self, cache_dir, capacity_bytes, clear=True):
+    """Creates the cache.
+
+    Args:
+      cache_dir (str): Directory where the cached files are stored, it is
+        created if it doesn't exist.
+      capacity_bytes (int): Maximum number of bytes stored in cache_dir.
+      clear (bool): Whether to delete the existing contents of cache_dir, so
+        that the first epoch always starts with a cold cache.
+
+    Raises:
+      ValueError: If capacity_bytes is not positive.
+    """
+    if capacity_bytes <= 0:
+      raise ValueError('Cache capacity should be positive')
+    if clear:
+      shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    self.cache_dir = cache_dir
+    self.capacity_bytes = capacity_bytes
+    self.epoch_records: List[EpochRecord] = []
+
+    self._lock = multiprocessing.Lock()
+    self._bytes_used = multiprocessing.Value('q', self._get_dir_size(),
+                                             lock=False)
+    self._counters = {
+        field.name: multiprocessing.Value('q', 0, lock=False)
+        for field in dataclasses.fields(CacheStats)
+    }
+
+  def _get_dir_size(self) -> int:
+    with os.scandir(self.cache_dir) as entries:
+      return sum(entry.stat().st_size for entry in entries if entry.is_file())
+
+  def _cache_path(self, path) -> str:
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(self.cache_dir, key)
+
+  def _add(self, name, value) -> None:
+    with self._lock:
+      self._counters[name].value += value
+
+  def _evict(self) -> None:
+    """Deletes the least recently used files until the low watermark is hit.
+
+    Must be called with self._lock held.
+    """
+    with os.scandir(self.cache_dir) as entries:
+      files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+               for entry in entries
+               if entry.is_file() and not entry.name.startswith('.')]
+    files.sort()
+
+    target_bytes = self.capacity_bytes * EVICTION_LOW_WATERMARK
+    for _, size, path in files:
+      if self._bytes_used.value <= target_bytes:
+        break
+      with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+        self._bytes_used.value -= size
+        self._counters['evictions'].value += 1
+
+  def _insert(self, cache_path, data) -> None:
+    """Stores data at cache_path, evicting other files if needed."""
+    if len(data) > self.capacity_bytes:
+      return
+
+    fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.')
+    with os.fdopen(fd, 'wb') as f:
+      f.write(data)
+
+    with self._lock:
+      # Another worker may have cached the same file in the meantime.
+      if os.path.exists(cache_path):
+        os.remove(temp_path)
+        return
+      os.replace(temp_path, cache_path)
+      self._bytes_used.value += len(data)
+      if self._bytes_used.value > self.capacity_bytes:
+        self._evict()
+
+  def read(self, path) -> bytes:
+    """Returns the contents of path, from the cache when possible.
+
+    Args:
+      path (str): Path of the file in the dataset.
+    Returns:
+      bytes
+    """
+    cache_path = self._cache_path(path)
+    try:
+      with open(cache_path, 'rb') as f:
+        data = f.read()
+    except FileNotFoundError:
+      data = None
+
+    if data is not None:
+      # Updating mtime to mark the file as recently used.
+      with contextlib.suppress(FileNotFoundError):
+        os.utime(cache_path)
+      self._add('hits', 1)
+      self._add('bytes_from_cache', len(data))
+      return data
+
+    with open(path, 'rb') as f:
+      data = f.read()
+    self._add('misses', 1)
+    self._add('bytes_from_source', len(data))
+    self._insert(cache_path, data)
+    return data
+
+  def pil_loader(self, path):
+    """Drop-in replacement of torchvision's default ImageFolder loader."""
+    # Imported here so that the cache can be used without Pillow.
+    from PIL import Image
+    img = Image.open(io.BytesIO(self.read(path)))
+    return img.convert('RGB')
+
+  def stats(self) -> CacheStats:
+    """Returns a snapshot of the cache counters."""
+    with self._lock:
+      return CacheStats(**{
+          name: counter.value for name, counter in self._counters.items()
+      })
+
+  @property
+  def bytes_used(self) -> int:
+    return self._bytes_used.value
+
+  @contextlib.contextmanager
+  def epoch(self, epoch):
+    """Times an epoch and records the cache counters during that epoch.
+
+    Args:
+      epoch (int): Index of the epoch, starting from 0.
+    """
+    start_stats = self.stats()
+    start_time_sec = time.time()
+    yield
+    record = EpochRecord(epoch, start_time_sec, time.time(),
+                         self.stats() - start_stats)
+    self.epoch_records.append(record)
+    print(f'Epoch {epoch + 1} time: {record.duration_sec:.2f}s, '
+          f'cache hit ratio: {record.stats.hit_ratio:.2f}, '
+          f'bytes from source: {record.stats.bytes_from_source}, '
+          f'evictions: {record.stats.evictions}')
+
+  def print_summary(self) -> None:
+    """Prints the per-epoch times and the share of the first epoch."""
+    if not self.epoch_records:
+      return
+    total_sec = sum(record.duration_sec for record in self.epoch_records)
+    first_epoch_sec = self.epoch_records[0].duration_sec
+    print(f'Epoch cache: capacity {self.capacity_bytes} bytes, '
+          f'{self.bytes_used} bytes used, '
+          f'overall hit ratio {self.stats().hit_ratio:.2f}')
+    print(f'First epoch: {first_epoch_sec:.2f}s of {total_sec:.2f}s total '
+          f'({100 * first_epoch_sec / total_sec:.1f}%)')
@@ -0,0 +1,100 @@
+"""Tests for epoch_cache."""
+import os
+import tempfile
+import unittest
+
+import epoch_cache
+
+
+class EpochCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.data_dir = os.path.join(self.temp_dir.name, 'data')
+    self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+    os.makedirs(self.data_dir)
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+    super().tearDown()
+
+  def _create_file(self, name, size):
+    path = os.path.join(self.data_dir, name)
+    with open(path, 'wb') as f:
+      f.write(os.urandom(size))
+    return path
+
+  def test_init_with_non_positive_capacity_raises_value_error(self):
+    with self.assertRaises(ValueError):
+      epoch_cache.ReadThroughCache(self.cache_dir, 0)
+
+  def test_read_returns_file_contents_on_miss_and_hit(self):
+    path = self._create_file('a', 100)
+    with open(path, 'rb') as f:
+      expected = f.read()
+    cache = epoch_cache.ReadThroughCache(self.cache_dir, 1000)
+
+    self.assertEqual(expected, cache.read(path))
+    self.assertEqual(expected, cache.read(path))
+    stats = cache.stats()
+    self.assertEqual(1, stats.hits)
+    self.assertEqual(1, stats.misses)
+    self.assertEqual(100, stats.bytes_from_source)
+    self.assertEqual(100, stats.bytes_from_cache)
+    self.assertEqual(0.5, stats.hit_ratio)
+    self.assertEqual(100, cache.bytes_used)
+
+  def test_read_evicts_least_recently_used_file_when_full(self):
+    paths = [self._create_file(name, 400) for name in ['a', 'b', 'c']]
+    cache = epoch_cache.ReadThroughCache(self.cache_dir, 1000)
+    cache.read(paths[0])
+    cache.read(paths[1])
+    # Making 'a' the least recently used file.
+    os.utime(cache._cache_path(paths[0]), (0, 0))
+
+    cache.read(paths[2])
+
+    self.assertEqual(1, cache.stats().evictions)
+    self.assertEqual(800, cache.bytes_used)
+    self.assertFalse(os.path.exists(cache._cache_path(paths[0])))
+    self.assertTrue(os.path.exists(cache._cache_path(paths[1])))
+    self.assertTrue(os.path.exists(cache._cache_path(paths[2])))
+
+  def test_read_does_not_cache_file_larger_than_capacity(self):
+    path = self._create_file('a', 2000)
+    cache = epoch_cache.ReadThroughCache(self.cache_dir, 1000)
+
+    cache.read(path)
+    cache.read(path)
+
+    self.assertEqual(0, cache.stats().hits)
+    self.assertEqual(2, cache.stats().misses)
+    self.assertEqual(0, cache.bytes_used)
+
+  def test_init_clears_existing_cache_dir(self):
+    path = self._create_file('a', 100)
+    epoch_cache.ReadThroughCache(self.cache_dir, 1000).read(path)
+
+    cache = epoch_cache.ReadThroughCache(self.cache_dir, 1000)
+
+    self.assertEqual(0, cache.bytes_used)
+    self.assertEqual([], os.listdir(self.cache_dir))
+
+  def test_epoch_records_hit_ratio_per_epoch(self):
+    paths = [self._create_file(name, 10) for name in ['a', 'b']]
+    cache = epoch_cache.ReadThroughCache(self.cache_dir, 1000)
+
+    for epoch in range(2):
+      with cache.epoch(epoch):
+        for path in paths:
+          cache.read(path)
+
+    self.assertEqual(2, len(cache.epoch_records))
+    self.assertEqual(0.0, cache.epoch_records[0].stats.hit_ratio)
+    self.assertEqual(1.0, cache.epoch_records[1].stats.hit_ratio)
+    self.assertGreaterEqual(cache.epoch_records[1].duration_sec, 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
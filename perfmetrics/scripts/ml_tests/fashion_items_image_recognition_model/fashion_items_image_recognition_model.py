@@ -4,6 +4,8 @@
 
 #Importing modules
 from __future__ import print_function, division
+import argparse
+import contextlib
 import os
 import sys
 import torch
@@ -18,6 +20,30 @@ from PIL import Image
 import matplotlib.pyplot as plt 
 import numpy as np 
 import pandas as pd 
+from torchvision.datasets.folder import default_loader
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import decoded_cache
+import epoch_cache
+import run_results
+
+parser = argparse.ArgumentParser()
+parser.add_argument('data_path', help='Path of the dataset')
+parser.add_argument('--epoch_cache_dir', default=None,
+                    help='Local directory for the read-through epoch cache')
+parser.add_argument('--epoch_cache_size_mb', type=int, default=10240,
+                    help='Capacity of the read-through epoch cache in MB')
+parser.add_argument('--decoded_cache_dir', default=None,
+                    help='Directory for the memory-mapped cache of decoded images')
+parser.add_argument('--keep_decoded_cache', action='store_true', default=False,
+                    help='Reuse the decoded images of a previous run, so that '
+                    'the first epoch reads from the cache too')
+parser.add_argument('--no_pretrained_weights', action='store_true', default=False,
+                    help='Start from random weights instead of downloading them')
+parser.add_argument('--results_file', default=None,
+                    help='JSON lines file where the phase records are appended')
+args = parser.parse_args()
+recorder = run_results.PhaseRecorder(args.results_file)
 
 
 # ### Loading the New Dataset
@@ -44,15 +70,56 @@ data_transforms = {
     ]),
 }
 
-data_dir = sys.argv[1]
-image_datasets = {x: datasets.ImageFolder(os.path.join(data_dir, x),
-                                          data_transforms[x])
-                  for x in ['train', 'val']}
+recorder.start_phase(run_results.INDEX_BUILD)
+cache = None
+loader = default_loader
+if args.epoch_cache_dir:
+    cache = epoch_cache.ReadThroughCache(
+        args.epoch_cache_dir, args.epoch_cache_size_mb * epoch_cache.MB_TO_BYTES)
+    loader = cache.pil_loader
+
+# Deterministic part of data_transforms, whose output is stored in the decoded
+# image cache, and the part applied on the cached images in every epoch.
+decoded_pre_transform = transforms.Compose([
+    transforms.Resize(256),
+    transforms.CenterCrop(224),
+])
+decoded_post_transforms = {
+    'train': transforms.Compose([
+        transforms.RandomHorizontalFlip(),
+        transforms.ConvertImageDtype(torch.float),
+        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    ]),
+    'val': transforms.Compose([
+        transforms.ConvertImageDtype(torch.float),
+        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    ]),
+}
+
+data_dir = args.data_path
+timers = decoded_cache.StageTimers()
+if args.decoded_cache_dir:
+    image_datasets = {}
+    for x in ['train', 'val']:
+        folder = datasets.ImageFolder(os.path.join(data_dir, x))
+        decoded_images = decoded_cache.DecodedImageCache(
+            os.path.join(args.decoded_cache_dir, x), folder.samples, (224, 224),
+            clear=not args.keep_decoded_cache)
+        image_datasets[x] = decoded_cache.DecodedImageFolder(
+            folder.samples, folder.classes, decoded_images,
+            decoded_pre_transform, decoded_post_transforms[x],
+            reader=cache.read if cache else decoded_cache.read_file,
+            timers=timers)
+else:
+    image_datasets = {x: datasets.ImageFolder(os.path.join(data_dir, x),
+                                              data_transforms[x], loader=loader)
+                      for x in ['train', 'val']}
 dataloaders = {x: torch.utils.data.DataLoader(image_datasets[x], batch_size=16,
                                              shuffle=True, num_workers=4)
               for x in ['train', 'val']}
 dataset_sizes = {x: len(image_datasets[x]) for x in ['train', 'val']}
 class_names = image_datasets['train'].classes
+recorder.end_phase()
 
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
@@ -101,8 +168,15 @@ def train_model(model, criterion, optimizer, scheduler, num_epochs=25):
         # print('Epoch {}/{}'.format(epoch, num_epochs - 1))
         # print('-' * 10)
 
+        epoch_timers = contextlib.ExitStack()
+        if cache:
+            epoch_timers.enter_context(cache.epoch(epoch))
+        if args.decoded_cache_dir:
+            epoch_timers.enter_context(timers.epoch(epoch))
         # Each epoch has a training and validation phase
         for phase in ['train', 'val']:
+            recorder.start_phase(run_results.EPOCH if phase == 'train' else run_results.EVAL,
+                                 epoch=epoch + 1)
             if phase == 'train':
                 model.train()  # Set model to training mode
             else:
@@ -113,6 +187,7 @@ def train_model(model, criterion, optimizer, scheduler, num_epochs=25):
 
             # Iterate over data.
             for inputs, labels in dataloaders[phase]:
+                compute_start = time.perf_counter()
                 inputs = inputs.to(device)
                 labels = labels.to(device)
 
@@ -134,6 +209,7 @@ def train_model(model, criterion, optimizer, scheduler, num_epochs=25):
                 # statistics
                 running_loss += loss.item() * inputs.size(0)
                 running_corrects += torch.sum(preds == labels.data)
+                timers.add(decoded_cache.COMPUTE, time.perf_counter() - compute_start)
             if phase == 'train':
                 scheduler.step()
 
@@ -146,6 +222,8 @@ def train_model(model, criterion, optimizer, scheduler, num_epochs=25):
             if phase == 'val' and epoch_acc > best_acc:
                 best_acc = epoch_acc
                 best_model_wts = copy.deepcopy(model.state_dict())
+        recorder.end_phase()
+        epoch_timers.close()
 
         print()
 
@@ -199,7 +277,8 @@ def visualize_model(model, num_images=6):
 # In[7]:
 
 
-model_ft = models.resnet18(pretrained=True)
+recorder.start_phase(run_results.SETUP)
+model_ft = models.resnet18(pretrained=not args.no_pretrained_weights)
 num_ftrs = model_ft.fc.in_features
 
 #Changing the number of outputs in the last layer to the number of different item types
@@ -214,6 +293,7 @@ optimizer_ft = optim.SGD(model_ft.parameters(), lr=0.001, momentum=0.9)
 
 # Decay LR by a factor of 0.1 every 7 epochs
 exp_lr_scheduler = lr_scheduler.StepLR(optimizer_ft, step_size=7, gamma=0.1)
+recorder.end_phase()
 
 
 # **Train and evaluate**
@@ -224,4 +304,6 @@ exp_lr_scheduler = lr_scheduler.StepLR(optimizer_ft, step_size=7, gamma=0.1)
 
 model_ft = train_model(model_ft, criterion, optimizer_ft, exp_lr_scheduler,
                        num_epochs=5)
+if cache:
+    cache.print_summary()
 
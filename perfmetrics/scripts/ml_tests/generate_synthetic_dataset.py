@@ -0,0 +1,173 @@
+"""Generates a synthetic ImageFolder dataset for the ML models.
+
+The ML models normally read the ml-models-data-gcsfuse bucket. This script
+creates a dataset with the same layout on local disk, so that the models can be
+benchmarked on a machine with no network, or uploaded to any bucket. Images are
+smooth random colour fields saved as JPEG, so that their compressed sizes are
+close to those of real photos rather than of random noise.
+
+The output only depends on the arguments: every image is generated from its own
+seed derived from --seed, so the same files are created whatever the number of
+processes.
+
+To run the script:
+>> python3 generate_synthetic_dataset.py <output_dir> [--num_classes 10] [--images_per_class 100] [--min_size 64] [--max_size 512] [--size_distribution uniform] [--jpeg_quality 90] [--splits train:0.8,val:0.2] [--seed 0] [--num_processes 8]
+
+-> <output_dir> Root directory of the dataset, <output_dir>/<class>/<image>.jpg
+   or <output_dir>/<split>/<class>/<image>.jpg when --splits is given. The
+   animal model reads the former and the fashion model the latter
+   (--splits train:0.8,val:0.2).
+-> --size_distribution uniform draws width and height between --min_size and
+   --max_size, lognormal draws them around the geometric mean of the two.
+"""
+import argparse
+import concurrent.futures
+import dataclasses
+import math
+import os
+import random
+import sys
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Side of the random colour field which is upscaled to the image size.
+NUM_CONTROL_POINTS = 8
+NOISE_STDDEV = 8
+SIZE_DISTRIBUTIONS = ['uniform', 'lognormal']
+
+
+@dataclasses.dataclass(frozen=True)
+class ImageSpec:
+  path: str
+  width: int
+  height: int
+  seed: int
+
+
+def _parse_splits(value) -> List[Tuple[str, float]]:
+  """Parses 'train:0.8,val:0.2' into [('train', 0.8), ('val', 0.2)].
+
+  Raises:
+    argparse.ArgumentTypeError: If the fractions don't add up to 1.
+  """
+  if not value:
+    return []
+  splits = []
+  for split in value.split(','):
+    name, _, fraction = split.partition(':')
+    splits.append((name, float(fraction)))
+  if not math.isclose(sum(fraction for _, fraction in splits), 1.0):
+    raise argparse.ArgumentTypeError('Split fractions should add up to 1')
+  return splits
+
+
+def _get_size(rng, size_distribution, min_size, max_size) -> int:
+  if size_distribution == 'uniform':
+    return rng.randint(min_size, max_size)
+  mean = math.log(math.sqrt(min_size * max_size))
+  sigma = (math.log(max_size) - math.log(min_size)) / 4
+  return int(min(max(rng.lognormvariate(mean, sigma), min_size), max_size))
+
+
+def get_image_specs(output_dir, num_classes, images_per_class, min_size,
+                    max_size, size_distribution, splits,
+                    seed) -> List[ImageSpec]:
+  """Returns the path, size and seed of every image of the dataset.
+
+  Images of a class are assigned to the splits in order, e.g. with 10 images per
+  class and train:0.8,val:0.2, images 0-7 go to train and 8-9 go to val.
+  """
+  rng = random.Random(seed)
+  specs = []
+  for class_index in range(num_classes):
+    class_name = f'class_{class_index:04d}'
+    boundaries = []
+    total = 0.0
+    for name, fraction in splits:
+      total += fraction
+      boundaries.append((round(total * images_per_class), name))
+
+    for image_index in range(images_per_class):
+      class_dir = os.path.join(output_dir, class_name)
+      for boundary, name in boundaries:
+        if image_index < boundary:
+          class_dir = os.path.join(output_dir, name, class_name)
+          break
+      specs.append(
+          ImageSpec(
+              path=os.path.join(class_dir, f'image_{image_index:06d}.jpg'),
+              width=_get_size(rng, size_distribution, min_size, max_size),
+              height=_get_size(rng, size_distribution, min_size, max_size),
+              seed=rng.getrandbits(32)))
+  return specs
+
+
+def generate_image(spec, jpeg_quality) -> int:
+  """Writes the image described by spec and returns its size in bytes."""
+  rng = np.random.default_rng(spec.seed)
+  control_points = rng.integers(
+      0, 256, size=(NUM_CONTROL_POINTS, NUM_CONTROL_POINTS, 3), dtype=np.uint8)
+  field = Image.fromarray(control_points).resize((spec.width, spec.height),
+                                                 Image.BILINEAR)
+  pixels = np.asarray(field, dtype=np.int16) + rng.normal(
+      0, NOISE_STDDEV, size=(spec.height, spec.width, 3)).astype(np.int16)
+  image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+  os.makedirs(os.path.dirname(spec.path), exist_ok=True)
+  image.save(spec.path, format='JPEG', quality=jpeg_quality)
+  return os.path.getsize(spec.path)
+
+
+def _generate_chunk(specs, jpeg_quality) -> int:
+  return sum(generate_image(spec, jpeg_quality) for spec in specs)
+
+
+def generate_dataset(specs, jpeg_quality, num_processes) -> int:
+  """Generates the images with a process pool and returns their total size."""
+  chunk_size = max(1, len(specs) // (num_processes * 16))
+  chunks = [specs[i:i + chunk_size] for i in range(0, len(specs), chunk_size)]
+  total_bytes = 0
+  with concurrent.futures.ProcessPoolExecutor(num_processes) as executor:
+    futures = [
+        executor.submit(_generate_chunk, chunk, jpeg_quality)
+        for chunk in chunks
+    ]
+    for future in concurrent.futures.as_completed(futures):
+      total_bytes += future.result()
+  return total_bytes
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('output_dir', help='Root directory of the dataset')
+  parser.add_argument('--num_classes', type=int, default=10)
+  parser.add_argument('--images_per_class', type=int, default=100)
+  parser.add_argument('--min_size', type=int, default=64,
+                      help='Minimum width/height of the images in pixels')
+  parser.add_argument('--max_size', type=int, default=512,
+                      help='Maximum width/height of the images in pixels')
+  parser.add_argument('--size_distribution', choices=SIZE_DISTRIBUTIONS,
+                      default='uniform')
+  parser.add_argument('--jpeg_quality', type=int, default=90)
+  parser.add_argument('--splits', type=_parse_splits, default=[],
+                      help='Comma separated <split>:<fraction>, e.g. '
+                      'train:0.8,val:0.2')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--num_processes', type=int, default=os.cpu_count())
+  args = parser.parse_args(argv[1:])
+
+  if not 0 < args.min_size <= args.max_size:
+    raise ValueError('Expected 0 < min_size <= max_size')
+
+  specs = get_image_specs(args.output_dir, args.num_classes,
+                          args.images_per_class, args.min_size, args.max_size,
+                          args.size_distribution, args.splits, args.seed)
+  total_bytes = generate_dataset(specs, args.jpeg_quality, args.num_processes)
+  print(f'Generated {len(specs)} images, {total_bytes} bytes in '
+        f'{args.output_dir}')
+
+
+if __name__ == '__main__':
+  main(sys.argv)
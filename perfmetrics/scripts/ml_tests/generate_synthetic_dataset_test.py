@@ -0,0 +1,81 @@
+"""Tests for generate_synthetic_dataset."""
+import argparse
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+import generate_synthetic_dataset
+
+
+class GenerateSyntheticDatasetTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+    super().tearDown()
+
+  def _get_specs(self, splits, seed=0):
+    return generate_synthetic_dataset.get_image_specs(
+        self.temp_dir.name, num_classes=2, images_per_class=5, min_size=16,
+        max_size=32, size_distribution='uniform', splits=splits, seed=seed)
+
+  def test_parse_splits(self):
+    self.assertEqual([('train', 0.8), ('val', 0.2)],
+                     generate_synthetic_dataset._parse_splits(
+                         'train:0.8,val:0.2'))
+
+  def test_parse_splits_not_adding_up_to_one_raises_error(self):
+    with self.assertRaises(argparse.ArgumentTypeError):
+      generate_synthetic_dataset._parse_splits('train:0.8,val:0.1')
+
+  def test_get_image_specs_without_splits(self):
+    specs = self._get_specs([])
+
+    self.assertEqual(10, len(specs))
+    self.assertEqual(
+        os.path.join(self.temp_dir.name, 'class_0001', 'image_000004.jpg'),
+        specs[-1].path)
+    for spec in specs:
+      self.assertTrue(16 <= spec.width <= 32)
+      self.assertTrue(16 <= spec.height <= 32)
+
+  def test_get_image_specs_with_splits(self):
+    specs = self._get_specs([('train', 0.8), ('val', 0.2)])
+
+    split_dirs = [
+        os.path.relpath(spec.path, self.temp_dir.name).split(os.sep)[0]
+        for spec in specs
+    ]
+    self.assertEqual(8, split_dirs.count('train'))
+    self.assertEqual(2, split_dirs.count('val'))
+
+  def test_get_image_specs_is_deterministic(self):
+    self.assertEqual(self._get_specs([], seed=1), self._get_specs([], seed=1))
+    self.assertNotEqual(self._get_specs([], seed=1),
+                        self._get_specs([], seed=2))
+
+  def test_generate_dataset_is_deterministic(self):
+    specs = self._get_specs([])
+
+    total_bytes = generate_synthetic_dataset.generate_dataset(specs, 90, 2)
+    with open(specs[3].path, 'rb') as f:
+      first_contents = f.read()
+    generate_synthetic_dataset.generate_image(specs[3], 90)
+    with open(specs[3].path, 'rb') as f:
+      second_contents = f.read()
+
+    self.assertEqual(first_contents, second_contents)
+    self.assertEqual(sum(os.path.getsize(spec.path) for spec in specs),
+                     total_bytes)
+    with Image.open(specs[3].path) as image:
+      self.assertEqual((specs[3].width, specs[3].height), image.size)
+      self.assertEqual('JPEG', image.format)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -21,6 +21,34 @@ Flag --gcsfuse_data_path
 Flag --disk_data_path.
 -> Give the absolute path of the data on the disk to be processed [--disk_data_path /path/to/data]
 
+Flag --epoch_cache_dir.
+-> Local directory for a read-through cache of the dataset. When given, only
+   the first epoch reads from the data path and the model prints the per-epoch
+   time and cache hit ratio.
+
+Flag --epoch_cache_size_mb.
+-> Capacity of the read-through epoch cache in MB.
+
+Flag --decoded_cache_dir.
+-> Local directory for a memory-mapped cache of the decoded and resized images.
+   The first epoch fills it and the later epochs read from it, and the model
+   prints the raw file read, decode/transform and model compute time of every
+   epoch. The cache is cleared at the start of every run.
+
+Flag --keep_decoded_cache.
+-> Reuse the decoded image cache of a previous run instead of clearing it.
+
+Flag --no_pretrained_weights.
+-> Start the models from random weights, so that no weights are downloaded.
+
+Flag --skip_vm_metrics.
+-> Don't fetch the VM metrics after the model run, e.g. on a machine without
+   network access running on a synthetic dataset (generate_synthetic_dataset.py).
+
+Flag --gcsfuse_local_file_cache.
+-> Mount the bucket with gcsfuse's --experimental-local-file-cache, to compare
+   it against the epoch cache.
+
 -> <directory_name> Provide the directory_name when you want to run the model and store the output
 
 The code takes input the ml model path, corresponding
@@ -30,7 +58,10 @@ gcsfuse or download the source code on the Machine and mount
 the GCS bucket, after that it will install the required dependencies/modules
 and then it will run the ML Model reading data from GCS bucket and/or reading
 data from the disk. The output will be stored in the directory_name/output.txt
-file in the same directory. At the end, it will unmount the GCS bucket.
+file in the same directory. The start and end time of every phase of the run
+(setup, index build, each epoch, eval) are stored in the
+directory_name/results_<data read method>.jsonl file, and the VM metrics are
+fetched for every phase. At the end, it will unmount the GCS bucket.
 """
 
 import argparse
@@ -70,15 +101,16 @@ def _install_gcsfuse() -> None:
             ''')
 
 
-def _mount_gcsbucket(gcs_bucket, data_directory_name) -> None:
+def _mount_gcsbucket(gcs_bucket, data_directory_name, extra_gcsfuse_flags='') -> None:
   """Mount Specific bucket to given directory.
 
   Args:
     gcs_bucket(str): Name of the gcs_bucket to be mounted.
     data_directory_name(str): Destination for mounting the gcs_bucket.
+    extra_gcsfuse_flags(str): Flags added to the default gcsfuse flags.
   """
   os.system(f'''mkdir {data_directory_name}
-            gcsfuse --implicit-dirs --stat-cache-capacity 1000000 --disable-http2 --max-conns-per-host 100 --experimental-stackdriver-export-interval=60s {gcs_bucket} {data_directory_name}
+            gcsfuse --implicit-dirs --stat-cache-capacity 1000000 --disable-http2 --max-conns-per-host 100 --experimental-stackdriver-export-interval=60s {extra_gcsfuse_flags} {gcs_bucket} {data_directory_name}
             ''')
 
 
@@ -95,22 +127,23 @@ def _unmount_gcsbucket(data_directory_name) -> None:
             ''')
 
 
-def _run_from_source(gcs_bucket, data_directory_name) -> None:
+def _run_from_source(gcs_bucket, data_directory_name, extra_gcsfuse_flags='') -> None:
   """Run the GCSFuse from the source code and mount specific bucket to given directory.
 
   Args:
     gcs_bucket(str): Name of the gcs_bucket to be mounted.
     data_directory_name(str): Destination for mounting the gcs_bucket.
+    extra_gcsfuse_flags(str): Flags added to the default gcsfuse flags.
   """
   os.system(f'''mkdir {data_directory_name}
             git clone {GITHUB_REPO}
             cd gcsfuse
-            go run . --implicit-dirs --stat-cache-capacity 1000000 --disable-http2 --max-conns-per-host 100 --experimental-stackdriver-export-interval=60s {gcs_bucket} ../{data_directory_name}
+            go run . --implicit-dirs --stat-cache-capacity 1000000 --disable-http2 --max-conns-per-host 100 --experimental-stackdriver-export-interval=60s {extra_gcsfuse_flags} {gcs_bucket} ../{data_directory_name}
             cd ..
             ''')
 
 
-def _run_model(directory_name, data_path, data_read_method, ml_model_path, req_file_path) -> None:
+def _run_model(directory_name, data_path, data_read_method, ml_model_path, req_file_path, model_args='', fetch_vm_metrics=True) -> None:
   """Automates running the ML model by installing required modules.
 
   Args:
@@ -119,6 +152,8 @@ def _run_model(directory_name, data_path, data_read_method, ml_model_path, req_f
     data_read_method(str): Data read method for the model.
     ml_model_path(str): Path of the ml model to Run.
     req_file_path(str): Path of the corresponding requirements.txt file.
+    model_args(str): Optional flags passed to the ml model.
+    fetch_vm_metrics(bool): Whether to fetch the VM metrics of the run.
   """
   os.system(f'''sudo -H pip3 install virtualenv
             mkdir {directory_name}
@@ -127,21 +162,29 @@ def _run_model(directory_name, data_path, data_read_method, ml_model_path, req_f
             pip install -r {req_file_path}
             ''')
   
+  results_file = os.path.abspath(
+      os.path.join(directory_name, f'results_{data_read_method}.jsonl'))
+  if os.path.exists(results_file):
+    os.remove(results_file)
+
   start_time = int(time.time())
   
   os.system(f'''cd {directory_name}
-            python3 {ml_model_path} {data_path} >> output.txt
+            python3 {ml_model_path} {data_path} {model_args} --results_file {results_file} >> output.txt
             ''')
   
   end_time = int(time.time())
 
+  if not fetch_vm_metrics:
+    return
+
   os.system(f'''cd ..
             chmod +x populate_metrics.sh
-            ./populate_metrics.sh {start_time} {end_time}
+            ./populate_metrics.sh {start_time} {end_time} {results_file}
             ''')
 
 
-def _run_model_using_gcsfuse(install_gcsfuse, gcsbucket_data_path, ml_model_path, req_file_path, directory_name) -> None:
+def _run_model_using_gcsfuse(install_gcsfuse, gcsbucket_data_path, ml_model_path, req_file_path, directory_name, model_args='', extra_gcsfuse_flags='', fetch_vm_metrics=True) -> None:
   """Run model which uses GCSFuse to read data.
 
   Args:
@@ -150,6 +193,9 @@ def _run_model_using_gcsfuse(install_gcsfuse, gcsbucket_data_path, ml_model_path
     ml_model_path(str): Path of the ml model to Run.
     req_file_path(str): Path of the corresponding requirements.txt file.
     directory_name(str): Name of the directory where the model will run.
+    model_args(str): Optional flags passed to the ml model.
+    extra_gcsfuse_flags(str): Flags added to the default gcsfuse flags.
+    fetch_vm_metrics(bool): Whether to fetch the VM metrics of the run.
   """
 
   data_directory_name = 'data'
@@ -159,11 +205,11 @@ def _run_model_using_gcsfuse(install_gcsfuse, gcsbucket_data_path, ml_model_path
     exitcode = _check_gcsfuse()
     if exitcode == COMMAND_NOT_FOUND_CODE:
       _install_gcsfuse()
-    _mount_gcsbucket(GCS_BUCKET, data_directory_name)
+    _mount_gcsbucket(GCS_BUCKET, data_directory_name, extra_gcsfuse_flags)
   else:
-    _run_from_source(GCS_BUCKET, data_directory_name)
+    _run_from_source(GCS_BUCKET, data_directory_name, extra_gcsfuse_flags)
 
-  _run_model(directory_name, data_path, 'gcsfuse', ml_model_path, req_file_path)
+  _run_model(directory_name, data_path, 'gcsfuse', ml_model_path, req_file_path, model_args, fetch_vm_metrics)
   _unmount_gcsbucket(data_directory_name)
 
 
@@ -204,6 +250,49 @@ def main(argv) -> None:
       default='None',
       help='Provide Absolute disk data path',
       required=False)
+  parser.add_argument(
+      '--epoch_cache_dir',
+      action='store',
+      default=None,
+      help='Local directory for the read-through epoch cache of the dataset',
+      required=False)
+  parser.add_argument(
+      '--epoch_cache_size_mb',
+      action='store',
+      type=int,
+      default=10240,
+      help='Capacity of the read-through epoch cache in MB',
+      required=False)
+  parser.add_argument(
+      '--decoded_cache_dir',
+      action='store',
+      default=None,
+      help='Local directory for the memory-mapped cache of the decoded images',
+      required=False)
+  parser.add_argument(
+      '--keep_decoded_cache',
+      action='store_true',
+      default=False,
+      help='Reuse the decoded image cache of a previous run',
+      required=False)
+  parser.add_argument(
+      '--no_pretrained_weights',
+      action='store_true',
+      default=False,
+      help='Start the models from random weights',
+      required=False)
+  parser.add_argument(
+      '--skip_vm_metrics',
+      action='store_true',
+      default=False,
+      help='Do not fetch the VM metrics after the run',
+      required=False)
+  parser.add_argument(
+      '--gcsfuse_local_file_cache',
+      action='store_true',
+      default=False,
+      help='Mount with --experimental-local-file-cache to compare it with the epoch cache',
+      required=False)
   args = parser.parse_args(argv[1:])
 
   directory_name = args.directory_name
@@ -212,19 +301,35 @@ def main(argv) -> None:
   ml_model_path = os.path.abspath(args.ml_model_path)
   req_file_path = os.path.abspath(args.req_file_path)
 
+  model_args = ''
+  if args.epoch_cache_dir:
+    model_args += (f'--epoch_cache_dir {os.path.abspath(args.epoch_cache_dir)} '
+                   f'--epoch_cache_size_mb {args.epoch_cache_size_mb} ')
+  if args.decoded_cache_dir:
+    model_args += f'--decoded_cache_dir {os.path.abspath(args.decoded_cache_dir)} '
+    if args.keep_decoded_cache:
+      model_args += '--keep_decoded_cache '
+  if args.no_pretrained_weights:
+    model_args += '--no_pretrained_weights '
+  fetch_vm_metrics = not args.skip_vm_metrics
+
+  extra_gcsfuse_flags = ''
+  if args.gcsfuse_local_file_cache:
+    extra_gcsfuse_flags += '--experimental-local-file-cache '
+
   # Run the model which uses GCSFuse to read data from GCSBucket
   if data_read_method == 'gcsfuse' or data_read_method == 'both':
     if args.gcsbucket_data_path == 'None':
       app.UsageError('GCS_BUCKET data path must be provided')
 
-    _run_model_using_gcsfuse(args.install_gcsfuse, args.gcsbucket_data_path, ml_model_path, req_file_path,directory_name)
+    _run_model_using_gcsfuse(args.install_gcsfuse, args.gcsbucket_data_path, ml_model_path, req_file_path,directory_name, model_args, extra_gcsfuse_flags, fetch_vm_metrics)
 
   # Run the model which reads data from the disk.
   if data_read_method == 'disk' or data_read_method == 'both':
     if args.disk_data_path == 'None':
       app.UsageError('Disk data path must be provided')
 
-    _run_model(directory_name, args.disk_data_path, 'disk', ml_model_path, req_file_path)
+    _run_model(directory_name, args.disk_data_path, 'disk', ml_model_path, req_file_path, model_args, fetch_vm_metrics)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,151 @@
+"""Structured per-phase records of an ML model run.
+
+The ML models record the start and end time of every phase of a run (index
+build, setup, each epoch, eval) as JSON lines, one record per phase:
+  {"phase": "epoch", "epoch": 1, "start_time_sec": 1656300600.5,
+   "end_time_sec": 1656300720.2}
+
+populate_vm_metrics.py reads these records and fetches the VM metrics of every
+phase separately, so that the CPU and network behaviour can be attributed to
+each epoch.
+
+  Usage inside a model script:
+    recorder = run_results.PhaseRecorder(results_file)
+    recorder.start_phase('setup')
+    ...
+    recorder.end_phase()
+    for epoch in range(nb_epochs):
+      with recorder.phase('epoch', epoch=epoch + 1):
+        ...
+"""
+import contextlib
+import dataclasses
+import json
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+PHASE = 'phase'
+START_TIME = 'start_time_sec'
+END_TIME = 'end_time_sec'
+
+SETUP = 'setup'
+INDEX_BUILD = 'index_build'
+EPOCH = 'epoch'
+EVAL = 'eval'
+
+
+@dataclasses.dataclass(frozen=True)
+class MetricWindow:
+  """Whole-second interval over which the VM metrics of a phase are fetched."""
+  label: str
+  start_time_sec: int
+  end_time_sec: int
+
+
+class PhaseRecorder:
+  """Appends a JSON record for every phase of a run to a file.
+
+  Attributes:
+    records: Records of all the phases ended so far.
+  """
+
+  def __init__(self, output_file=None):
+    """Creates the recorder.
+
+    Args:
+      output_file (str): JSON lines file the records are appended to. When None,
+        the records are only kept in memory.
+    """
+    self._output_file = output_file
+    self._current: Optional[Dict[str, Any]] = None
+    self.records: List[Dict[str, Any]] = []
+
+  def start_phase(self, name, **attributes) -> None:
+    """Starts a phase, ending the current one if any.
+
+    Args:
+      name (str): Name of the phase, e.g. SETUP or EPOCH.
+      **attributes: Extra fields stored in the record, e.g. epoch=1.
+    """
+    self.end_phase()
+    self._current = {PHASE: name, **attributes, START_TIME: time.time()}
+
+  def end_phase(self, **attributes) -> None:
+    """Ends the current phase and writes its record.
+
+    Args:
+      **attributes: Extra fields stored in the record, e.g. loss=0.3.
+    """
+    if self._current is None:
+      return
+    record = self._current
+    self._current = None
+    record.update(attributes)
+    record[END_TIME] = time.time()
+    self.records.append(record)
+    if self._output_file:
+      with open(self._output_file, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+  @contextlib.contextmanager
+  def phase(self, name, **attributes):
+    """Records the block as a phase."""
+    self.start_phase(name, **attributes)
+    yield
+    self.end_phase()
+
+
+def load_records(results_file) -> List[Dict[str, Any]]:
+  """Returns the records of a results file, ignoring the empty lines."""
+  with open(results_file, 'r') as f:
+    return [json.loads(line) for line in f if line.strip()]
+
+
+def _get_label(record) -> str:
+  """Returns e.g. 'setup', 'epoch_2' or 'eval_epoch_2'."""
+  if EPOCH not in record:
+    return record[PHASE]
+  if record[PHASE] == EPOCH:
+    return f'{EPOCH}_{record[EPOCH]}'
+  return f'{record[PHASE]}_{EPOCH}_{record[EPOCH]}'
+
+
+def get_metric_windows(records, min_period_sec) -> List[MetricWindow]:
+  """Converts phase records into whole-second metric windows.
+
+  Cloud Monitoring doesn't return any point for an interval shorter than the
+  alignment period, so a phase shorter than min_period_sec is merged with the
+  phases after it, under the labels of all of them joined by '+', until the
+  window is long enough. The last window is extended to min_period_sec if
+  needed. Windows never overlap, so no sample is counted in two windows.
+
+  Args:
+    records (list[dict]): Phase records in time order, as returned by
+      load_records.
+    min_period_sec (int): Minimum length of a window.
+  Returns:
+    list[MetricWindow]
+  """
+  windows = []
+  labels = []
+  start_time_sec = None
+  previous_end_time_sec = None
+  for record in records:
+    if not labels:
+      start_time_sec = math.floor(record[START_TIME])
+      if previous_end_time_sec is not None:
+        start_time_sec = max(start_time_sec, previous_end_time_sec)
+    labels.append(_get_label(record))
+    end_time_sec = math.ceil(record[END_TIME])
+    if end_time_sec - start_time_sec < min_period_sec:
+      continue
+    windows.append(MetricWindow('+'.join(labels), start_time_sec,
+                                end_time_sec))
+    labels = []
+    previous_end_time_sec = end_time_sec
+  if labels:
+    windows.append(MetricWindow('+'.join(labels), start_time_sec,
+                                max(end_time_sec,
+                                    start_time_sec + min_period_sec)))
+  return windows
@@ -0,0 +1,89 @@
+"""Tests for run_results."""
+import os
+import tempfile
+import unittest
+
+import run_results
+
+
+class RunResultsTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.results_file = os.path.join(self.temp_dir.name, 'results.jsonl')
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+    super().tearDown()
+
+  def test_phase_records_are_written_to_results_file(self):
+    recorder = run_results.PhaseRecorder(self.results_file)
+
+    recorder.start_phase(run_results.SETUP)
+    recorder.start_phase(run_results.INDEX_BUILD)
+    recorder.end_phase(num_samples=10)
+    for epoch in range(2):
+      with recorder.phase(run_results.EPOCH, epoch=epoch + 1):
+        pass
+    recorder.end_phase()
+
+    records = run_results.load_records(self.results_file)
+    self.assertEqual(recorder.records, records)
+    self.assertEqual(['setup', 'index_build', 'epoch', 'epoch'],
+                     [record[run_results.PHASE] for record in records])
+    self.assertEqual(10, records[1]['num_samples'])
+    self.assertEqual(2, records[3][run_results.EPOCH])
+    for record in records:
+      self.assertLessEqual(record[run_results.START_TIME],
+                           record[run_results.END_TIME])
+    self.assertLessEqual(records[0][run_results.END_TIME],
+                         records[1][run_results.START_TIME])
+
+  def test_phase_recorder_without_results_file(self):
+    recorder = run_results.PhaseRecorder()
+
+    with recorder.phase(run_results.EVAL):
+      pass
+
+    self.assertEqual(1, len(recorder.records))
+    self.assertFalse(os.path.exists(self.results_file))
+
+  def test_get_metric_windows(self):
+    records = [
+        {'phase': 'setup', 'start_time_sec': 100.7, 'end_time_sec': 110.2},
+        {'phase': 'index_build', 'start_time_sec': 110.2,
+         'end_time_sec': 170.5},
+        {'phase': 'epoch', 'epoch': 1, 'start_time_sec': 170.5,
+         'end_time_sec': 300.1},
+        {'phase': 'eval', 'epoch': 1, 'start_time_sec': 300.1,
+         'end_time_sec': 380},
+    ]
+
+    windows = run_results.get_metric_windows(records, 60)
+
+    # The short setup is merged with the index build, and the windows are
+    # clipped so that they don't overlap.
+    self.assertEqual([
+        run_results.MetricWindow('setup+index_build', 100, 171),
+        run_results.MetricWindow('epoch_1', 171, 301),
+        run_results.MetricWindow('eval_epoch_1', 301, 380),
+    ], windows)
+
+  def test_get_metric_windows_extends_the_last_window(self):
+    records = [
+        {'phase': 'epoch', 'epoch': 1, 'start_time_sec': 100,
+         'end_time_sec': 200},
+        {'phase': 'eval', 'epoch': 1, 'start_time_sec': 200,
+         'end_time_sec': 210},
+    ]
+
+    windows = run_results.get_metric_windows(records, 60)
+
+    self.assertEqual([
+        run_results.MetricWindow('epoch_1', 100, 200),
+        run_results.MetricWindow('eval_epoch_1', 200, 260),
+    ], windows)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,195 @@
+"""Compares the throughput of reading a dataset in different file orders.
+
+The fashion model reads its dataset with shuffle=True and the animal model with
+random_split, so files are opened in random order across the whole bucket
+prefix, which defeats gcsfuse's sequential read heuristics. This script reads
+the same files in three orders:
+  random: a full shuffle of all the files.
+  directory: the listing order, as ImageFolder lists the files.
+  block_shuffle: contiguous blocks of --block_size files in listing order, with
+    the order of the blocks shuffled. The samples are then emitted through an
+    in-memory shuffle buffer of --buffer_size samples, so the order seen by the
+    training loop is still random within the buffer.
+
+For every order it reports the throughput and, with --fetch_gcs_metrics, the
+number of GCS object readers opened by gcsfuse during the run (reader churn),
+fetched from Cloud Monitoring once the metrics are visible. Cloud Monitoring
+counts an order shorter than its alignment period over a whole period, so with
+--fetch_gcs_metrics every order starts once the period of the previous one has
+ended, and the readers of one order are not counted in another.
+
+To run the script:
+>> python3 shuffle_order_benchmark.py <data_path> [--orders random,directory,block_shuffle] [--block_size 256] [--buffer_size 1024] [--num_threads 4] [--seed 0] [--max_files 10000] [--drop_caches] [--fetch_gcs_metrics]
+"""
+import argparse
+import concurrent.futures
+import dataclasses
+import os
+import random
+import socket
+import sys
+import time
+from typing import Iterable, Iterator, List
+
+import distributed_readers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+ORDERS = ['random', 'directory', 'block_shuffle']
+MB = 1024 * 1024
+
+
+@dataclasses.dataclass
+class OrderResult:
+  order: str
+  num_files: int
+  num_bytes: int
+  start_time_sec: float
+  end_time_sec: float
+  # Average memory held by the shuffle buffer.
+  buffer_bytes: int = 0
+  readers_opened: float = -1
+
+  @property
+  def elapsed_sec(self) -> float:
+    return self.end_time_sec - self.start_time_sec
+
+  @property
+  def mb_per_sec(self) -> float:
+    return self.num_bytes / MB / self.elapsed_sec if self.elapsed_sec else 0.0
+
+  @property
+  def files_per_sec(self) -> float:
+    return self.num_files / self.elapsed_sec if self.elapsed_sec else 0.0
+
+
+def get_read_order(num_files, order, block_size, seed) -> List[int]:
+  """Returns the indices of the files in the order they are read."""
+  indices = list(range(num_files))
+  rng = random.Random(seed)
+  if order == 'random':
+    rng.shuffle(indices)
+  elif order == 'block_shuffle':
+    blocks = [
+        indices[i:i + block_size] for i in range(0, num_files, block_size)
+    ]
+    rng.shuffle(blocks)
+    indices = [index for block in blocks for index in block]
+  elif order != 'directory':
+    raise ValueError(f'Unknown order {order}, expected one of {ORDERS}')
+  return indices
+
+
+def shuffle_buffer(samples: Iterable, buffer_size, seed) -> Iterator:
+  """Yields the samples in an order randomized within a buffer.
+
+  The buffer is filled with the first buffer_size samples, then every new
+  sample replaces a randomly chosen buffered one, which is yielded.
+  """
+  rng = random.Random(seed)
+  buffer = []
+  for sample in samples:
+    if len(buffer) < buffer_size:
+      buffer.append(sample)
+      continue
+    index = rng.randrange(buffer_size)
+    yield buffer[index]
+    buffer[index] = sample
+  rng.shuffle(buffer)
+  yield from buffer
+
+
+def _read_file(path) -> bytes:
+  with open(path, 'rb') as f:
+    return f.read()
+
+
+def read_in_order(files, order, block_size, buffer_size, num_threads,
+                  seed) -> OrderResult:
+  """Reads all the files in the given order and returns the throughput."""
+  read_order = [files[i] for i in get_read_order(len(files), order,
+                                                 block_size, seed)]
+  num_bytes = 0
+  start_time_sec = time.time()
+  with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+    # executor.map keeps the read order, as a DataLoader keeps the sampler
+    # order.
+    samples = executor.map(_read_file, read_order)
+    if order == 'block_shuffle':
+      samples = shuffle_buffer(samples, buffer_size, seed)
+    for data in samples:
+      num_bytes += len(data)
+  end_time_sec = time.time()
+
+  buffer_bytes = 0
+  if order == 'block_shuffle' and files:
+    buffer_bytes = num_bytes * min(buffer_size, len(files)) // len(files)
+  return OrderResult(order, len(files), num_bytes, start_time_sec,
+                     end_time_sec, buffer_bytes=buffer_bytes)
+
+
+def _fetch_readers_opened(results) -> None:
+  """Sets readers_opened of every result from Cloud Monitoring."""
+  vm_metrics = bench_utils.import_vm_metrics()
+  bench_utils.wait_for_metrics()
+  vm_metrics_obj = vm_metrics.VmMetrics()
+  for result in results:
+    result.readers_opened = vm_metrics_obj.fetch_metric_total(
+        *bench_utils.get_metric_window(result.start_time_sec,
+                                       result.end_time_sec),
+        socket.gethostname(), vm_metrics.READER_OPENED_COUNT)
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('data_path', help='Directory of the dataset')
+  parser.add_argument('--orders', default=','.join(ORDERS))
+  parser.add_argument('--block_size', type=int, default=256,
+                      help='Number of contiguous files in a block')
+  parser.add_argument('--buffer_size', type=int, default=1024,
+                      help='Number of samples in the shuffle buffer')
+  parser.add_argument('--num_threads', type=int, default=4)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--max_files', type=int, default=0)
+  parser.add_argument('--drop_caches', action='store_true', default=False,
+                      help='Drop the kernel page cache before every order, '
+                      'requires root')
+  parser.add_argument('--fetch_gcs_metrics', action='store_true',
+                      default=False,
+                      help='Fetch the GCS readers opened by gcsfuse for every '
+                      'order from Cloud Monitoring')
+  args = parser.parse_args(argv[1:])
+
+  files = distributed_readers.list_files(args.data_path)
+  if args.max_files:
+    files = files[:args.max_files]
+
+  results = []
+  for order in args.orders.split(','):
+    if args.fetch_gcs_metrics and results:
+      bench_utils.wait_for_metric_window(results[-1].start_time_sec,
+                                         results[-1].end_time_sec)
+    if args.drop_caches:
+      bench_utils.drop_caches()
+    results.append(
+        read_in_order(files, order, args.block_size, args.buffer_size,
+                      args.num_threads, args.seed))
+
+  if args.fetch_gcs_metrics:
+    _fetch_readers_opened(results)
+
+  for result in results:
+    line = (f'{result.order}: {result.files_per_sec:.1f} files/s, '
+            f'{result.mb_per_sec:.1f} MB/s')
+    if result.order == 'block_shuffle':
+      line += f', shuffle buffer of ~{result.buffer_bytes} bytes'
+    if result.readers_opened >= 0:
+      line += (f', {result.readers_opened:.0f} GCS readers opened '
+               f'({result.readers_opened / result.num_files:.2f} per file)')
+    print(line)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,69 @@
+"""Tests for shuffle_order_benchmark."""
+import os
+import tempfile
+import unittest
+
+import shuffle_order_benchmark
+
+
+class ShuffleOrderBenchmarkTest(unittest.TestCase):
+
+  def test_directory_order(self):
+    order = shuffle_order_benchmark.get_read_order(5, 'directory', 2, 0)
+
+    self.assertEqual([0, 1, 2, 3, 4], order)
+
+  def test_random_order_is_a_permutation(self):
+    order = shuffle_order_benchmark.get_read_order(100, 'random', 10, 0)
+
+    self.assertEqual(list(range(100)), sorted(order))
+    self.assertNotEqual(list(range(100)), order)
+
+  def test_block_shuffle_keeps_blocks_contiguous(self):
+    order = shuffle_order_benchmark.get_read_order(10, 'block_shuffle', 3, 1)
+
+    self.assertEqual(list(range(10)), sorted(order))
+    for block in [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]:
+      position = order.index(block[0])
+      self.assertEqual(block, order[position:position + len(block)])
+
+  def test_unknown_order(self):
+    with self.assertRaises(ValueError):
+      shuffle_order_benchmark.get_read_order(10, 'reverse', 3, 0)
+
+  def test_shuffle_buffer_yields_all_samples(self):
+    samples = list(
+        shuffle_order_benchmark.shuffle_buffer(range(100), 10, seed=0))
+
+    self.assertEqual(list(range(100)), sorted(samples))
+    self.assertNotEqual(list(range(100)), samples)
+
+  def test_shuffle_buffer_stays_within_buffer(self):
+    samples = shuffle_order_benchmark.shuffle_buffer(range(100), 10, seed=0)
+
+    # A sample cannot be yielded before the buffer has seen it.
+    for position, sample in enumerate(samples):
+      self.assertLess(sample, position + 10)
+
+  def test_read_in_order(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      files = []
+      for i in range(6):
+        path = os.path.join(temp_dir, f'{i}.bin')
+        with open(path, 'wb') as f:
+          f.write(b'x' * (i + 1))
+        files.append(path)
+
+      result = shuffle_order_benchmark.read_in_order(
+          files, 'block_shuffle', block_size=2, buffer_size=3, num_threads=2,
+          seed=0)
+
+    self.assertEqual(6, result.num_files)
+    self.assertEqual(21, result.num_bytes)
+    self.assertEqual(10, result.buffer_bytes)
+    self.assertGreaterEqual(result.elapsed_sec, 0)
+    self.assertEqual(-1, result.readers_opened)
+
+
+if __name__ == '__main__':
+  unittest.main()
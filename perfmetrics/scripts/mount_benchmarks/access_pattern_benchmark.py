@@ -0,0 +1,387 @@
+"""Sweeps the read access patterns of one file handle through gcsfuse.
+
+gcsfuse serves the reads of a file handle from one GCS reader at a time
+(internal/gcsx/random_reader.go). A reader is reused for reads after its
+position within maxReadSize (8 MiB) and otherwise reopened, which counts as a
+seek. After minSeeksForRandom (2) seeks, new readers only fetch the average
+read size between seeks, rounded up to the next MiB within [1 MiB, 8 MiB],
+instead of the rest of the object. This script reads one file through a single
+file handle with the patterns:
+  sequential: consecutive reads of --read_sizes_kb.
+  seek: after every read, seeks by a distance of --seek_distances_kb from its
+    end, forward or backward (negative), i.e. a stride of the read size plus
+    the distance, wrapping around the file.
+  random: reads at random offsets aligned to the read size.
+  hotspot: a fraction of --hotspot_probability of the reads at random offsets
+    in a region of --hotspot_fractions of the file, the others anywhere.
+  streams: --num_streams sequential streams starting at evenly spaced offsets,
+    read in turn, as interleaved readers of a shared file do.
+Every pattern is run for every read size, for --run_bytes_mb bytes.
+
+For every run, it reports the throughput and the GCS readers opened by gcsfuse
+(reader churn) and bytes they read, from the stats of the fake GCS server of
+fake_gcs with --fake_gcs_endpoint, or from Cloud Monitoring with
+--fetch_gcs_metrics. Cloud Monitoring counts a run shorter than its alignment
+period over a whole period, so with --fetch_gcs_metrics every run starts once
+the period of the previous one has ended, and the GCS reads of one run are not
+counted in another. It also replays the reads through a model of the random
+reader for every value of --simulated_min_seeks, to compare the readers opened
+with other values of minSeeksForRandom without rebuilding gcsfuse. The model
+sees the application reads split into FUSE requests, not the kernel readahead.
+gcsfuse skips forward with a single read of the response body, which returns
+the bytes already received only, so --simulated_skip_kb bounds the skips of the
+model.
+
+To run the script:
+>> python3 access_pattern_benchmark.py <file on the mount> [--patterns sequential,seek,random,hotspot,streams] [--read_sizes_kb 4,128,1024] [--seek_distances_kb=-8192,-128,128,4096,16384] [--hotspot_fractions 0.01,0.1] [--hotspot_probability 0.9] [--num_streams 2,4,16] [--run_bytes_mb 256] [--seed 0] [--fadvise normal] [--simulated_min_seeks 2] [--simulated_skip_kb 0] [--fake_gcs_endpoint http://localhost:9000] [--fetch_gcs_metrics] [--drop_caches] [--output_file access_patterns.csv]
+"""
+import argparse
+import csv
+import dataclasses
+import os
+import random
+import socket
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+PATTERNS = ['sequential', 'seek', 'random', 'hotspot', 'streams']
+KB = 1024
+MB = 1024 * 1024
+# Constants of internal/gcsx/random_reader.go.
+MIN_READ_SIZE = MB
+MAX_READ_SIZE = 8 * MB
+MIN_SEEKS_FOR_RANDOM = 2
+# Largest read request sent by the kernel to gcsfuse.
+MAX_FUSE_READ_SIZE = 128 * KB
+FADVISE = {
+    'normal': os.POSIX_FADV_NORMAL,
+    'sequential': os.POSIX_FADV_SEQUENTIAL,
+    'random': os.POSIX_FADV_RANDOM,
+}
+
+
+@dataclasses.dataclass
+class Run:
+  pattern: str
+  read_size: int
+  # Seek distance, hotspot fraction or number of streams, by pattern.
+  param: Optional[float] = None
+
+
+@dataclasses.dataclass
+class SimulatedReads:
+  readers_opened: int = 0
+  # Bytes consumed from the readers, including the bytes skipped forward.
+  gcs_read_bytes: int = 0
+
+
+@dataclasses.dataclass
+class RunResult:
+  run: Run
+  num_reads: int
+  num_bytes: int
+  start_time_sec: float
+  end_time_sec: float
+  readers_opened: float = -1
+  gcs_read_bytes: float = -1
+  # Simulated reads by minSeeksForRandom.
+  simulated: Dict[int, SimulatedReads] = dataclasses.field(
+      default_factory=dict)
+
+  @property
+  def elapsed_sec(self) -> float:
+    return self.end_time_sec - self.start_time_sec
+
+  @property
+  def mb_per_sec(self) -> float:
+    return self.num_bytes / MB / self.elapsed_sec if self.elapsed_sec else 0.0
+
+
+def get_runs(patterns, read_sizes, seek_distances, hotspot_fractions,
+             num_streams) -> List[Run]:
+  """Returns the runs of the sweep, every pattern for every read size."""
+  params = {
+      'sequential': [None],
+      'seek': seek_distances,
+      'random': [None],
+      'hotspot': hotspot_fractions,
+      'streams': num_streams,
+  }
+  runs = []
+  for pattern in patterns:
+    if pattern not in params:
+      raise ValueError(f'Unknown pattern {pattern}, expected one of {PATTERNS}')
+    for read_size in read_sizes:
+      runs.extend(Run(pattern, read_size, param) for param in params[pattern])
+  return runs
+
+
+def get_reads(run: Run, file_size, num_reads, seed,
+              hotspot_probability=0.9) -> List[Tuple[int, int]]:
+  """Returns the (offset, size) of the reads of a run.
+
+  Offsets wrap around the file, and reads are cut at its end.
+
+  Raises:
+    ValueError: When the file is smaller than the read size.
+  """
+  read_size = run.read_size
+  num_slots = file_size // read_size
+  if not num_slots:
+    raise ValueError(f'File of {file_size} bytes smaller than {read_size}')
+  rng = random.Random(seed)
+  if run.pattern == 'sequential':
+    offsets = [(i % num_slots) * read_size for i in range(num_reads)]
+  elif run.pattern == 'seek':
+    stride = read_size + int(run.param)
+    # Backward seeks start at the end of the file.
+    start = 0 if stride >= 0 else file_size - read_size
+    offsets = [(start + i * stride) % (file_size - read_size + 1)
+               for i in range(num_reads)]
+  elif run.pattern == 'random':
+    offsets = [rng.randrange(num_slots) * read_size for _ in range(num_reads)]
+  elif run.pattern == 'hotspot':
+    hot_slots = max(1, int(num_slots * run.param))
+    hot_start = rng.randrange(num_slots - hot_slots + 1)
+    offsets = []
+    for _ in range(num_reads):
+      if rng.random() < hotspot_probability:
+        slot = hot_start + rng.randrange(hot_slots)
+      else:
+        slot = rng.randrange(num_slots)
+      offsets.append(slot * read_size)
+  elif run.pattern == 'streams':
+    num_streams = int(run.param)
+    slots_per_stream = max(1, num_slots // num_streams)
+    offsets = [((i % num_streams) * slots_per_stream +
+                (i // num_streams) % slots_per_stream) % num_slots * read_size
+               for i in range(num_reads)]
+  else:
+    raise ValueError(
+        f'Unknown pattern {run.pattern}, expected one of {PATTERNS}')
+  return [(offset, min(read_size, file_size - offset)) for offset in offsets]
+
+
+def simulate_random_reader(
+    reads, object_size, min_seeks_for_random=MIN_SEEKS_FOR_RANDOM,
+    max_skip_bytes=MAX_READ_SIZE,
+    max_fuse_read_size=MAX_FUSE_READ_SIZE) -> SimulatedReads:
+  """Replays reads through a model of randomReader.ReadAt of gcsfuse.
+
+  Args:
+    reads: (offset, size) of the application reads, split into FUSE requests
+      of at most max_fuse_read_size bytes.
+    object_size: Size of the object.
+    min_seeks_for_random: minSeeksForRandom of the model.
+    max_skip_bytes: Most bytes skipped forward in a reader, beyond which the
+      reader is reopened.
+    max_fuse_read_size: Largest FUSE read request.
+
+  Returns:
+    The readers opened and the bytes they read.
+  """
+  result = SimulatedReads()
+  # Position and limit of the current reader, or None.
+  reader = None
+  seeks = 0
+  total_read_bytes = 0
+  for read_offset, read_size in reads:
+    for request_offset in range(read_offset, read_offset + read_size,
+                                max_fuse_read_size):
+      offset = request_offset
+      size = min(max_fuse_read_size, read_offset + read_size - offset)
+      while size > 0 and offset < object_size:
+        if reader is not None:
+          start, limit = reader
+          if start < offset and offset - start < MAX_READ_SIZE:
+            skipped = min(offset, limit, start + max_skip_bytes) - start
+            result.gcs_read_bytes += skipped
+            start += skipped
+          reader = (start, limit)
+          if start != offset:
+            reader = None
+            seeks += 1
+        if reader is None:
+          end = object_size
+          # Without seeks, a reader is sequential whatever
+          # min_seeks_for_random.
+          if seeks and seeks >= min_seeks_for_random:
+            average_read_bytes = total_read_bytes // seeks
+            if average_read_bytes < MAX_READ_SIZE:
+              random_read_size = (average_read_bytes // MB + 1) * MB
+              random_read_size = min(max(random_read_size, MIN_READ_SIZE),
+                                     MAX_READ_SIZE)
+              end = offset + random_read_size
+          reader = (offset, min(end, object_size))
+          result.readers_opened += 1
+        start, limit = reader
+        num_bytes = min(size, limit - start)
+        offset += num_bytes
+        size -= num_bytes
+        total_read_bytes += num_bytes
+        result.gcs_read_bytes += num_bytes
+        reader = None if offset == limit else (offset, limit)
+  return result
+
+
+def run_reads(path, run: Run, reads, fadvise='normal',
+              fake_gcs_endpoint=None) -> RunResult:
+  """Reads a file through one file handle and returns the throughput."""
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    # Evicts the pages of earlier runs, kept in the page cache by gcsfuse.
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    os.posix_fadvise(fd, 0, 0, FADVISE[fadvise])
+    if fake_gcs_endpoint:
+      readers_before, bytes_before = bench_utils.fetch_fake_gcs_reads(
+          fake_gcs_endpoint)
+    num_bytes = 0
+    start_time_sec = time.time()
+    for offset, size in reads:
+      num_bytes += len(os.pread(fd, size, offset))
+    end_time_sec = time.time()
+  finally:
+    os.close(fd)
+  result = RunResult(run, len(reads), num_bytes, start_time_sec, end_time_sec)
+  if fake_gcs_endpoint:
+    readers_after, bytes_after = bench_utils.fetch_fake_gcs_reads(
+        fake_gcs_endpoint)
+    result.readers_opened = readers_after - readers_before
+    result.gcs_read_bytes = bytes_after - bytes_before
+  return result
+
+
+def _fetch_gcs_metrics(results) -> None:
+  """Sets the GCS reads of every result from Cloud Monitoring."""
+  vm_metrics = bench_utils.import_vm_metrics()
+  bench_utils.wait_for_metrics()
+  vm_metrics_obj = vm_metrics.VmMetrics()
+  for result in results:
+    result.gcs_read_bytes, result.readers_opened = (
+        vm_metrics_obj.fetch_gcs_reads(
+            *bench_utils.get_metric_window(result.start_time_sec,
+                                           result.end_time_sec),
+            socket.gethostname()))
+
+
+def get_rows(results: List[RunResult]) -> List[Dict]:
+  """Returns the CSV rows of the results, one per run."""
+  rows = []
+  for result in results:
+    row = {
+        'pattern': result.run.pattern,
+        'read_size': result.run.read_size,
+        'param': '' if result.run.param is None else result.run.param,
+        'reads': result.num_reads,
+        'bytes': result.num_bytes,
+        'elapsed_sec': result.elapsed_sec,
+        'mb_per_sec': result.mb_per_sec,
+        'readers_opened': result.readers_opened,
+        'gcs_read_bytes': result.gcs_read_bytes,
+    }
+    for min_seeks, simulated in sorted(result.simulated.items()):
+      row[f'simulated_readers_{min_seeks}'] = simulated.readers_opened
+      row[f'simulated_gcs_read_bytes_{min_seeks}'] = simulated.gcs_read_bytes
+    rows.append(row)
+  return rows
+
+
+def _int_list(value) -> List[int]:
+  return [int(v) for v in value.split(',')]
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('path', help='File read by the benchmark')
+  parser.add_argument('--patterns', default=','.join(PATTERNS))
+  parser.add_argument('--read_sizes_kb', type=_int_list, default=[4, 128, 1024])
+  parser.add_argument('--seek_distances_kb', type=_int_list,
+                      default=[-8192, -128, 128, 4096, 16384],
+                      help='Comma separated distances from the end of a read '
+                      'to the next, negative for backward seeks')
+  parser.add_argument('--hotspot_fractions',
+                      type=lambda value: [float(v) for v in value.split(',')],
+                      default=[0.01, 0.1],
+                      help='Comma separated fractions of the file in the '
+                      'hotspot')
+  parser.add_argument('--hotspot_probability', type=float, default=0.9,
+                      help='Probability of a read in the hotspot')
+  parser.add_argument('--num_streams', type=_int_list, default=[2, 4, 16])
+  parser.add_argument('--run_bytes_mb', type=int, default=256,
+                      help='Bytes read by every run')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--fadvise', choices=sorted(FADVISE), default='normal',
+                      help='Access pattern advised to the kernel, which sets '
+                      'its readahead')
+  parser.add_argument('--simulated_min_seeks', type=_int_list,
+                      default=[MIN_SEEKS_FOR_RANDOM],
+                      help='Comma separated values of minSeeksForRandom of '
+                      'the simulated random reader')
+  parser.add_argument('--simulated_skip_kb', type=int, default=0,
+                      help='Most bytes skipped forward in a reader by the '
+                      'simulated random reader, maxReadSize by default')
+  parser.add_argument('--fake_gcs_endpoint', default='',
+                      help='Endpoint of the fake GCS server the file is '
+                      'mounted from, e.g. http://localhost:9000, to count the '
+                      'GCS readers opened')
+  parser.add_argument('--fetch_gcs_metrics', action='store_true',
+                      default=False,
+                      help='Fetch the GCS readers opened by gcsfuse for every '
+                      'run from Cloud Monitoring')
+  parser.add_argument('--drop_caches', action='store_true', default=False,
+                      help='Drop the kernel page cache before every run, '
+                      'requires root')
+  parser.add_argument('--output_file', default='access_patterns.csv')
+  args = parser.parse_args(argv[1:])
+
+  file_size = os.path.getsize(args.path)
+  runs = get_runs(args.patterns.split(','),
+                  [size * KB for size in args.read_sizes_kb],
+                  [distance * KB for distance in args.seek_distances_kb],
+                  args.hotspot_fractions, args.num_streams)
+  results = []
+  for run in runs:
+    reads = get_reads(run, file_size,
+                      max(1, args.run_bytes_mb * MB // run.read_size),
+                      args.seed, args.hotspot_probability)
+    if args.fetch_gcs_metrics and results:
+      bench_utils.wait_for_metric_window(results[-1].start_time_sec,
+                                         results[-1].end_time_sec)
+    if args.drop_caches:
+      bench_utils.drop_caches()
+    result = run_reads(args.path, run, reads, args.fadvise,
+                       args.fake_gcs_endpoint)
+    for min_seeks in args.simulated_min_seeks:
+      result.simulated[min_seeks] = simulate_random_reader(
+          reads, file_size, min_seeks,
+          args.simulated_skip_kb * KB or MAX_READ_SIZE)
+    results.append(result)
+
+  if args.fetch_gcs_metrics:
+    _fetch_gcs_metrics(results)
+
+  for result in results:
+    line = (f'{result.run.pattern} {result.run.read_size // KB}KiB'
+            + ('' if result.run.param is None else f' ({result.run.param})')
+            + f': {result.mb_per_sec:.1f} MB/s')
+    if result.readers_opened >= 0:
+      line += f', {result.readers_opened:.0f} GCS readers opened'
+    simulated = result.simulated.get(MIN_SEEKS_FOR_RANDOM)
+    if simulated:
+      line += f' ({simulated.readers_opened} simulated)'
+    print(line)
+
+  rows = get_rows(results)
+  with open(args.output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,151 @@
+"""Tests for access_pattern_benchmark."""
+import os
+import tempfile
+import unittest
+
+import access_pattern_benchmark
+from access_pattern_benchmark import KB, MB, Run
+
+
+class AccessPatternBenchmarkTest(unittest.TestCase):
+
+  def test_get_runs(self):
+    runs = access_pattern_benchmark.get_runs(['sequential', 'seek'], [4, 8],
+                                             [-1, 1], [0.1], [2])
+
+    self.assertEqual([
+        Run('sequential', 4),
+        Run('sequential', 8),
+        Run('seek', 4, -1),
+        Run('seek', 4, 1),
+        Run('seek', 8, -1),
+        Run('seek', 8, 1)
+    ], runs)
+    with self.assertRaises(ValueError):
+      access_pattern_benchmark.get_runs(['zigzag'], [4], [], [], [])
+
+  def test_sequential_reads_wrap_around(self):
+    reads = access_pattern_benchmark.get_reads(Run('sequential', 4), 10, 4, 0)
+
+    self.assertEqual([(0, 4), (4, 4), (0, 4), (4, 4)], reads)
+
+  def test_seek_forward_and_backward(self):
+    forward = access_pattern_benchmark.get_reads(Run('seek', 2, 3), 20, 4, 0)
+    backward = access_pattern_benchmark.get_reads(Run('seek', 2, -4), 20, 4, 0)
+
+    self.assertEqual([(0, 2), (5, 2), (10, 2), (15, 2)], forward)
+    self.assertEqual([(18, 2), (16, 2), (14, 2), (12, 2)], backward)
+
+  def test_random_reads_are_aligned(self):
+    reads = access_pattern_benchmark.get_reads(Run('random', 4), 100, 50, 0)
+
+    self.assertTrue(all(offset % 4 == 0 and size == 4 for offset, size in reads))
+    self.assertEqual(
+        reads, access_pattern_benchmark.get_reads(Run('random', 4), 100, 50, 0))
+
+  def test_hotspot_reads(self):
+    reads = access_pattern_benchmark.get_reads(
+        Run('hotspot', 1, 0.1), 1000, 1000, 1, hotspot_probability=0.9)
+
+    offsets = [offset for offset, _ in reads]
+    counts = [
+        sum(1 for offset in offsets if start <= offset < start + 100)
+        for start in range(0, 901)
+    ]
+    # At least the hot reads are in a region of a tenth of the file.
+    self.assertGreaterEqual(max(counts), 900 * 0.95)
+
+  def test_interleaved_streams(self):
+    reads = access_pattern_benchmark.get_reads(Run('streams', 2, 2), 16, 6, 0)
+
+    self.assertEqual([0, 8, 2, 10, 4, 12], [offset for offset, _ in reads])
+
+  def test_reads_are_cut_at_the_end_of_the_file(self):
+    reads = access_pattern_benchmark.get_reads(Run('seek', 4, 1), 10, 3, 0)
+
+    self.assertEqual([(0, 4), (5, 4), (3, 4)], reads)
+    with self.assertRaises(ValueError):
+      access_pattern_benchmark.get_reads(Run('sequential', 20), 10, 1, 0)
+
+  def test_simulated_sequential_reads_use_one_reader(self):
+    reads = [(offset, MB) for offset in range(0, 64 * MB, MB)]
+
+    simulated = access_pattern_benchmark.simulate_random_reader(
+        reads, 64 * MB)
+
+    self.assertEqual(1, simulated.readers_opened)
+    self.assertEqual(64 * MB, simulated.gcs_read_bytes)
+
+  def test_simulated_short_forward_seeks_skip_in_the_reader(self):
+    # Seeks of 1MiB forward are within maxReadSize.
+    reads = [(offset, 128 * KB) for offset in range(0, 32 * MB, MB + 128 * KB)]
+
+    simulated = access_pattern_benchmark.simulate_random_reader(
+        reads, 64 * MB)
+
+    self.assertEqual(1, simulated.readers_opened)
+    self.assertEqual(reads[-1][0] + 128 * KB, simulated.gcs_read_bytes)
+
+  def test_simulated_skips_beyond_the_limit_reopen(self):
+    reads = [(offset, 128 * KB) for offset in range(0, 32 * MB, MB + 128 * KB)]
+
+    simulated = access_pattern_benchmark.simulate_random_reader(
+        reads, 64 * MB, max_skip_bytes=64 * KB)
+
+    self.assertEqual(len(reads), simulated.readers_opened)
+    # Skipped bytes are read too.
+    self.assertEqual(
+        len(reads) * 128 * KB + (len(reads) - 1) * 64 * KB,
+        simulated.gcs_read_bytes)
+
+  def test_simulated_random_reads_shrink_after_min_seeks(self):
+    # Small reads backward 16MiB apart, then a read of 4MiB.
+    reads = [(48 * MB, 128 * KB), (32 * MB, 128 * KB), (16 * MB, 128 * KB),
+             (0, 4 * MB)]
+
+    default = access_pattern_benchmark.simulate_random_reader(reads, 64 * MB)
+    later = access_pattern_benchmark.simulate_random_reader(
+        reads, 64 * MB, min_seeks_for_random=5)
+
+    # From the second seek, readers only fetch 1MiB, so that the last read
+    # opens four of them.
+    self.assertEqual(7, default.readers_opened)
+    self.assertEqual(3 * 128 * KB + 4 * MB, default.gcs_read_bytes)
+    self.assertEqual(4, later.readers_opened)
+
+  def test_simulated_reads_with_no_min_seeks(self):
+    reads = [(48 * MB, 128 * KB), (32 * MB, 128 * KB), (16 * MB, 128 * KB),
+             (0, 4 * MB)]
+
+    simulated = access_pattern_benchmark.simulate_random_reader(
+        reads, 64 * MB, min_seeks_for_random=0)
+
+    # As with 1, the first reader is sequential, the others random.
+    self.assertEqual(
+        access_pattern_benchmark.simulate_random_reader(
+            reads, 64 * MB, min_seeks_for_random=1), simulated)
+
+  def test_run_reads_and_rows(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, 'file')
+      with open(path, 'wb') as f:
+        f.write(os.urandom(64 * KB))
+      run = Run('random', 4 * KB)
+      reads = access_pattern_benchmark.get_reads(run, 64 * KB, 10, 0)
+
+      result = access_pattern_benchmark.run_reads(path, run, reads)
+      result.simulated[2] = access_pattern_benchmark.simulate_random_reader(
+          reads, 64 * KB)
+
+    self.assertEqual(10, result.num_reads)
+    self.assertEqual(40 * KB, result.num_bytes)
+    self.assertEqual(-1, result.readers_opened)
+    row = access_pattern_benchmark.get_rows([result])[0]
+    self.assertEqual('random', row['pattern'])
+    self.assertEqual('', row['param'])
+    self.assertEqual(40 * KB, row['bytes'])
+    self.assertIn('simulated_readers_2', row)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,227 @@
+"""Measures the cost of appending records to one file through gcsfuse.
+
+Log-style workloads open a file, append a small record and close it, over and
+over. On close, gcsfuse uploads the file: an object smaller than the append
+threshold (AppendThreshold, 2 MiB in mount.go) is rewritten whole, a larger one
+is appended to by uploading the new bytes to a temporary object, composing it
+with the object and deleting it (internal/gcsx/append_object_creator.go).
+Opening the file for writing also reads the whole object into a local temp
+file first, so the cost of an append may grow with the file.
+
+This script creates a file of --initial_size_kb and appends --num_appends
+records of --record_size bytes to it, each with an open-append-close cycle. It
+reports the latency of every append and, with --fake_gcs_endpoint, the GCS
+requests by API method and the bytes sent and received by the fake GCS server
+of fake_gcs for every append, in a CSV row per append to chart against the
+file size, and prints a summary of --num_buckets groups of consecutive appends.
+
+To run the script against the fake GCS server:
+>> ./fake_gcs/mount_fake_gcs.sh your-bucket-name gcs
+>> python3 append_benchmark.py gcs/log.txt [--num_appends 2000] [--record_size 256] [--initial_size_kb 0] [--num_buckets 10] [--fake_gcs_endpoint http://localhost:9000] [--output_file appends.csv]
+"""
+import argparse
+import csv
+import dataclasses
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+KB = 1024
+MS_PER_SEC = 1000
+
+
+@dataclasses.dataclass
+class GcsDelta:
+  """GCS requests and bytes of an API method over an append."""
+  requests: int = 0
+  bytes_sent: int = 0
+  bytes_received: int = 0
+
+
+@dataclasses.dataclass
+class AppendResult:
+  append: int
+  # Size of the file after the append.
+  size: int
+  open_sec: float
+  write_sec: float
+  close_sec: float
+  # GCS requests and bytes by API method, empty without the fake GCS server.
+  gcs: Dict[str, GcsDelta] = dataclasses.field(default_factory=dict)
+
+  @property
+  def latency_sec(self) -> float:
+    return self.open_sec + self.write_sec + self.close_sec
+
+  @property
+  def gcs_requests(self) -> int:
+    return sum(delta.requests for delta in self.gcs.values())
+
+  @property
+  def gcs_bytes(self) -> int:
+    return sum(
+        delta.bytes_sent + delta.bytes_received for delta in self.gcs.values())
+
+
+def get_record(index, record_size) -> bytes:
+  """Returns a log line of record_size bytes numbered index."""
+  line = f'{index:010d} '.encode().ljust(record_size - 1, b'x')
+  return line[:record_size - 1] + b'\n'
+
+
+def get_gcs_deltas(before, after) -> Dict[str, GcsDelta]:
+  """Returns the GCS requests and bytes of every API method between two stats.
+
+  Args:
+    before: Stats of the fake GCS server by API method, see
+      fake_gcs_server.fetch_stats.
+    after: Later stats of the server.
+
+  Returns:
+    The deltas of the methods with requests in between.
+  """
+  deltas = {}
+  for method, stats in after.items():
+    previous = before.get(method, GcsDelta())
+    delta = GcsDelta(stats.requests - previous.requests,
+                     stats.bytes_sent - previous.bytes_sent,
+                     stats.bytes_received - previous.bytes_received)
+    if delta.requests:
+      deltas[method] = delta
+  return deltas
+
+
+def append_record(path, record) -> Tuple[float, float, float]:
+  """Appends a record to a file.
+
+  Returns:
+    Seconds spent in open, write and close.
+  """
+  start_sec = time.perf_counter()
+  fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+  open_end_sec = time.perf_counter()
+  try:
+    os.write(fd, record)
+    write_end_sec = time.perf_counter()
+  finally:
+    os.close(fd)
+  return (open_end_sec - start_sec, write_end_sec - open_end_sec,
+          time.perf_counter() - write_end_sec)
+
+
+def run_appends(path, num_appends, record_size, initial_size=0,
+                fetch_stats=None) -> List[AppendResult]:
+  """Creates a file and appends records to it one open-append-close at a time.
+
+  Args:
+    path: Path of the file, overwritten.
+    num_appends: Number of records appended.
+    record_size: Bytes of every record.
+    initial_size: Bytes of the file before the first append.
+    fetch_stats: Function returning the stats of the fake GCS server by API
+      method, or None.
+
+  Returns:
+    The result of every append.
+  """
+  with open(path, 'wb') as f:
+    f.write(b'\0' * initial_size)
+  size = initial_size
+  results = []
+  for append in range(num_appends):
+    record = get_record(append, record_size)
+    before = fetch_stats() if fetch_stats else {}
+    timings = append_record(path, record)
+    size += len(record)
+    result = AppendResult(append, size, *timings)
+    if fetch_stats:
+      result.gcs = get_gcs_deltas(before, fetch_stats())
+    results.append(result)
+  return results
+
+
+def get_rows(results: List[AppendResult]) -> List[Dict[str, object]]:
+  """Returns one CSV row per append, with the GCS totals so far."""
+  methods = sorted({method for r in results for method in r.gcs})
+  total_requests = total_bytes = 0
+  rows = []
+  for result in results:
+    total_requests += result.gcs_requests
+    total_bytes += result.gcs_bytes
+    row = {
+        'append': result.append,
+        'size': result.size,
+        'latency_ms': result.latency_sec * MS_PER_SEC,
+        'open_ms': result.open_sec * MS_PER_SEC,
+        'write_ms': result.write_sec * MS_PER_SEC,
+        'close_ms': result.close_sec * MS_PER_SEC,
+        'gcs_requests': result.gcs_requests,
+        'gcs_bytes': result.gcs_bytes,
+        'total_gcs_requests': total_requests,
+        'total_gcs_bytes': total_bytes,
+    }
+    for method in methods:
+      row[f'{method}_requests'] = result.gcs.get(method, GcsDelta()).requests
+    rows.append(row)
+  return rows
+
+
+def get_summary(results: List[AppendResult], num_buckets) -> List[str]:
+  """Returns a line per bucket of consecutive appends."""
+  bucket_size = max(1, -(-len(results) // num_buckets))
+  lines = []
+  for start in range(0, len(results), bucket_size):
+    bucket = results[start:start + bucket_size]
+    latencies_ms = sorted(r.latency_sec * MS_PER_SEC for r in bucket)
+    lines.append(
+        f'appends {bucket[0].append}-{bucket[-1].append} '
+        f'({bucket[0].size // KB}-{bucket[-1].size // KB}KiB): mean '
+        f'{statistics.mean(latencies_ms):.1f}ms, max {latencies_ms[-1]:.1f}ms, '
+        f'{statistics.mean(r.gcs_requests for r in bucket):.1f} GCS requests '
+        f'and {statistics.mean(r.gcs_bytes for r in bucket) / KB:.1f}KiB per '
+        'append')
+  return lines
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('path', help='File appended to, overwritten')
+  parser.add_argument('--num_appends', type=int, default=2000)
+  parser.add_argument('--record_size', type=int, default=256,
+                      help='Bytes of every record')
+  parser.add_argument('--initial_size_kb', type=int, default=0,
+                      help='Size of the file before the first append, e.g. '
+                      'above the append threshold of 2MiB')
+  parser.add_argument('--num_buckets', type=int, default=10,
+                      help='Number of groups of appends in the summary')
+  parser.add_argument('--fake_gcs_endpoint', default='',
+                      help='Endpoint of the fake GCS server the file is '
+                      'mounted from, e.g. http://localhost:9000, to count the '
+                      'GCS requests and bytes of every append')
+  parser.add_argument('--output_file', default='appends.csv')
+  args = parser.parse_args(argv[1:])
+
+  fetch_stats = None
+  if args.fake_gcs_endpoint:
+    fetch_stats = lambda: bench_utils.fetch_fake_gcs_stats(
+        args.fake_gcs_endpoint)
+  results = run_appends(args.path, args.num_appends, args.record_size,
+                        args.initial_size_kb * KB, fetch_stats)
+  for line in get_summary(results, args.num_buckets):
+    print(line)
+
+  rows = get_rows(results)
+  with open(args.output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,70 @@
+"""Tests for append_benchmark."""
+import os
+import tempfile
+import unittest
+
+import append_benchmark
+from append_benchmark import AppendResult, GcsDelta
+
+
+class AppendBenchmarkTest(unittest.TestCase):
+
+  def test_get_record(self):
+    self.assertEqual(b'0000000012 xxxx\n', append_benchmark.get_record(12, 16))
+    self.assertEqual(b'00000\n', append_benchmark.get_record(12, 6))
+
+  def test_get_gcs_deltas(self):
+    before = {'objects.get': GcsDelta(2, 100, 0)}
+    after = {
+        'objects.get': GcsDelta(2, 100, 0),
+        'objects.compose': GcsDelta(1, 400, 300)
+    }
+
+    self.assertEqual({'objects.compose': GcsDelta(1, 400, 300)},
+                     append_benchmark.get_gcs_deltas(before, after))
+
+  def test_run_appends(self):
+    stats = {'objects.insert': GcsDelta()}
+
+    def fetch_stats():
+      # Every append uploads the file once.
+      stats['objects.insert'] = GcsDelta(
+          stats['objects.insert'].requests + 1, 0,
+          stats['objects.insert'].bytes_received + 10)
+      return dict(stats)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, 'log')
+
+      results = append_benchmark.run_appends(path, 3, 16, initial_size=100,
+                                             fetch_stats=fetch_stats)
+
+      self.assertEqual(148, os.path.getsize(path))
+    self.assertEqual([116, 132, 148], [r.size for r in results])
+    self.assertEqual([1, 1, 1], [r.gcs_requests for r in results])
+    self.assertEqual(10, results[0].gcs_bytes)
+
+  def test_rows_and_summary(self):
+    results = [
+        AppendResult(0, 10, 0.001, 0, 0.009,
+                     {'objects.insert': GcsDelta(1, 0, 10)}),
+        AppendResult(1, 20, 0.001, 0, 0.019, {
+            'objects.compose': GcsDelta(1, 500, 100),
+            'objects.delete': GcsDelta(1, 0, 0)
+        }),
+    ]
+
+    rows = append_benchmark.get_rows(results)
+    summary = append_benchmark.get_summary(results, 2)
+
+    self.assertAlmostEqual(20, rows[1]['latency_ms'])
+    self.assertEqual(3, rows[1]['total_gcs_requests'])
+    self.assertEqual(610, rows[1]['total_gcs_bytes'])
+    self.assertEqual(0, rows[0]['objects.compose_requests'])
+    self.assertEqual(1, rows[1]['objects.delete_requests'])
+    self.assertEqual(2, len(summary))
+    self.assertIn('2.0 GCS requests', summary[1])
+
+
+if __name__ == '__main__':
+  unittest.main()
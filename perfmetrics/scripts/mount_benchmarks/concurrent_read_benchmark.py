@@ -0,0 +1,353 @@
+"""Measures concurrent ranged reads of one large file through gcsfuse.
+
+Model loading reads one multi-GB file with many threads or processes, each at
+its own offsets. This script starts N readers together on a barrier, every
+reader reading its range of the file sequentially in --read_size_kb reads. The
+ranges are laid out with an overlap: 0 gives disjoint ranges that read the file
+once, 1 gives the same range to all the readers, and values in between shift
+every range by a fraction of its size. The readers either share one file
+handle, i.e. one gcsfuse handle and GCS reader, or open their own.
+
+For every N in the sweep, the script reports the aggregate throughput, the
+speedup over one reader and the read latency percentiles. Reads serialized by
+a lock scale neither throughput nor latency with N: the speedup stays close to
+1 while the mean latency grows N-fold. Comparing shared and separate handles
+tells the per-handle locking (only shared handles are serialized) from the
+per-inode locking (both are). With --fake_gcs_endpoint, it also reports the
+GCS readers opened, i.e. the reader churn of readers interleaving on one
+handle.
+
+To run the script:
+>> python3 concurrent_read_benchmark.py <file on the mount> [--num_readers 1,2,4,8,16] [--mode threads] [--handles shared,separate] [--overlaps 0,1] [--read_size_kb 1024] [--range_mb 0] [--fake_gcs_endpoint http://localhost:9000] [--drop_caches] [--output_file concurrent_reads.csv]
+"""
+import argparse
+import csv
+import dataclasses
+import multiprocessing
+import os
+import queue as queue_lib
+import statistics
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+MODES = ['threads', 'processes']
+HANDLES = ['shared', 'separate']
+KB = 1024
+MB = 1024 * 1024
+MS_PER_SEC = 1000
+POLL_INTERVAL_SEC = 1
+
+
+@dataclasses.dataclass
+class ReaderResult:
+  reader: int
+  num_bytes: int
+  start_time_sec: float
+  end_time_sec: float
+  read_latencies_sec: List[float]
+
+  @property
+  def elapsed_sec(self) -> float:
+    return self.end_time_sec - self.start_time_sec
+
+
+@dataclasses.dataclass
+class SweepPoint:
+  """Results of all the readers of a run with num_readers readers."""
+  num_readers: int
+  mode: str
+  handles: str
+  overlap: float
+  readers: List[ReaderResult]
+  readers_opened: int = -1
+  gcs_read_bytes: int = -1
+
+  @property
+  def num_bytes(self) -> int:
+    return sum(r.num_bytes for r in self.readers)
+
+  @property
+  def elapsed_sec(self) -> float:
+    return (max(r.end_time_sec for r in self.readers) -
+            min(r.start_time_sec for r in self.readers))
+
+  @property
+  def aggregate_mb_per_sec(self) -> float:
+    if self.elapsed_sec <= 0:
+      return 0.0
+    return self.num_bytes / MB / self.elapsed_sec
+
+  @property
+  def latencies_sec(self) -> List[float]:
+    return [
+        latency for r in self.readers for latency in r.read_latencies_sec
+    ]
+
+  @property
+  def straggler_skew(self) -> float:
+    """Time of the slowest reader divided by the median reader time."""
+    median_sec = statistics.median(r.elapsed_sec for r in self.readers)
+    if median_sec <= 0:
+      return 0.0
+    return max(r.elapsed_sec for r in self.readers) / median_sec
+
+
+def get_ranges(file_size, num_readers, overlap, read_size,
+               range_bytes=0) -> List[Tuple[int, int]]:
+  """Returns the (start, size) of the range of every reader.
+
+  Args:
+    file_size: Size of the file.
+    num_readers: Number of readers.
+    overlap: Fraction of a range shared with the next one, in [0, 1].
+    read_size: Size of the reads, the ranges are aligned to.
+    range_bytes: Size of every range, the file size divided by the number of
+      readers by default.
+
+  Raises:
+    ValueError: When the ranges do not fit in the file.
+  """
+  if not 0 <= overlap <= 1:
+    raise ValueError(f'Overlap {overlap} not in [0, 1]')
+  size = range_bytes or file_size // num_readers // read_size * read_size
+  step = int(size * (1 - overlap)) // read_size * read_size
+  if not size or (num_readers - 1) * step + size > file_size:
+    raise ValueError(f'{num_readers} ranges of {size} bytes with an overlap '
+                     f'of {overlap} do not fit in {file_size} bytes')
+  return [(reader * step, size) for reader in range(num_readers)]
+
+
+def _read_range(reader, fd, path, start, size, read_size) -> ReaderResult:
+  """Reads a range of the file, through fd if set or a handle of its own."""
+  own_fd = fd is None
+  if own_fd:
+    fd = os.open(path, os.O_RDONLY)
+  try:
+    latencies_sec = []
+    num_bytes = 0
+    start_time_sec = time.time()
+    for offset in range(start, start + size, read_size):
+      read_start_sec = time.perf_counter()
+      num_bytes += len(os.pread(fd, min(read_size, start + size - offset),
+                                offset))
+      latencies_sec.append(time.perf_counter() - read_start_sec)
+    end_time_sec = time.time()
+  finally:
+    if own_fd:
+      os.close(fd)
+  return ReaderResult(reader, num_bytes, start_time_sec, end_time_sec,
+                      latencies_sec)
+
+
+def _run_thread(barrier, results, errors, *args) -> None:
+  """Reads a range in a thread, adding what it raises to errors."""
+  barrier.wait()
+  try:
+    results.append(_read_range(*args))
+  except Exception as e:
+    errors.append(e)
+
+
+def _run_process(barrier, queue, *args) -> None:
+  barrier.wait()
+  queue.put(_read_range(*args))
+
+
+def _get_results(queue, processes) -> List[ReaderResult]:
+  """Waits for the result of every reader process.
+
+  Raises:
+    RuntimeError: If a process exited without putting its result, in which
+      case the other processes are terminated.
+  """
+  results = []
+  while len(results) < len(processes):
+    try:
+      results.append(queue.get(timeout=POLL_INTERVAL_SEC))
+      continue
+    except queue_lib.Empty:
+      pass
+    failed = [(reader, process.exitcode)
+              for reader, process in enumerate(processes)
+              if process.exitcode not in (None, 0)]
+    if failed:
+      for process in processes:
+        process.terminate()
+        process.join()
+      raise RuntimeError('Reader processes failed, (reader, exit code): '
+                         f'{failed}')
+  return results
+
+
+def run_readers(path, ranges, read_size, mode='threads',
+                handles='shared') -> List[ReaderResult]:
+  """Reads the ranges of a file with one reader each, started together.
+
+  Raises:
+    Exception: The first exception raised by a reader thread.
+    RuntimeError: If a reader process failed.
+  """
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    # Evicts the pages of earlier runs, kept in the page cache by gcsfuse.
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    shared_fd = fd if handles == 'shared' else None
+    if mode == 'threads':
+      barrier = threading.Barrier(len(ranges))
+      results = []
+      errors = []
+      workers = [
+          threading.Thread(target=_run_thread,
+                           args=(barrier, results, errors, reader, shared_fd,
+                                 path, start, size, read_size))
+          for reader, (start, size) in enumerate(ranges)
+      ]
+    elif mode == 'processes':
+      # Forked readers inherit the shared file handle.
+      context = multiprocessing.get_context('fork')
+      barrier = context.Barrier(len(ranges))
+      queue = context.Queue()
+      workers = [
+          context.Process(target=_run_process,
+                          args=(barrier, queue, reader, shared_fd, path, start,
+                                size, read_size))
+          for reader, (start, size) in enumerate(ranges)
+      ]
+    else:
+      raise ValueError(f'Unknown mode {mode}, expected one of {MODES}')
+    for worker in workers:
+      worker.start()
+    if mode == 'processes':
+      results = _get_results(queue, workers)
+    for worker in workers:
+      worker.join()
+    if mode == 'threads' and errors:
+      raise errors[0]
+  finally:
+    os.close(fd)
+  return sorted(results, key=lambda r: r.reader)
+
+
+def get_rows(points: List[SweepPoint]) -> List[Dict[str, object]]:
+  """Returns one CSV row per sweep point.
+
+  The speedup and latency growth are relative to the point with one reader of
+  the same mode, handles and overlap.
+  """
+  base_points = {(p.mode, p.handles, p.overlap): p
+                 for p in points if p.num_readers == 1}
+  rows = []
+  for point in points:
+    latencies_sec = point.latencies_sec
+    mean_latency_sec = statistics.mean(latencies_sec)
+    speedup = latency_growth = efficiency = ''
+    base = base_points.get((point.mode, point.handles, point.overlap))
+    if base and base.aggregate_mb_per_sec:
+      speedup = point.aggregate_mb_per_sec / base.aggregate_mb_per_sec
+      efficiency = speedup / point.num_readers
+      latency_growth = mean_latency_sec / statistics.mean(base.latencies_sec)
+    rows.append({
+        'num_readers': point.num_readers,
+        'mode': point.mode,
+        'handles': point.handles,
+        'overlap': point.overlap,
+        'bytes': point.num_bytes,
+        'elapsed_sec': point.elapsed_sec,
+        'aggregate_mb_per_sec': point.aggregate_mb_per_sec,
+        'speedup': speedup,
+        'scaling_efficiency': efficiency,
+        'mean_latency_ms': mean_latency_sec * MS_PER_SEC,
+        'p50_latency_ms':
+            bench_utils.percentile(latencies_sec, 50) * MS_PER_SEC,
+        'p99_latency_ms':
+            bench_utils.percentile(latencies_sec, 99) * MS_PER_SEC,
+        'latency_growth': latency_growth,
+        'straggler_skew': point.straggler_skew,
+        'readers_opened': point.readers_opened,
+        'gcs_read_bytes': point.gcs_read_bytes,
+    })
+  return rows
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('path', help='File read by all the readers')
+  parser.add_argument(
+      '--num_readers',
+      type=lambda value: [int(v) for v in value.split(',')],
+      default=[1, 2, 4, 8, 16],
+      help='Comma separated numbers of readers to sweep')
+  parser.add_argument('--mode', choices=MODES, default='threads')
+  parser.add_argument('--handles', default=','.join(HANDLES),
+                      help='Comma separated handles of the readers: shared '
+                      'for one file handle, separate for one each')
+  parser.add_argument(
+      '--overlaps',
+      type=lambda value: [float(v) for v in value.split(',')],
+      default=[0.0, 1.0],
+      help='Comma separated fractions of the ranges shared by consecutive '
+      'readers, 0 for disjoint ranges')
+  parser.add_argument('--read_size_kb', type=int, default=1024)
+  parser.add_argument('--range_mb', type=int, default=0,
+                      help='Bytes read by every reader, the file size divided '
+                      'by the number of readers by default')
+  parser.add_argument('--fake_gcs_endpoint', default='',
+                      help='Endpoint of the fake GCS server the file is '
+                      'mounted from, e.g. http://localhost:9000, to count the '
+                      'GCS readers opened')
+  parser.add_argument('--drop_caches', action='store_true', default=False,
+                      help='Drop the kernel page cache before every run, '
+                      'requires root')
+  parser.add_argument('--output_file', default='concurrent_reads.csv')
+  args = parser.parse_args(argv[1:])
+
+  file_size = os.path.getsize(args.path)
+  read_size = args.read_size_kb * KB
+  points = []
+  for handles in args.handles.split(','):
+    if handles not in HANDLES:
+      raise ValueError(f'Unknown handles {handles}, expected one of {HANDLES}')
+    for overlap in args.overlaps:
+      for num_readers in args.num_readers:
+        ranges = get_ranges(file_size, num_readers, overlap, read_size,
+                            args.range_mb * MB)
+        if args.drop_caches:
+          bench_utils.drop_caches()
+        if args.fake_gcs_endpoint:
+          readers_before, bytes_before = bench_utils.fetch_fake_gcs_reads(
+              args.fake_gcs_endpoint)
+        point = SweepPoint(
+            num_readers, args.mode, handles, overlap,
+            run_readers(args.path, ranges, read_size, args.mode, handles))
+        if args.fake_gcs_endpoint:
+          readers_after, bytes_after = bench_utils.fetch_fake_gcs_reads(
+              args.fake_gcs_endpoint)
+          point.readers_opened = readers_after - readers_before
+          point.gcs_read_bytes = bytes_after - bytes_before
+        points.append(point)
+
+  rows = get_rows(points)
+  for row in rows:
+    line = (f'{row["num_readers"]} {args.mode} with {row["handles"]} handles, '
+            f'overlap {row["overlap"]}: {row["aggregate_mb_per_sec"]:.1f} MB/s')
+    if row['speedup'] != '':
+      line += (f', speedup {row["speedup"]:.2f}, mean latency '
+               f'x{row["latency_growth"]:.2f}')
+    if row['readers_opened'] >= 0:
+      line += f', {row["readers_opened"]} GCS readers opened'
+    print(line)
+
+  with open(args.output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,86 @@
+"""Tests for concurrent_read_benchmark."""
+import os
+import tempfile
+import unittest
+
+import concurrent_read_benchmark
+from concurrent_read_benchmark import KB, ReaderResult, SweepPoint
+
+
+class ConcurrentReadBenchmarkTest(unittest.TestCase):
+
+  def test_disjoint_ranges(self):
+    ranges = concurrent_read_benchmark.get_ranges(100, 3, 0, 4)
+
+    self.assertEqual([(0, 32), (32, 32), (64, 32)], ranges)
+
+  def test_overlapping_ranges(self):
+    half = concurrent_read_benchmark.get_ranges(100, 3, 0.5, 4, range_bytes=40)
+    same = concurrent_read_benchmark.get_ranges(100, 3, 1, 4)
+
+    self.assertEqual([(0, 40), (20, 40), (40, 40)], half)
+    self.assertEqual([(0, 32)] * 3, same)
+
+  def test_ranges_must_fit(self):
+    with self.assertRaises(ValueError):
+      concurrent_read_benchmark.get_ranges(100, 3, 0, 4, range_bytes=40)
+    with self.assertRaises(ValueError):
+      concurrent_read_benchmark.get_ranges(100, 3, 2, 4)
+
+  def test_run_readers(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, 'file')
+      with open(path, 'wb') as f:
+        f.write(os.urandom(64 * KB))
+      ranges = concurrent_read_benchmark.get_ranges(64 * KB, 4, 0, 4 * KB)
+
+      for mode in concurrent_read_benchmark.MODES:
+        for handles in concurrent_read_benchmark.HANDLES:
+          readers = concurrent_read_benchmark.run_readers(
+              path, ranges, 4 * KB, mode, handles)
+
+          self.assertEqual([0, 1, 2, 3], [r.reader for r in readers])
+          self.assertEqual([16 * KB] * 4, [r.num_bytes for r in readers])
+          self.assertEqual([4] * 4,
+                           [len(r.read_latencies_sec) for r in readers])
+
+  def test_failing_readers(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, 'file')
+      with open(path, 'wb') as f:
+        f.write(os.urandom(16 * KB))
+      ranges = concurrent_read_benchmark.get_ranges(16 * KB, 2, 0, 4 * KB)
+
+      # Reads of size 0 make every reader raise a ValueError.
+      with self.assertRaises(ValueError):
+        concurrent_read_benchmark.run_readers(path, ranges, 0, 'threads')
+      with self.assertRaises(RuntimeError):
+        concurrent_read_benchmark.run_readers(path, ranges, 0, 'processes')
+
+  def test_rows(self):
+    one = SweepPoint(1, 'threads', 'shared', 0,
+                     [ReaderResult(0, 100 * KB * KB, 0, 1, [0.01] * 100)])
+    # Two readers serialized: same throughput and twice the latency.
+    two = SweepPoint(2, 'threads', 'shared', 0, [
+        ReaderResult(0, 50 * KB * KB, 0, 1, [0.02] * 50),
+        ReaderResult(1, 50 * KB * KB, 0, 1, [0.02] * 50)
+    ])
+    separate = SweepPoint(2, 'threads', 'separate', 0, [
+        ReaderResult(0, 50 * KB * KB, 0, 0.5, [0.01] * 50),
+        ReaderResult(1, 50 * KB * KB, 0, 0.5, [0.01] * 50)
+    ])
+
+    rows = concurrent_read_benchmark.get_rows([one, two, separate])
+
+    self.assertEqual(100, rows[0]['aggregate_mb_per_sec'])
+    self.assertEqual(1, rows[1]['speedup'])
+    self.assertEqual(0.5, rows[1]['scaling_efficiency'])
+    self.assertAlmostEqual(2, rows[1]['latency_growth'])
+    self.assertAlmostEqual(20, rows[1]['p99_latency_ms'])
+    # No point with one reader and separate handles to compare with.
+    self.assertEqual('', rows[2]['speedup'])
+    self.assertEqual(200, rows[2]['aggregate_mb_per_sec'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,383 @@
+"""Measures the local file cache of gcsfuse (--experimental-local-file-cache).
+
+With the local file cache, gcsfuse downloads every object read into a cache
+file under --temp-dir (internal/contentcache), serves the later reads of the
+same generation from it, and on startup recovers the cache files left by the
+previous mount (RecoverCache) before the mount completes. The cache has no
+capacity of its own: it grows until the file system of the temp dir is full,
+so a working set larger than the cache is one larger than the free space of
+the temp dir, e.g. a tmpfs of a given size.
+
+This script mounts the bucket itself, with and without the cache, and:
+  - for every working set of --working_sets_mb, made of files of
+    --file_size_mb, reads all its files --passes times and reports the
+    throughput of every pass, the speedup of the cached mount over the uncached
+    one and the bytes in the temp dir. The kernel page cache of every file is
+    dropped before reading it, so that repeated reads reach gcsfuse.
+  - for every number of files of --recovery_files, fills the cache with them,
+    remounts and reports the mount time with the cache to recover against the
+    mount time with an empty temp dir, i.e. the startup penalty of the
+    recovery, and the throughput of reading the files after it.
+With --fake_gcs_endpoint, every pass also reports the bytes read from the fake
+GCS server, which are close to 0 for cache hits.
+
+The files are created under --data_dir in the bucket if missing. Cache files of
+earlier runs are deleted from the temp dir before every mount.
+
+To run the script:
+>> python3 content_cache_benchmark.py <bucket> <mount point> [--gcsfuse gcsfuse] [--gcsfuse_flags="--endpoint http://localhost:9000"] [--temp_dir /tmp/content_cache] [--unmount_command "fusermount -u"] [--data_dir content_cache_benchmark] [--working_sets_mb 256,4096] [--file_size_mb 16] [--passes 3] [--recovery_files 100,1000] [--recovery_file_size_kb 64] [--fake_gcs_endpoint http://localhost:9000] [--output_file content_cache.csv] [--recovery_output_file content_cache_recovery.csv]
+"""
+import argparse
+import csv
+import dataclasses
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+KB = 1024
+MB = 1024 * 1024
+# Prefix of the cache and metadata files of internal/contentcache.
+CACHE_FILE_PREFIX = 'gcsfusecache'
+CACHE_FLAG = '--experimental-local-file-cache'
+READ_SIZE = MB
+
+
+@dataclasses.dataclass
+class PassResult:
+  """Reads of all the files of a working set."""
+  working_set_bytes: int
+  cached: bool
+  index: int
+  num_bytes: int
+  elapsed_sec: float
+  # Bytes of the cache files in the temp dir after the pass.
+  cache_bytes: int = 0
+  gcs_read_bytes: int = -1
+
+  @property
+  def mb_per_sec(self) -> float:
+    return self.num_bytes / MB / self.elapsed_sec if self.elapsed_sec else 0.0
+
+
+@dataclasses.dataclass
+class RecoveryResult:
+  num_files: int
+  cache_files: int
+  cache_bytes: int
+  # Mount times with an empty temp dir and with the cache files to recover.
+  empty_mount_sec: float
+  recovered_mount_sec: float
+  # Reads of all the files after the recovery.
+  read_bytes: int
+  read_sec: float
+  gcs_read_bytes: int = -1
+
+  @property
+  def penalty_sec(self) -> float:
+    return self.recovered_mount_sec - self.empty_mount_sec
+
+  @property
+  def read_mb_per_sec(self) -> float:
+    return self.read_bytes / MB / self.read_sec if self.read_sec else 0.0
+
+
+class Mount:
+  """Mounts and unmounts a bucket with gcsfuse."""
+
+  def __init__(self, bucket, mount_point, gcsfuse='gcsfuse', flags='',
+               unmount_command='fusermount -u'):
+    self.bucket = bucket
+    self.mount_point = mount_point
+    self.gcsfuse = gcsfuse
+    self.flags = shlex.split(flags)
+    self.unmount_command = shlex.split(unmount_command)
+
+  def get_command(self, temp_dir=None) -> List[str]:
+    """Returns the gcsfuse command, with the local file cache if temp_dir."""
+    command = [self.gcsfuse] + self.flags
+    if temp_dir:
+      command += [CACHE_FLAG, '--temp-dir', temp_dir]
+    return command + [self.bucket, self.mount_point]
+
+  def mount(self, temp_dir=None) -> float:
+    """Mounts the bucket and returns the seconds until it is mounted.
+
+    gcsfuse returns once the file system is mounted, after recovering the
+    cache.
+    """
+    start_sec = time.perf_counter()
+    subprocess.run(self.get_command(temp_dir), check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start_sec
+
+  def unmount(self) -> None:
+    subprocess.run(self.unmount_command + [self.mount_point], check=True)
+
+
+def get_paths(directory, num_files) -> List[str]:
+  return [os.path.join(directory, f'file_{i:06d}') for i in range(num_files)]
+
+
+def create_files(paths, file_size) -> int:
+  """Creates the files that are missing or of another size.
+
+  Returns:
+    The number of files created.
+  """
+  data = os.urandom(min(file_size, READ_SIZE))
+  created = 0
+  for path in paths:
+    if os.path.exists(path) and os.path.getsize(path) == file_size:
+      continue
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+      for offset in range(0, file_size, len(data)):
+        f.write(data[:file_size - offset])
+    created += 1
+  return created
+
+
+def read_files(paths) -> Tuple[int, float]:
+  """Reads the files, dropping their pages from the kernel page cache first.
+
+  Returns:
+    The bytes read and the seconds spent.
+  """
+  num_bytes = 0
+  start_sec = time.perf_counter()
+  for path in paths:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+      os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+      while True:
+        chunk = os.read(fd, READ_SIZE)
+        if not chunk:
+          break
+        num_bytes += len(chunk)
+    finally:
+      os.close(fd)
+  return num_bytes, time.perf_counter() - start_sec
+
+
+def get_cache_size(temp_dir) -> Tuple[int, int]:
+  """Returns the number of cache files in the temp dir and their bytes.
+
+  The bytes include the metadata files of the cache files.
+  """
+  num_files = num_bytes = 0
+  with os.scandir(temp_dir) as entries:
+    for entry in entries:
+      if entry.name.startswith(CACHE_FILE_PREFIX) and entry.is_file():
+        num_bytes += entry.stat().st_size
+        if not entry.name.endswith('.json'):
+          num_files += 1
+  return num_files, num_bytes
+
+
+def clear_cache(temp_dir) -> None:
+  """Deletes the cache files of gcsfuse, and only them, from the temp dir."""
+  with os.scandir(temp_dir) as entries:
+    for entry in entries:
+      if entry.name.startswith(CACHE_FILE_PREFIX) and entry.is_file():
+        os.remove(entry.path)
+
+
+def get_pass_rows(results: List[PassResult]) -> List[Dict[str, object]]:
+  """Returns one CSV row per pass.
+
+  The speedup of a cached pass is over the uncached pass of the same working
+  set and index.
+  """
+  uncached = {(r.working_set_bytes, r.index): r
+              for r in results if not r.cached}
+  rows = []
+  for result in results:
+    speedup = ''
+    base = uncached.get((result.working_set_bytes, result.index))
+    if result.cached and base and base.mb_per_sec:
+      speedup = result.mb_per_sec / base.mb_per_sec
+    rows.append({
+        'working_set_bytes': result.working_set_bytes,
+        'cached': result.cached,
+        'pass': result.index,
+        'bytes': result.num_bytes,
+        'elapsed_sec': result.elapsed_sec,
+        'mb_per_sec': result.mb_per_sec,
+        'speedup': speedup,
+        'cache_bytes': result.cache_bytes,
+        'gcs_read_bytes': result.gcs_read_bytes,
+    })
+  return rows
+
+
+def get_recovery_rows(
+    results: List[RecoveryResult]) -> List[Dict[str, object]]:
+  return [{
+      'num_files': r.num_files,
+      'cache_files': r.cache_files,
+      'cache_bytes': r.cache_bytes,
+      'empty_mount_sec': r.empty_mount_sec,
+      'recovered_mount_sec': r.recovered_mount_sec,
+      'penalty_sec': r.penalty_sec,
+      'read_mb_per_sec': r.read_mb_per_sec,
+      'gcs_read_bytes': r.gcs_read_bytes,
+  } for r in results]
+
+
+def run_passes(mount: Mount, paths, num_passes, cached, temp_dir,
+               fetch_read_bytes=None) -> List[PassResult]:
+  """Mounts the bucket and reads the files num_passes times."""
+  clear_cache(temp_dir)
+  mount.mount(temp_dir if cached else None)
+  results = []
+  try:
+    working_set_bytes = sum(os.path.getsize(path) for path in paths)
+    for index in range(num_passes):
+      read_bytes_before = fetch_read_bytes() if fetch_read_bytes else 0
+      num_bytes, elapsed_sec = read_files(paths)
+      result = PassResult(working_set_bytes, cached, index, num_bytes,
+                          elapsed_sec, get_cache_size(temp_dir)[1])
+      if fetch_read_bytes:
+        result.gcs_read_bytes = fetch_read_bytes() - read_bytes_before
+      results.append(result)
+  finally:
+    mount.unmount()
+  return results
+
+
+def run_recovery(mount: Mount, paths, temp_dir,
+                 fetch_read_bytes=None) -> RecoveryResult:
+  """Fills the cache with the files and times the mount recovering it."""
+  clear_cache(temp_dir)
+  empty_mount_sec = mount.mount(temp_dir)
+  try:
+    read_files(paths)
+  finally:
+    mount.unmount()
+  cache_files, cache_bytes = get_cache_size(temp_dir)
+  recovered_mount_sec = mount.mount(temp_dir)
+  try:
+    read_bytes_before = fetch_read_bytes() if fetch_read_bytes else 0
+    read_bytes, read_sec = read_files(paths)
+    result = RecoveryResult(len(paths), cache_files, cache_bytes,
+                            empty_mount_sec, recovered_mount_sec, read_bytes,
+                            read_sec)
+    if fetch_read_bytes:
+      result.gcs_read_bytes = fetch_read_bytes() - read_bytes_before
+  finally:
+    mount.unmount()
+  return result
+
+
+def _write_csv(output_file, rows) -> None:
+  with open(output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def _int_list(value) -> List[int]:
+  return [int(v) for v in value.split(',') if v]
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('bucket')
+  parser.add_argument('mount_point')
+  parser.add_argument('--gcsfuse', default='gcsfuse',
+                      help='Path of the gcsfuse binary')
+  parser.add_argument('--gcsfuse_flags', default='',
+                      help='Flags of every mount, e.g. '
+                      '--gcsfuse_flags="--endpoint http://localhost:9000"')
+  parser.add_argument('--temp_dir',
+                      default=os.path.join(tempfile.gettempdir(),
+                                           'content_cache'),
+                      help='Temp dir of the cache, whose free space bounds '
+                      'the cache')
+  parser.add_argument('--unmount_command', default='fusermount -u')
+  parser.add_argument('--data_dir', default='content_cache_benchmark',
+                      help='Directory of the files in the bucket')
+  parser.add_argument('--working_sets_mb', type=_int_list, default=[256, 4096])
+  parser.add_argument('--file_size_mb', type=int, default=16)
+  parser.add_argument('--passes', type=int, default=3)
+  parser.add_argument('--recovery_files', type=_int_list, default=[100, 1000],
+                      help='Comma separated numbers of cached files to '
+                      'recover, empty to skip the recovery')
+  parser.add_argument('--recovery_file_size_kb', type=int, default=64)
+  parser.add_argument('--fake_gcs_endpoint', default='',
+                      help='Endpoint of the fake GCS server the bucket is '
+                      'mounted from, e.g. http://localhost:9000, to count the '
+                      'bytes read from GCS')
+  parser.add_argument('--output_file', default='content_cache.csv')
+  parser.add_argument('--recovery_output_file',
+                      default='content_cache_recovery.csv')
+  args = parser.parse_args(argv[1:])
+
+  os.makedirs(args.temp_dir, exist_ok=True)
+  mount = Mount(args.bucket, args.mount_point, args.gcsfuse,
+                args.gcsfuse_flags, args.unmount_command)
+  data_dir = os.path.join(args.mount_point, args.data_dir)
+  file_size = args.file_size_mb * MB
+  working_sets = {
+      working_set_mb:
+      get_paths(os.path.join(data_dir, f'working_set_{working_set_mb}mb'),
+                max(1, working_set_mb // args.file_size_mb))
+      for working_set_mb in args.working_sets_mb
+  }
+  recovery_sets = {
+      num_files: get_paths(os.path.join(data_dir, 'recovery'), num_files)
+      for num_files in args.recovery_files
+  }
+  mount.mount()
+  try:
+    for paths in working_sets.values():
+      create_files(paths, file_size)
+    if recovery_sets:
+      create_files(recovery_sets[max(recovery_sets)],
+                   args.recovery_file_size_kb * KB)
+  finally:
+    mount.unmount()
+  free_bytes = (os.statvfs(args.temp_dir).f_bavail *
+                os.statvfs(args.temp_dir).f_frsize)
+  fetch_read_bytes = None
+  if args.fake_gcs_endpoint:
+    fetch_read_bytes = lambda: bench_utils.fetch_fake_gcs_reads(
+        args.fake_gcs_endpoint)[1]
+
+  pass_results = []
+  for working_set_mb, paths in working_sets.items():
+    larger = ' (larger than the free space of the temp dir)' if (
+        working_set_mb * MB > free_bytes) else ''
+    for cached in [False, True]:
+      results = run_passes(mount, paths, args.passes, cached, args.temp_dir,
+                           fetch_read_bytes)
+      pass_results.extend(results)
+      print(f'{working_set_mb}MB{larger}, '
+            f'{"cached" if cached else "uncached"}: ' +
+            ', '.join(f'{r.mb_per_sec:.1f}' for r in results) +
+            f' MB/s, {results[-1].cache_bytes // MB}MB in the temp dir')
+  _write_csv(args.output_file, get_pass_rows(pass_results))
+
+  recovery_results = []
+  for num_files, paths in recovery_sets.items():
+    result = run_recovery(mount, paths, args.temp_dir, fetch_read_bytes)
+    recovery_results.append(result)
+    print(f'{num_files} files ({result.cache_bytes // KB}KiB cached): mount '
+          f'{result.recovered_mount_sec:.2f}s with recovery, '
+          f'{result.empty_mount_sec:.2f}s empty, then '
+          f'{result.read_mb_per_sec:.1f} MB/s')
+  clear_cache(args.temp_dir)
+  if recovery_results:
+    _write_csv(args.recovery_output_file, get_recovery_rows(recovery_results))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
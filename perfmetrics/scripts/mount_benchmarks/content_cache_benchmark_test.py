@@ -0,0 +1,99 @@
+"""Tests for content_cache_benchmark."""
+import os
+import tempfile
+import unittest
+
+import content_cache_benchmark
+from content_cache_benchmark import KB, MB, PassResult
+
+
+class ContentCacheBenchmarkTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.data_dir = os.path.join(self.temp_dir.name, 'data')
+    self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+    os.mkdir(self.cache_dir)
+    # Mounting and unmounting does nothing, the files are local.
+    self.mount = content_cache_benchmark.Mount('bucket', self.data_dir, 'true',
+                                               unmount_command='true')
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+    super().tearDown()
+
+  def _write(self, name, size):
+    with open(os.path.join(self.cache_dir, name), 'wb') as f:
+      f.write(b'x' * size)
+
+  def test_mount_command(self):
+    mount = content_cache_benchmark.Mount(
+        'bucket', 'gcs', '/bin/gcsfuse', '--endpoint "http://localhost:9000"')
+
+    self.assertEqual(
+        ['/bin/gcsfuse', '--endpoint', 'http://localhost:9000', 'bucket', 'gcs'],
+        mount.get_command())
+    self.assertEqual([
+        '/bin/gcsfuse', '--endpoint', 'http://localhost:9000',
+        '--experimental-local-file-cache', '--temp-dir', '/tmp/c', 'bucket',
+        'gcs'
+    ], mount.get_command('/tmp/c'))
+
+  def test_create_and_read_files(self):
+    paths = content_cache_benchmark.get_paths(self.data_dir, 3)
+
+    created = content_cache_benchmark.create_files(paths, 100 * KB)
+    created_again = content_cache_benchmark.create_files(paths, 100 * KB)
+    num_bytes, _ = content_cache_benchmark.read_files(paths)
+
+    self.assertEqual(3, created)
+    self.assertEqual(0, created_again)
+    self.assertEqual(300 * KB, num_bytes)
+    self.assertEqual(os.path.join(self.data_dir, 'file_000002'), paths[-1])
+
+  def test_cache_size_and_clear(self):
+    self._write('gcsfusecache123', 1000)
+    self._write('gcsfusecache123.json', 10)
+    self._write('other', 5)
+
+    self.assertEqual((1, 1010),
+                     content_cache_benchmark.get_cache_size(self.cache_dir))
+    content_cache_benchmark.clear_cache(self.cache_dir)
+    self.assertEqual(['other'], os.listdir(self.cache_dir))
+
+  def test_run_passes_and_recovery(self):
+    paths = content_cache_benchmark.get_paths(self.data_dir, 2)
+    content_cache_benchmark.create_files(paths, 10 * KB)
+    self._write('gcsfusecache1', 10)
+
+    results = content_cache_benchmark.run_passes(self.mount, paths, 2, True,
+                                                 self.cache_dir)
+    recovery = content_cache_benchmark.run_recovery(self.mount, paths,
+                                                    self.cache_dir)
+
+    self.assertEqual([0, 1], [r.index for r in results])
+    self.assertEqual(20 * KB, results[0].working_set_bytes)
+    # The cache of an earlier run is deleted.
+    self.assertEqual(0, results[0].cache_bytes)
+    self.assertEqual(20 * KB, recovery.read_bytes)
+    self.assertEqual(-1, recovery.gcs_read_bytes)
+
+  def test_pass_rows(self):
+    results = [
+        PassResult(MB, False, 0, MB, 1),
+        PassResult(MB, True, 0, MB, 2, cache_bytes=MB),
+        PassResult(MB, True, 1, MB, 0.25, cache_bytes=MB),
+    ]
+
+    rows = content_cache_benchmark.get_pass_rows(results)
+
+    self.assertEqual('', rows[0]['speedup'])
+    self.assertEqual(0.5, rows[1]['speedup'])
+    # No uncached pass 1 to compare with.
+    self.assertEqual('', rows[2]['speedup'])
+    self.assertEqual(4, rows[2]['mb_per_sec'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,437 @@
+"""Measures the metadata caches of gcsfuse against writes by another client.
+
+gcsfuse caches object metadata in the stat cache (--stat-cache-capacity
+entries, kept for --stat-cache-ttl, gcscaching.fastStatBucket), lets the kernel
+cache attributes and directory entries for --stat-cache-ttl as well
+(internal/fs) and caches whether a name is a file or a directory for
+--type-cache-ttl (internal/fs/inode.typeCache). Longer TTLs and larger caches
+spare GCS metadata requests and lookup latency, at the cost of serving metadata
+that another client has already changed.
+
+This script mounts the bucket itself once per point of the sweep of
+--stat_cache_capacities x --stat_cache_ttls_sec x --type_cache_ttls_sec. On
+every mount, --num_readers threads stat random files of --num_files for
+--duration_sec, while a writer thread rewrites random objects directly in the
+backend, --writes_per_sec times a second, through the JSON API of the fake GCS
+server of fake_gcs, with a size one byte larger than their last one. The size
+of a file seen by a lookup tells the version it saw, so for every point the
+script reports:
+  - the lookups per second and the percentiles of the lookup latency,
+  - the GCS metadata requests (objects.get and objects.list) per second and
+    per lookup, from the stats of the fake GCS server,
+  - the fraction of stale lookups and the staleness of the stale ones, i.e.
+    the seconds since the version they saw was replaced.
+A fraction --missing_fraction of the files is only created by the writer, so
+that stale lookups include missing files cached as missing.
+
+The objects are created under --data_dir in the bucket, and rewritten to their
+first version before every point.
+
+To run the script against the fake GCS server:
+>> python3 fake_gcs/fake_gcs_server.py --port 9000 --bucket your-bucket-name &
+>> python3 mount_benchmarks/metadata_cache_benchmark.py your-bucket-name gcs --endpoint http://localhost:9000 [--gcsfuse gcsfuse] [--gcsfuse_flags ""] [--unmount_command "fusermount -u"] [--data_dir metadata_cache_benchmark] [--num_files 1000] [--missing_fraction 0.1] [--stat_cache_capacities 100,4096] [--stat_cache_ttls_sec 0,1,10,60] [--type_cache_ttls_sec 0,60] [--duration_sec 30] [--num_readers 4] [--writes_per_sec 20] [--seed 0] [--output_file metadata_cache.csv]
+"""
+import argparse
+import bisect
+import csv
+import dataclasses
+import math
+import os
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+MS_PER_SEC = 1000
+PERCENTILES = [50, 90, 99]
+
+
+@dataclasses.dataclass(frozen=True)
+class Config:
+  """Metadata cache flags of a mount."""
+  stat_cache_capacity: int
+  stat_cache_ttl_sec: int
+  type_cache_ttl_sec: int
+
+  def get_flags(self) -> List[str]:
+    return [
+        '--stat-cache-capacity', str(self.stat_cache_capacity),
+        '--stat-cache-ttl', f'{self.stat_cache_ttl_sec}s',
+        '--type-cache-ttl', f'{self.type_cache_ttl_sec}s'
+    ]
+
+
+@dataclasses.dataclass
+class PointResult:
+  """Lookups through a mount with a config while the writer ran."""
+  config: Config
+  elapsed_sec: float
+  latencies_sec: List[float]
+  # Seconds since the version seen was replaced, of the stale lookups.
+  staleness_sec: List[float]
+  num_writes: int
+  gcs_metadata_requests: int = -1
+
+  @property
+  def num_lookups(self) -> int:
+    return len(self.latencies_sec)
+
+
+class VersionLog:
+  """Sizes the writer gave every object, and when, safe across threads.
+
+  Every version of an object is one byte larger than the previous one, so the
+  size seen by a lookup identifies the version it saw. None is the size of a
+  missing object. A write is logged before it starts, with no end until it
+  ends, so that a lookup seeing it meanwhile finds its version.
+  """
+
+  def __init__(self, sizes: Dict[str, Optional[int]], time_sec=0.0):
+    self._lock = threading.Lock()
+    # Start time, end time and size of every write of every object.
+    self._writes = {
+        name: [(time_sec, time_sec, size)] for name, size in sizes.items()
+    }
+
+  def get_size(self, name) -> Optional[int]:
+    with self._lock:
+      return self._writes[name][-1][2]
+
+  def add(self, name, start_sec, end_sec, size) -> None:
+    with self._lock:
+      self._writes[name].append((start_sec, end_sec, size))
+
+  def start_write(self, name, start_sec, size) -> None:
+    """Logs a write of an object that has started and not ended yet."""
+    self.add(name, start_sec, math.inf, size)
+
+  def end_write(self, name, end_sec) -> None:
+    """Sets the end of the last write of an object."""
+    with self._lock:
+      start_sec, _, size = self._writes[name][-1]
+      self._writes[name][-1] = (start_sec, end_sec, size)
+
+  def get_staleness(self, name, size, start_sec, end_sec) -> float:
+    """Returns how stale the size of an object seen by a lookup was.
+
+    A lookup is fresh if it saw the version current when it started or one
+    written while it ran.
+
+    Args:
+      name: Name of the object.
+      size: Size seen, None if the object was missing.
+      start_sec: Time the lookup started.
+      end_sec: Time the lookup ended.
+
+    Returns:
+      0 if the lookup was fresh, else the seconds from the end of the write
+      replacing the version seen to the start of the lookup.
+
+    Raises:
+      ValueError: The size is of no version of the object.
+    """
+    with self._lock:
+      writes = list(self._writes[name])
+    ends = [end for _, end, _ in writes]
+    current = max(0, bisect.bisect_right(ends, start_sec) - 1)
+    fresh_sizes = {writes[current][2]} | {
+        write_size for write_start_sec, _, write_size in writes[current + 1:]
+        if write_start_sec < end_sec
+    }
+    if size in fresh_sizes:
+      return 0.0
+    for index in range(current - 1, -1, -1):
+      if writes[index][2] == size:
+        return start_sec - writes[index + 1][1]
+    raise ValueError(f'{name} was never of size {size}')
+
+
+def get_configs(capacities, stat_cache_ttls_sec,
+                type_cache_ttls_sec) -> List[Config]:
+  return [
+      Config(capacity, stat_ttl, type_ttl) for capacity in capacities
+      for stat_ttl in stat_cache_ttls_sec for type_ttl in type_cache_ttls_sec
+  ]
+
+
+def get_names(data_dir, num_files) -> List[str]:
+  return [f'{data_dir}/file_{i:06d}' for i in range(num_files)]
+
+
+def get_initial_sizes(names, missing_fraction) -> Dict[str, Optional[int]]:
+  """Returns the first size of every object, None for the missing ones."""
+  num_missing = int(len(names) * missing_fraction)
+  return {
+      name: None if i >= len(names) - num_missing else 1
+      for i, name in enumerate(names)
+  }
+
+
+def upload_object(endpoint, bucket, name, data) -> None:
+  """Writes an object through the JSON API, bypassing the mount."""
+  query = urllib.parse.urlencode({'uploadType': 'media', 'name': name})
+  request = urllib.request.Request(
+      f'{endpoint}/upload/storage/v1/b/{urllib.parse.quote(bucket, safe="")}'
+      f'/o?{query}', data=data, method='POST',
+      headers={'Content-Type': 'application/octet-stream'})
+  with urllib.request.urlopen(request) as response:
+    response.read()
+
+
+def delete_object(endpoint, bucket, name) -> None:
+  """Deletes an object through the JSON API, if it exists."""
+  request = urllib.request.Request(
+      f'{endpoint}/storage/v1/b/{urllib.parse.quote(bucket, safe="")}/o/'
+      f'{urllib.parse.quote(name, safe="")}', method='DELETE')
+  try:
+    with urllib.request.urlopen(request) as response:
+      response.read()
+  except urllib.error.HTTPError as e:
+    if e.code != 404:
+      raise
+
+
+def reset_objects(endpoint, bucket, data_dir,
+                  sizes: Dict[str, Optional[int]]) -> None:
+  """Writes the directory and the first version of every object."""
+  upload_object(endpoint, bucket, f'{data_dir}/', b'')
+  for name, size in sizes.items():
+    if size is None:
+      delete_object(endpoint, bucket, name)
+    else:
+      upload_object(endpoint, bucket, name, b'x' * size)
+
+
+def run_writer(write, log: VersionLog, names, writes_per_sec, stop, seed=0,
+               clock=time.monotonic) -> int:
+  """Rewrites random objects one byte larger until stop is set.
+
+  Args:
+    write: Function writing the object of a name with a size.
+    log: Versions of the objects, updated with every write.
+    names: Names of the objects.
+    writes_per_sec: Rate of the writes.
+    stop: threading.Event ending the writes.
+    seed: Seed of the random names.
+    clock: Function returning the time of the log.
+
+  Returns:
+    The number of writes.
+  """
+  rng = random.Random(seed)
+  num_writes = 0
+  start_sec = clock()
+  while not stop.is_set():
+    name = rng.choice(names)
+    size = (log.get_size(name) or 0) + 1
+    log.start_write(name, clock(), size)
+    write(name, size)
+    log.end_write(name, clock())
+    num_writes += 1
+    stop.wait(max(0.0, start_sec + num_writes / writes_per_sec - clock()))
+  return num_writes
+
+
+def lookup(path) -> Optional[int]:
+  """Returns the size of a file, None if it is missing."""
+  try:
+    return os.stat(path).st_size
+  except FileNotFoundError:
+    return None
+
+
+def _run_lookups(mount_point, names, log, duration_sec, seed, clock,
+                 latencies_sec, staleness_sec) -> None:
+  rng = random.Random(seed)
+  end_sec = clock() + duration_sec
+  while True:
+    name = rng.choice(names)
+    start_sec = clock()
+    if start_sec >= end_sec:
+      return
+    size = lookup(os.path.join(mount_point, name))
+    lookup_end_sec = clock()
+    latencies_sec.append(lookup_end_sec - start_sec)
+    staleness = log.get_staleness(name, size, start_sec, lookup_end_sec)
+    if staleness:
+      staleness_sec.append(staleness)
+
+
+def _run_and_catch(errors, function, *args):
+  """Runs a function in a thread, adding what it raises to errors."""
+  try:
+    return function(*args)
+  except Exception as e:
+    errors.append(e)
+
+
+def run_point(config, mount_point, names, log, write, duration_sec,
+              num_readers, writes_per_sec, seed=0,
+              clock=time.monotonic) -> PointResult:
+  """Stats random files with num_readers threads while the writer runs.
+
+  Raises:
+    Exception: The first exception raised by a reader or the writer.
+  """
+  latencies_sec = []
+  staleness_sec = []
+  errors = []
+  readers = [
+      threading.Thread(target=_run_and_catch,
+                       args=(errors, _run_lookups, mount_point, names, log,
+                             duration_sec, seed + reader + 1, clock,
+                             latencies_sec, staleness_sec))
+      for reader in range(num_readers)
+  ]
+  stop = threading.Event()
+  writes = []
+  writer = threading.Thread(
+      target=lambda: writes.append(
+          _run_and_catch(errors, run_writer, write, log, names,
+                         writes_per_sec, stop, seed, clock)))
+  start_sec = time.perf_counter()
+  writer.start()
+  for reader in readers:
+    reader.start()
+  for reader in readers:
+    reader.join()
+  elapsed_sec = time.perf_counter() - start_sec
+  stop.set()
+  writer.join()
+  if errors:
+    raise errors[0]
+  return PointResult(config, elapsed_sec, latencies_sec, staleness_sec,
+                     writes[0] if writes else 0)
+
+
+def get_rows(results: List[PointResult]) -> List[Dict[str, object]]:
+  """Returns one CSV row per config."""
+  rows = []
+  for result in results:
+    config = result.config
+    row = {
+        'stat_cache_capacity': config.stat_cache_capacity,
+        'stat_cache_ttl_sec': config.stat_cache_ttl_sec,
+        'type_cache_ttl_sec': config.type_cache_ttl_sec,
+        'lookups': result.num_lookups,
+        'lookups_per_sec': result.num_lookups / result.elapsed_sec,
+        'writes': result.num_writes,
+    }
+    for percentile in PERCENTILES:
+      row[f'p{percentile}_lookup_ms'] = bench_utils.percentile(
+          result.latencies_sec, percentile) * MS_PER_SEC
+    row['gcs_metadata_requests'] = result.gcs_metadata_requests
+    row['gcs_metadata_requests_per_sec'] = ''
+    row['gcs_metadata_requests_per_lookup'] = ''
+    if result.gcs_metadata_requests >= 0:
+      row['gcs_metadata_requests_per_sec'] = (result.gcs_metadata_requests /
+                                              result.elapsed_sec)
+      row['gcs_metadata_requests_per_lookup'] = (result.gcs_metadata_requests /
+                                                 result.num_lookups)
+    row['stale_fraction'] = len(result.staleness_sec) / result.num_lookups
+    row['mean_staleness_sec'] = ''
+    row['max_staleness_sec'] = ''
+    if result.staleness_sec:
+      row['mean_staleness_sec'] = (sum(result.staleness_sec) /
+                                   len(result.staleness_sec))
+      row['max_staleness_sec'] = max(result.staleness_sec)
+    rows.append(row)
+  return rows
+
+
+def _mount(gcsfuse, flags, bucket, mount_point) -> None:
+  subprocess.run([gcsfuse] + flags + [bucket, mount_point], check=True,
+                 stdout=subprocess.DEVNULL)
+
+
+def _int_list(value) -> List[int]:
+  return [int(v) for v in value.split(',')]
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('bucket')
+  parser.add_argument('mount_point')
+  parser.add_argument('--endpoint', required=True,
+                      help='Endpoint of the fake GCS server, e.g. '
+                      'http://localhost:9000, mounted and written to by the '
+                      'writer without authentication')
+  parser.add_argument('--gcsfuse', default='gcsfuse',
+                      help='Path of the gcsfuse binary')
+  parser.add_argument('--gcsfuse_flags', default='',
+                      help='Other flags of every mount')
+  parser.add_argument('--unmount_command', default='fusermount -u')
+  parser.add_argument('--data_dir', default='metadata_cache_benchmark',
+                      help='Directory of the objects in the bucket')
+  parser.add_argument('--num_files', type=int, default=1000)
+  parser.add_argument('--missing_fraction', type=float, default=0.1,
+                      help='Fraction of the files missing until the writer '
+                      'creates them')
+  parser.add_argument('--stat_cache_capacities', type=_int_list,
+                      default=[100, 4096])
+  parser.add_argument('--stat_cache_ttls_sec', type=_int_list,
+                      default=[0, 1, 10, 60])
+  parser.add_argument('--type_cache_ttls_sec', type=_int_list, default=[0, 60])
+  parser.add_argument('--duration_sec', type=float, default=30,
+                      help='Duration of the lookups of every config')
+  parser.add_argument('--num_readers', type=int, default=4)
+  parser.add_argument('--writes_per_sec', type=float, default=20)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--output_file', default='metadata_cache.csv')
+  args = parser.parse_args(argv[1:])
+
+  names = get_names(args.data_dir, args.num_files)
+  initial_sizes = get_initial_sizes(names, args.missing_fraction)
+  write = lambda name, size: upload_object(args.endpoint, args.bucket, name,
+                                           b'x' * size)
+  flags = ['--endpoint', args.endpoint] + shlex.split(args.gcsfuse_flags)
+  results = []
+  for config in get_configs(args.stat_cache_capacities,
+                            args.stat_cache_ttls_sec,
+                            args.type_cache_ttls_sec):
+    reset_objects(args.endpoint, args.bucket, args.data_dir, initial_sizes)
+    log = VersionLog(initial_sizes, time.monotonic())
+    _mount(args.gcsfuse, flags + config.get_flags(), args.bucket,
+           args.mount_point)
+    try:
+      requests_before = bench_utils.fetch_fake_gcs_metadata_requests(
+          args.endpoint)
+      result = run_point(config, args.mount_point, names, log, write,
+                         args.duration_sec, args.num_readers,
+                         args.writes_per_sec, args.seed)
+      result.gcs_metadata_requests = (
+          bench_utils.fetch_fake_gcs_metadata_requests(args.endpoint) -
+          requests_before)
+    finally:
+      subprocess.run(shlex.split(args.unmount_command) + [args.mount_point],
+                     check=True)
+    results.append(result)
+
+  rows = get_rows(results)
+  for row in rows:
+    print(f'capacity {row["stat_cache_capacity"]}, stat TTL '
+          f'{row["stat_cache_ttl_sec"]}s, type TTL '
+          f'{row["type_cache_ttl_sec"]}s: {row["lookups_per_sec"]:.0f} '
+          f'lookups/s, p50 {row["p50_lookup_ms"]:.2f}ms p99 '
+          f'{row["p99_lookup_ms"]:.2f}ms, '
+          f'{row["gcs_metadata_requests_per_sec"]:.0f} GCS metadata '
+          f'requests/s, {row["stale_fraction"]:.1%} stale')
+
+  with open(args.output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,185 @@
+"""Tests for metadata_cache_benchmark."""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+import metadata_cache_benchmark
+from metadata_cache_benchmark import Config, PointResult, VersionLog
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+fake_gcs_server = bench_utils.import_fake_gcs_server()
+import object_store
+
+BUCKET = 'bucket'
+
+
+class VersionLogTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.log = VersionLog({'a': 1, 'b': None})
+    self.log.add('a', 10, 11, 2)
+    self.log.add('a', 20, 21, 3)
+    self.log.add('b', 5, 6, 1)
+
+  def test_fresh_lookups(self):
+    self.assertEqual(0, self.log.get_staleness('a', 1, 1, 2))
+    self.assertEqual(0, self.log.get_staleness('a', 2, 15, 16))
+    # Versions written while the lookup ran are fresh too.
+    self.assertEqual(0, self.log.get_staleness('a', 2, 10.5, 10.6))
+    self.assertEqual(0, self.log.get_staleness('a', 3, 19, 20.5))
+    self.assertEqual(0, self.log.get_staleness('b', None, 4, 5))
+    self.assertEqual(3, self.log.get_size('a'))
+
+  def test_stale_lookups(self):
+    self.assertEqual(4, self.log.get_staleness('a', 1, 15, 16))
+    self.assertEqual(14, self.log.get_staleness('a', 1, 25, 26))
+    self.assertEqual(4, self.log.get_staleness('a', 2, 25, 26))
+    self.assertEqual(2, self.log.get_staleness('b', None, 8, 9))
+
+  def test_pending_write(self):
+    self.log.start_write('a', 30, 4)
+
+    # Both the version being written and the one it replaces are fresh.
+    self.assertEqual(0, self.log.get_staleness('a', 4, 30.5, 30.6))
+    self.assertEqual(0, self.log.get_staleness('a', 3, 31, 32))
+    self.assertEqual(4, self.log.get_size('a'))
+    self.log.end_write('a', 33)
+    self.assertEqual(2, self.log.get_staleness('a', 3, 35, 36))
+
+  def test_unknown_size(self):
+    with self.assertRaises(ValueError):
+      self.log.get_staleness('a', 7, 25, 26)
+
+
+class MetadataCacheBenchmarkTest(unittest.TestCase):
+
+  def test_configs(self):
+    configs = metadata_cache_benchmark.get_configs([100, 4096], [0, 60], [60])
+
+    self.assertEqual(4, len(configs))
+    self.assertEqual([
+        '--stat-cache-capacity', '4096', '--stat-cache-ttl', '0s',
+        '--type-cache-ttl', '60s'
+    ], configs[2].get_flags())
+
+  def test_initial_sizes(self):
+    names = metadata_cache_benchmark.get_names('dir', 10)
+
+    sizes = metadata_cache_benchmark.get_initial_sizes(names, 0.2)
+
+    self.assertEqual('dir/file_000009', names[-1])
+    self.assertEqual([1] * 8 + [None] * 2, list(sizes.values()))
+
+  def test_reset_and_upload_objects(self):
+    store = object_store.MemoryObjectStore()
+    store.create_bucket(BUCKET)
+    server = fake_gcs_server.start_server(store)
+    self.addCleanup(server.shutdown)
+    metadata_cache_benchmark.upload_object(server.endpoint, BUCKET, 'dir/b',
+                                           b'xx')
+
+    metadata_cache_benchmark.reset_objects(server.endpoint, BUCKET, 'dir', {
+        'dir/a': 1,
+        'dir/b': None
+    })
+
+    self.assertEqual(['dir/', 'dir/a'],
+                     [m.name for m in store.list(BUCKET, '')[0]])
+    self.assertEqual(1, store.get_metadata(BUCKET, 'dir/a').size)
+
+  def test_run_point(self):
+    # The writer replaces local files, which lookups always see fresh.
+    with tempfile.TemporaryDirectory() as temp_dir:
+      names = metadata_cache_benchmark.get_names('dir', 5)
+      os.mkdir(os.path.join(temp_dir, 'dir'))
+      sizes = metadata_cache_benchmark.get_initial_sizes(names, 0.2)
+      for name, size in sizes.items():
+        if size is not None:
+          with open(os.path.join(temp_dir, name), 'wb') as f:
+            f.write(b'x' * size)
+      log = VersionLog(sizes, metadata_cache_benchmark.time.monotonic())
+
+      def write(name, size):
+        path = os.path.join(temp_dir, name)
+        with open(path + '.tmp', 'wb') as f:
+          f.write(b'x' * size)
+        os.replace(path + '.tmp', path)
+
+      result = metadata_cache_benchmark.run_point(Config(1, 0, 0), temp_dir,
+                                                  names, log, write, 0.2, 2,
+                                                  100)
+
+    self.assertGreater(result.num_lookups, 0)
+    self.assertGreater(result.num_writes, 0)
+    self.assertEqual([], result.staleness_sec)
+
+  def test_run_point_raises_reader_errors(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      names = ['a']
+      # A size of no version of the object.
+      with open(os.path.join(temp_dir, 'a'), 'wb') as f:
+        f.write(b'x' * 7)
+      log = VersionLog({'a': 1}, metadata_cache_benchmark.time.monotonic())
+
+      with self.assertRaises(ValueError):
+        metadata_cache_benchmark.run_point(Config(1, 0, 0), temp_dir, names,
+                                           log, lambda name, size: None, 0.1,
+                                           2, 100)
+
+  def test_run_point_raises_writer_errors(self):
+
+    def write(name, size):
+      raise OSError('write failed')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+      log = VersionLog({'a': None}, metadata_cache_benchmark.time.monotonic())
+
+      with self.assertRaisesRegex(OSError, 'write failed'):
+        metadata_cache_benchmark.run_point(Config(1, 0, 0), temp_dir, ['a'],
+                                           log, write, 0.1, 1, 100)
+
+  def test_run_writer_stops(self):
+    names = ['a']
+    log = VersionLog({'a': None})
+    stop = threading.Event()
+    written = []
+
+    def write(name, size):
+      written.append((name, size))
+      if len(written) == 2:
+        stop.set()
+
+    num_writes = metadata_cache_benchmark.run_writer(write, log, names, 1000,
+                                                     stop)
+
+    self.assertEqual(2, num_writes)
+    self.assertEqual([('a', 1), ('a', 2)], written)
+    self.assertEqual(2, log.get_size('a'))
+
+  def test_rows(self):
+    fresh = PointResult(Config(100, 0, 0), 2, [0.001] * 100, [], 10, 200)
+    stale = PointResult(Config(100, 60, 60), 1, [0.0001] * 100, [1, 3], 5)
+
+    rows = metadata_cache_benchmark.get_rows([fresh, stale])
+
+    self.assertEqual(50, rows[0]['lookups_per_sec'])
+    self.assertEqual(100, rows[0]['gcs_metadata_requests_per_sec'])
+    self.assertEqual(2, rows[0]['gcs_metadata_requests_per_lookup'])
+    self.assertEqual(0, rows[0]['stale_fraction'])
+    self.assertEqual('', rows[0]['mean_staleness_sec'])
+    self.assertAlmostEqual(0.1, rows[1]['p99_lookup_ms'])
+    # No fake GCS server stats.
+    self.assertEqual('', rows[1]['gcs_metadata_requests_per_sec'])
+    self.assertEqual(0.02, rows[1]['stale_fraction'])
+    self.assertEqual(2, rows[1]['mean_staleness_sec'])
+    self.assertEqual(3, rows[1]['max_staleness_sec'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,273 @@
+"""Times the phases of writing files through gcsfuse.
+
+gcsfuse writes to a local temp file (gcsx.TempFile) and uploads it to GCS when
+the file is synced or closed (gcsx.syncer), so the bandwidth of the writes, as
+fio reports it, says little of the upload, whose cost lands in fsync() or
+close(). This script writes files of every size of --sizes_kb with N writer
+threads started together, and times open, write, fsync (with --fsync) and
+close of every file separately.
+
+For every size and number of writers, it reports the end to end throughput of
+all the writers over the wall-clock time, the per-file write and upload
+throughput (bytes over the write, and the fsync and close, time of a file,
+summed over the files, which concurrent writers overlap) and the percentiles
+of the close (and fsync) latency. Sizes and numbers of writers writing more
+than --max_point_gb with one file per writer are skipped. With
+--fake_gcs_endpoint, it also reports the GCS requests and bytes uploaded, from
+the stats of the fake GCS server.
+
+To run the script:
+>> python3 write_benchmark.py <directory on the mount> [--sizes_kb 256,1024,16384,262144,1048576,4194304] [--num_writers 1,4,16] [--files_per_writer 4] [--max_point_gb 8] [--write_size_kb 1024] [--fsync] [--fake_gcs_endpoint http://localhost:9000] [--output_file writes.csv]
+"""
+import argparse
+import csv
+import dataclasses
+import os
+import statistics
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import bench_utils
+
+KB = 1024
+MB = 1024 * 1024
+GB = 1024 * MB
+MS_PER_SEC = 1000
+PERCENTILES = [50, 90, 99]
+
+
+@dataclasses.dataclass
+class FileTiming:
+  """Seconds spent in every phase of writing a file."""
+  writer: int
+  size: int
+  open_sec: float
+  write_sec: float
+  fsync_sec: float
+  close_sec: float
+
+  @property
+  def upload_sec(self) -> float:
+    return self.fsync_sec + self.close_sec
+
+
+@dataclasses.dataclass
+class SweepPoint:
+  """Files written by num_writers writers of files of a size."""
+  size: int
+  num_writers: int
+  files: List[FileTiming]
+  start_time_sec: float
+  end_time_sec: float
+  gcs_requests: int = -1
+  gcs_bytes_received: int = -1
+
+  @property
+  def num_bytes(self) -> int:
+    return sum(f.size for f in self.files)
+
+  @property
+  def mb_per_sec(self) -> float:
+    return _get_mb_per_sec(self.num_bytes,
+                           self.end_time_sec - self.start_time_sec)
+
+
+def _get_mb_per_sec(num_bytes, seconds) -> float:
+  return num_bytes / MB / seconds if seconds > 0 else 0.0
+
+
+def get_files_per_writer(size, num_writers, files_per_writer,
+                         max_point_bytes) -> int:
+  """Returns the files of every writer within max_point_bytes.
+
+  0 if one file per writer is over max_point_bytes, to skip the point.
+  """
+  return min(files_per_writer, max_point_bytes // (size * num_writers))
+
+
+def write_file(path, size, data, fsync=False) -> Tuple[float, float, float,
+                                                        float]:
+  """Writes size bytes of data repeated to a file.
+
+  Returns:
+    Seconds spent in open, write, fsync and close.
+  """
+  start_sec = time.perf_counter()
+  fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+  open_end_sec = time.perf_counter()
+  try:
+    view = memoryview(data)
+    remaining = size
+    while remaining:
+      remaining -= os.write(fd, view[:min(remaining, len(view))])
+    write_end_sec = time.perf_counter()
+    if fsync:
+      os.fsync(fd)
+    fsync_end_sec = time.perf_counter()
+  finally:
+    os.close(fd)
+  close_end_sec = time.perf_counter()
+  return (open_end_sec - start_sec, write_end_sec - open_end_sec,
+          fsync_end_sec - write_end_sec, close_end_sec - fsync_end_sec)
+
+
+def _write_files(writer, paths, size, data, fsync, barrier, results,
+                 errors) -> None:
+  """Writes the files of a writer thread, adding what it raises to errors."""
+  barrier.wait()
+  try:
+    for path in paths:
+      results.append(FileTiming(writer, size, *write_file(path, size, data,
+                                                          fsync)))
+  except Exception as e:
+    errors.append(e)
+
+
+def run_writers(directory, size, num_writers, files_per_writer, data,
+                fsync=False, keep_files=False) -> SweepPoint:
+  """Writes files_per_writer files of a size with every writer.
+
+  Raises:
+    Exception: The first exception raised by a writer, e.g. an OSError of a
+      failed upload on close.
+  """
+  paths = [[
+      os.path.join(directory, f'write_{size}_{num_writers}_{writer}_{i}')
+      for i in range(files_per_writer)
+  ] for writer in range(num_writers)]
+  barrier = threading.Barrier(num_writers + 1)
+  results = []
+  errors = []
+  threads = [
+      threading.Thread(target=_write_files,
+                       args=(writer, paths[writer], size, data, fsync,
+                             barrier, results, errors))
+      for writer in range(num_writers)
+  ]
+  for thread in threads:
+    thread.start()
+  barrier.wait()
+  start_time_sec = time.time()
+  for thread in threads:
+    thread.join()
+  end_time_sec = time.time()
+  if not keep_files:
+    for path in sum(paths, []):
+      # A failed writer leaves its remaining files unwritten.
+      if os.path.exists(path):
+        os.remove(path)
+  if errors:
+    raise errors[0]
+  return SweepPoint(size, num_writers, results, start_time_sec, end_time_sec)
+
+
+def get_rows(points: List[SweepPoint], fsync=False) -> List[Dict[str, object]]:
+  """Returns one CSV row per size and number of writers."""
+  rows = []
+  for point in points:
+    files = point.files
+    row = {
+        'size': point.size,
+        'num_writers': point.num_writers,
+        'files': len(files),
+        'bytes': point.num_bytes,
+        'mb_per_sec': point.mb_per_sec,
+        # Over the time of the files summed, not the wall-clock time.
+        'per_file_write_mb_per_sec': _get_mb_per_sec(
+            point.num_bytes, sum(f.write_sec for f in files)),
+        'per_file_upload_mb_per_sec': _get_mb_per_sec(
+            point.num_bytes, sum(f.upload_sec for f in files)),
+        'mean_open_ms': statistics.mean(f.open_sec for f in files) *
+                        MS_PER_SEC,
+        'mean_write_ms': statistics.mean(f.write_sec for f in files) *
+                         MS_PER_SEC,
+    }
+    phases = [('close', [f.close_sec for f in files])]
+    if fsync:
+      phases.insert(0, ('fsync', [f.fsync_sec for f in files]))
+    for phase, latencies_sec in phases:
+      row[f'mean_{phase}_ms'] = statistics.mean(latencies_sec) * MS_PER_SEC
+      for percentile in PERCENTILES:
+        row[f'p{percentile}_{phase}_ms'] = bench_utils.percentile(
+            latencies_sec, percentile) * MS_PER_SEC
+    row['gcs_requests'] = point.gcs_requests
+    row['gcs_bytes_received'] = point.gcs_bytes_received
+    rows.append(row)
+  return rows
+
+
+def _int_list(value) -> List[int]:
+  return [int(v) for v in value.split(',')]
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('directory', help='Directory the files are written in')
+  parser.add_argument('--sizes_kb', type=_int_list,
+                      default=[256, 1024, 16384, 262144, 1048576, 4194304],
+                      help='Comma separated sizes of the files')
+  parser.add_argument('--num_writers', type=_int_list, default=[1, 4, 16],
+                      help='Comma separated numbers of concurrent writers')
+  parser.add_argument('--files_per_writer', type=int, default=4)
+  parser.add_argument('--max_point_gb', type=int, default=8,
+                      help='Most bytes written per size and number of '
+                      'writers, lowering the files per writer of large sizes '
+                      'and skipping those over it with one file per writer')
+  parser.add_argument('--write_size_kb', type=int, default=1024)
+  parser.add_argument('--fsync', action='store_true', default=False,
+                      help='Sync every file before closing it')
+  parser.add_argument('--keep_files', action='store_true', default=False)
+  parser.add_argument('--fake_gcs_endpoint', default='',
+                      help='Endpoint of the fake GCS server the directory is '
+                      'mounted from, e.g. http://localhost:9000, to count the '
+                      'GCS requests and bytes uploaded')
+  parser.add_argument('--output_file', default='writes.csv')
+  args = parser.parse_args(argv[1:])
+
+  data = os.urandom(args.write_size_kb * KB)
+  points = []
+  for size in [size_kb * KB for size_kb in args.sizes_kb]:
+    for num_writers in args.num_writers:
+      files_per_writer = get_files_per_writer(size, num_writers,
+                                              args.files_per_writer,
+                                              args.max_point_gb * GB)
+      if not files_per_writer:
+        print(f'Skipping {size // KB}KiB x {num_writers} writers, over '
+              f'--max_point_gb {args.max_point_gb}')
+        continue
+      if args.fake_gcs_endpoint:
+        requests_before, bytes_before = bench_utils.fetch_fake_gcs_uploads(
+            args.fake_gcs_endpoint)
+      point = run_writers(args.directory, size, num_writers, files_per_writer,
+                          data, args.fsync, args.keep_files)
+      if args.fake_gcs_endpoint:
+        requests_after, bytes_after = bench_utils.fetch_fake_gcs_uploads(
+            args.fake_gcs_endpoint)
+        point.gcs_requests = requests_after - requests_before
+        point.gcs_bytes_received = bytes_after - bytes_before
+      points.append(point)
+  if not points:
+    print('No size and number of writers within --max_point_gb '
+          f'{args.max_point_gb}')
+    return
+
+  rows = get_rows(points, args.fsync)
+  for row in rows:
+    print(f'{row["size"] // KB}KiB x {row["files"]} files, '
+          f'{row["num_writers"]} writers: {row["mb_per_sec"]:.1f} MB/s, '
+          f'per file write {row["per_file_write_mb_per_sec"]:.1f} MB/s, '
+          f'upload {row["per_file_upload_mb_per_sec"]:.1f} MB/s, close p50 '
+          f'{row["p50_close_ms"]:.1f}ms p99 {row["p99_close_ms"]:.1f}ms')
+
+  with open(args.output_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
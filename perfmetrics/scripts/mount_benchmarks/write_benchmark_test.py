@@ -0,0 +1,77 @@
+"""Tests for write_benchmark."""
+import os
+import tempfile
+import unittest
+
+import write_benchmark
+from write_benchmark import KB, MB, FileTiming, SweepPoint
+
+
+class WriteBenchmarkTest(unittest.TestCase):
+
+  def test_files_per_writer(self):
+    self.assertEqual(4, write_benchmark.get_files_per_writer(MB, 2, 4, 100 * MB))
+    self.assertEqual(2, write_benchmark.get_files_per_writer(MB, 2, 4, 4 * MB))
+    self.assertEqual(1, write_benchmark.get_files_per_writer(MB, 16, 4,
+                                                             16 * MB))
+    # Over the budget with one file per writer.
+    self.assertEqual(0, write_benchmark.get_files_per_writer(MB, 16, 4, MB))
+
+  def test_write_file(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      path = os.path.join(temp_dir, 'file')
+
+      timings = write_benchmark.write_file(path, 10 * KB, b'x' * 4096,
+                                           fsync=True)
+
+      self.assertEqual(10 * KB, os.path.getsize(path))
+    self.assertEqual(4, len(timings))
+    self.assertTrue(all(timing >= 0 for timing in timings))
+
+  def test_run_writers(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      point = write_benchmark.run_writers(temp_dir, 8 * KB, 3, 2, b'x' * KB)
+
+      self.assertEqual([], os.listdir(temp_dir))
+    self.assertEqual(6, len(point.files))
+    self.assertEqual([0, 0, 1, 1, 2, 2],
+                     sorted(f.writer for f in point.files))
+    self.assertEqual(48 * KB, point.num_bytes)
+
+  def test_run_writers_with_failing_writers(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      directory = os.path.join(temp_dir, 'missing')
+
+      with self.assertRaises(FileNotFoundError):
+        write_benchmark.run_writers(directory, 8 * KB, 3, 2, b'x' * KB)
+
+  def test_rows(self):
+    files = [
+        FileTiming(0, MB, 0.001, 0.01, 0, close_sec)
+        for close_sec in [0.1] * 98 + [0.5, 1.0]
+    ]
+    point = SweepPoint(MB, 1, files, 0, 10)
+
+    row = write_benchmark.get_rows([point])[0]
+
+    self.assertEqual(100, row['files'])
+    self.assertEqual(10, row['mb_per_sec'])
+    self.assertAlmostEqual(100, row['per_file_write_mb_per_sec'])
+    self.assertAlmostEqual(100 / 11.3, row['per_file_upload_mb_per_sec'])
+    self.assertAlmostEqual(100, row['p50_close_ms'])
+    self.assertAlmostEqual(1000, row['p99_close_ms'])
+    self.assertNotIn('p99_fsync_ms', row)
+    self.assertIn('p99_fsync_ms', write_benchmark.get_rows([point], True)[0])
+
+  def test_rows_of_instant_writes(self):
+    point = SweepPoint(KB, 1, [FileTiming(0, KB, 0, 0, 0, 0)], 0, 0)
+
+    row = write_benchmark.get_rows([point])[0]
+
+    self.assertEqual(0, row['mb_per_sec'])
+    self.assertEqual(0, row['per_file_write_mb_per_sec'])
+    self.assertEqual(0, row['per_file_upload_mb_per_sec'])
+
+
+if __name__ == '__main__':
+  unittest.main()
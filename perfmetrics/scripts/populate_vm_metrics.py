@@ -1,26 +1,33 @@
 """Executes vm_metrics.py by passing appropriate arguments.
 
 To run the script:
->> python3 populate_vm_metrics.py <start_time> <end_time>
+>> python3 populate_vm_metrics.py <start_time> <end_time> [<results_file>]
+
+When the JSON lines results file written by the ML models is given, the VM
+metrics are fetched separately for every phase of the run (setup, index build,
+each epoch, eval) at PHASE_PERIOD_SEC alignment, and the phase label is appended
+to every row as a last column, after the columns of the ml_metrics worksheet.
+Otherwise a single row covers the whole run.
 """
+import os
 import socket
 import sys
 import time
-import os
+from gsheet import gsheet
+from ml_tests import run_results
 from vm_metrics import vm_metrics
 
 
 INSTANCE = socket.gethostname()
-metric_data_name = ['start_time_sec', 'cpu_utilization_peak','cpu_utilization_mean',
-                    'network_bandwidth_peak', 'network_bandwidth_mean', 'gcs/ops_latency', 
-                    'gcs/read_bytes_count', 'gcs/ops_error_count']
+PHASE_PERIOD_SEC = vm_metrics.MIN_PERIOD_SEC
+WORKSHEET_NAME = 'ml_metrics!'
 
 if __name__ == '__main__':
   argv = sys.argv
-  if len(argv) != 3:
+  if len(argv) not in [3, 4]:
     raise TypeError('Incorrect number of arguments.\n'
                     'Usage: '
-                    'python3 populate_vm_metrics.py <start_time> <end_time>')
+                    'python3 populate_vm_metrics.py <start_time> <end_time> [<results_file>]')
 
   print('Waiting for 250 seconds for metrics to be updated on VM...')
   # It takes up to 240 seconds for sampled data to be visible on the VM metrics graph
@@ -28,11 +35,28 @@ if __name__ == '__main__':
   time.sleep(250)
 
   vm_metrics_obj = vm_metrics.VmMetrics()
-  
+
   start_time_sec = int(argv[1])
   end_time_sec = int(argv[2])
-  period = end_time_sec - start_time_sec
-  print(f'Getting VM metrics for ML model')
-
-  vm_metrics_obj.fetch_metrics_and_write_to_google_sheet(start_time_sec, end_time_sec, INSTANCE, period, 'read', 'ml_metrics!')
 
+  records = []
+  if len(argv) == 4 and os.path.exists(argv[3]):
+    records = run_results.load_records(argv[3])
+
+  if records:
+    windows = run_results.get_metric_windows(records, PHASE_PERIOD_SEC)
+    period = PHASE_PERIOD_SEC
+  else:
+    windows = [run_results.MetricWindow('run', start_time_sec, end_time_sec)]
+    period = end_time_sec - start_time_sec
+
+  vm_metrics_data = []
+  for window in windows:
+    print(f'Getting VM metrics for ML model phase {window.label}')
+    metrics_data = vm_metrics_obj.fetch_metrics(window.start_time_sec,
+                                                window.end_time_sec, INSTANCE,
+                                                period, 'read')
+    for row in metrics_data:
+      vm_metrics_data.append(row + [window.label])
+
+  gsheet.write_to_google_sheet(WORKSHEET_NAME, vm_metrics_data)
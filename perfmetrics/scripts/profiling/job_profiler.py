@@ -0,0 +1,263 @@
+"""Runs a fio job file and profiles gcsfuse during every job.
+
+gcsfuse writes a 10s CPU profile to /tmp/cpu-<unixnano>.pprof on SIGUSR1 and a
+heap profile to /tmp/mem-<unixnano>.pprof on SIGUSR2 (internal/perf). This
+script starts fio, sends the signals to the gcsfuse process once every job is
+past its ramp time, according to the startdelay and ramp_time of the job file
+(the startdelay of every job being its offset from the start of fio, as the
+README requires), and then moves the profiles to the output directory:
+  <output dir>/fio.json: fio output.
+  <output dir>/<job index>_<job name>_{cpu,mem}.pprof: profiles of every job.
+    With --heap, a heap profile is also written at the start of the CPU
+    profile, <job index>_<job name>_mem_base.pprof, since the allocations of
+    heap profiles are counted from the start of gcsfuse.
+  <output dir>/profiles.json: job name, params, time window, io bytes,
+    bandwidth and profile paths of every job.
+  <output dir>/top_functions.csv: top --top functions of every job by flat CPU
+    time (and bytes allocated during the CPU profile with --heap).
+
+Jobs must run for at least 10 seconds after their ramp time for the CPU
+profile to cover only the job.
+
+To run the script:
+>> python3 job_profiler.py <job file> <output dir> [--pid <gcsfuse pid>] [--heap] [--top 20] [-- <fio args>]
+"""
+import argparse
+import configparser
+import csv
+import dataclasses
+import glob
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+from fio import constants as consts
+from fio import fio_metrics
+from local_metrics import proc_sampler
+import pprof
+
+GLOBAL_SECTION = 'global'
+CPU_PROFILE = 'cpu'
+HEAP_PROFILE = 'mem'
+HEAP_BASE_PROFILE = 'mem_base'
+PROFILE_SIGNALS = {CPU_PROFILE: signal.SIGUSR1, HEAP_PROFILE: signal.SIGUSR2}
+PROFILE_DIR = '/tmp'
+CPU_PROFILE_DURATION_SEC = 10
+# Time given to gcsfuse to write the last profiles after fio exits.
+PROFILE_WAIT_SEC = CPU_PROFILE_DURATION_SEC + 5
+PROFILES_FILE = 'profiles.json'
+TOP_FUNCTIONS_FILE = 'top_functions.csv'
+FIO_OUTPUT_FILE = 'fio.json'
+
+
+@dataclasses.dataclass
+class ScheduledJob:
+  name: str
+  # Seconds from the start of fio after which the job is past its ramp time.
+  profile_offset_sec: float
+  signal_time_ns: int = 0
+  # Time of the heap profile signal at the end of the CPU profile.
+  heap_signal_time_ns: int = 0
+
+
+def _get_time_sec(options, option) -> float:
+  if option not in options or not options[option]:
+    return 0
+  return fio_metrics.get_time_ms(options[option]) / 1000
+
+
+def get_job_schedule(job_file) -> List[ScheduledJob]:
+  """Returns the jobs of a fio job file with their profiling offsets.
+
+  Raises:
+    configparser.Error: When the job file cannot be parsed.
+  """
+  parser = configparser.ConfigParser(allow_no_value=True, strict=False,
+                                     interpolation=None)
+  with open(job_file, 'r') as f:
+    parser.read_file(f)
+  global_options = (dict(parser[GLOBAL_SECTION])
+                    if parser.has_section(GLOBAL_SECTION) else {})
+  jobs = []
+  for section in parser.sections():
+    if section == GLOBAL_SECTION:
+      continue
+    options = dict(global_options)
+    options.update(parser[section])
+    jobs.append(
+        ScheduledJob(
+            section,
+            _get_time_sec(options, consts.STARTDELAY) +
+            _get_time_sec(options, consts.RAMPTIME)))
+  return jobs
+
+
+def find_profile(kind, signal_time_ns,
+                 profile_dir=PROFILE_DIR) -> Optional[str]:
+  """Returns the first profile of a kind written after a signal, or None.
+
+  The profiles are named <kind>-<unixnano>.pprof, unixnano being the time the
+  signal was handled.
+  """
+  candidates = []
+  for path in glob.glob(os.path.join(profile_dir, f'{kind}-*.pprof')):
+    try:
+      written_ns = int(os.path.basename(path)[len(kind) + 1:-len('.pprof')])
+    except ValueError:
+      continue
+    if written_ns >= signal_time_ns:
+      candidates.append((written_ns, path))
+  return min(candidates)[1] if candidates else None
+
+
+def _signal_jobs(jobs, pid, kinds, fio_process) -> None:
+  """Signals gcsfuse when every job is past its ramp time, while fio runs.
+
+  With heap profiles, gcsfuse is signaled again at the end of the CPU profile
+  for the allocations during the CPU profile to be known.
+  """
+  events = []
+  for job in jobs:
+    events.append((job.profile_offset_sec, job, kinds))
+    if HEAP_PROFILE in kinds:
+      events.append((job.profile_offset_sec + CPU_PROFILE_DURATION_SEC, job,
+                     None))
+  events.sort(key=lambda event: event[0])
+
+  start_time = time.time()
+  for offset_sec, job, event_kinds in events:
+    delay = start_time + offset_sec - time.time()
+    if delay > 0:
+      try:
+        fio_process.wait(timeout=delay)
+        return
+      except subprocess.TimeoutExpired:
+        pass
+    if event_kinds is None:
+      job.heap_signal_time_ns = time.time_ns()
+      os.kill(pid, PROFILE_SIGNALS[HEAP_PROFILE])
+      continue
+    job.signal_time_ns = time.time_ns()
+    print(f'Profiling job {job.name}...')
+    for kind in event_kinds:
+      os.kill(pid, PROFILE_SIGNALS[kind])
+
+
+def get_top_rows(job_index, job_name, params, profile_path, kind, top,
+                 base_profile_path=None) -> List[list]:
+  """Returns the top functions of a profile as CSV rows.
+
+  With a base profile, the functions are ranked by their cost since the base
+  profile.
+  """
+  profile = pprof.load_profile(profile_path)
+  if base_profile_path:
+    profile = pprof.subtract_profiles(profile,
+                                      pprof.load_profile(base_profile_path))
+  sample_type = pprof.CPU if kind == CPU_PROFILE else pprof.ALLOC_SPACE
+  total = profile.total(sample_type)
+  rows = []
+  for rank, cost in enumerate(
+      pprof.top_functions(profile, sample_type, top), start=1):
+    rows.append([
+        job_index, job_name, params.get(consts.RW),
+        params.get(consts.THREADS), params.get(consts.FILESIZE_KB),
+        sample_type, rank, cost.name, cost.flat,
+        cost.flat / total if total else 0, cost.cum,
+        cost.cum / total if total else 0
+    ])
+  return rows
+
+
+def main(argv) -> None:
+  if '--' in argv:
+    fio_args = argv[argv.index('--') + 1:]
+    argv = argv[:argv.index('--')]
+  else:
+    fio_args = []
+  parser = argparse.ArgumentParser()
+  parser.add_argument('job_file')
+  parser.add_argument('output_dir')
+  parser.add_argument('--pid', type=int,
+                      help='gcsfuse pid, found by name by default')
+  parser.add_argument('--heap', action='store_true', default=False,
+                      help='Also write a heap profile for every job')
+  parser.add_argument('--top', type=int, default=20)
+  parser.add_argument('--profile_dir', default=PROFILE_DIR,
+                      help='Directory gcsfuse writes the profiles to')
+  args = parser.parse_args(argv[1:])
+
+  pid = args.pid or proc_sampler.find_pid()
+  if pid is None:
+    raise RuntimeError('No gcsfuse process found, pass --pid')
+  kinds = [CPU_PROFILE] + ([HEAP_PROFILE] if args.heap else [])
+  jobs = get_job_schedule(args.job_file)
+  os.makedirs(args.output_dir, exist_ok=True)
+  fio_output_file = os.path.join(args.output_dir, FIO_OUTPUT_FILE)
+
+  fio_process = subprocess.Popen(
+      ['fio', args.job_file, '--output-format=json',
+       f'--output={fio_output_file}'] + fio_args)
+  _signal_jobs(jobs, pid, kinds, fio_process)
+  if fio_process.wait() != 0:
+    raise RuntimeError(f'fio exited with {fio_process.returncode}')
+  time.sleep(PROFILE_WAIT_SEC)
+
+  fio_jobs = fio_metrics.FioMetrics().get_metrics(fio_output_file)
+  records = []
+  top_rows = []
+  for index, (job, fio_job) in enumerate(zip(jobs, fio_jobs), start=1):
+    record = {
+        'job': index,
+        'name': job.name,
+        consts.PARAMS: fio_job[consts.PARAMS],
+        consts.START_TIME: fio_job[consts.START_TIME],
+        consts.END_TIME: fio_job[consts.END_TIME],
+        consts.IO_BYTES: fio_job[consts.METRICS][consts.IO_BYTES],
+        consts.BW_BYTES: fio_job[consts.METRICS][consts.BW_BYTES],
+        'profile_duration_sec': CPU_PROFILE_DURATION_SEC,
+    }
+    # The heap profile written at the start of the CPU profile is the base of
+    # the one written at its end.
+    profiles = [(CPU_PROFILE, CPU_PROFILE, job.signal_time_ns)]
+    if HEAP_PROFILE in kinds:
+      profiles += [(HEAP_BASE_PROFILE, HEAP_PROFILE, job.signal_time_ns),
+                   (HEAP_PROFILE, HEAP_PROFILE, job.heap_signal_time_ns)]
+    for name, kind, signal_time_ns in profiles:
+      path = (find_profile(kind, signal_time_ns, args.profile_dir)
+              if signal_time_ns else None)
+      if path is None:
+        print(f'No {name} profile found for job {job.name}')
+        continue
+      destination = os.path.join(args.output_dir,
+                                 f'{index}_{job.name}_{name}.pprof')
+      shutil.move(path, destination)
+      record[f'{name}_profile'] = destination
+      if name != HEAP_BASE_PROFILE:
+        top_rows += get_top_rows(index, job.name, fio_job[consts.PARAMS],
+                                 destination, kind, args.top,
+                                 record.get(f'{HEAP_BASE_PROFILE}_profile'))
+    records.append(record)
+
+  with open(os.path.join(args.output_dir, PROFILES_FILE), 'w') as f:
+    json.dump(records, f, indent=2)
+  with open(os.path.join(args.output_dir, TOP_FUNCTIONS_FILE), 'w',
+            newline='') as f:
+    writer = csv.writer(f)
+    writer.writerow([
+        'job', 'name', consts.RW, consts.THREADS, consts.FILESIZE_KB,
+        'sample_type', 'rank', 'function', 'flat', 'flat_fraction', 'cum',
+        'cum_fraction'
+    ])
+    writer.writerows(top_rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,98 @@
+"""Tests for job_profiler."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from fio import constants as consts
+import job_profiler
+
+TESTDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'testdata')
+JOB_FILE = '''[global]
+ioengine=sync
+ramp_time=10s
+runtime=60s
+startdelay=5m
+
+[1_thread]
+stonewall
+rw=read
+
+[2_thread]
+stonewall
+startdelay=370
+numjobs=2
+rw=read
+
+[3_thread]
+startdelay=1m
+ramp_time=500ms
+rw=randread
+'''
+
+
+class JobProfilerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def test_get_job_schedule(self):
+    job_file = os.path.join(self.tmp_dir, 'jobs.fio')
+    with open(job_file, 'w') as f:
+      f.write(JOB_FILE)
+
+    jobs = job_profiler.get_job_schedule(job_file)
+
+    self.assertEqual([
+        job_profiler.ScheduledJob('1_thread', 310),
+        job_profiler.ScheduledJob('2_thread', 380),
+        job_profiler.ScheduledJob('3_thread', 60.5),
+    ], jobs)
+
+  def test_find_profile_returns_first_profile_after_signal(self):
+    for name in ['cpu-100.pprof', 'cpu-300.pprof', 'cpu-200.pprof',
+                 'mem-150.pprof', 'cpu-bad.pprof']:
+      open(os.path.join(self.tmp_dir, name), 'w').close()
+
+    self.assertEqual(os.path.join(self.tmp_dir, 'cpu-200.pprof'),
+                     job_profiler.find_profile('cpu', 150, self.tmp_dir))
+    self.assertEqual(os.path.join(self.tmp_dir, 'mem-150.pprof'),
+                     job_profiler.find_profile('mem', 150, self.tmp_dir))
+    self.assertIsNone(job_profiler.find_profile('cpu', 301, self.tmp_dir))
+
+  def test_get_top_rows(self):
+    params = {consts.RW: 'read', consts.THREADS: 1, consts.FILESIZE_KB: 256}
+
+    rows = job_profiler.get_top_rows(
+        1, '1_thread', params, os.path.join(TESTDATA_DIR, 'cpu.pprof'),
+        job_profiler.CPU_PROFILE, 1)
+
+    self.assertEqual([[
+        1, '1_thread', 'read', 1, 256, 'cpu', 1, 'main.hashLoop', 300000000,
+        1.0, 300000000, 1.0
+    ]], rows)
+
+  def test_get_top_rows_of_heap_profile_uses_alloc_space(self):
+    rows = job_profiler.get_top_rows(
+        2, '2_thread', {}, os.path.join(TESTDATA_DIR, 'mem.pprof'),
+        job_profiler.HEAP_PROFILE, 3)
+
+    self.assertEqual(3, len(rows))
+    self.assertEqual({'alloc_space'}, {row[5] for row in rows})
+
+  def test_get_top_rows_of_heap_profile_since_base_profile(self):
+    heap_profile = os.path.join(TESTDATA_DIR, 'mem.pprof')
+
+    rows = job_profiler.get_top_rows(2, '2_thread', {}, heap_profile,
+                                     job_profiler.HEAP_PROFILE, 3,
+                                     heap_profile)
+
+    self.assertEqual([], rows)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,233 @@
+"""Reads pprof profiles written by gcsfuse (runtime/pprof) without Go tooling.
+
+A profile is a gzipped profile.proto message, decoded with the protobuf wire
+reader of local_metrics. Refer
+https://github.com/google/pprof/blob/main/proto/profile.proto.
+
+To print the top functions of a profile:
+>> python3 pprof.py <profile> [--sample_type cpu] [--top 20]
+"""
+import argparse
+import dataclasses
+import gzip
+import os
+import sys
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'local_metrics'))
+import protowire
+
+GZIP_MAGIC = b'\x1f\x8b'
+# Sample types written by the Go runtime.
+CPU = 'cpu'
+SAMPLES = 'samples'
+ALLOC_OBJECTS = 'alloc_objects'
+ALLOC_SPACE = 'alloc_space'
+INUSE_OBJECTS = 'inuse_objects'
+INUSE_SPACE = 'inuse_space'
+
+
+@dataclasses.dataclass
+class Profile:
+  """Samples of a profile, with the stack of function names of every sample.
+
+  sample_types are (type, unit) pairs, e.g. ('cpu', 'nanoseconds'), and every
+  sample has one value per sample type. Stacks are leaf first, with inlined
+  functions expanded.
+  """
+  sample_types: List[Tuple[str, str]]
+  stacks: List[List[str]]
+  values: List[List[int]]
+  time_nanos: int = 0
+  duration_nanos: int = 0
+
+  def get_sample_index(self, sample_type) -> int:
+    """Returns the index of the values of a sample type.
+
+    Raises:
+      ValueError: When the profile has no such sample type.
+    """
+    for index, (type_name, _) in enumerate(self.sample_types):
+      if type_name == sample_type:
+        return index
+    raise ValueError(f'No sample type {sample_type} in the profile, expected '
+                     f'one of {[t for t, _ in self.sample_types]}')
+
+  def total(self, sample_type) -> int:
+    index = self.get_sample_index(sample_type)
+    return sum(values[index] for values in self.values)
+
+
+@dataclasses.dataclass
+class FunctionCost:
+  """Cost of a function: flat in the function itself, cum including callees."""
+  name: str
+  flat: int = 0
+  cum: int = 0
+
+
+def _repeated_varints(values) -> List[int]:
+  """Returns the values of a repeated varint field, packed or not."""
+  result = []
+  for value in values:
+    if isinstance(value, int):
+      result.append(value)
+    else:
+      result.extend(protowire.packed_varints(value))
+  return result
+
+
+def parse_profile(data) -> Profile:
+  """Parses a profile.proto message, gzipped or not.
+
+  Raises:
+    protowire.DecodeError: When the data is not a valid profile.
+  """
+  if data[:2] == GZIP_MAGIC:
+    data = gzip.decompress(data)
+  fields = protowire.get_fields(data)
+  strings = [protowire.to_string(value) for value in fields.get(6, [])]
+
+  functions = {}
+  for function in fields.get(5, []):
+    function_fields = protowire.get_fields(function)
+    name_index = function_fields.get(2, [0])[0]
+    functions[function_fields.get(1, [0])[0]] = strings[name_index]
+
+  locations = {}
+  for location in fields.get(4, []):
+    location_fields = protowire.get_fields(location)
+    names = []
+    # The lines of a location are its inlined functions, leaf first.
+    for line in location_fields.get(4, []):
+      function_id = protowire.get_fields(line).get(1, [0])[0]
+      names.append(functions.get(function_id, '<unknown>'))
+    if not names:
+      names = [f'0x{location_fields.get(3, [0])[0]:x}']
+    locations[location_fields.get(1, [0])[0]] = names
+
+  sample_types = []
+  for value_type in fields.get(1, []):
+    value_type_fields = protowire.get_fields(value_type)
+    sample_types.append((strings[value_type_fields.get(1, [0])[0]],
+                         strings[value_type_fields.get(2, [0])[0]]))
+
+  stacks, values = [], []
+  for sample in fields.get(2, []):
+    sample_fields = protowire.get_fields(sample)
+    stack = []
+    for location_id in _repeated_varints(sample_fields.get(1, [])):
+      stack.extend(locations.get(location_id, ['<unknown>']))
+    stacks.append(stack)
+    values.append([
+        protowire.to_int64(value)
+        for value in _repeated_varints(sample_fields.get(2, []))
+    ])
+
+  return Profile(sample_types, stacks, values,
+                 protowire.to_int64(fields.get(9, [0])[0]),
+                 protowire.to_int64(fields.get(10, [0])[0]))
+
+
+def load_profile(path) -> Profile:
+  with open(path, 'rb') as f:
+    return parse_profile(f.read())
+
+
+def subtract_profiles(profile: Profile, base: Profile) -> Profile:
+  """Returns the samples of a profile minus those of a base profile.
+
+  Used for the allocations between two heap profiles, whose alloc_* values are
+  counted from the start of the program. Samples are matched by stack.
+
+  Raises:
+    ValueError: When the profiles have different sample types.
+  """
+  if profile.sample_types != base.sample_types:
+    raise ValueError(f'Cannot subtract a profile of {base.sample_types} from '
+                     f'a profile of {profile.sample_types}')
+  values_by_stack = {}
+  for stack, values in zip(profile.stacks, profile.values):
+    total = values_by_stack.setdefault(tuple(stack), [0] * len(values))
+    for index, value in enumerate(values):
+      total[index] += value
+  for stack, values in zip(base.stacks, base.values):
+    total = values_by_stack.setdefault(tuple(stack), [0] * len(values))
+    for index, value in enumerate(values):
+      total[index] -= value
+  stacks, values = [], []
+  for stack, total in values_by_stack.items():
+    if any(total):
+      stacks.append(list(stack))
+      values.append(total)
+  return Profile(profile.sample_types, stacks, values, profile.time_nanos,
+                 profile.time_nanos - base.time_nanos)
+
+
+def get_package(function_name) -> str:
+  """Returns the Go package of a function.
+
+  E.g. github.com/x/gcsx for github.com/x/gcsx.(*randomReader).ReadAt.
+  """
+  slash = function_name.rfind('/') + 1
+  dot = function_name.find('.', slash)
+  return function_name if dot < 0 else function_name[:dot]
+
+
+def get_function_costs(profile: Profile, sample_type,
+                       group_by=None) -> Dict[str, FunctionCost]:
+  """Returns the flat and cumulative cost of every function in the profile.
+
+  Args:
+    profile: Profile.
+    sample_type: Sample type of the costs, e.g. CPU.
+    group_by: Function mapping function names to the names the costs are
+      grouped by, e.g. get_package. By default, costs are per function.
+  """
+  index = profile.get_sample_index(sample_type)
+  costs = {}
+  for stack, values in zip(profile.stacks, profile.values):
+    value = values[index]
+    if not stack or not value:
+      continue
+    if group_by:
+      stack = [group_by(name) for name in stack]
+    costs.setdefault(stack[0], FunctionCost(stack[0])).flat += value
+    # Recursive functions are counted once per sample.
+    for name in set(stack):
+      costs.setdefault(name, FunctionCost(name)).cum += value
+  return costs
+
+
+def top_functions(profile: Profile, sample_type, n,
+                  by_cum=False) -> List[FunctionCost]:
+  """Returns the n functions with the highest flat (or cumulative) cost."""
+  costs = get_function_costs(profile, sample_type).values()
+  key = ((lambda cost: (-cost.cum, -cost.flat, cost.name)) if by_cum else
+         (lambda cost: (-cost.flat, -cost.cum, cost.name)))
+  return sorted(costs, key=key)[:n]
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('profile')
+  parser.add_argument('--sample_type', default='',
+                      help='cpu, alloc_space, inuse_space, ... By default, '
+                      'the last sample type of the profile')
+  parser.add_argument('--top', type=int, default=20)
+  parser.add_argument('--cum', action='store_true', default=False,
+                      help='Sort by cumulative cost')
+  args = parser.parse_args(argv[1:])
+
+  profile = load_profile(args.profile)
+  sample_type = args.sample_type or profile.sample_types[-1][0]
+  total = profile.total(sample_type)
+  print(f'{sample_type}: total {total}')
+  for cost in top_functions(profile, sample_type, args.top, args.cum):
+    print(f'{cost.flat:>14} {100 * cost.flat / total:6.2f}% '
+          f'{cost.cum:>14} {100 * cost.cum / total:6.2f}%  {cost.name}')
+
+
+if __name__ == '__main__':
+  main(sys.argv)
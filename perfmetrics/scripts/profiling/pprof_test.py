@@ -0,0 +1,115 @@
+"""Tests for pprof."""
+import gzip
+import os
+import unittest
+
+import pprof
+
+TESTDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'testdata')
+CPU_PROFILE = os.path.join(TESTDATA_DIR, 'cpu.pprof')
+HEAP_PROFILE = os.path.join(TESTDATA_DIR, 'mem.pprof')
+
+
+class PprofTest(unittest.TestCase):
+
+  def test_load_cpu_profile(self):
+    profile = pprof.load_profile(CPU_PROFILE)
+
+    self.assertEqual([('samples', 'count'), ('cpu', 'nanoseconds')],
+                     profile.sample_types)
+    self.assertEqual(300000000, profile.total(pprof.CPU))
+    self.assertGreater(profile.duration_nanos, 0)
+
+  def test_top_functions_of_cpu_profile(self):
+    profile = pprof.load_profile(CPU_PROFILE)
+
+    top = pprof.top_functions(profile, pprof.CPU, 1)
+
+    self.assertEqual([pprof.FunctionCost('main.hashLoop', 300000000,
+                                         300000000)], top)
+
+  def test_top_functions_by_cum_includes_callers(self):
+    profile = pprof.load_profile(CPU_PROFILE)
+
+    names = [cost.name for cost in
+             pprof.top_functions(profile, pprof.CPU, 10, by_cum=True)]
+
+    self.assertIn('main.main', names)
+
+  def test_load_heap_profile(self):
+    profile = pprof.load_profile(HEAP_PROFILE)
+
+    self.assertEqual([
+        pprof.ALLOC_OBJECTS, pprof.ALLOC_SPACE, pprof.INUSE_OBJECTS,
+        pprof.INUSE_SPACE
+    ], [sample_type for sample_type, _ in profile.sample_types])
+    self.assertEqual(2873636, profile.total(pprof.ALLOC_SPACE))
+
+  def test_parse_profile_not_gzipped(self):
+    with open(CPU_PROFILE, 'rb') as f:
+      data = gzip.decompress(f.read())
+
+    profile = pprof.parse_profile(data)
+
+    self.assertEqual(300000000, profile.total(pprof.CPU))
+
+  def test_get_function_costs_counts_recursion_once(self):
+    profile = pprof.Profile([('cpu', 'nanoseconds')],
+                            [['f', 'f', 'main'], ['main']], [[10], [5]])
+
+    costs = pprof.get_function_costs(profile, pprof.CPU)
+
+    self.assertEqual(pprof.FunctionCost('f', 10, 10), costs['f'])
+    self.assertEqual(pprof.FunctionCost('main', 5, 15), costs['main'])
+
+  def test_get_function_costs_grouped_by_package(self):
+    profile = pprof.Profile([('cpu', 'nanoseconds')], [
+        ['a/gcsx.(*randomReader).ReadAt', 'a/gcsx.(*randomReader).readFull',
+         'a/fs.(*fileSystem).ReadFile'],
+        ['runtime.memmove', 'a/gcsx.(*randomReader).ReadAt'],
+    ], [[10], [5]])
+
+    costs = pprof.get_function_costs(profile, pprof.CPU, pprof.get_package)
+
+    self.assertEqual(pprof.FunctionCost('a/gcsx', 10, 15), costs['a/gcsx'])
+    self.assertEqual(pprof.FunctionCost('a/fs', 0, 10), costs['a/fs'])
+    self.assertEqual(pprof.FunctionCost('runtime', 5, 5), costs['runtime'])
+
+  def test_get_package(self):
+    self.assertEqual(
+        'github.com/googlecloudplatform/gcsfuse/internal/gcsx',
+        pprof.get_package('github.com/googlecloudplatform/gcsfuse/internal/'
+                          'gcsx.(*randomReader).ReadAt'))
+    self.assertEqual('runtime', pprof.get_package('runtime.mallocgc'))
+    self.assertEqual('0x4f2a', pprof.get_package('0x4f2a'))
+
+  def test_subtract_profiles(self):
+    sample_types = [(pprof.ALLOC_OBJECTS, 'count'), (pprof.ALLOC_SPACE,
+                                                     'bytes')]
+    base = pprof.Profile(sample_types, [['f', 'main'], ['g', 'main']],
+                         [[1, 100], [2, 200]], time_nanos=10)
+    profile = pprof.Profile(sample_types,
+                            [['f', 'main'], ['g', 'main'], ['h', 'main']],
+                            [[3, 300], [2, 200], [1, 50]], time_nanos=30)
+
+    diff = pprof.subtract_profiles(profile, base)
+
+    self.assertEqual([['f', 'main'], ['h', 'main']], diff.stacks)
+    self.assertEqual([[2, 200], [1, 50]], diff.values)
+    self.assertEqual(20, diff.duration_nanos)
+
+  def test_subtract_profiles_of_different_types_raises(self):
+    with self.assertRaises(ValueError):
+      pprof.subtract_profiles(pprof.load_profile(HEAP_PROFILE),
+                              pprof.load_profile(CPU_PROFILE))
+
+  def test_unknown_sample_type_raises(self):
+    profile = pprof.load_profile(CPU_PROFILE)
+
+    with self.assertRaises(ValueError):
+      profile.total(pprof.ALLOC_SPACE)
+
+
+if __name__ == '__main__':
+  unittest.main()
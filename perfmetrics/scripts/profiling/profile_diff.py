@@ -0,0 +1,256 @@
+"""Compares the gcsfuse profiles of two runs of the same fio jobs.
+
+The runs are output directories of job_profiler.py. For every job of both runs,
+the CPU time and the allocations (with --heap profiles) of every function are
+normalized per GB transferred by fio during the CPU profile, i.e. the bandwidth
+of the job times the profile duration, so that runs with different throughputs
+can be compared. The functions whose cost per GB grew or shrank the most are
+printed, along with the total CPU time and allocation rate of both runs, and
+all the differences are written to the output file.
+
+To run the script:
+>> python3 profile_diff.py <base run dir> <new run dir> [--job <job name>] [--focus 'gcsx|contentcache|fs\\.\\(\\*fileInode\\)'] [--by_package] [--top 10] [--output_file profile_diff.csv]
+"""
+import argparse
+import csv
+import dataclasses
+import json
+import math
+import os
+import re
+import sys
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+from fio import constants as consts
+import job_profiler
+import pprof
+
+GB = 10**9
+NS_TO_MS = 10**(-6)
+# Name of the rows of the total cost of a profile.
+TOTAL = '<total>'
+# Sample types compared for CPU and heap profiles.
+CPU_SAMPLE_TYPES = [pprof.CPU]
+HEAP_SAMPLE_TYPES = [pprof.ALLOC_SPACE, pprof.ALLOC_OBJECTS]
+
+
+@dataclasses.dataclass
+class CostDiff:
+  """Cost per GB transferred of a function in the base and new runs."""
+  name: str
+  sample_type: str
+  base_flat: float = 0
+  new_flat: float = 0
+  base_cum: float = 0
+  new_cum: float = 0
+
+  @property
+  def flat_delta(self) -> float:
+    return self.new_flat - self.base_flat
+
+  @property
+  def cum_delta(self) -> float:
+    return self.new_cum - self.base_cum
+
+  @property
+  def cum_change(self) -> float:
+    """Relative change of the cumulative cost, inf for new functions."""
+    if not self.base_cum:
+      return math.inf if self.new_cum else 0
+    return self.cum_delta / self.base_cum
+
+
+def get_bytes_transferred(record) -> float:
+  """Returns the bytes transferred by fio during the profiles of a job.
+
+  Args:
+    record: Job of profiles.json written by job_profiler.py.
+  """
+  bytes_transferred = (record.get(consts.BW_BYTES, 0) *
+                       record.get('profile_duration_sec', 0))
+  # Runs without bandwidth are normalized by the bytes of the whole job.
+  return bytes_transferred or record[consts.IO_BYTES]
+
+
+def get_costs_per_gb(profile: pprof.Profile, sample_type, bytes_transferred,
+                     group_by=None) -> Dict[str, pprof.FunctionCost]:
+  """Returns the costs of every function per GB transferred, with the total.
+
+  Raises:
+    ValueError: When no bytes were transferred.
+  """
+  if bytes_transferred <= 0:
+    raise ValueError('Cannot normalize a profile of a job without I/O')
+  scale = GB / bytes_transferred
+  costs = pprof.get_function_costs(profile, sample_type, group_by)
+  for cost in costs.values():
+    cost.flat *= scale
+    cost.cum *= scale
+  total = profile.total(sample_type) * scale
+  costs[TOTAL] = pprof.FunctionCost(TOTAL, total, total)
+  return costs
+
+
+def diff_costs(base: Dict[str, pprof.FunctionCost],
+               new: Dict[str, pprof.FunctionCost], sample_type,
+               focus: Optional[str] = None) -> List[CostDiff]:
+  """Returns the cost diffs of the total and of all the functions.
+
+  The total comes first, then the functions by decreasing growth of their flat
+  cost.
+
+  Args:
+    base: Costs of the base run, from get_costs_per_gb.
+    new: Costs of the new run, from get_costs_per_gb.
+    sample_type: Sample type of the costs.
+    focus: Regex the functions must match. The total always matches.
+  """
+  diffs = []
+  for name in base.keys() | new.keys():
+    if name != TOTAL and focus and not re.search(focus, name):
+      continue
+    base_cost = base.get(name, pprof.FunctionCost(name))
+    new_cost = new.get(name, pprof.FunctionCost(name))
+    diffs.append(
+        CostDiff(name, sample_type, base_cost.flat, new_cost.flat,
+                 base_cost.cum, new_cost.cum))
+  return sorted(diffs,
+                key=lambda diff:
+                (diff.name != TOTAL, -diff.flat_delta, diff.name))
+
+
+def load_run(run_dir) -> Dict[str, dict]:
+  """Returns the jobs of profiles.json of a run, by job name.
+
+  Profile paths are resolved in the run directory, so that runs can be moved.
+  """
+  with open(os.path.join(run_dir, job_profiler.PROFILES_FILE), 'r') as f:
+    records = json.load(f)
+  jobs = {}
+  for record in records:
+    for key, value in record.items():
+      if key.endswith('_profile'):
+        record[key] = os.path.join(run_dir, os.path.basename(value))
+    jobs[record['name']] = record
+  return jobs
+
+
+def _load_job_profile(record, name) -> Optional[pprof.Profile]:
+  """Returns a profile of a job, relative to its base for heap profiles."""
+  path = record.get(f'{name}_profile')
+  if not path:
+    return None
+  profile = pprof.load_profile(path)
+  base_path = record.get(f'{job_profiler.HEAP_BASE_PROFILE}_profile')
+  if name == job_profiler.HEAP_PROFILE and base_path:
+    profile = pprof.subtract_profiles(profile, pprof.load_profile(base_path))
+  return profile
+
+
+def diff_jobs(base_record, new_record, focus=None,
+              group_by=None) -> List[CostDiff]:
+  """Returns the cost diffs of the profiles both runs have for a job."""
+  base_bytes = get_bytes_transferred(base_record)
+  new_bytes = get_bytes_transferred(new_record)
+  diffs = []
+  for name, sample_types in [(job_profiler.CPU_PROFILE, CPU_SAMPLE_TYPES),
+                             (job_profiler.HEAP_PROFILE, HEAP_SAMPLE_TYPES)]:
+    base_profile = _load_job_profile(base_record, name)
+    new_profile = _load_job_profile(new_record, name)
+    if base_profile is None or new_profile is None:
+      continue
+    for sample_type in sample_types:
+      diffs += diff_costs(
+          get_costs_per_gb(base_profile, sample_type, base_bytes, group_by),
+          get_costs_per_gb(new_profile, sample_type, new_bytes, group_by),
+          sample_type, focus)
+  return diffs
+
+
+def _format_cost(value, sample_type) -> str:
+  if sample_type == pprof.CPU:
+    return f'{value * NS_TO_MS:.1f}ms'
+  if sample_type == pprof.ALLOC_SPACE:
+    return f'{value / 2**20:.1f}MiB'
+  return f'{value:.0f}'
+
+
+def _format_change(diff: CostDiff) -> str:
+  change = diff.cum_change
+  return 'new' if math.isinf(change) else f'{100 * change:+.1f}%'
+
+
+def print_job_diffs(job_name, diffs: List[CostDiff], top) -> None:
+  """Prints the totals and the functions that grew and shrank the most."""
+  print(f'Job {job_name}, per GB transferred:')
+  for sample_type in CPU_SAMPLE_TYPES + HEAP_SAMPLE_TYPES:
+    sample_diffs = [diff for diff in diffs if diff.sample_type == sample_type]
+    if not sample_diffs:
+      continue
+    total = next(diff for diff in sample_diffs if diff.name == TOTAL)
+    print(f'  {sample_type}: {_format_cost(total.base_cum, sample_type)} -> '
+          f'{_format_cost(total.new_cum, sample_type)} '
+          f'({_format_change(total)})')
+    functions = [diff for diff in sample_diffs if diff.name != TOTAL]
+    grew = [diff for diff in functions if diff.flat_delta > 0][:top]
+    shrank = [diff for diff in reversed(functions) if diff.flat_delta < 0][:top]
+    for title, function_diffs in [('grew', grew), ('shrank', shrank)]:
+      if function_diffs:
+        print(f'    {title}:')
+      for diff in function_diffs:
+        print(f'      {_format_cost(diff.flat_delta, sample_type):>12} flat  '
+              f'{_format_cost(diff.base_cum, sample_type)} -> '
+              f'{_format_cost(diff.new_cum, sample_type)} cum '
+              f'({_format_change(diff)})  {diff.name}')
+
+
+def main(argv) -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('base_run_dir')
+  parser.add_argument('new_run_dir')
+  parser.add_argument('--job', action='append', default=[],
+                      help='Job to compare, all the jobs of both runs by '
+                      'default. Can be repeated')
+  parser.add_argument('--focus', default='',
+                      help='Regex of the functions to compare')
+  parser.add_argument('--by_package', action='store_true', default=False,
+                      help='Compare the costs of Go packages')
+  parser.add_argument('--top', type=int, default=10,
+                      help='Number of functions printed per direction')
+  parser.add_argument('--output_file', default='',
+                      help='CSV filepath to write all the differences to')
+  args = parser.parse_args(argv[1:])
+
+  base_jobs = load_run(args.base_run_dir)
+  new_jobs = load_run(args.new_run_dir)
+  job_names = args.job or [name for name in base_jobs if name in new_jobs]
+  group_by = pprof.get_package if args.by_package else None
+  rows = []
+  for job_name in job_names:
+    base_record, new_record = base_jobs[job_name], new_jobs[job_name]
+    if base_record[consts.PARAMS] != new_record[consts.PARAMS]:
+      print(f'Job {job_name} has different params in the runs: '
+            f'{base_record[consts.PARAMS]}, {new_record[consts.PARAMS]}')
+    diffs = diff_jobs(base_record, new_record, args.focus, group_by)
+    print_job_diffs(job_name, diffs, args.top)
+    rows += [[
+        job_name, diff.sample_type, diff.name, diff.base_flat, diff.new_flat,
+        diff.flat_delta, diff.base_cum, diff.new_cum, diff.cum_delta,
+        diff.cum_change
+    ] for diff in diffs]
+
+  if args.output_file:
+    with open(args.output_file, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow([
+          'job', 'sample_type', 'function', 'base_flat_per_gb',
+          'new_flat_per_gb', 'flat_delta_per_gb', 'base_cum_per_gb',
+          'new_cum_per_gb', 'cum_delta_per_gb', 'cum_change'
+      ])
+      writer.writerows(rows)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,148 @@
+"""Tests for profile_diff."""
+import json
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from fio import constants as consts
+import pprof
+import profile_diff
+
+TESTDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'testdata')
+GCSX_READ = 'a/gcsx.(*randomReader).ReadAt'
+INODE_READ = 'a/fs.(*fileInode).Read'
+
+
+def _cpu_profile(read_ns, inode_ns) -> pprof.Profile:
+  return pprof.Profile([('samples', 'count'), ('cpu', 'nanoseconds')],
+                       [[GCSX_READ, INODE_READ], [INODE_READ]],
+                       [[1, read_ns], [1, inode_ns]])
+
+
+class ProfileDiffTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def test_get_bytes_transferred(self):
+    self.assertEqual(
+        10**9,
+        profile_diff.get_bytes_transferred({
+            consts.BW_BYTES: 10**8,
+            'profile_duration_sec': 10,
+            consts.IO_BYTES: 6 * 10**9
+        }))
+    self.assertEqual(
+        6 * 10**9,
+        profile_diff.get_bytes_transferred({consts.IO_BYTES: 6 * 10**9}))
+
+  def test_get_costs_per_gb(self):
+    costs = profile_diff.get_costs_per_gb(_cpu_profile(100, 50), pprof.CPU,
+                                          2 * 10**9)
+
+    self.assertEqual(pprof.FunctionCost(GCSX_READ, 50, 50), costs[GCSX_READ])
+    self.assertEqual(pprof.FunctionCost(INODE_READ, 25, 75), costs[INODE_READ])
+    self.assertEqual(pprof.FunctionCost(profile_diff.TOTAL, 75, 75),
+                     costs[profile_diff.TOTAL])
+
+  def test_get_costs_per_gb_without_bytes_raises(self):
+    with self.assertRaises(ValueError):
+      profile_diff.get_costs_per_gb(_cpu_profile(100, 50), pprof.CPU, 0)
+
+  def test_diff_costs_normalizes_by_bytes(self):
+    # The new run transferred twice the bytes with the same CPU time for the
+    # reader, so only the inode grew per GB.
+    base = profile_diff.get_costs_per_gb(_cpu_profile(100, 50), pprof.CPU,
+                                         10**9)
+    new = profile_diff.get_costs_per_gb(_cpu_profile(200, 300), pprof.CPU,
+                                        2 * 10**9)
+
+    diffs = profile_diff.diff_costs(base, new, pprof.CPU)
+
+    self.assertEqual([profile_diff.TOTAL, INODE_READ, GCSX_READ],
+                     [diff.name for diff in diffs])
+    self.assertEqual(100, diffs[1].flat_delta)
+    self.assertEqual(100, diffs[1].cum_delta)
+    self.assertAlmostEqual(100 / 150, diffs[1].cum_change)
+    self.assertEqual(0, diffs[2].flat_delta)
+
+  def test_diff_costs_of_new_function(self):
+    diffs = profile_diff.diff_costs(
+        {}, {GCSX_READ: pprof.FunctionCost(GCSX_READ, 1, 1)}, pprof.CPU)
+
+    self.assertTrue(math.isinf(diffs[0].cum_change))
+
+  def test_diff_costs_with_focus(self):
+    costs = profile_diff.get_costs_per_gb(_cpu_profile(100, 50), pprof.CPU,
+                                          10**9)
+
+    diffs = profile_diff.diff_costs(costs, costs, pprof.CPU, focus='gcsx')
+
+    self.assertEqual({GCSX_READ, profile_diff.TOTAL},
+                     {diff.name for diff in diffs})
+
+  def _write_run(self, name, bw_bytes):
+    run_dir = os.path.join(self.tmp_dir, name)
+    os.makedirs(run_dir)
+    records = [{
+        'job': 1,
+        'name': '1_thread',
+        consts.PARAMS: {consts.RW: 'read'},
+        consts.IO_BYTES: 6 * 10**9,
+        consts.BW_BYTES: bw_bytes,
+        'profile_duration_sec': 10,
+    }]
+    for profile in ['cpu', 'mem', 'mem_base']:
+      source = os.path.join(TESTDATA_DIR,
+                            'cpu.pprof' if profile == 'cpu' else 'mem.pprof')
+      shutil.copy(source, os.path.join(run_dir, f'1_1_thread_{profile}.pprof'))
+      # Paths as written by job_profiler.py, in another directory.
+      records[0][f'{profile}_profile'] = f'/elsewhere/1_1_thread_{profile}.pprof'
+    with open(os.path.join(run_dir, 'profiles.json'), 'w') as f:
+      json.dump(records, f)
+    return run_dir
+
+  def test_diff_jobs_of_runs(self):
+    base_jobs = profile_diff.load_run(self._write_run('base', 10**8))
+    new_jobs = profile_diff.load_run(self._write_run('new', 2 * 10**8))
+
+    diffs = profile_diff.diff_jobs(base_jobs['1_thread'], new_jobs['1_thread'])
+
+    totals = {
+        diff.sample_type: diff for diff in diffs
+        if diff.name == profile_diff.TOTAL
+    }
+    # The CPU profile has 300ms of CPU time, for 1GB and then 2GB.
+    self.assertEqual(300000000, totals[pprof.CPU].base_cum)
+    self.assertEqual(150000000, totals[pprof.CPU].new_cum)
+    self.assertAlmostEqual(-0.5, totals[pprof.CPU].cum_change)
+    # The heap profiles are the same at the start and end of the profile.
+    self.assertEqual(0, totals[pprof.ALLOC_SPACE].base_cum)
+    self.assertEqual(0, totals[pprof.ALLOC_OBJECTS].new_cum)
+
+  def test_main_writes_output_file(self):
+    base_dir = self._write_run('base', 10**8)
+    new_dir = self._write_run('new', 10**8)
+    output_file = os.path.join(self.tmp_dir, 'diff.csv')
+
+    profile_diff.main([
+        'profile_diff.py', base_dir, new_dir, '--by_package', '--output_file',
+        output_file
+    ])
+
+    with open(output_file, 'r') as f:
+      lines = f.read().splitlines()
+    self.assertTrue(lines[0].startswith('job,sample_type,function'))
+    self.assertIn(
+        '1_thread,cpu,main,300000000.0,300000000.0,0.0,300000000.0,'
+        '300000000.0,0.0,0.0', lines[1:])
+
+
+if __name__ == '__main__':
+  unittest.main()
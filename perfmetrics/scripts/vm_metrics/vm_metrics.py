@@ -13,6 +13,9 @@
    6.Opencensus Error Count
    7.Opencensus Mean Latency(s)
 
+   Distribution values (latencies) can also be decoded into a Histogram to
+   estimate percentiles, see Histogram.from_distribution_value.
+
   Usage:
   >>python3 vm_metrics.py {instance} {start time in epoch sec} {end time in epoch sec} {period in sec} {test_type} {worksheet_name}
 
@@ -26,7 +29,8 @@ from google.api_core.exceptions import GoogleAPICallError
 import google.cloud
 from google.cloud import monitoring_v3
 from gsheet import gsheet
-from typing import List
+import numpy as np
+from typing import Dict, List, Tuple
 
 PROJECT_NAME = 'projects/gcs-fuse-test'
 CPU_UTI_METRIC_TYPE = 'compute.googleapis.com/instance/cpu/utilization'
@@ -34,6 +38,13 @@ RECEIVED_BYTES_COUNT_METRIC_TYPE = 'compute.googleapis.com/instance/network/rece
 OPS_LATENCY_METRIC_TYPE = 'custom.googleapis.com/gcsfuse/fs/ops_latency'
 READ_BYTES_COUNT_METRIC_TYPE = 'custom.googleapis.com/gcsfuse/gcs/read_bytes_count'
 OPS_ERROR_COUNT_METRIC_TYPE = 'custom.googleapis.com/gcsfuse/fs/ops_error_count'
+READER_COUNT_METRIC_TYPE = 'custom.googleapis.com/gcsfuse/gcs/reader_count'
+GCSFUSE_METRIC_TYPE_PREFIX = 'custom.googleapis.com/gcsfuse/'
+# Smallest alignment period supported by Cloud Monitoring.
+MIN_PERIOD_SEC = 60
+# Percentiles reported for distribution-valued metrics.
+PERCENTILES = [50, 90, 99, 99.9]
+MB = 10**6
 
 @dataclasses.dataclass
 class MetricPoint:
@@ -78,12 +89,194 @@ OPS_ERROR_COUNT = Metric(
     reducer='REDUCE_SUM',
     group_fields=['metric.labels'])
 
+# Number of GCS object readers opened by gcsfuse, i.e. the reader churn. Not
+# part of METRICS_LIST, fetched on demand with VmMetrics.fetch_metric_total.
+READER_OPENED_COUNT = Metric(
+    metric_type=READER_COUNT_METRIC_TYPE,
+    factor=1,
+    aligner='ALIGN_DELTA',
+    extra_filter='metric.labels.io_method = "opened"',
+    reducer='REDUCE_SUM',
+    group_fields=['metric.labels.io_method'])
+
 METRICS_LIST = [
     CPU_UTI_PEAK, CPU_UTI_MEAN, REC_BYTES_PEAK, REC_BYTES_MEAN,
     READ_BYTES_COUNT, OPS_ERROR_COUNT
 ]
 
 
+@dataclasses.dataclass
+class Histogram:
+  """Bucket counts of a distribution value.
+
+  bounds are the N finite bucket boundaries in increasing order and counts the
+  N + 1 bucket counts: counts[0] is the underflow bucket (-inf, bounds[0]),
+  counts[i] is [bounds[i - 1], bounds[i]) and counts[N] is the overflow bucket
+  [bounds[N - 1], +inf). Refer
+  https://cloud.google.com/monitoring/api/ref_v3/rest/v3/TypedValue#Distribution.
+  """
+  bounds: np.ndarray
+  counts: np.ndarray
+  # Sum of all the values, for the exact mean.
+  total: float = 0.0
+
+  @classmethod
+  def from_distribution_value(cls, distribution_value):
+    """Decodes the bucket options and bucket counts of a distribution value.
+
+    Args:
+      distribution_value (object): Distribution object from API response
+    Returns:
+      Histogram
+    Raises:
+      ValueError: When the bucket options are missing.
+    """
+    bounds = _get_bucket_bounds(distribution_value.bucket_options)
+    counts = np.zeros(len(bounds) + 1, dtype=np.int64)
+    # Trailing empty buckets can be omitted from the response.
+    bucket_counts = np.asarray(
+        list(getattr(distribution_value, 'bucket_counts', [])), dtype=np.int64)
+    counts[:len(bucket_counts)] = bucket_counts[:len(counts)]
+    count = int(getattr(distribution_value, 'count', 0)) or int(counts.sum())
+    return cls(bounds, counts, distribution_value.mean * count)
+
+  @property
+  def count(self) -> int:
+    return int(self.counts.sum())
+
+  @property
+  def mean(self) -> float:
+    return self.total / self.count if self.count else 0.0
+
+  def merge(self, other):
+    """Returns the histogram of the values of both histograms.
+
+    Raises:
+      ValueError: When the histograms have different bucket bounds.
+    """
+    if not np.array_equal(self.bounds, other.bounds):
+      raise ValueError('Cannot merge histograms with different bucket bounds')
+    return Histogram(self.bounds, self.counts + other.counts,
+                     self.total + other.total)
+
+  def percentiles(self, percentiles) -> np.ndarray:
+    """Estimates percentiles by linear interpolation within the buckets.
+
+    Values in the underflow and overflow buckets are reported as the first and
+    last bound respectively, as these buckets have no finite width.
+
+    Args:
+      percentiles (list[float]): Percentiles between 0 and 100
+    Returns:
+      np.ndarray of the estimated values, NaN for an empty histogram
+    """
+    percentiles = np.asarray(percentiles, dtype=np.float64)
+    if not self.count:
+      return np.full(percentiles.shape, np.nan)
+    cumulative = np.cumsum(self.counts)
+    ranks = percentiles / 100 * cumulative[-1]
+    # Index of the bucket holding every rank, skipping empty buckets.
+    buckets = np.searchsorted(cumulative, ranks, side='left')
+    buckets = np.minimum(buckets, len(self.counts) - 1)
+    below = np.where(buckets > 0, cumulative[buckets - 1], 0)
+    in_bucket = self.counts[buckets]
+    fraction = np.divide(ranks - below, in_bucket,
+                         out=np.zeros_like(ranks), where=in_bucket > 0)
+    edges = np.concatenate(([self.bounds[0]], self.bounds, [self.bounds[-1]]))
+    lower = edges[buckets]
+    upper = edges[buckets + 1]
+    return lower + np.clip(fraction, 0, 1) * (upper - lower)
+
+
+def merge_histograms(histograms) -> Histogram:
+  """Merges histograms of different alignment periods or series.
+
+  Raises:
+    ValueError: When there are no histograms or their bucket bounds differ.
+  """
+  if not histograms:
+    raise ValueError('No histograms to merge')
+  bounds = histograms[0].bounds
+  for histogram in histograms[1:]:
+    if not np.array_equal(bounds, histogram.bounds):
+      raise ValueError('Cannot merge histograms with different bucket bounds')
+  return Histogram(bounds,
+                   np.sum([histogram.counts for histogram in histograms],
+                          axis=0),
+                   sum(histogram.total for histogram in histograms))
+
+
+def _get_bucket_bounds(bucket_options) -> np.ndarray:
+  """Returns the finite bucket bounds of explicit, exponential or linear buckets.
+
+  Raises:
+    ValueError: When none of the bucket options are set.
+  """
+  explicit = getattr(bucket_options, 'explicit_buckets', None)
+  if explicit is not None and len(explicit.bounds):
+    return np.asarray(list(explicit.bounds), dtype=np.float64)
+
+  exponential = getattr(bucket_options, 'exponential_buckets', None)
+  if exponential is not None and exponential.num_finite_buckets:
+    exponents = np.arange(exponential.num_finite_buckets + 1)
+    return exponential.scale * np.power(exponential.growth_factor, exponents)
+
+  linear = getattr(bucket_options, 'linear_buckets', None)
+  if linear is not None and linear.num_finite_buckets:
+    return linear.offset + linear.width * np.arange(
+        linear.num_finite_buckets + 1, dtype=np.float64)
+
+  raise ValueError('Unhandled bucket options')
+
+
+@dataclasses.dataclass
+class GcsfuseView:
+  """An OpenCensus view exported by gcsfuse, fetched per value of its labels.
+
+  The name and labels are the view name and tag keys registered in
+  internal/monitor/bucket.go and internal/fs/wrappers/monitoring.go. Counts are
+  summed over the interval, distributions (latencies) are merged into a
+  Histogram reported as its mean and PERCENTILES.
+  """
+  name: str
+  labels: List[str] = field(default_factory=list)
+  is_distribution: bool = False
+
+  @property
+  def metric_type(self) -> str:
+    return GCSFUSE_METRIC_TYPE_PREFIX + self.name
+
+  def get_metric(self) -> Metric:
+    """Returns the Metric summing the series of every label combination."""
+    return Metric(
+        metric_type=self.metric_type,
+        factor=1,
+        aligner='ALIGN_DELTA',
+        reducer='REDUCE_SUM',
+        group_fields=['metric.labels.' + label for label in self.labels])
+
+  def get_column(self, label_values) -> str:
+    """Returns the column name of a label combination, e.g. fs/ops_count/ReadFile."""
+    return '/'.join([self.name] + list(label_values))
+
+
+FS_OPS_COUNT = GcsfuseView('fs/ops_count', labels=['fs_op'])
+FS_OPS_ERROR_COUNT = GcsfuseView(
+    'fs/ops_error_count', labels=['fs_op', 'fs_error'])
+FS_OPS_LATENCY = GcsfuseView(
+    'fs/ops_latency', labels=['fs_op'], is_distribution=True)
+GCS_READ_BYTES_COUNT = GcsfuseView('gcs/read_bytes_count')
+GCS_READER_COUNT = GcsfuseView('gcs/reader_count', labels=['io_method'])
+GCS_REQUEST_COUNT = GcsfuseView('gcs/request_count', labels=['gcs_method'])
+GCS_REQUEST_LATENCIES = GcsfuseView(
+    'gcs/request_latencies', labels=['gcs_method'], is_distribution=True)
+
+GCSFUSE_VIEWS = [
+    FS_OPS_COUNT, FS_OPS_ERROR_COUNT, FS_OPS_LATENCY, GCS_READ_BYTES_COUNT,
+    GCS_READER_COUNT, GCS_REQUEST_COUNT, GCS_REQUEST_LATENCIES
+]
+
+
 class NoValuesError(Exception):
   """API response values are missing."""
 
@@ -152,6 +345,155 @@ def _create_metric_points_from_response(metrics_response, factor):
   metric_point_list.reverse()
   return metric_point_list
 
+def _create_labeled_metric_points_from_response(
+    metrics_response, factor,
+    labels) -> Dict[Tuple[str, ...], List[MetricPoint]]:
+  """Parses the given metrics API response into MetricPoint lists per series.
+
+    Args:
+      metrics_response (object): The metrics API response
+      factor (float) : Converting the API response values into appropriate unit
+      labels (list[str]): The metric labels identifying a series
+    Returns:
+      dict[tuple of label values, list[MetricPoint]]
+  """
+  metric_points = {}
+  for metric in metrics_response:
+    metric_labels = dict(metric.metric.labels)
+    label_values = tuple(metric_labels.get(label, '') for label in labels)
+    metric_points.setdefault(label_values, []).extend(
+        _create_metric_points_from_response([metric], factor))
+  return metric_points
+
+
+def _create_labeled_histograms_from_response(
+    metrics_response, labels) -> Dict[Tuple[str, ...], Histogram]:
+  """Parses a distribution metrics API response into a Histogram per series.
+
+  The histograms of all the alignment periods of a series are merged.
+
+    Args:
+      metrics_response (object): The metrics API response
+      labels (list[str]): The metric labels identifying a series
+    Returns:
+      dict[tuple of label values, Histogram]
+  """
+  histograms = {}
+  for metric in metrics_response:
+    metric_labels = dict(metric.metric.labels)
+    label_values = tuple(metric_labels.get(label, '') for label in labels)
+    histograms.setdefault(label_values, []).extend(
+        Histogram.from_distribution_value(point.value.distribution_value)
+        for point in metric.points)
+  return {
+      label_values: merge_histograms(series_histograms)
+      for label_values, series_histograms in histograms.items()
+      if series_histograms
+  }
+
+
+def _get_view_period(start_time_sec, end_time_sec) -> int:
+  return max(int(end_time_sec - start_time_sec), MIN_PERIOD_SEC)
+
+
+def get_metric_window_end(start_time_sec, end_time_sec) -> int:
+  """Returns the end of the interval fetched by fetch_metric_total.
+
+  The interval is widened to MIN_PERIOD_SEC, so anything running before this
+  end is counted in the total of the interval too. Benchmarks fetching the
+  totals of consecutive runs wait until then before starting the next run.
+  """
+  return int(start_time_sec) + _get_view_period(start_time_sec, end_time_sec)
+
+
+@dataclasses.dataclass
+class OpMix:
+  """Share of a FUSE op in the ops and the latency of a job."""
+  fs_op: str
+  ops_count: float
+  ops_per_sec: float
+  mean_latency_ms: float
+  p99_latency_ms: float
+  # Fraction of the total time spent in FUSE ops that is spent in this op.
+  latency_share: float
+
+
+def get_op_mix(ops_counts, latencies, duration_sec) -> List[OpMix]:
+  """Returns the op mix sorted by decreasing share of the total latency.
+
+    Args:
+      ops_counts (dict[str, float]): fs/ops_count per fs_op
+      latencies (dict[str, Histogram]): fs/ops_latency per fs_op, in ms
+      duration_sec (float): Duration over which the ops were counted
+    Returns:
+      list[OpMix]
+  """
+  total_latency = sum(histogram.total for histogram in latencies.values())
+  op_mix = []
+  for fs_op in set(ops_counts) | set(latencies):
+    histogram = latencies.get(fs_op)
+    ops_count = ops_counts.get(fs_op, histogram.count if histogram else 0)
+    op_latency = histogram.total if histogram else 0.0
+    op_mix.append(
+        OpMix(
+            fs_op=fs_op,
+            ops_count=ops_count,
+            ops_per_sec=ops_count / duration_sec,
+            mean_latency_ms=histogram.mean if histogram else 0.0,
+            p99_latency_ms=(float(histogram.percentiles([99])[0])
+                            if histogram and histogram.count else 0.0),
+            latency_share=(op_latency /
+                           total_latency if total_latency else 0.0)))
+  op_mix.sort(key=lambda op: (-op.latency_share, -op.ops_count, op.fs_op))
+  return op_mix
+
+
+@dataclasses.dataclass
+class ReadAmplification:
+  """Bytes read from GCS and readers opened per byte read by fio in a job."""
+  io_bytes: float
+  gcs_read_bytes: float
+  readers_opened: float
+  # GCS bytes read per byte read by fio, 1 without read-ahead waste.
+  read_amplification: float
+  readers_opened_per_mb: float
+
+
+def get_read_amplification(io_bytes, gcs_read_bytes,
+                           readers_opened) -> ReadAmplification:
+  """Returns the read amplification of a job.
+
+    Args:
+      io_bytes (float): Bytes read by fio, FioMetrics io_bytes
+      gcs_read_bytes (float): gcs/read_bytes_count over the job
+      readers_opened (float): gcs/reader_count opened over the job
+    Returns:
+      ReadAmplification, with ratios of 0 when fio read no bytes
+  """
+  return ReadAmplification(
+      io_bytes=io_bytes,
+      gcs_read_bytes=gcs_read_bytes,
+      readers_opened=readers_opened,
+      read_amplification=gcs_read_bytes / io_bytes if io_bytes else 0.0,
+      readers_opened_per_mb=readers_opened * MB / io_bytes if io_bytes else 0.0)
+
+
+def pivot_rows(columns_list) -> Tuple[List[str], List[list]]:
+  """Pivots a list of {column: value} dicts into a header and rows.
+
+  The columns are sorted, and missing values (e.g. a FUSE op that did not occur
+  in a job) are 0.
+
+    Args:
+      columns_list (list[dict[str, float]]): One dict per row
+    Returns:
+      (list[str] header, list[list[float]] rows)
+  """
+  header = sorted({column for columns in columns_list for column in columns})
+  rows = [[columns.get(column, 0) for column in header]
+          for columns in columns_list]
+  return header, rows
+
 
 class VmMetrics:
 
@@ -316,6 +658,129 @@ class VmMetrics:
 
     return metrics_data
 
+  def fetch_metric_total(self, start_time_sec, end_time_sec, instance,
+                         metric):
+    """Returns the sum of the values of a metric over the interval.
+
+    The interval is aligned as a single period of at least MIN_PERIOD_SEC.
+
+    Args:
+      start_time_sec (int): Epoch seconds
+      end_time_sec (int): Epoch seconds
+      instance (str): VM instance
+      metric: Metric object, with a delta aligner for a meaningful sum
+    Returns:
+      float, 0 when no values were retrieved
+    """
+    self._validate_start_end_times(start_time_sec, end_time_sec)
+    period = _get_view_period(start_time_sec, end_time_sec)
+    try:
+      metric_points = self._get_metrics(
+          start_time_sec, get_metric_window_end(start_time_sec, end_time_sec),
+          instance, period, metric)
+    except NoValuesError:
+      return 0
+    return sum(metric_point.value for metric_point in metric_points)
+
+  def fetch_gcs_reads(self, start_time_sec, end_time_sec,
+                      instance) -> Tuple[float, float]:
+    """Fetches the bytes read from GCS and the readers opened over the interval.
+
+    Args:
+      start_time_sec (int): Epoch seconds
+      end_time_sec (int): Epoch seconds
+      instance (str): VM instance
+    Returns:
+      (gcs/read_bytes_count, gcs/reader_count opened), see fetch_metric_total
+    """
+    return (self.fetch_metric_total(start_time_sec, end_time_sec, instance,
+                                    READ_BYTES_COUNT),
+            self.fetch_metric_total(start_time_sec, end_time_sec, instance,
+                                    READER_OPENED_COUNT))
+
+  def _fetch_view(self, start_time_sec, end_time_sec, instance, view):
+    """Fetches a gcsfuse view aligned as a single period over the interval.
+
+    The period is at least MIN_PERIOD_SEC, see _get_view_period.
+
+    Args:
+      start_time_sec (int): Epoch seconds
+      end_time_sec (int): Epoch seconds
+      instance (str): VM instance
+      view: GcsfuseView object
+    Returns:
+      dict[tuple of label values, Histogram] for a distribution view,
+      dict[tuple of label values, float total] otherwise
+    """
+    period = _get_view_period(start_time_sec, end_time_sec)
+    metric = view.get_metric()
+    metrics_response = self._get_api_response(start_time_sec,
+                                              start_time_sec + period,
+                                              instance, period, metric)
+    if view.is_distribution:
+      return _create_labeled_histograms_from_response(metrics_response,
+                                                      view.labels)
+    metric_points = _create_labeled_metric_points_from_response(
+        metrics_response, metric.factor, view.labels)
+    return {
+        label_values: sum(point.value for point in points)
+        for label_values, points in metric_points.items()
+        if points
+    }
+
+  def fetch_gcsfuse_metrics(self, start_time_sec, end_time_sec, instance,
+                            views=None) -> Dict[str, float]:
+    """Fetches gcsfuse views over the interval, with a column per label value.
+
+    The interval is aligned as a single period of at least MIN_PERIOD_SEC.
+
+    Args:
+      start_time_sec (int): Epoch seconds
+      end_time_sec (int): Epoch seconds
+      instance (str): VM instance
+      views (list[GcsfuseView]): The views to fetch, GCSFUSE_VIEWS by default
+    Returns:
+      dict[column, value], e.g. {'gcs/request_count/NewReader': 120,
+      'fs/ops_latency/ReadFile/p99': 35.2}. Views without values in the
+      interval have no columns.
+    """
+    self._validate_start_end_times(start_time_sec, end_time_sec)
+    columns = {}
+    for view in views or GCSFUSE_VIEWS:
+      values = self._fetch_view(start_time_sec, end_time_sec, instance, view)
+      for label_values, value in sorted(values.items()):
+        column = view.get_column(label_values)
+        if not view.is_distribution:
+          columns[column] = value
+          continue
+        if not value.count:
+          continue
+        columns[column] = value.mean
+        for percentile, estimate in zip(PERCENTILES,
+                                        value.percentiles(PERCENTILES)):
+          columns[f'{column}/p{percentile:g}'] = estimate
+    return columns
+
+  def fetch_op_mix(self, start_time_sec, end_time_sec, instance) -> List[OpMix]:
+    """Fetches the count and latency of every FUSE op over the interval.
+
+    Args:
+      start_time_sec (int): Epoch seconds
+      end_time_sec (int): Epoch seconds
+      instance (str): VM instance
+    Returns:
+      list[OpMix], see get_op_mix
+    """
+    self._validate_start_end_times(start_time_sec, end_time_sec)
+    ops_counts = self._fetch_view(start_time_sec, end_time_sec, instance,
+                                  FS_OPS_COUNT)
+    latencies = self._fetch_view(start_time_sec, end_time_sec, instance,
+                                 FS_OPS_LATENCY)
+    return get_op_mix(
+        {fs_op: count for (fs_op,), count in ops_counts.items()},
+        {fs_op: histogram for (fs_op,), histogram in latencies.items()},
+        _get_view_period(start_time_sec, end_time_sec))
+
   def fetch_metrics_and_write_to_google_sheet(self, start_time_sec,
                                               end_time_sec, instance, period,
                                               test_type, worksheet_name):
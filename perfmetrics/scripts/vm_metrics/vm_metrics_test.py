@@ -103,6 +103,24 @@ def get_response_from_filename(filename):
   return metrics_response
 
 
+def get_labeled_response(labels, values, value_type=2):
+  """Returns a time series with the given labels and one int64 point per value."""
+  points = []
+  for i, value in enumerate(values):
+    points.append(MetricsResponseObject({
+        'interval': MetricsResponseObject({
+            'start_time': MetricsResponseObject({'seconds': TEST_START_TIME_SEC + 60 * i}),
+            'end_time': MetricsResponseObject({'seconds': TEST_START_TIME_SEC + 60 * (i + 1)}),
+        }),
+        'value': MetricsResponseObject({'int64_value': value}),
+    }))
+  return MetricsResponseObject({
+      'metric': MetricsResponseObject({'labels': labels}),
+      'value_type': value_type,
+      'points': points,
+  })
+
+
 class TestVmmetricsTest(unittest.TestCase):
 
   def setUp(self):
@@ -301,5 +319,251 @@ class TestVmmetricsTest(unittest.TestCase):
 
     self.assertEqual(ops_error_count_data, EXPECTED_OPS_ERROR_COUNT_DATA)
 
+  @mock.patch.object(vm_metrics.VmMetrics, '_get_api_response')
+  def test_fetch_metric_total(self, mock_get_api_response):
+    metrics_response = get_response_from_filename(
+        'read_bytes_count_response')
+    mock_get_api_response.return_value = [metrics_response]
+
+    total = self.vm_metrics_obj.fetch_metric_total(
+        TEST_START_TIME_SEC, TEST_START_TIME_SEC + 30, TEST_INSTANCE,
+        READ_BYTES_COUNT)
+
+    self.assertEqual(725685157.0 + 746803219.0 + 759282126.0, total)
+    self.assertEqual(60, mock_get_api_response.call_args[0][3])
+
+  def test_get_metric_window_end(self):
+    self.assertEqual(160, vm_metrics.get_metric_window_end(100, 130))
+    self.assertEqual(190, vm_metrics.get_metric_window_end(100, 190))
+
+  @mock.patch.object(vm_metrics.VmMetrics, '_get_api_response')
+  def test_fetch_metric_total_without_values_returns_zero(
+      self, mock_get_api_response):
+    mock_get_api_response.return_value = {}
+
+    total = self.vm_metrics_obj.fetch_metric_total(
+        TEST_START_TIME_SEC, TEST_END_TIME_SEC, TEST_INSTANCE,
+        vm_metrics.READER_OPENED_COUNT)
+
+    self.assertEqual(0, total)
+
+  def test_gcsfuse_view_get_metric(self):
+    metric = vm_metrics.FS_OPS_ERROR_COUNT.get_metric()
+
+    self.assertEqual(OPS_ERROR_COUNT_METRIC_TYPE, metric.metric_type)
+    self.assertEqual('ALIGN_DELTA', metric.aligner)
+    self.assertEqual('REDUCE_SUM', metric.reducer)
+    self.assertEqual(['metric.labels.fs_op', 'metric.labels.fs_error'],
+                     metric.group_fields)
+
+  def test_create_labeled_metric_points_from_response(self):
+    metrics_response = [
+        get_labeled_response({'gcs_method': 'NewReader'}, [3, 4]),
+        get_labeled_response({'gcs_method': 'StatObject'}, [5]),
+    ]
+
+    metric_points = vm_metrics._create_labeled_metric_points_from_response(
+        metrics_response, 1, ['gcs_method'])
+
+    self.assertEqual([4, 3], [p.value for p in metric_points[('NewReader',)]])
+    self.assertEqual([5], [p.value for p in metric_points[('StatObject',)]])
+
+  def test_pivot_rows(self):
+    header, rows = vm_metrics.pivot_rows([{'b': 1, 'a': 2}, {'c': 3}])
+
+    self.assertEqual(['a', 'b', 'c'], header)
+    self.assertEqual([[2, 1, 0], [0, 0, 3]], rows)
+
+  @mock.patch.object(vm_metrics.VmMetrics, '_get_api_response')
+  def test_fetch_gcsfuse_metrics(self, mock_get_api_response):
+    mock_get_api_response.side_effect = [
+        [get_labeled_response({'io_method': 'opened'}, [2, 3]),
+         get_labeled_response({'io_method': 'closed'}, [1])],
+        [],
+    ]
+
+    columns = self.vm_metrics_obj.fetch_gcsfuse_metrics(
+        TEST_START_TIME_SEC, TEST_START_TIME_SEC + 30, TEST_INSTANCE,
+        [vm_metrics.GCS_READER_COUNT, vm_metrics.GCS_REQUEST_COUNT])
+
+    self.assertEqual({'gcs/reader_count/opened': 5,
+                      'gcs/reader_count/closed': 1}, columns)
+    self.assertEqual(60, mock_get_api_response.call_args[0][3])
+
+  @mock.patch.object(vm_metrics.VmMetrics, '_get_api_response')
+  def test_fetch_gcsfuse_metrics_merges_distributions(
+      self, mock_get_api_response):
+    metrics_response = get_response_from_filename(
+        'request_latencies_distribution_response')
+    metrics_response.metric = MetricsResponseObject(
+        {'labels': {'gcs_method': 'NewReader'}})
+    mock_get_api_response.return_value = [metrics_response]
+
+    columns = self.vm_metrics_obj.fetch_gcsfuse_metrics(
+        TEST_START_TIME_SEC, TEST_END_TIME_SEC, TEST_INSTANCE,
+        [vm_metrics.GCS_REQUEST_LATENCIES])
+
+    self.assertEqual([
+        'gcs/request_latencies/NewReader',
+        'gcs/request_latencies/NewReader/p50',
+        'gcs/request_latencies/NewReader/p90',
+        'gcs/request_latencies/NewReader/p99',
+        'gcs/request_latencies/NewReader/p99.9'
+    ], list(columns))
+    self.assertEqual(10, columns['gcs/request_latencies/NewReader'])
+    self.assertAlmostEqual(5 + 40 / 90 * 5,
+                           columns['gcs/request_latencies/NewReader/p50'])
+
+  def test_histogram_from_explicit_buckets(self):
+    metric = get_response_from_filename(
+        'request_latencies_distribution_response')
+
+    histogram = vm_metrics.Histogram.from_distribution_value(
+        metric.points[0].value.distribution_value)
+
+    self.assertEqual([0, 5, 10, 20, 50], list(histogram.bounds))
+    self.assertEqual(100, histogram.count)
+    self.assertEqual(12.5, histogram.mean)
+    self.assertEqual([10, 20, 50, 50],
+                     list(histogram.percentiles(vm_metrics.PERCENTILES)))
+
+  def test_histogram_pads_omitted_bucket_counts(self):
+    metric = get_response_from_filename(
+        'request_latencies_distribution_response')
+
+    histogram = vm_metrics.Histogram.from_distribution_value(
+        metric.points[1].value.distribution_value)
+
+    self.assertEqual([0, 50, 50, 0, 0, 0], list(histogram.counts))
+
+  def test_histogram_from_exponential_buckets(self):
+    distribution_value = dict_to_obj({
+        'count': 3, 'mean': 3,
+        'bucket_options': {'exponential_buckets': {
+            'num_finite_buckets': 3, 'growth_factor': 2, 'scale': 1}},
+        'bucket_counts': [0, 1, 1, 1]
+    })
+
+    histogram = vm_metrics.Histogram.from_distribution_value(
+        distribution_value)
+
+    self.assertEqual([1, 2, 4, 8], list(histogram.bounds))
+
+  def test_histogram_from_linear_buckets(self):
+    distribution_value = dict_to_obj({
+        'count': 1, 'mean': 3,
+        'bucket_options': {'linear_buckets': {
+            'num_finite_buckets': 2, 'width': 5, 'offset': 1}},
+        'bucket_counts': [0, 1]
+    })
+
+    histogram = vm_metrics.Histogram.from_distribution_value(
+        distribution_value)
+
+    self.assertEqual([1, 6, 11], list(histogram.bounds))
+    self.assertEqual([0, 1, 0, 0], list(histogram.counts))
+
+  def test_histogram_without_bucket_options_raises_value_error(self):
+    distribution_value = dict_to_obj({'count': 0, 'mean': 0,
+                                      'bucket_options': {}})
+
+    with self.assertRaises(ValueError):
+      vm_metrics.Histogram.from_distribution_value(distribution_value)
+
+  def test_empty_histogram_percentiles_are_nan(self):
+    histogram = vm_metrics.Histogram(vm_metrics.np.array([1.0, 2.0]),
+                                     vm_metrics.np.zeros(3))
+
+    self.assertTrue(all(vm_metrics.np.isnan(histogram.percentiles([50]))))
+
+  def test_merge_histograms(self):
+    metric = get_response_from_filename(
+        'request_latencies_distribution_response')
+    histograms = [
+        vm_metrics.Histogram.from_distribution_value(
+            point.value.distribution_value) for point in metric.points
+    ]
+
+    merged = vm_metrics.merge_histograms(histograms)
+
+    self.assertEqual([0, 60, 90, 40, 9, 1], list(merged.counts))
+    self.assertEqual(10, merged.mean)
+    self.assertEqual(list(merged.counts),
+                     list(histograms[0].merge(histograms[1]).counts))
+
+  def test_merge_histograms_with_different_bounds_raises_value_error(self):
+    first = vm_metrics.Histogram(vm_metrics.np.array([1.0]),
+                                 vm_metrics.np.zeros(2))
+    second = vm_metrics.Histogram(vm_metrics.np.array([2.0]),
+                                  vm_metrics.np.zeros(2))
+
+    with self.assertRaises(ValueError):
+      vm_metrics.merge_histograms([first, second])
+
+  def test_get_op_mix(self):
+    bounds = vm_metrics.np.array([0.0, 10.0])
+    latencies = {
+        'ReadFile': vm_metrics.Histogram(bounds, vm_metrics.np.array([0, 4, 0]), 20),
+        'LookUpInode': vm_metrics.Histogram(bounds, vm_metrics.np.array([0, 8, 0]), 60),
+    }
+
+    op_mix = vm_metrics.get_op_mix({'ReadFile': 4, 'LookUpInode': 8, 'OpenFile': 2},
+                                   latencies, 2)
+
+    self.assertEqual(['LookUpInode', 'ReadFile', 'OpenFile'],
+                     [op.fs_op for op in op_mix])
+    self.assertEqual(4, op_mix[0].ops_per_sec)
+    self.assertEqual(7.5, op_mix[0].mean_latency_ms)
+    self.assertEqual(0.75, op_mix[0].latency_share)
+    self.assertEqual(0.25, op_mix[1].latency_share)
+    self.assertEqual(0, op_mix[2].latency_share)
+    self.assertEqual(0, op_mix[2].p99_latency_ms)
+
+  def test_get_read_amplification(self):
+    amplification = vm_metrics.get_read_amplification(4 * 10**6, 10**7, 20)
+
+    self.assertEqual(2.5, amplification.read_amplification)
+    self.assertEqual(5, amplification.readers_opened_per_mb)
+    self.assertEqual(
+        0, vm_metrics.get_read_amplification(0, 10, 1).read_amplification)
+
+  @mock.patch.object(vm_metrics.VmMetrics, '_get_api_response')
+  def test_fetch_gcs_reads(self, mock_get_api_response):
+    mock_get_api_response.side_effect = [
+        [get_response_from_filename('read_bytes_count_response')],
+        [get_labeled_response({'io_method': 'opened'}, [3, 4])],
+    ]
+
+    read_bytes, readers_opened = self.vm_metrics_obj.fetch_gcs_reads(
+        TEST_START_TIME_SEC, TEST_START_TIME_SEC + 30, TEST_INSTANCE)
+
+    self.assertEqual(725685157.0 + 746803219.0 + 759282126.0, read_bytes)
+    self.assertEqual(7, readers_opened)
+    self.assertEqual(vm_metrics.READER_COUNT_METRIC_TYPE,
+                     mock_get_api_response.call_args[0][4].metric_type)
+
+  @mock.patch.object(vm_metrics.VmMetrics, '_get_api_response')
+  def test_fetch_op_mix(self, mock_get_api_response):
+    latency_response = get_response_from_filename(
+        'request_latencies_distribution_response')
+    latency_response.metric = MetricsResponseObject(
+        {'labels': {'fs_op': 'ReadFile'}})
+    mock_get_api_response.side_effect = [
+        [get_labeled_response({'fs_op': 'ReadFile'}, [150, 50])],
+        [latency_response],
+    ]
+
+    op_mix = self.vm_metrics_obj.fetch_op_mix(TEST_START_TIME_SEC,
+                                              TEST_START_TIME_SEC + 100,
+                                              TEST_INSTANCE)
+
+    self.assertEqual(1, len(op_mix))
+    self.assertEqual(200, op_mix[0].ops_count)
+    self.assertEqual(2, op_mix[0].ops_per_sec)
+    self.assertEqual(10, op_mix[0].mean_latency_ms)
+    self.assertEqual(1, op_mix[0].latency_share)
+    self.assertEqual(vm_metrics.OPS_LATENCY_METRIC_TYPE,
+                     mock_get_api_response.call_args[0][4].metric_type)
+
 if __name__ == '__main__':
   unittest.main()